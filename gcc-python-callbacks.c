@@ -132,6 +132,7 @@ PyGcc_FinishInvokingCallback(PyGILState_STATE gstate,
     PyObject *result = NULL;
     gcc_location saved_loc = gcc_get_input_location();
     enum plugin_event saved_event;
+    struct PyGccTimerSample sample;
 
     assert(closure);
     /* We take ownership of wrapped_gcc_data.
@@ -154,7 +155,9 @@ PyGcc_FinishInvokingCallback(PyGILState_STATE gstate,
     saved_event = current_event;
     current_event = closure->event;
 
+    PyGcc_timer_start(&sample);
     result = PyObject_Call(closure->callback, args, closure->kwargs);
+    PyGcc_timer_stop(closure->timer, &sample);
 
     current_event = saved_event;
 
@@ -314,6 +317,13 @@ PyGcc_RegisterCallback(PyObject *self, PyObject *args, PyObject *kwargs)
         return PyErr_NoMemory();
     }
 
+    closure->timer = PyGcc_timer_for_callback((enum plugin_event)event,
+                                              callback);
+    if (!closure->timer) {
+        PyGcc_closure_free(closure);
+        return NULL;
+    }
+
     switch ((enum plugin_event)event) {
     case PLUGIN_ATTRIBUTES:
         register_callback("python", // FIXME
@@ -102,7 +102,8 @@ error:
     return NULL;
 }
 
-static PyObject *cgraph_edge_wrapper_cache = NULL;
+static PyGccWrapperCache cgraph_edge_wrapper_cache =
+    PyGccWrapperCache_INIT("gcc.CallgraphEdge");
 PyObject *
 PyGccCallgraphEdge_New(gcc_cgraph_edge edge)
 {
@@ -153,7 +154,8 @@ PyGcc_WrtpMarkForPyGccCallgraphNode(PyGccCallgraphNode *wrapper)
 }
 
 
-static PyObject *cgraph_node_wrapper_cache = NULL;
+static PyGccWrapperCache cgraph_node_wrapper_cache =
+    PyGccWrapperCache_INIT("gcc.CallgraphNode");
 PyObject *
 PyGccCallgraphNode_New(gcc_cgraph_node node)
 {
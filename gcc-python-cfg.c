@@ -70,7 +70,8 @@ error:
     return NULL;
 }
 
-static PyObject *edge_wrapper_cache = NULL;
+static PyGccWrapperCache edge_wrapper_cache =
+    PyGccWrapperCache_INIT("gcc.Edge");
 
 PyObject *
 PyGccEdge_New(gcc_cfg_edge e)
@@ -169,106 +170,6 @@ PyGccBasicBlock_get_rtl(PyGccBasicBlock *self, void *closure)
 }
 
 
-/*
-  Force a 1-1 mapping between pointer values and wrapper objects
- */
-PyObject *
-PyGcc_LazilyCreateWrapper(PyObject **cache,
-				 void *ptr,
-				 PyObject *(*ctor)(void *ptr))
-{
-    PyObject *key = NULL;
-    PyObject *oldobj = NULL;
-    PyObject *newobj = NULL;
-
-    /* printf("PyGcc_LazilyCreateWrapper(&%p, %p, %p)\n", *cache, ptr, ctor); */
-
-    assert(cache);
-    /* ptr is allowed to be NULL */
-    assert(ctor);
-
-    /* The cache is lazily created: */
-    if (!*cache) {
-	*cache = PyDict_New();
-	if (!*cache) {
-	    return NULL;
-	}
-    }
-
-    key = PyLong_FromVoidPtr(ptr);
-    if (!key) {
-	return NULL;
-    }
-
-    oldobj = PyDict_GetItem(*cache, key);
-    if (oldobj) {
-	/* The cache already contains an object wrapping "ptr": reuse t */
-	/* printf("reusing %p for %p\n", oldobj, ptr); */
-	Py_INCREF(oldobj); /* it was a borrowed ref */
-	Py_DECREF(key);
-	return oldobj;
-    }
-
-    /* 
-       Not in the cache: we don't yet have a wrapper object for this pointer
-    */
-       
-    assert(NULL != key); /* we own a ref */
-    assert(NULL == oldobj);
-    assert(NULL == newobj);
-
-    /* Construct a wrapper : */
-
-    newobj = (*ctor)(ptr);
-    if (!newobj) {
-	Py_DECREF(key);
-	return NULL;
-    }
-
-    /* printf("created %p for %p\n", newobj, ptr); */
-
-    if (PyDict_SetItem(*cache, key, newobj)) {
-	Py_DECREF(newobj);
-	Py_DECREF(key);
-	return NULL;
-    }
-
-    Py_DECREF(key);
-    return newobj;
-}
-
-int
-PyGcc_insert_new_wrapper_into_cache(PyObject **cache,
-                                         void *ptr,
-                                         PyObject *obj)
-{
-    PyObject *key;
-    assert(cache);
-    assert(ptr);
-    assert(obj);
-
-    /* The cache is lazily created: */
-    if (!*cache) {
-	*cache = PyDict_New();
-	if (!*cache) {
-	    return -1;
-	}
-    }
-
-    key = PyLong_FromVoidPtr(ptr);
-    if (!key) {
-	return -1;
-    }
-
-    if (PyDict_SetItem(*cache, key, obj)) {
-	Py_DECREF(key);
-	return -1;
-    }
-
-    Py_DECREF(key);
-    return 0;
-}
-
 union cfg_block_or_ptr {
     gcc_cfg_block block;
     void *ptr;
@@ -368,7 +269,8 @@ PyGcc_WrtpMarkForPyGccBasicBlock(PyGccBasicBlock *wrapper)
 }
 
 
-static PyObject *basic_block_wrapper_cache = NULL;
+static PyGccWrapperCache basic_block_wrapper_cache =
+    PyGccWrapperCache_INIT("gcc.BasicBlock");
 PyObject *
 PyGccBasicBlock_New(gcc_cfg_block bb)
 {
@@ -481,7 +383,8 @@ error:
     return NULL;
 }
 
-static PyObject *cfg_wrapper_cache = NULL;
+static PyGccWrapperCache cfg_wrapper_cache =
+    PyGccWrapperCache_INIT("gcc.Cfg");
 PyObject *
 PyGccCfg_New(gcc_cfg cfg)
 {
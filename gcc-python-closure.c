@@ -63,6 +63,7 @@ PyGcc_closure_new_generic(PyObject *callback, PyObject *extraargs, PyObject *kwa
     }
 
     closure->event = (enum plugin_event)GCC_PYTHON_PLUGIN_BAD_EVENT;
+    closure->timer = NULL;
 
     return closure;
 }
@@ -27,6 +27,8 @@ struct callback_closure
     PyObject *kwargs;
     enum plugin_event event;
       /* or GCC_PYTHON_PLUGIN_BAD_EVENT if not an event */
+    struct PyGccTimer *timer;
+      /* or NULL if calls aren't being timed */
 };
 
 struct callback_closure *
@@ -30,6 +30,20 @@
 
 #include "function.h"
 #include "gcc-c-api/gcc-function.h"
+#include "gcc-c-api/gcc-gimple.h"
+#include "gcc-c-api/gcc-location.h"
+
+/* gimple_phi_arg_def etc were in tree-flow-inline.h prior to 4.9, when they
+   moved to gimple.h  */
+#if (GCC_VERSION < 4009)
+#include "tree-flow.h"
+#include "tree-flow-inline.h"
+#endif
+
+/* "maybe_get_identifier" was moved from tree.h to stringpool.h in 4.9 */
+#if (GCC_VERSION >= 4009)
+#include "stringpool.h" /* for maybe_get_identifier */
+#endif
 
 PyObject *
 PyGccFunction_repr(struct PyGccFunction * self)
@@ -180,6 +194,645 @@ PyGcc_WrtpMarkForPyGccFunction(PyGccFunction *wrapper)
 }
 
 
+/*
+  gcc.Function.export()
+
+  Build a snapshot of the function's CFG and gimple in a single pass,
+  referring to blocks, statements, trees and locations by integer ids, so
+  that analyses don't need to cross the C/Python boundary (and create
+  wrapper objects and lists) for every block, statement and operand.
+*/
+struct export_state {
+    /* list of tuples, one per statement: */
+    PyObject *stmts;
+
+    /* list of gcc.Tree, and a dict mapping from them to their ids: */
+    PyObject *trees;
+    PyObject *tree_ids;
+
+    /* list of (filename, line, column), and a dict mapping from the
+       location_t to their ids: */
+    PyObject *locations;
+    PyObject *location_ids;
+    location_t last_loc;
+    PyObject *last_loc_id;
+
+    PyObject *blocks;
+    PyObject *edges;
+
+    /* ids of the phi nodes and other statements within the current block: */
+    int bb_index;
+    PyObject *phi_ids;
+    PyObject *stmt_ids;
+};
+
+static PyObject *
+export_tree_id(struct export_state *state, gcc_tree t)
+{
+    PyObject *tree_obj;
+    PyObject *id_obj;
+
+    if (!t.inner) {
+        return PyGccInt_FromLong(-1);
+    }
+
+    /* (this is a cache hit for any tree we've already seen) */
+    tree_obj = PyGccTree_New(t);
+    if (!tree_obj) {
+        return NULL;
+    }
+
+    id_obj = PyDict_GetItem(state->tree_ids, tree_obj);
+    if (id_obj) {
+        Py_INCREF(id_obj);
+        Py_DECREF(tree_obj);
+        return id_obj;
+    }
+
+    id_obj = PyGccInt_FromLong(PyList_GET_SIZE(state->trees));
+    if (!id_obj) {
+        goto error;
+    }
+    if (-1 == PyList_Append(state->trees, tree_obj)) {
+        goto error;
+    }
+    if (-1 == PyDict_SetItem(state->tree_ids, tree_obj, id_obj)) {
+        goto error;
+    }
+    Py_DECREF(tree_obj);
+    return id_obj;
+
+ error:
+    Py_DECREF(tree_obj);
+    Py_XDECREF(id_obj);
+    return NULL;
+}
+
+static PyObject *
+export_location_id(struct export_state *state, gcc_location loc)
+{
+    PyObject *key = NULL;
+    PyObject *id_obj = NULL;
+    PyObject *loc_obj = NULL;
+
+    if (gcc_location_is_unknown(loc)) {
+        return PyGccInt_FromLong(-1);
+    }
+
+    /* Consecutive statements often share a location: */
+    if (state->last_loc_id && loc.inner == state->last_loc) {
+        Py_INCREF(state->last_loc_id);
+        return state->last_loc_id;
+    }
+
+    key = PyLong_FromUnsignedLong(loc.inner);
+    if (!key) {
+        return NULL;
+    }
+
+    id_obj = PyDict_GetItem(state->location_ids, key);
+    if (id_obj) {
+        Py_INCREF(id_obj);
+    } else {
+        id_obj = PyGccInt_FromLong(PyList_GET_SIZE(state->locations));
+        if (!id_obj) {
+            goto error;
+        }
+        loc_obj = Py_BuildValue("(sii)",
+                                gcc_location_get_filename(loc),
+                                gcc_location_get_line(loc),
+                                gcc_location_get_column(loc));
+        if (!loc_obj) {
+            goto error;
+        }
+        if (-1 == PyList_Append(state->locations, loc_obj)) {
+            goto error;
+        }
+        if (-1 == PyDict_SetItem(state->location_ids, key, id_obj)) {
+            goto error;
+        }
+        Py_DECREF(loc_obj);
+    }
+    Py_DECREF(key);
+
+    Py_XDECREF(state->last_loc_id);
+    Py_INCREF(id_obj);
+    state->last_loc_id = id_obj;
+    state->last_loc = loc.inner;
+
+    return id_obj;
+
+ error:
+    Py_XDECREF(key);
+    Py_XDECREF(id_obj);
+    Py_XDECREF(loc_obj);
+    return NULL;
+}
+
+/*
+  Add a tuple for the statement to state->stmts, and append its id to
+  "ids"; returns true on error (for use by the for_each iterators):
+*/
+static bool
+export_stmt(struct export_state *state, gcc_gimple stmt, PyObject *ids)
+{
+    gimple inner = stmt.inner;
+    PyObject *kind;
+    PyObject *loc_id = NULL;
+    PyObject *ops = NULL;
+    PyObject *extra = NULL;
+    PyObject *stmt_obj = NULL;
+    PyObject *id_obj = NULL;
+    unsigned int i;
+
+    kind = (PyObject*)PyGcc_autogenerated_gimple_type_for_stmt(stmt);
+    assert(kind);
+
+    loc_id = export_location_id(state, gcc_gimple_get_location(stmt));
+    if (!loc_id) {
+        goto error;
+    }
+
+    if (gimple_code(inner) == GIMPLE_PHI) {
+        /*
+          The result, followed by the arguments; "extra" gives the index of
+          the source block for each argument:
+        */
+        gcc_gimple_phi phi = gcc_gimple_as_gcc_gimple_phi(stmt);
+        unsigned int num_args = gimple_phi_num_args(inner);
+
+        ops = PyTuple_New(num_args + 1);
+        extra = PyTuple_New(num_args);
+        if (!ops || !extra) {
+            goto error;
+        }
+        PyTuple_SET_ITEM(ops, 0,
+                         export_tree_id(state, gcc_gimple_phi_get_result(phi)));
+        if (!PyTuple_GET_ITEM(ops, 0)) {
+            goto error;
+        }
+        for (i = 0; i < num_args; i++) {
+            edge arg_edge = gimple_phi_arg_edge(AS_A_GPHI(inner), i);
+            PyObject *arg_id;
+            PyObject *src_obj;
+
+            arg_id = export_tree_id(state,
+                                    gcc_private_make_tree(gimple_phi_arg_def(inner, i)));
+            if (!arg_id) {
+                goto error;
+            }
+            PyTuple_SET_ITEM(ops, i + 1, arg_id);
+
+            src_obj = PyGccInt_FromLong(arg_edge->src->index);
+            if (!src_obj) {
+                goto error;
+            }
+            PyTuple_SET_ITEM(extra, i, src_obj);
+        }
+    } else {
+        /* The operands, in GCC's internal order (see gimple_op): */
+        unsigned int num_ops = gimple_has_ops(inner) ? gimple_num_ops(inner) : 0;
+
+        ops = PyTuple_New(num_ops);
+        if (!ops) {
+            goto error;
+        }
+        for (i = 0; i < num_ops; i++) {
+            PyObject *op_id;
+
+            op_id = export_tree_id(state,
+                                   gcc_private_make_tree(gimple_op(inner, i)));
+            if (!op_id) {
+                goto error;
+            }
+            PyTuple_SET_ITEM(ops, i, op_id);
+        }
+
+        if (gimple_code(inner) == GIMPLE_CALL) {
+            /* The id of the callee's declaration, or -1 if it's not known: */
+            extra = export_tree_id(state,
+                                   gcc_gimple_call_get_fndecl(gcc_gimple_as_gcc_gimple_call(stmt)));
+            if (!extra) {
+                goto error;
+            }
+        } else {
+            extra = Py_None;
+            Py_INCREF(extra);
+        }
+    }
+
+    stmt_obj = Py_BuildValue("(OiOOO)", kind, state->bb_index, loc_id, ops, extra);
+    if (!stmt_obj) {
+        goto error;
+    }
+    id_obj = PyGccInt_FromLong(PyList_GET_SIZE(state->stmts));
+    if (!id_obj) {
+        goto error;
+    }
+    if (-1 == PyList_Append(state->stmts, stmt_obj)) {
+        goto error;
+    }
+    if (-1 == PyList_Append(ids, id_obj)) {
+        goto error;
+    }
+
+    Py_DECREF(loc_id);
+    Py_DECREF(ops);
+    Py_DECREF(extra);
+    Py_DECREF(stmt_obj);
+    Py_DECREF(id_obj);
+    return false;
+
+ error:
+    Py_XDECREF(loc_id);
+    Py_XDECREF(ops);
+    Py_XDECREF(extra);
+    Py_XDECREF(stmt_obj);
+    Py_XDECREF(id_obj);
+    return true;
+}
+
+static bool
+export_phi_cb(gcc_gimple_phi phi, void *user_data)
+{
+    struct export_state *state = (struct export_state *)user_data;
+
+    return export_stmt(state, gcc_gimple_phi_as_gcc_gimple(phi),
+                       state->phi_ids);
+}
+
+static bool
+export_stmt_cb(gcc_gimple stmt, void *user_data)
+{
+    struct export_state *state = (struct export_state *)user_data;
+
+    return export_stmt(state, stmt, state->stmt_ids);
+}
+
+static bool
+export_edge_cb(gcc_cfg_edge e, void *user_data)
+{
+    struct export_state *state = (struct export_state *)user_data;
+    PyObject *edge_obj;
+    int result;
+
+    edge_obj = Py_BuildValue("(iii)",
+                             gcc_cfg_block_get_index(gcc_cfg_edge_get_src(e)),
+                             gcc_cfg_block_get_index(gcc_cfg_edge_get_dest(e)),
+                             (int)e.inner->flags);
+    if (!edge_obj) {
+        return true;
+    }
+    result = PyList_Append(state->edges, edge_obj);
+    Py_DECREF(edge_obj);
+    return (-1 == result);
+}
+
+static bool
+export_block_cb(gcc_cfg_block block, void *user_data)
+{
+    struct export_state *state = (struct export_state *)user_data;
+    PyObject *block_obj = NULL;
+    bool result = true;
+
+    if (!block.inner) {
+        return false;
+    }
+
+    state->bb_index = gcc_cfg_block_get_index(block);
+    state->phi_ids = PyList_New(0);
+    state->stmt_ids = PyList_New(0);
+    if (!state->phi_ids || !state->stmt_ids) {
+        goto cleanup;
+    }
+
+    if (gcc_cfg_block_for_each_gimple_phi(block, export_phi_cb, state)) {
+        goto cleanup;
+    }
+    if (gcc_cfg_block_for_each_gimple(block, export_stmt_cb, state)) {
+        goto cleanup;
+    }
+    if (gcc_cfg_block_for_each_succ_edge(block, export_edge_cb, state)) {
+        goto cleanup;
+    }
+
+    block_obj = Py_BuildValue("(iO&O&)",
+                              state->bb_index,
+                              PyList_AsTuple, state->phi_ids,
+                              PyList_AsTuple, state->stmt_ids);
+    if (!block_obj) {
+        goto cleanup;
+    }
+    if (-1 == PyList_Append(state->blocks, block_obj)) {
+        goto cleanup;
+    }
+    result = false;
+
+ cleanup:
+    Py_XDECREF(block_obj);
+    Py_CLEAR(state->phi_ids);
+    Py_CLEAR(state->stmt_ids);
+    return result;
+}
+
+PyObject *
+PyGccFunction_export(struct PyGccFunction *self, PyObject *noargs)
+{
+    struct export_state state;
+    gcc_cfg cfg;
+    PyObject *result = NULL;
+
+    cfg = gcc_function_get_cfg(self->fun);
+    if (!cfg.inner) {
+        Py_RETURN_NONE;
+    }
+
+    memset(&state, 0, sizeof(state));
+    state.stmts = PyList_New(0);
+    state.trees = PyList_New(0);
+    state.tree_ids = PyDict_New();
+    state.locations = PyList_New(0);
+    state.location_ids = PyDict_New();
+    state.blocks = PyList_New(0);
+    state.edges = PyList_New(0);
+    if (!state.stmts || !state.trees || !state.tree_ids
+        || !state.locations || !state.location_ids
+        || !state.blocks || !state.edges) {
+        goto cleanup;
+    }
+
+    if (gcc_cfg_for_each_block(cfg, export_block_cb, &state)) {
+        goto cleanup;
+    }
+
+    result = Py_BuildValue("{s:O, s:O, s:O, s:O, s:O, s:i, s:i}",
+                           "blocks", state.blocks,
+                           "edges", state.edges,
+                           "stmts", state.stmts,
+                           "trees", state.trees,
+                           "locations", state.locations,
+                           "entry",
+                           gcc_cfg_block_get_index(gcc_cfg_get_entry(cfg)),
+                           "exit",
+                           gcc_cfg_block_get_index(gcc_cfg_get_exit(cfg)));
+
+ cleanup:
+    Py_XDECREF(state.stmts);
+    Py_XDECREF(state.trees);
+    Py_XDECREF(state.tree_ids);
+    Py_XDECREF(state.locations);
+    Py_XDECREF(state.location_ids);
+    Py_XDECREF(state.last_loc_id);
+    Py_XDECREF(state.blocks);
+    Py_XDECREF(state.edges);
+    return result;
+}
+
+/*
+  gcc.Function.gimple_list(kinds=None, callees=None)
+
+  Get a list of the statements in the function's CFG, filtering them by
+  kind and by callee before any wrapper objects get created, so that
+  sparse queries (such as "all calls to PyArg_ParseTuple") over large
+  functions don't have to wrap every statement.
+*/
+struct gimple_list_state {
+    /* tuple of types to match, or NULL for any kind of statement: */
+    PyObject *kinds;
+
+    /* cache of whether each gimple code matches "kinds"
+       (-1 for "not yet known"): */
+    signed char code_matches[LAST_AND_UNUSED_GIMPLE_CODE];
+
+    /* identifiers of the callees to match, or NULL for any statement: */
+    tree *callee_names;
+    Py_ssize_t num_callee_names;
+
+    PyObject *result;
+};
+
+/* Returns 1 if statements with the given code match, 0 if not, or -1 on
+   error: */
+static int
+gimple_list_code_matches(struct gimple_list_state *state,
+                         enum gimple_code code)
+{
+    if (state->code_matches[code] == -1) {
+        PyObject *type =
+            (PyObject*)PyGcc_autogenerated_gimple_type_for_code(code);
+        int matches;
+
+        if (state->num_callee_names && code != GIMPLE_CALL) {
+            matches = 0;
+        } else if (state->kinds) {
+            matches = PyObject_IsSubclass(type, state->kinds);
+            if (-1 == matches) {
+                return -1;
+            }
+        } else {
+            matches = 1;
+        }
+        state->code_matches[code] = matches;
+    }
+    return state->code_matches[code];
+}
+
+static bool
+gimple_list_cb(gcc_gimple stmt, void *user_data)
+{
+    struct gimple_list_state *state = (struct gimple_list_state *)user_data;
+    PyObject *stmt_obj;
+    int result;
+
+    result = gimple_list_code_matches(state, gimple_code(stmt.inner));
+    if (result != 1) {
+        return (-1 == result);
+    }
+
+    if (state->num_callee_names) {
+        gcc_tree fndecl =
+            gcc_gimple_call_get_fndecl(gcc_gimple_as_gcc_gimple_call(stmt));
+        Py_ssize_t i;
+
+        if (!fndecl.inner) {
+            return false;
+        }
+        for (i = 0; i < state->num_callee_names; i++) {
+            if (DECL_NAME(fndecl.inner) == state->callee_names[i]) {
+                break;
+            }
+        }
+        if (i == state->num_callee_names) {
+            return false;
+        }
+    }
+
+    stmt_obj = PyGccGimple_New(stmt);
+    if (!stmt_obj) {
+        return true;
+    }
+    result = PyList_Append(state->result, stmt_obj);
+    Py_DECREF(stmt_obj);
+    return (-1 == result);
+}
+
+static bool
+gimple_list_phi_cb(gcc_gimple_phi phi, void *user_data)
+{
+    return gimple_list_cb(gcc_gimple_phi_as_gcc_gimple(phi), user_data);
+}
+
+static bool
+gimple_list_block_cb(gcc_cfg_block block, void *user_data)
+{
+    struct gimple_list_state *state = (struct gimple_list_state *)user_data;
+    int phis_match;
+
+    if (!block.inner) {
+        return false;
+    }
+
+    /* Don't bother walking the phi nodes if they can't match: */
+    phis_match = gimple_list_code_matches(state, GIMPLE_PHI);
+    if (-1 == phis_match) {
+        return true;
+    }
+    if (phis_match) {
+        if (gcc_cfg_block_for_each_gimple_phi(block, gimple_list_phi_cb, state)) {
+            return true;
+        }
+    }
+
+    return gcc_cfg_block_for_each_gimple(block, gimple_list_cb, state);
+}
+
+/*
+  Convert the "callees" argument (an iterable of str) to an array of
+  identifiers.  A name that GCC has never seen as an identifier can't be the
+  name of any callee, so it doesn't need an entry; we note that by setting
+  *num_out to -1 if none of the names are known.
+*/
+static int
+gimple_list_get_callee_names(PyObject *callees,
+                             tree **names_out, Py_ssize_t *num_out)
+{
+    PyObject *seq;
+    tree *names;
+    Py_ssize_t i, num = 0;
+
+    seq = PySequence_Fast(callees, "callees must be an iterable of str");
+    if (!seq) {
+        return -1;
+    }
+
+    names = PyMem_New(tree, PySequence_Fast_GET_SIZE(seq) + 1);
+    if (!names) {
+        Py_DECREF(seq);
+        PyErr_NoMemory();
+        return -1;
+    }
+
+    for (i = 0; i < PySequence_Fast_GET_SIZE(seq); i++) {
+        PyObject *item = PySequence_Fast_GET_ITEM(seq, i);
+        const char *name;
+        tree t;
+
+        if (!PyGccString_Check(item)) {
+            PyErr_Format(PyExc_TypeError,
+                         "callees must be an iterable of str (got %s)",
+                         Py_TYPE(item)->tp_name);
+            goto error;
+        }
+        name = PyGccString_AsString(item);
+        if (!name) {
+            goto error;
+        }
+        t = maybe_get_identifier(name);
+        if (t) {
+            names[num++] = t;
+        }
+    }
+    Py_DECREF(seq);
+
+    *names_out = names;
+    *num_out = num ? num : -1;
+    return 0;
+
+ error:
+    Py_DECREF(seq);
+    PyMem_Free(names);
+    return -1;
+}
+
+PyObject *
+PyGccFunction_gimple_list(struct PyGccFunction *self,
+                          PyObject *args, PyObject *kwargs)
+{
+    struct gimple_list_state state;
+    gcc_cfg cfg;
+    PyObject *kinds = Py_None;
+    PyObject *callees = Py_None;
+    PyObject *result = NULL;
+    const char *keywords[] = {"kinds",
+                              "callees",
+                              NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs,
+                                     "|OO:gimple_list", (char**)keywords,
+                                     &kinds, &callees)) {
+        return NULL;
+    }
+
+    memset(&state, 0, sizeof(state));
+    memset(state.code_matches, -1, sizeof(state.code_matches));
+
+    if (kinds != Py_None) {
+        if (PyType_Check(kinds)) {
+            state.kinds = PyTuple_Pack(1, kinds);
+        } else {
+            state.kinds = PySequence_Tuple(kinds);
+        }
+        if (!state.kinds) {
+            return NULL;
+        }
+    }
+
+    if (callees != Py_None) {
+        if (PyGccString_Check(callees)) {
+            PyErr_SetString(PyExc_TypeError,
+                            "callees must be an iterable of str, not a str");
+            goto cleanup;
+        }
+        if (-1 == gimple_list_get_callee_names(callees,
+                                               &state.callee_names,
+                                               &state.num_callee_names)) {
+            goto cleanup;
+        }
+    }
+
+    state.result = PyList_New(0);
+    if (!state.result) {
+        goto cleanup;
+    }
+
+    /* (if none of the callees have ever been named, nothing can match) */
+    cfg = gcc_function_get_cfg(self->fun);
+    if (cfg.inner && state.num_callee_names != -1) {
+        if (gcc_cfg_for_each_block(cfg, gimple_list_block_cb, &state)) {
+            goto cleanup;
+        }
+    }
+
+    result = state.result;
+    state.result = NULL;
+
+ cleanup:
+    Py_XDECREF(state.kinds);
+    PyMem_Free(state.callee_names);
+    Py_XDECREF(state.result);
+    return result;
+}
+
 /*
   PEP-7  
 Local variables:
@@ -273,6 +273,45 @@ PyGccGimple_walk_tree(struct PyGccGimple * self, PyObject *args, PyObject *kwarg
     return PyGccTree_New(gcc_private_make_tree(result));
 }
 
+PyObject *
+PyGccGimple_find_trees(struct PyGccGimple * self, PyObject *args, PyObject *kwargs)
+{
+    gimple stmt = self->stmt.inner;
+    tree *roots;
+    unsigned int num_roots;
+    unsigned int i;
+    PyObject *result;
+
+    /* The same operands that walk_gimple_op visits: */
+    if (gimple_code(stmt) == GIMPLE_PHI) {
+        num_roots = gimple_phi_num_args(stmt) + 1;
+    } else if (gimple_has_ops(stmt)) {
+        num_roots = gimple_num_ops(stmt);
+    } else {
+        num_roots = 0;
+    }
+
+    roots = PyMem_New(tree, num_roots + 1);
+    if (!roots) {
+        return PyErr_NoMemory();
+    }
+
+    if (gimple_code(stmt) == GIMPLE_PHI) {
+        roots[0] = gcc_gimple_phi_get_result(PyGccGimple_as_gcc_gimple_phi(self)).inner;
+        for (i = 1; i < num_roots; i++) {
+            roots[i] = gimple_phi_arg_def(stmt, i - 1);
+        }
+    } else {
+        for (i = 0; i < num_roots; i++) {
+            roots[i] = gimple_op(stmt, i);
+        }
+    }
+
+    result = PyGcc_find_trees(roots, num_roots, args, kwargs);
+    PyMem_Free(roots);
+    return result;
+}
+
 PyObject *
 PyGccGimple_get_rhs(struct PyGccGimple *self, void *closure)
 {
@@ -391,9 +430,10 @@ PyGccGimpleSwitch_get_labels(struct PyGccGimple *self, void *closure)
 
 
 /*
-   Ensure we have a unique PyGccGimple per gimple address (by maintaining a dict):
+   Ensure we have a unique PyGccGimple per gimple address (by maintaining a cache):
 */
-static PyObject *gimple_wrapper_cache = NULL;
+static PyGccWrapperCache gimple_wrapper_cache =
+    PyGccWrapperCache_INIT("gcc.Gimple");
 
 union gcc_gimple_or_ptr {
     gcc_gimple stmt;
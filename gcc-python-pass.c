@@ -33,14 +33,15 @@
 */
 
 /*
-   Ensure we have a unique PyGccPass per pass address (by maintaining a dict)
+   Ensure we have a unique PyGccPass per pass address (by maintaining a cache)
 
-   For passes defined in Python, this dictionary maps from
-   long (struct opt_pass *) to the gcc.Pass wrapper object for that pass
+   For passes defined in Python, this cache maps from
+   (struct opt_pass *) to the gcc.Pass wrapper object for that pass
 
    The references on the right-hand-side keep these wrappers alive
 */
-static PyObject *pass_wrapper_cache = NULL;
+static PyGccWrapperCache pass_wrapper_cache =
+    PyGccWrapperCache_INIT_PERMANENT("gcc.Pass");
 
 static bool impl_gate(function *fun)
 {
@@ -49,6 +50,8 @@ static bool impl_gate(function *fun)
     PyObject* result_obj;
     int result;
     gcc_location saved_loc = gcc_get_input_location();
+    struct PyGccTimer *timer;
+    struct PyGccTimerSample sample;
 
     /*
        It appears that current_pass is not set by when gcc (4.7 at least) when
@@ -72,6 +75,17 @@ static bool impl_gate(function *fun)
         return true;
     }
 
+    timer = ((struct PyGccPass *)pass_obj)->gate_timer;
+    if (!timer) {
+        timer = PyGcc_timer_for_pass(current_pass, "gate", pass_obj);
+        if (timer) {
+            ((struct PyGccPass *)pass_obj)->gate_timer = timer;
+        } else {
+            /* Don't time it, rather than failing: */
+            PyErr_Clear();
+        }
+    }
+
     /* Supply the function, if any */
     if (fun) {
         assert (fun == cfun);
@@ -86,11 +100,14 @@ static bool impl_gate(function *fun)
             gcc_set_input_location(saved_loc);
             return false;
         }
+        PyGcc_timer_start(&sample);
         result_obj = PyObject_CallMethod(pass_obj, (char*)"gate", (char*)"O",
                                          cfun_obj, NULL);
     } else {
+        PyGcc_timer_start(&sample);
         result_obj = PyObject_CallMethod(pass_obj, (char*)"gate", NULL);
     }
+    PyGcc_timer_stop(timer, &sample);
 
     Py_XDECREF(cfun_obj);
     Py_DECREF(pass_obj);
@@ -113,11 +130,24 @@ static unsigned int impl_execute(function *fun)
     PyObject *cfun_obj = NULL;
     PyObject* result_obj;
     gcc_location saved_loc = gcc_get_input_location();
+    struct PyGccTimer *timer;
+    struct PyGccTimerSample sample;
 
     assert(current_pass);
     pass_obj = PyGccPass_New(current_pass);
     assert(pass_obj); /* we own a ref at this point */
 
+    timer = ((struct PyGccPass *)pass_obj)->execute_timer;
+    if (!timer) {
+        timer = PyGcc_timer_for_pass(current_pass, "execute", pass_obj);
+        if (timer) {
+            ((struct PyGccPass *)pass_obj)->execute_timer = timer;
+        } else {
+            /* Don't time it, rather than failing: */
+            PyErr_Clear();
+        }
+    }
+
     if (fun) {
         assert (fun == cfun);
         gcc_function cf = gcc_get_current_function();
@@ -131,11 +161,14 @@ static unsigned int impl_execute(function *fun)
             gcc_set_input_location(saved_loc);
             return false;
         }
+        PyGcc_timer_start(&sample);
         result_obj = PyObject_CallMethod(pass_obj, (char*)"execute",
                                          (char*)"O", cfun_obj, NULL);
     } else {
+        PyGcc_timer_start(&sample);
         result_obj = PyObject_CallMethod(pass_obj, (char*)"execute", NULL);
     }
+    PyGcc_timer_stop(timer, &sample);
 
     Py_XDECREF(cfun_obj);
     Py_DECREF(pass_obj);
@@ -345,6 +378,8 @@ do_pass_init(PyObject *s, PyObject *args, PyObject *kwargs,
     }
 
     self->pass = pass;
+    self->gate_timer = NULL;
+    self->execute_timer = NULL;
     return 0; // FIXME
 }
 
@@ -680,6 +715,8 @@ real_make_pass_wrapper(void *p)
     }
 
     pass_obj->pass = pass;
+    pass_obj->gate_timer = NULL;
+    pass_obj->execute_timer = NULL;
     /* FIXME: do we need to do something for the GCC GC? */
 
     return (PyObject*)pass_obj;
@@ -0,0 +1,530 @@
+/*
+   Copyright 2011, 2012 David Malcolm <dmalcolm@redhat.com>
+   Copyright 2011, 2012 Red Hat, Inc.
+
+   This is free software: you can redistribute it and/or modify it
+   under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful, but
+   WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+   General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see
+   <http://www.gnu.org/licenses/>.
+*/
+
+#include <Python.h>
+#include <time.h>
+#include "gcc-python.h"
+#include "gcc-python-wrappers.h"
+#include "function.h"
+
+/*
+  Timing of the Python code run by the plugin.
+
+  Each callback registered via gcc.register_callback() gets a timer when
+  it's registered (kept on its closure), and each Python pass gets a timer
+  for its "gate" and for its "execute" method when they are first called
+  (kept on its gcc.Pass).  Every invocation updates the call count, and the
+  wall-clock and CPU time spent within the Python code, along with the name
+  of the function being compiled during the slowest invocation.
+
+  This is always enabled: the overhead (a few clock reads per call) is
+  negligible compared to that of calling into Python.
+
+  The timers are exposed via gcc.get_plugin_stats(), and can be written
+  out as JSON at PLUGIN_FINISH via -fplugin-arg-python-stats=FILENAME
+
+  We also time each phase of the plugin's startup (initializing Python,
+  the "gcc" module and its types, and running any script).
+
+  Scripts can also record counts of their own alongside the timings, via
+  gcc.add_plugin_stat(); these are given by the "counters" entry.
+*/
+
+struct PyGccTimer {
+    /* "callback", or "gate"/"execute" for passes: */
+    const char *kind;
+
+    /* the name of the event, or of the pass: */
+    PyObject *detail;
+
+    /* the name of the Python callable, or of the pass's class: */
+    PyObject *name;
+
+    /* the pass being timed, or NULL for callbacks: */
+    struct opt_pass *pass;
+
+    unsigned long calls;
+    double wall_time;
+    double cpu_time;
+    double max_wall_time;
+    PyObject *slowest_function;
+
+    struct PyGccTimer *next;
+};
+
+static struct PyGccTimer *first_timer;
+static struct PyGccTimer *last_timer;
+
+static const char *event_names[] = {
+#define DEFEVENT(NAME) #NAME,
+# include "plugin.def"
+#undef DEFEVENT
+};
+
+static double
+get_wall_time(void)
+{
+    struct timespec ts;
+
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec * 1e-9;
+}
+
+static double
+get_cpu_time(void)
+{
+    struct timespec ts;
+
+    clock_gettime(CLOCK_PROCESS_CPUTIME_ID, &ts);
+    return ts.tv_sec + ts.tv_nsec * 1e-9;
+}
+
+/*
+  Get a name for a Python callable e.g. "module.function" or
+  "module.Class.method" (or just its repr, if that fails)
+*/
+static PyObject *
+get_name_of_callable(PyObject *callable)
+{
+    PyObject *module = NULL;
+    PyObject *name = NULL;
+    PyObject *result;
+
+    name = PyObject_GetAttrString(callable, "__qualname__");
+    if (!name) {
+        PyErr_Clear();
+        name = PyObject_GetAttrString(callable, "__name__");
+    }
+    if (!name || !PyGccString_Check(name)) {
+        PyErr_Clear();
+        Py_XDECREF(name);
+        return PyObject_Repr(callable);
+    }
+
+    module = PyObject_GetAttrString(callable, "__module__");
+    if (!module || !PyGccString_Check(module)) {
+        PyErr_Clear();
+        Py_XDECREF(module);
+        return name;
+    }
+
+    result = PyGccString_FromFormat("%s.%s",
+                                    PyGccString_AsString(module),
+                                    PyGccString_AsString(name));
+    Py_DECREF(module);
+    Py_DECREF(name);
+    return result;
+}
+
+static struct PyGccTimer *
+make_timer(const char *kind, PyObject *detail, PyObject *name)
+    CPYCHECKER_STEALS_REFERENCE_TO_ARG(2)
+    CPYCHECKER_STEALS_REFERENCE_TO_ARG(3);
+
+static struct PyGccTimer *
+make_timer(const char *kind, PyObject *detail, PyObject *name)
+{
+    struct PyGccTimer *timer;
+
+    if (!detail || !name) {
+        goto error;
+    }
+
+    timer = PyMem_New(struct PyGccTimer, 1);
+    if (!timer) {
+        PyErr_NoMemory();
+        goto error;
+    }
+    memset(timer, 0, sizeof(*timer));
+    timer->kind = kind;
+    timer->detail = detail;
+    timer->name = name;
+
+    /* Keep them in order of creation: */
+    if (last_timer) {
+        last_timer->next = timer;
+    } else {
+        first_timer = timer;
+    }
+    last_timer = timer;
+
+    return timer;
+
+ error:
+    Py_XDECREF(detail);
+    Py_XDECREF(name);
+    return NULL;
+}
+
+struct PyGccTimer *
+PyGcc_timer_for_callback(enum plugin_event event, PyObject *callback)
+{
+    const char *event_name = "(unknown event)";
+
+    if ((unsigned)event < sizeof(event_names) / sizeof(event_names[0])) {
+        event_name = event_names[event];
+    }
+
+    return make_timer("callback",
+                      PyGccString_FromString(event_name),
+                      get_name_of_callable(callback));
+}
+
+struct PyGccTimer *
+PyGcc_timer_for_pass(struct opt_pass *pass, const char *kind,
+                     PyObject *pass_obj)
+{
+    struct PyGccTimer *timer;
+
+    timer = make_timer(kind,
+                       PyGccStringOrNone(pass->name),
+                       get_name_of_callable((PyObject*)Py_TYPE(pass_obj)));
+    if (timer) {
+        timer->pass = pass;
+    }
+    return timer;
+}
+
+void
+PyGcc_timer_start(struct PyGccTimerSample *sample)
+{
+    sample->wall_start = get_wall_time();
+    sample->cpu_start = get_cpu_time();
+}
+
+void
+PyGcc_timer_stop(struct PyGccTimer *timer,
+                 const struct PyGccTimerSample *sample)
+{
+    double wall_time = get_wall_time() - sample->wall_start;
+    double cpu_time = get_cpu_time() - sample->cpu_start;
+
+    if (!timer) {
+        return;
+    }
+
+    timer->calls++;
+    timer->wall_time += wall_time;
+    timer->cpu_time += cpu_time;
+
+    if (timer->calls == 1 || wall_time > timer->max_wall_time) {
+        timer->max_wall_time = wall_time;
+        Py_CLEAR(timer->slowest_function);
+        if (cfun) {
+            /* The call may have raised an exception, which the caller has
+               yet to handle: */
+            PyObject *exc_type, *exc_value, *exc_tb;
+
+            PyErr_Fetch(&exc_type, &exc_value, &exc_tb);
+            timer->slowest_function =
+                PyGccString_FromString(current_function_name());
+            PyErr_Clear();
+            PyErr_Restore(exc_type, exc_value, exc_tb);
+        }
+    }
+}
+
+/*
+  Timing of the phases of the plugin's startup, for
+  -fplugin-arg-python-startup-stats
+*/
+#define MAX_STARTUP_PHASES 16
+
+static struct {
+    int num_phases;
+    double last_wall_time;
+    double last_cpu_time;
+    struct {
+        const char *name;
+        double wall_time;
+        double cpu_time;
+    } phases[MAX_STARTUP_PHASES];
+} startup;
+
+void
+PyGcc_startup_timing_begin(void)
+{
+    startup.num_phases = 0;
+    startup.last_wall_time = get_wall_time();
+    startup.last_cpu_time = get_cpu_time();
+}
+
+void
+PyGcc_startup_timing_mark(const char *phase)
+{
+    double wall_time = get_wall_time();
+    double cpu_time = get_cpu_time();
+
+    if (startup.num_phases < MAX_STARTUP_PHASES) {
+        startup.phases[startup.num_phases].name = phase;
+        startup.phases[startup.num_phases].wall_time =
+            wall_time - startup.last_wall_time;
+        startup.phases[startup.num_phases].cpu_time =
+            cpu_time - startup.last_cpu_time;
+        startup.num_phases++;
+    }
+    startup.last_wall_time = wall_time;
+    startup.last_cpu_time = cpu_time;
+}
+
+void
+PyGcc_startup_timing_report(void)
+{
+    double total_wall_time = 0.0;
+    double total_cpu_time = 0.0;
+    int i;
+
+    fprintf(stderr, "python plugin startup:\n");
+    for (i = 0; i < startup.num_phases; i++) {
+        fprintf(stderr, "  %-24s %8.2f ms wall %8.2f ms cpu\n",
+                startup.phases[i].name,
+                startup.phases[i].wall_time * 1000.0,
+                startup.phases[i].cpu_time * 1000.0);
+        total_wall_time += startup.phases[i].wall_time;
+        total_cpu_time += startup.phases[i].cpu_time;
+    }
+    fprintf(stderr, "  %-24s %8.2f ms wall %8.2f ms cpu\n",
+            "total",
+            total_wall_time * 1000.0,
+            total_cpu_time * 1000.0);
+}
+
+static PyObject *
+make_startup_list(void)
+{
+    PyObject *result;
+    int i;
+
+    result = PyList_New(startup.num_phases);
+    if (!result) {
+        return NULL;
+    }
+    for (i = 0; i < startup.num_phases; i++) {
+        PyObject *phase_dict;
+
+        phase_dict = Py_BuildValue("{s:s, s:d, s:d}",
+                                   "phase", startup.phases[i].name,
+                                   "wall_time", startup.phases[i].wall_time,
+                                   "cpu_time", startup.phases[i].cpu_time);
+        if (!phase_dict) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        PyList_SET_ITEM(result, i, phase_dict);
+    }
+    return result;
+}
+
+/*
+  Named counters, incremented by gcc.add_plugin_stat(); a dict from str to
+  int, or NULL if none have been added yet
+*/
+static PyObject *counters;
+
+PyObject *
+PyGcc_add_plugin_stat(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    const char *name;
+    long value = 1;
+    PyObject *old_value;
+    PyObject *new_value;
+    int err;
+    const char *keywords[] = {"name", "value",
+                              NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs,
+                                     "s|l:add_plugin_stat", (char**)keywords,
+                                     &name, &value)) {
+        return NULL;
+    }
+
+    if (!counters) {
+        counters = PyDict_New();
+        if (!counters) {
+            return NULL;
+        }
+    }
+
+    /* (borrowed ref) */
+    old_value = PyDict_GetItemString(counters, name);
+    if (old_value) {
+        value += PyGccInt_AsLong(old_value);
+    }
+
+    new_value = PyGccInt_FromLong(value);
+    if (!new_value) {
+        return NULL;
+    }
+    err = PyDict_SetItemString(counters, name, new_value);
+    Py_DECREF(new_value);
+    if (-1 == err) {
+        return NULL;
+    }
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+make_timer_dict(struct PyGccTimer *timer)
+{
+    PyObject *slowest_function;
+
+    slowest_function = timer->slowest_function ? timer->slowest_function : Py_None;
+
+    if (!timer->pass) {
+        return Py_BuildValue("{s:O, s:O, s:k, s:d, s:d, s:d, s:O}",
+                             "event", timer->detail,
+                             "name", timer->name,
+                             "calls", timer->calls,
+                             "wall_time", timer->wall_time,
+                             "cpu_time", timer->cpu_time,
+                             "max_wall_time", timer->max_wall_time,
+                             "slowest_function", slowest_function);
+    } else {
+        return Py_BuildValue("{s:O, s:s, s:O, s:k, s:d, s:d, s:d, s:O}",
+                             "pass", timer->detail,
+                             "method", timer->kind,
+                             "name", timer->name,
+                             "calls", timer->calls,
+                             "wall_time", timer->wall_time,
+                             "cpu_time", timer->cpu_time,
+                             "max_wall_time", timer->max_wall_time,
+                             "slowest_function", slowest_function);
+    }
+}
+
+PyObject *
+PyGcc_get_plugin_stats(PyObject *self, PyObject *args)
+{
+    PyObject *callbacks = NULL;
+    PyObject *passes = NULL;
+    PyObject *startup_list = NULL;
+    PyObject *counters_dict = NULL;
+    PyObject *result = NULL;
+    struct PyGccTimer *timer;
+
+    callbacks = PyList_New(0);
+    if (!callbacks) {
+        goto cleanup;
+    }
+    passes = PyList_New(0);
+    if (!passes) {
+        goto cleanup;
+    }
+
+    for (timer = first_timer; timer; timer = timer->next) {
+        PyObject *timer_dict = make_timer_dict(timer);
+        int err;
+
+        if (!timer_dict) {
+            goto cleanup;
+        }
+        err = PyList_Append(timer->pass ? passes : callbacks, timer_dict);
+        Py_DECREF(timer_dict);
+        if (-1 == err) {
+            goto cleanup;
+        }
+    }
+
+    startup_list = make_startup_list();
+    if (!startup_list) {
+        goto cleanup;
+    }
+
+    /* Give the caller a copy, so that it can't modify ours: */
+    if (counters) {
+        counters_dict = PyDict_Copy(counters);
+    } else {
+        counters_dict = PyDict_New();
+    }
+    if (!counters_dict) {
+        goto cleanup;
+    }
+
+    result = Py_BuildValue("{s:O, s:O, s:O, s:O}",
+                           "callbacks", callbacks,
+                           "passes", passes,
+                           "startup", startup_list,
+                           "counters", counters_dict);
+
+ cleanup:
+    Py_XDECREF(callbacks);
+    Py_XDECREF(passes);
+    Py_XDECREF(startup_list);
+    Py_XDECREF(counters_dict);
+    return result;
+}
+
+/*
+  Called at PLUGIN_FINISH if -fplugin-arg-python-stats was given: write out
+  the result of gcc.get_plugin_stats() as JSON to the given file, or to
+  stderr if filename is NULL
+*/
+void
+PyGcc_timing_write_stats(const char *filename)
+{
+    PyObject *stats = NULL;
+    PyObject *json_module = NULL;
+    PyObject *text = NULL;
+    FILE *f;
+
+    stats = PyGcc_get_plugin_stats(NULL, NULL);
+    if (!stats) {
+        goto error;
+    }
+    json_module = PyImport_ImportModule("json");
+    if (!json_module) {
+        goto error;
+    }
+    text = PyObject_CallMethod(json_module, (char*)"dumps", (char*)"O",
+                               stats);
+    if (!text) {
+        goto error;
+    }
+
+    if (filename) {
+        f = fopen(filename, "w");
+        if (!f) {
+            fprintf(stderr,
+                    "Unable to write plugin stats to: %s\n", filename);
+            goto cleanup;
+        }
+        fprintf(f, "%s\n", PyGccString_AsString(text));
+        fclose(f);
+    } else {
+        fprintf(stderr, "%s\n", PyGccString_AsString(text));
+    }
+    goto cleanup;
+
+ error:
+    PyErr_Print();
+
+ cleanup:
+    Py_XDECREF(stats);
+    Py_XDECREF(json_module);
+    Py_XDECREF(text);
+}
+
+/*
+  PEP-7
+Local variables:
+c-basic-offset: 4
+indent-tabs-mode: nil
+End:
+*/
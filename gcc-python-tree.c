@@ -1035,10 +1035,11 @@ PyGcc_WrtpMarkForPyGccTree(PyGccTree *wrapper)
 }
 
 /*
-   Ensure we have a unique PyGccTree per tree address (by maintaining a dict)
+   Ensure we have a unique PyGccTree per tree address (by maintaining a cache)
    (what about lifetimes?)
 */
-static PyObject *tree_wrapper_cache = NULL;
+static PyGccWrapperCache tree_wrapper_cache =
+    PyGccWrapperCache_INIT("gcc.Tree");
 
 PyObject *
 PyGccTree_New(gcc_tree t)
@@ -1216,6 +1217,238 @@ VEC_tree_as_PyList(
     return NULL;
 }
 
+/*
+  Support for gcc.Tree.find_trees() and gcc.Gimple.find_trees(): a walk
+  over some trees and their operands that's done entirely in C, so that
+  wrapper objects only get created for the nodes that match.
+*/
+struct find_trees_state {
+    /* tuple of classes to match, or NULL for any kind of node: */
+    PyObject *kinds;
+
+    /* cache of whether each tree code matches "kinds"
+       (-1 for "not yet known"): */
+    signed char code_matches[MAX_TREE_CODES];
+
+    /* the maximum depth to descend to, or -1 for no limit: */
+    int max_depth;
+
+    /* stop at the first match? */
+    int first;
+
+    PyObject *result;
+};
+
+/* Returns 1 if nodes with the given code match, 0 if not, or -1 on
+   error: */
+static int
+find_trees_code_matches(struct find_trees_state *state, enum tree_code code)
+{
+    if (state->code_matches[code] == -1) {
+        int matches = 1;
+
+        if (state->kinds) {
+            PyObject *type =
+                (PyObject*)PyGcc_autogenerated_tree_type_for_tree_code(code, 1);
+            matches = PyObject_IsSubclass(type, state->kinds);
+            if (-1 == matches) {
+                return -1;
+            }
+        }
+        state->code_matches[code] = matches;
+    }
+    return state->code_matches[code];
+}
+
+static int
+find_trees_visit(struct find_trees_state *state, tree t, int depth);
+
+/* Visit a single (non-NULL) node, and its operands, but not any nodes
+   chained after it.
+   Returns 0 to continue the walk, 1 to stop it, or -1 on error: */
+static int
+find_trees_visit_node(struct find_trees_state *state, tree t, int depth)
+{
+    int result;
+    int i;
+
+    result = find_trees_code_matches(state, TREE_CODE(t));
+    if (-1 == result) {
+        return -1;
+    }
+    if (result) {
+        PyObject *tree_obj = PyGccTree_New(gcc_private_make_tree(t));
+        if (!tree_obj) {
+            return -1;
+        }
+        result = PyList_Append(state->result, tree_obj);
+        Py_DECREF(tree_obj);
+        if (-1 == result) {
+            return -1;
+        }
+        if (state->first) {
+            return 1;
+        }
+    }
+
+    if (state->max_depth != -1 && depth >= state->max_depth) {
+        return 0;
+    }
+
+    /* Descend into the same nodes that walk_tree would for gimple
+       operands: */
+    switch (TREE_CODE(t)) {
+    case TREE_LIST:
+        if ((result = find_trees_visit(state, TREE_PURPOSE(t), depth + 1))) {
+            return result;
+        }
+        return find_trees_visit(state, TREE_VALUE(t), depth + 1);
+
+    case TREE_VEC:
+        for (i = 0; i < TREE_VEC_LENGTH(t); i++) {
+            if ((result = find_trees_visit(state, TREE_VEC_ELT(t, i), depth + 1))) {
+                return result;
+            }
+        }
+        return 0;
+
+    case CONSTRUCTOR:
+        {
+            unsigned HOST_WIDE_INT idx;
+            tree index;
+            tree value;
+
+            FOR_EACH_CONSTRUCTOR_ELT(CONSTRUCTOR_ELTS(t), idx, index, value) {
+                if ((result = find_trees_visit(state, index, depth + 1))) {
+                    return result;
+                }
+                if ((result = find_trees_visit(state, value, depth + 1))) {
+                    return result;
+                }
+            }
+        }
+        return 0;
+
+    default:
+        if (EXPR_P(t)) {
+            for (i = 0; i < TREE_OPERAND_LENGTH(t); i++) {
+                if ((result = find_trees_visit(state, TREE_OPERAND(t, i), depth + 1))) {
+                    return result;
+                }
+            }
+        }
+        return 0;
+    }
+}
+
+/*
+  Visit a node (which can be NULL) and its operands.  The elements of a
+  TREE_LIST chain are siblings, so we walk along the chain at the same depth,
+  rather than recursing, which would be a deep C recursion for a long list,
+  and would lose the later elements to max_depth.
+  Returns 0 to continue the walk, 1 to stop it, or -1 on error:
+*/
+static int
+find_trees_visit(struct find_trees_state *state, tree t, int depth)
+{
+    int result;
+
+    while (t) {
+        if ((result = find_trees_visit_node(state, t, depth))) {
+            return result;
+        }
+        t = (TREE_CODE(t) == TREE_LIST) ? TREE_CHAIN(t) : NULL_TREE;
+    }
+    return 0;
+}
+
+/*
+  Implementation of find_trees(kinds=None, max_depth=None, first=False),
+  walking the given array of root nodes (NULL entries are skipped)
+*/
+PyObject *
+PyGcc_find_trees(tree *roots, int num_roots, PyObject *args, PyObject *kwargs)
+{
+    struct find_trees_state state;
+    PyObject *kinds = Py_None;
+    PyObject *max_depth = Py_None;
+    PyObject *first = Py_False;
+    PyObject *result = NULL;
+    int i;
+    const char *keywords[] = {"kinds",
+                              "max_depth",
+                              "first",
+                              NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs,
+                                     "|OOO:find_trees", (char**)keywords,
+                                     &kinds, &max_depth, &first)) {
+        return NULL;
+    }
+
+    memset(&state, 0, sizeof(state));
+    memset(state.code_matches, -1, sizeof(state.code_matches));
+
+    state.max_depth = -1;
+    if (max_depth != Py_None) {
+        long depth = PyGccInt_AsLong(max_depth);
+        if (depth == -1 && PyErr_Occurred()) {
+            return NULL;
+        }
+        if (depth < 0) {
+            PyErr_SetString(PyExc_ValueError,
+                            "max_depth must be non-negative");
+            return NULL;
+        }
+        state.max_depth = (int)depth;
+    }
+
+    state.first = PyObject_IsTrue(first);
+    if (-1 == state.first) {
+        return NULL;
+    }
+
+    if (kinds != Py_None) {
+        if (PyType_Check(kinds)) {
+            state.kinds = PyTuple_Pack(1, kinds);
+        } else {
+            state.kinds = PySequence_Tuple(kinds);
+        }
+        if (!state.kinds) {
+            return NULL;
+        }
+    }
+
+    state.result = PyList_New(0);
+    if (!state.result) {
+        goto cleanup;
+    }
+
+    for (i = 0; i < num_roots; i++) {
+        int walk_result = find_trees_visit(&state, roots[i], 0);
+        if (-1 == walk_result) {
+            goto cleanup;
+        }
+        if (walk_result) {
+            break;
+        }
+    }
+
+    result = state.result;
+    state.result = NULL;
+
+ cleanup:
+    Py_XDECREF(state.kinds);
+    Py_XDECREF(state.result);
+    return result;
+}
+
+PyObject *
+PyGccTree_find_trees(struct PyGccTree *self, PyObject *args, PyObject *kwargs)
+{
+    return PyGcc_find_trees(&self->t.inner, 1, args, kwargs);
+}
+
 /*
   PEP-7  
 Local variables:
@@ -36,7 +36,9 @@
   All of our wrapper types are subclasses of PyGccWrapper, which adds
   a doubly-linked list to the top of the objects, so that we can track
   all live wrapper objects.  This list is updated via their PyTypeObject's
-  tp_alloc and tp_dealloc.
+  tp_alloc and tp_dealloc.  Wrappers of objects that aren't managed by
+  GCC's garbage collector (locations, passes, etc) are kept in a separate
+  list, so that they don't add to the cost of each collection.
 
   Each has a PyTypeObject that's actually a PyGccWrapperTypeObject, which adds
   a "wrtp_mark" hook to a PyTypeObject, so that it can participate in
@@ -95,9 +97,14 @@
 #include "gcc-python-wrappers.h"
 #include "gcc-python-compat.h"
 
+#include <time.h>
+
 static void
 force_gcc_gc(void);
 
+static void
+wrapper_cache_forget(PyGccWrapperCache *cache, void *ptr, PyObject *obj);
+
 /* Debugging, for use by selftest routine */
 static int debug_PyGcc_wrapper = 0;
 
@@ -187,13 +194,78 @@ PyTypeObject PyGccWrapperMeta_TypeObj  = {
 #endif
 };
 
-/* Maintain a circular linked list of PyGccWrapper instances: */
+/*
+  Maintain circular linked lists of PyGccWrapper instances.
+
+  Wrappers whose types have a non-trivial wrtp_mark go in the list headed by
+  "sentinel", which is the one that gets walked when GCC's garbage collector
+  runs.  Wrappers of objects that aren't managed by the collector (e.g.
+  locations, passes, options) go in the list headed by "unmarked_sentinel",
+  so that the cost of each collection only depends on the number of
+  wrappers that actually need marking.
+*/
 static struct PyGccWrapper sentinel = {
     PyObject_HEAD_INIT(NULL)
     &sentinel,
     &sentinel,
+    NULL,
+    NULL,
+};
+
+static struct PyGccWrapper unmarked_sentinel = {
+    PyObject_HEAD_INIT(NULL)
+    &unmarked_sentinel,
+    &unmarked_sentinel,
+    NULL,
+    NULL,
+};
+
+/* Statistics on the above, and on the time spent marking: */
+static struct {
+    size_t num_marked_wrappers;
+    size_t num_unmarked_wrappers;
+    unsigned long num_walks;
+    size_t last_marked;
+    unsigned long long total_marked;
+    double last_time;
+    double total_time;
+} marking_stats;
+
+/*
+  The wrtp_mark callbacks that are known to do nothing (the underlying
+  objects aren't allocated by GCC's garbage collector):
+*/
+static const wrtp_marker trivial_markers[] = {
+    (wrtp_marker)PyGcc_WrtpMarkForPyGccLocation,
+    (wrtp_marker)PyGcc_WrtpMarkForPyGccOption,
+    (wrtp_marker)PyGcc_WrtpMarkForPyGccParameter,
+    (wrtp_marker)PyGcc_WrtpMarkForPyGccPass,
 };
 
+static int
+needs_marking(struct PyGccWrapper *obj)
+{
+    wrtp_marker wrtp_mark;
+    size_t i;
+
+    wrtp_mark = ((PyGccWrapperTypeObject*)Py_TYPE(obj))->wrtp_mark;
+    for (i = 0; i < sizeof(trivial_markers) / sizeof(trivial_markers[0]); i++) {
+        if (wrtp_mark == trivial_markers[i]) {
+            return 0;
+        }
+    }
+    return 1;
+}
+
+static double
+get_monotonic_time(void)
+{
+    struct timespec ts;
+
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec * 1e-9;
+}
+
 PyGccWrapper *
 _PyGccWrapper_New(PyGccWrapperTypeObject *typeobj)
 {
@@ -215,6 +287,8 @@ _PyGccWrapper_New(PyGccWrapperTypeObject *typeobj)
 extern void
 PyGccWrapper_Track(struct PyGccWrapper *obj)
 {
+    struct PyGccWrapper *head;
+
     assert(obj);
     assert(sentinel.wr_next);
     assert(sentinel.wr_prev);
@@ -231,12 +305,24 @@ PyGccWrapper_Track(struct PyGccWrapper *obj)
       PyGccWrapper_Dealloc or subtype_dealloc
      */
 
-    /* Add to end of list, immediately before sentinel: */
-    assert(sentinel.wr_prev->wr_next == &sentinel);
-    sentinel.wr_prev->wr_next = obj;
-    obj->wr_prev = sentinel.wr_prev;
-    obj->wr_next = &sentinel;
-    sentinel.wr_prev = obj;
+    if (needs_marking(obj)) {
+        head = &sentinel;
+        marking_stats.num_marked_wrappers++;
+    } else {
+        head = &unmarked_sentinel;
+        marking_stats.num_unmarked_wrappers++;
+    }
+
+    /* Add to end of list, immediately before its sentinel: */
+    assert(head->wr_prev->wr_next == head);
+    head->wr_prev->wr_next = obj;
+    obj->wr_prev = head->wr_prev;
+    obj->wr_next = head;
+    head->wr_prev = obj;
+
+    /* Not (yet) in any cache: */
+    obj->wr_cache = NULL;
+    obj->wr_cache_key = NULL;
 
     assert(obj->wr_prev);
     assert(obj->wr_next);
@@ -264,12 +350,25 @@ PyGcc_wrapper_untrack(struct PyGccWrapper *obj)
         assert(sentinel.wr_prev);
         assert(obj->wr_next);
 
+        if (needs_marking(obj)) {
+            marking_stats.num_marked_wrappers--;
+        } else {
+            marking_stats.num_unmarked_wrappers--;
+        }
+
         /* Remove from linked list: */
         obj->wr_prev->wr_next = obj->wr_next;
         obj->wr_next->wr_prev = obj->wr_prev;
         obj->wr_prev = NULL;
         obj->wr_next = NULL;
     }
+
+    /* Remove from the cache if it's within one: */
+    if (obj->wr_cache) {
+        wrapper_cache_forget(obj->wr_cache, obj->wr_cache_key,
+                             (PyObject*)obj);
+        obj->wr_cache = NULL;
+    }
 }
 
 void
@@ -285,6 +384,547 @@ PyGccWrapper_Dealloc(PyObject *obj)
     Py_TYPE(obj)->tp_free(obj);
 }
 
+/*
+  Pointer-keyed caches of wrapper objects (see PyGccWrapperCache in
+  gcc-python.h)
+*/
+
+/* Singly-linked list of all caches that have storage: */
+static PyGccWrapperCache *all_wrapper_caches = NULL;
+
+#define WRAPPER_CACHE_MIN_CAPACITY 64
+
+enum wrapper_cache_policy {
+    WRAPPER_CACHE_STRONG,
+    WRAPPER_CACHE_WEAK,
+    WRAPPER_CACHE_LRU
+};
+
+enum wrapper_cache_flush {
+    WRAPPER_CACHE_FLUSH_NEVER,
+    WRAPPER_CACHE_FLUSH_AFTER_PASS,
+    WRAPPER_CACHE_FLUSH_AFTER_UNIT
+};
+
+static enum wrapper_cache_policy cache_policy = WRAPPER_CACHE_STRONG;
+static size_t cache_maxsize = 0;
+static enum wrapper_cache_flush cache_flush = WRAPPER_CACHE_FLUSH_NEVER;
+
+static int
+is_wrapper(PyObject *obj)
+{
+    return PyObject_TypeCheck((PyObject*)Py_TYPE(obj),
+                              &PyGccWrapperMeta_TypeObj);
+}
+
+static size_t
+wrapper_cache_hash(void *ptr)
+{
+    /*
+      GC-allocated objects are aligned, so the low bits of the address
+      carry no information; use a multiplicative hash, folding the high
+      bits of the product (which depend on all of the input) back down:
+    */
+    size_t h = ((size_t)ptr) >> 3;
+    h *= (size_t)0x9E3779B97F4A7C15ULL;
+    h ^= h >> (sizeof(size_t) * 4);
+    return h;
+}
+
+/*
+  Locate the slot for "ptr": either the slot holding it, or the empty slot
+  at which it should be inserted.  There must be at least one empty slot.
+*/
+static size_t
+wrapper_cache_find_slot(void **keys, size_t capacity, void *ptr)
+{
+    size_t mask = capacity - 1;
+    size_t i = wrapper_cache_hash(ptr) & mask;
+
+    while (keys[i] && keys[i] != ptr) {
+        i = (i + 1) & mask;
+    }
+    return i;
+}
+
+static int
+wrapper_cache_resize(PyGccWrapperCache *cache, size_t new_capacity)
+{
+    void **new_keys;
+    PyObject **new_values;
+    char *new_strong;
+    size_t i;
+
+    assert(cache);
+    assert(new_capacity > cache->wc_size);
+    assert((new_capacity & (new_capacity - 1)) == 0);
+
+    new_keys = PyMem_New(void *, new_capacity);
+    new_values = PyMem_New(PyObject *, new_capacity);
+    new_strong = PyMem_New(char, new_capacity);
+    if (!new_keys || !new_values || !new_strong) {
+        PyMem_Free(new_keys);
+        PyMem_Free(new_values);
+        PyMem_Free(new_strong);
+        PyErr_NoMemory();
+        return -1;
+    }
+    memset(new_keys, 0, new_capacity * sizeof(void *));
+    memset(new_values, 0, new_capacity * sizeof(PyObject *));
+    memset(new_strong, 0, new_capacity);
+
+    /* Rehash the existing entries (transferring ownership of the refs): */
+    for (i = 0; i < cache->wc_capacity; i++) {
+        if (cache->wc_keys[i]) {
+            size_t j = wrapper_cache_find_slot(new_keys, new_capacity,
+                                               cache->wc_keys[i]);
+            new_keys[j] = cache->wc_keys[i];
+            new_values[j] = cache->wc_values[i];
+            new_strong[j] = cache->wc_strong[i];
+        }
+    }
+
+    if (cache->wc_keys) {
+        PyMem_Free(cache->wc_keys);
+        PyMem_Free(cache->wc_values);
+        PyMem_Free(cache->wc_strong);
+    } else {
+        /* First allocation: make the cache visible to the stats API: */
+        cache->wc_next = all_wrapper_caches;
+        all_wrapper_caches = cache;
+    }
+
+    cache->wc_keys = new_keys;
+    cache->wc_values = new_values;
+    cache->wc_strong = new_strong;
+    cache->wc_capacity = new_capacity;
+    return 0;
+}
+
+/*
+  Add (or replace) an entry for ptr.  The entry holds a new reference to
+  obj if the cache is permanent or the policy is "strong" (or if obj isn't
+  a wrapper, and thus can't remove itself from the cache when it goes away),
+  and a borrowed reference otherwise.
+  Returns 0 on success, or -1 with an exception set.
+*/
+static int
+wrapper_cache_insert(PyGccWrapperCache *cache, void *ptr, PyObject *obj)
+{
+    size_t i;
+    int strong;
+    PyObject *oldobj = NULL;
+
+    assert(cache);
+    assert(ptr);
+    assert(obj);
+
+    /* Keep the load factor at or below 2/3: */
+    if ((cache->wc_size + 1) * 3 > cache->wc_capacity * 2) {
+        size_t new_capacity = cache->wc_capacity
+            ? cache->wc_capacity * 2
+            : WRAPPER_CACHE_MIN_CAPACITY;
+        if (wrapper_cache_resize(cache, new_capacity)) {
+            return -1;
+        }
+    }
+
+    strong = (cache->wc_permanent
+              || cache_policy == WRAPPER_CACHE_STRONG
+              || !is_wrapper(obj));
+
+    i = wrapper_cache_find_slot(cache->wc_keys, cache->wc_capacity, ptr);
+    if (cache->wc_keys[i]) {
+        /* Replacing an existing entry: */
+        if (cache->wc_values[i] != obj) {
+            if (is_wrapper(cache->wc_values[i])) {
+                ((PyGccWrapper*)cache->wc_values[i])->wr_cache = NULL;
+            }
+        }
+        if (cache->wc_strong[i]) {
+            oldobj = cache->wc_values[i];
+            cache->wc_num_strong--;
+        }
+    } else {
+        cache->wc_keys[i] = ptr;
+        cache->wc_size++;
+    }
+
+    if (strong) {
+        Py_INCREF(obj);
+        cache->wc_num_strong++;
+    }
+    cache->wc_values[i] = obj;
+    cache->wc_strong[i] = strong;
+
+    if (is_wrapper(obj)) {
+        ((PyGccWrapper*)obj)->wr_cache = cache;
+        ((PyGccWrapper*)obj)->wr_cache_key = ptr;
+    }
+
+    Py_XDECREF(oldobj);
+    return 0;
+}
+
+/*
+  Remove the (weak) entry for a wrapper that's being deallocated.
+
+  Uses backward-shift deletion, so that we don't need tombstones: later
+  entries in the probe sequence are moved up into the gap.
+*/
+static void
+wrapper_cache_forget(PyGccWrapperCache *cache, void *ptr, PyObject *obj)
+{
+    size_t mask;
+    size_t i, j;
+
+    assert(cache);
+    assert(ptr);
+
+    if (!cache->wc_size) {
+        return;
+    }
+    mask = cache->wc_capacity - 1;
+    i = wrapper_cache_find_slot(cache->wc_keys, cache->wc_capacity, ptr);
+    if (!cache->wc_keys[i] || cache->wc_values[i] != obj) {
+        return;
+    }
+    assert(!cache->wc_strong[i]);
+
+    cache->wc_keys[i] = NULL;
+    cache->wc_values[i] = NULL;
+    cache->wc_size--;
+
+    for (j = (i + 1) & mask; cache->wc_keys[j]; j = (j + 1) & mask) {
+        size_t home = wrapper_cache_hash(cache->wc_keys[j]) & mask;
+
+        /* Can the entry at j be moved to the gap at i?  Only if its home
+           slot doesn't lie cyclically within (i, j]: */
+        if (i <= j ? (home <= i || home > j) : (home <= i && home > j)) {
+            cache->wc_keys[i] = cache->wc_keys[j];
+            cache->wc_values[i] = cache->wc_values[j];
+            cache->wc_strong[i] = cache->wc_strong[j];
+            cache->wc_keys[j] = NULL;
+            cache->wc_values[j] = NULL;
+            cache->wc_strong[j] = 0;
+            i = j;
+        }
+    }
+}
+
+/*
+  Under the "lru" policy, record that obj was just used, keeping it alive
+  until it drops out of the ring buffer.
+  Returns 0 on success, or -1 with an exception set.
+*/
+static int
+wrapper_cache_touch(PyGccWrapperCache *cache, PyObject *obj)
+{
+    PyObject *oldobj;
+
+    if (!cache->wc_ring) {
+        assert(cache_maxsize > 0);
+        cache->wc_ring = PyMem_New(PyObject *, cache_maxsize);
+        if (!cache->wc_ring) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        memset(cache->wc_ring, 0, cache_maxsize * sizeof(PyObject *));
+        cache->wc_ring_size = cache_maxsize;
+        cache->wc_ring_pos = 0;
+    }
+
+    Py_INCREF(obj);
+    oldobj = cache->wc_ring[cache->wc_ring_pos];
+    cache->wc_ring[cache->wc_ring_pos] = obj;
+    cache->wc_ring_pos = (cache->wc_ring_pos + 1) % cache->wc_ring_size;
+
+    /* This may deallocate a wrapper, removing it from the cache: */
+    Py_XDECREF(oldobj);
+    return 0;
+}
+
+PyObject *
+PyGcc_LazilyCreateWrapper(PyGccWrapperCache *cache,
+                          void *ptr,
+                          PyObject *(*ctor)(void *ptr))
+{
+    PyObject *obj;
+
+    assert(cache);
+    /* ptr is allowed to be NULL */
+    assert(ctor);
+
+    /*
+      NULL denotes an empty slot, so it can't be used as a key; the
+      constructors all return None for it, so there's nothing to gain from
+      caching it anyway:
+    */
+    if (!ptr) {
+        return (*ctor)(ptr);
+    }
+
+    obj = NULL;
+    if (cache->wc_size) {
+        size_t i = wrapper_cache_find_slot(cache->wc_keys,
+                                           cache->wc_capacity,
+                                           ptr);
+        if (cache->wc_keys[i]) {
+            /* The cache already contains an object wrapping "ptr": reuse it */
+            cache->wc_hits++;
+            obj = cache->wc_values[i];
+            Py_INCREF(obj);
+
+            /* Upgrade weak entries if the policy has become "strong": */
+            if (!cache->wc_strong[i]
+                && cache_policy == WRAPPER_CACHE_STRONG) {
+                Py_INCREF(obj);
+                cache->wc_strong[i] = 1;
+                cache->wc_num_strong++;
+            }
+        }
+    }
+
+    if (!obj) {
+        /*
+          Not in the cache: we don't yet have a wrapper object for this
+          pointer
+        */
+        cache->wc_misses++;
+
+        obj = (*ctor)(ptr);
+        if (!obj) {
+            return NULL;
+        }
+
+        /*
+          (The constructor could in theory have touched this cache, so we
+          locate the slot afresh rather than reusing the one found above)
+        */
+        if (wrapper_cache_insert(cache, ptr, obj)) {
+            Py_DECREF(obj);
+            return NULL;
+        }
+    }
+
+    if (cache_policy == WRAPPER_CACHE_LRU && !cache->wc_permanent) {
+        if (wrapper_cache_touch(cache, obj)) {
+            Py_DECREF(obj);
+            return NULL;
+        }
+    }
+
+    return obj;
+}
+
+int
+PyGcc_insert_new_wrapper_into_cache(PyGccWrapperCache *cache,
+                                    void *ptr,
+                                    PyObject *obj)
+{
+    return wrapper_cache_insert(cache, ptr, obj);
+}
+
+void
+PyGcc_wrapper_caches_flush(void)
+{
+    PyGccWrapperCache *cache;
+
+    for (cache = all_wrapper_caches; cache; cache = cache->wc_next) {
+        PyObject **refs;
+        size_t num_refs = 0;
+        size_t i;
+
+        if (cache->wc_permanent) {
+            continue;
+        }
+        if (!cache->wc_num_strong && !cache->wc_ring) {
+            continue;
+        }
+
+        /*
+          Demote every entry to a weak one, gathering up the references
+          that we held.  We can't release them as we go, since releasing the
+          last reference to a wrapper removes its entry from the table,
+          shuffling the other entries around:
+        */
+        refs = PyMem_New(PyObject *,
+                         cache->wc_num_strong + cache->wc_ring_size);
+        if (!refs) {
+            /* Not much we can do; try again on the next flush: */
+            continue;
+        }
+        for (i = 0; i < cache->wc_capacity; i++) {
+            if (cache->wc_keys[i] && cache->wc_strong[i]) {
+                refs[num_refs++] = cache->wc_values[i];
+                cache->wc_strong[i] = 0;
+            }
+        }
+        cache->wc_num_strong = 0;
+
+        if (cache->wc_ring) {
+            for (i = 0; i < cache->wc_ring_size; i++) {
+                if (cache->wc_ring[i]) {
+                    refs[num_refs++] = cache->wc_ring[i];
+                }
+            }
+            /* (the ring will be reallocated with the current maxsize on
+               demand) */
+            PyMem_Free(cache->wc_ring);
+            cache->wc_ring = NULL;
+            cache->wc_ring_size = 0;
+            cache->wc_ring_pos = 0;
+        }
+
+        /* Wrappers that are only referenced by the cache go away here: */
+        for (i = 0; i < num_refs; i++) {
+            Py_DECREF(refs[i]);
+        }
+        PyMem_Free(refs);
+    }
+}
+
+static void
+on_pass_execution(void *gcc_data, void *user_data)
+{
+    if (cache_flush == WRAPPER_CACHE_FLUSH_AFTER_PASS) {
+        PyGILState_STATE gstate = PyGILState_Ensure();
+        PyGcc_wrapper_caches_flush();
+        PyGILState_Release(gstate);
+    }
+}
+
+static void
+on_finish_unit(void *gcc_data, void *user_data)
+{
+    if (cache_flush != WRAPPER_CACHE_FLUSH_NEVER) {
+        PyGILState_STATE gstate = PyGILState_Ensure();
+        PyGcc_wrapper_caches_flush();
+        PyGILState_Release(gstate);
+    }
+}
+
+PyObject *
+PyGcc_set_wrapper_cache_policy(PyObject *self,
+                               PyObject *args, PyObject *kwargs)
+{
+    const char *policy_str;
+    Py_ssize_t maxsize = 0;
+    const char *flush_str = NULL;
+    enum wrapper_cache_policy policy;
+    enum wrapper_cache_flush flush;
+    const char *keywords[] = {"policy",
+                              "maxsize",
+                              "flush",
+                              NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs,
+                                     "s|nz:set_wrapper_cache_policy",
+                                     (char**)keywords,
+                                     &policy_str, &maxsize, &flush_str)) {
+        return NULL;
+    }
+
+    if (0 == strcmp(policy_str, "strong")) {
+        policy = WRAPPER_CACHE_STRONG;
+    } else if (0 == strcmp(policy_str, "weak")) {
+        policy = WRAPPER_CACHE_WEAK;
+    } else if (0 == strcmp(policy_str, "lru")) {
+        policy = WRAPPER_CACHE_LRU;
+        if (maxsize <= 0) {
+            return PyErr_Format(PyExc_ValueError,
+                                "the \"lru\" policy requires a positive maxsize");
+        }
+    } else {
+        return PyErr_Format(PyExc_ValueError,
+                            "unknown wrapper cache policy: \"%s\"",
+                            policy_str);
+    }
+
+    if (!flush_str) {
+        flush = WRAPPER_CACHE_FLUSH_NEVER;
+    } else if (0 == strcmp(flush_str, "pass")) {
+        flush = WRAPPER_CACHE_FLUSH_AFTER_PASS;
+    } else if (0 == strcmp(flush_str, "unit")) {
+        flush = WRAPPER_CACHE_FLUSH_AFTER_UNIT;
+    } else {
+        return PyErr_Format(PyExc_ValueError,
+                            "unknown wrapper cache flush point: \"%s\"",
+                            flush_str);
+    }
+
+    cache_policy = policy;
+    cache_maxsize = (policy == WRAPPER_CACHE_LRU) ? (size_t)maxsize : 0;
+    cache_flush = flush;
+
+    /*
+      Release whatever the caches were keeping alive under the old policy,
+      so that the new one takes effect immediately (entries for wrappers
+      that are still in use are kept, as weak entries):
+    */
+    if (policy != WRAPPER_CACHE_STRONG) {
+        PyGcc_wrapper_caches_flush();
+    }
+
+    Py_RETURN_NONE;
+}
+
+PyObject *
+PyGcc_flush_wrapper_caches(PyObject *self, PyObject *noargs)
+{
+    PyGcc_wrapper_caches_flush();
+    Py_RETURN_NONE;
+}
+
+static int
+add_size_to_dict(PyObject *dict, const char *key, size_t value)
+{
+    PyObject *obj = PyLong_FromSize_t(value);
+    int result;
+
+    if (!obj) {
+        return -1;
+    }
+    result = PyDict_SetItemString(dict, key, obj);
+    Py_DECREF(obj);
+    return result;
+}
+
+PyObject *
+PyGcc_get_wrapper_cache_stats(PyObject *self, PyObject *noargs)
+{
+    PyObject *result;
+    PyGccWrapperCache *cache;
+
+    result = PyDict_New();
+    if (!result) {
+        return NULL;
+    }
+
+    for (cache = all_wrapper_caches; cache; cache = cache->wc_next) {
+        PyObject *stats = PyDict_New();
+        if (!stats) {
+            goto error;
+        }
+        if (add_size_to_dict(stats, "hits", cache->wc_hits)
+            || add_size_to_dict(stats, "misses", cache->wc_misses)
+            || add_size_to_dict(stats, "size", cache->wc_size)
+            || add_size_to_dict(stats, "strong", cache->wc_num_strong)
+            || add_size_to_dict(stats, "capacity", cache->wc_capacity)
+            || PyDict_SetItemString(result, cache->wc_name, stats)) {
+            Py_DECREF(stats);
+            goto error;
+        }
+        Py_DECREF(stats);
+    }
+
+    return result;
+
+error:
+    Py_DECREF(result);
+    return NULL;
+}
+
 static void
 my_walker(void *arg ATTRIBUTE_UNUSED)
 {
@@ -296,6 +936,9 @@ my_walker(void *arg ATTRIBUTE_UNUSED)
       don't get swept
     */
     struct PyGccWrapper *iter;
+    size_t num_marked = 0;
+    double start_time = get_monotonic_time();
+    double elapsed;
 
     if (debug_PyGcc_wrapper) {
         printf("  walking the live PyGccWrapper objects\n");
@@ -310,10 +953,33 @@ my_walker(void *arg ATTRIBUTE_UNUSED)
         wrtp_mark = ((PyGccWrapperTypeObject*)Py_TYPE(iter))->wrtp_mark;
         assert(wrtp_mark);
         wrtp_mark(iter);
+        num_marked++;
     }
     if (debug_PyGcc_wrapper) {
         printf("  finished walking the live PyGccWrapper objects\n");
     }
+
+    elapsed = get_monotonic_time() - start_time;
+    marking_stats.num_walks++;
+    marking_stats.last_marked = num_marked;
+    marking_stats.total_marked += num_marked;
+    marking_stats.last_time = elapsed;
+    marking_stats.total_time += elapsed;
+}
+
+PyObject *
+PyGcc_get_wrapper_marking_stats(PyObject *self, PyObject *noargs)
+{
+    return Py_BuildValue("{s:n, s:n, s:k, s:n, s:K, s:d, s:d}",
+                         "live_marked_wrappers",
+                         (Py_ssize_t)marking_stats.num_marked_wrappers,
+                         "live_unmarked_wrappers",
+                         (Py_ssize_t)marking_stats.num_unmarked_wrappers,
+                         "num_walks", marking_stats.num_walks,
+                         "last_marked", (Py_ssize_t)marking_stats.last_marked,
+                         "total_marked", marking_stats.total_marked,
+                         "last_time", marking_stats.last_time,
+                         "total_time", marking_stats.total_time);
 }
 
 static struct ggc_root_tab myroottab[] = {
@@ -322,8 +988,14 @@ static struct ggc_root_tab myroottab[] = {
 };
 
 void
-PyGcc_wrapper_init(void)
+PyGcc_wrapper_init(const char *plugin_name)
 {
+    /* Hooks for flushing the wrapper caches: */
+    register_callback(plugin_name, PLUGIN_PASS_EXECUTION,
+                      on_pass_execution, NULL);
+    register_callback(plugin_name, PLUGIN_FINISH_UNIT,
+                      on_finish_unit, NULL);
+
     /* Register our GC root-walking callback: */
     ggc_register_root_tab(myroottab);
 
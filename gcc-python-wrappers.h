@@ -238,6 +238,13 @@ PyGccFunction_hash(struct PyGccFunction * self);
 PyObject *
 PyGccFunction_richcompare(PyObject *o1, PyObject *o2, int op);
 
+PyObject *
+PyGccFunction_export(struct PyGccFunction *self, PyObject *noargs);
+
+PyObject *
+PyGccFunction_gimple_list(struct PyGccFunction *self,
+                          PyObject *args, PyObject *kwargs);
+
 PyObject *
 PyGccArrayRef_repr(PyObject *self);
 
@@ -363,6 +370,9 @@ PyGccGimple_richcompare(PyObject *o1, PyObject *o2, int op);
 PyObject *
 PyGccGimple_walk_tree(struct PyGccGimple * self, PyObject *args, PyObject *kwargs);
 
+PyObject *
+PyGccGimple_find_trees(struct PyGccGimple * self, PyObject *args, PyObject *kwargs);
+
 PyObject *
 PyGccGimple_get_rhs(struct PyGccGimple *self, void *closure);
 
@@ -481,6 +491,19 @@ PyGcc_TreeMakeListFromTreeList(tree t);
 PyObject *
 PyGcc_TreeMakeListOfPairsFromTreeListChain(tree t);
 
+PyObject *
+PyGcc_find_trees(tree *roots, int num_roots, PyObject *args, PyObject *kwargs);
+
+PyObject *
+PyGccTree_find_trees(struct PyGccTree *self, PyObject *args, PyObject *kwargs);
+
+/* gcc-python-timing.c: */
+PyObject *
+PyGcc_get_plugin_stats(PyObject *self, PyObject *args);
+
+PyObject *
+PyGcc_add_plugin_stat(PyObject *self, PyObject *args, PyObject *kwargs);
+
 /* gcc-python-version.c: */
 void
 PyGcc_version_init(struct plugin_gcc_version *version);
@@ -493,7 +516,7 @@ PyGcc_get_gcc_version(PyObject *self, PyObject *args);
 
 /* gcc-python-wrappers.c: */
 void
-PyGcc_wrapper_init(void);
+PyGcc_wrapper_init(const char *plugin_name);
 
 PyObject *
 PyGcc__force_garbage_collection(PyObject *self, PyObject *args);
@@ -501,6 +524,19 @@ PyGcc__force_garbage_collection(PyObject *self, PyObject *args);
 PyObject *
 PyGcc__gc_selftest(PyObject *self, PyObject *args);
 
+PyObject *
+PyGcc_get_wrapper_cache_stats(PyObject *self, PyObject *noargs);
+
+PyObject *
+PyGcc_set_wrapper_cache_policy(PyObject *self,
+                               PyObject *args, PyObject *kwargs);
+
+PyObject *
+PyGcc_flush_wrapper_caches(PyObject *self, PyObject *noargs);
+
+PyObject *
+PyGcc_get_wrapper_marking_stats(PyObject *self, PyObject *noargs);
+
 /*
   PEP-7
 Local variables:
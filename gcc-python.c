@@ -481,6 +481,32 @@ static PyMethodDef GccMethods[] = {
     {"_gc_selftest", PyGcc__gc_selftest, METH_NOARGS,
      "Run a garbage-collection selftest"},
 
+    {"get_wrapper_cache_stats", PyGcc_get_wrapper_cache_stats, METH_NOARGS,
+     "Get a dict mapping from wrapper class name to a dict of statistics "
+     "about the cache of wrapper objects for that class"},
+
+    {"set_wrapper_cache_policy",
+     (PyCFunction)PyGcc_set_wrapper_cache_policy,
+     (METH_VARARGS | METH_KEYWORDS),
+     ("Set how the caches of wrapper objects keep wrappers alive: one of "
+      "\"strong\", \"weak\" or \"lru\" (with a maxsize), optionally "
+      "flushing them after each \"pass\" or \"unit\"")},
+
+    {"flush_wrapper_caches", PyGcc_flush_wrapper_caches, METH_NOARGS,
+     "Drop the references to wrapper objects held by the wrapper caches"},
+
+    {"get_wrapper_marking_stats", PyGcc_get_wrapper_marking_stats, METH_NOARGS,
+     "Get a dict of statistics on the marking of wrapped objects during "
+     "GCC's garbage collections"},
+
+    {"get_plugin_stats", PyGcc_get_plugin_stats, METH_NOARGS,
+     "Get a dict of timings of the Python callbacks and passes"},
+
+    {"add_plugin_stat",
+     (PyCFunction)PyGcc_add_plugin_stat,
+     (METH_VARARGS | METH_KEYWORDS),
+     "Add to a named counter within the plugin's statistics"},
+
     /* Sentinel: */
     {NULL, NULL, 0, NULL}
 };
@@ -584,6 +610,14 @@ PyGcc_init_gcc_module(struct plugin_name_args *plugin_info)
     PyModule_AddIntMacro(PyGcc_globals.module, PROP_cfglayout);
     PyModule_AddIntMacro(PyGcc_globals.module, PROP_gimple_lcx);
 
+    /* Edge flags, as used by gcc.Function.export(): */
+    PyModule_AddIntMacro(PyGcc_globals.module, EDGE_FALLTHRU);
+    PyModule_AddIntMacro(PyGcc_globals.module, EDGE_ABNORMAL);
+    PyModule_AddIntMacro(PyGcc_globals.module, EDGE_EH);
+    PyModule_AddIntMacro(PyGcc_globals.module, EDGE_TRUE_VALUE);
+    PyModule_AddIntMacro(PyGcc_globals.module, EDGE_FALSE_VALUE);
+    PyModule_AddIntMacro(PyGcc_globals.module, EDGE_LOOP_EXIT);
+
     PyModule_AddIntMacro(PyGcc_globals.module, GCC_VERSION);
 
     /* Success: */
@@ -615,6 +649,45 @@ static void PyGcc_run_any_command(void)
     }
 }
 
+static void PyGcc_start_any_profiler(void)
+{
+    PyObject *profile_dir; /* borrowed ref */
+    PyObject *interval; /* borrowed ref */
+    PyObject *module = NULL;
+    PyObject *result = NULL;
+
+    /* -fplugin-arg-python-profile[=DIR]: */
+    profile_dir = PyDict_GetItemString(PyGcc_globals.argument_dict, "profile");
+    if (!profile_dir) {
+        return;
+    }
+
+    /* -fplugin-arg-python-profile-interval=MILLISECONDS: */
+    interval = PyDict_GetItemString(PyGcc_globals.argument_dict,
+                                    "profile-interval");
+
+    module = PyImport_ImportModule("gccutils.profiler");
+    if (!module) {
+        goto error;
+    }
+    result = PyObject_CallMethod(module, (char*)"start", (char*)"OO",
+                                 profile_dir,
+                                 interval ? interval : Py_None);
+    if (!result) {
+        goto error;
+    }
+    Py_DECREF(module);
+    Py_DECREF(result);
+    return;
+
+ error:
+    /* Error starting the profiler */
+    PyErr_Print();
+    Py_XDECREF(module);
+    Py_Finalize();
+    exit(1);
+}
+
 static void PyGcc_run_any_script(void)
 {
     PyObject* script_name;
@@ -727,6 +800,16 @@ setup_sys(struct plugin_name_args *plugin_info)
 void
 on_plugin_finish(void *gcc_data, void *user_data)
 {
+    PyObject *stats_arg; /* borrowed ref */
+
+    /* Write out the timings, if requested via -fplugin-arg-python-stats: */
+    stats_arg = PyDict_GetItemString(PyGcc_globals.argument_dict, "stats");
+    if (stats_arg) {
+        PyGcc_timing_write_stats(stats_arg == Py_None
+                                 ? NULL
+                                 : PyGccString_AsString(stats_arg));
+    }
+
     /*
        Clean up the python runtime.
 
@@ -745,6 +828,8 @@ plugin_init (struct plugin_name_args *plugin_info,
 {
     LOG("plugin_init started");
 
+    PyGcc_startup_timing_begin();
+
     if (!plugin_default_version_check (version, &gcc_version)) {
         return 1;
     }
@@ -769,6 +854,8 @@ plugin_init (struct plugin_name_args *plugin_info,
 
     LOG("Py_Initialize finished");
 
+    PyGcc_startup_timing_mark("Py_Initialize");
+
     PyGcc_globals.module = PyImport_ImportModule("gcc");
 
     PyEval_InitThreads();
@@ -781,8 +868,10 @@ plugin_init (struct plugin_name_args *plugin_info,
         return 1;
     }
 
+    PyGcc_startup_timing_mark("gcc module");
+
     /* Init other modules */
-    PyGcc_wrapper_init();
+    PyGcc_wrapper_init(plugin_info->base_name);
 
     /* FIXME: properly integrate them within the module hierarchy */
 
@@ -816,14 +905,23 @@ plugin_init (struct plugin_name_args *plugin_info,
     autogenerated_tree_add_types(PyGcc_globals.module);
     autogenerated_variable_add_types(PyGcc_globals.module);
 
+    PyGcc_startup_timing_mark("wrapper types");
 
     /* Register at-exit finalization for the plugin: */
     register_callback(plugin_info->base_name, PLUGIN_FINISH,
                       on_plugin_finish, NULL);
 
+    PyGcc_start_any_profiler();
     PyGcc_run_any_command();
     PyGcc_run_any_script();
 
+    PyGcc_startup_timing_mark("script");
+
+    /* -fplugin-arg-python-startup-stats: */
+    if (PyDict_GetItemString(PyGcc_globals.argument_dict, "startup-stats")) {
+        PyGcc_startup_timing_report();
+    }
+
     //printf("%s:%i:got here\n", __FILE__, __LINE__);
 
 #if GCC_PYTHON_TRACE_ALL_EVENTS
@@ -74,6 +74,8 @@
   with GCC's garbage collector (so that things we wrap don't get collected
   from under us)
 */
+struct PyGccWrapperCache;
+
 typedef struct PyGccWrapper
 {
      PyObject_HEAD
@@ -85,6 +87,13 @@ typedef struct PyGccWrapper
      */
      struct PyGccWrapper *wr_prev;
      struct PyGccWrapper *wr_next;
+
+     /*
+       The cache (if any) holding this wrapper, and its key within it, so
+       that the entry can be removed when the wrapper is deallocated:
+     */
+     struct PyGccWrapperCache *wr_cache;
+     void *wr_cache_key;
 } PyGccWrapper;
 
 /*
@@ -123,6 +132,82 @@ extern void
 PyGccWrapper_Dealloc(PyObject *obj);
 
 extern PyTypeObject PyGccWrapperMeta_TypeObj;
+
+/*
+  A cache mapping from the address of a GCC object to the wrapper object
+  for it, so that we have a 1-1 mapping between the two.
+
+  This is an open-addressing hash table (with linear probing), keyed
+  directly on the raw pointer, so that a lookup doesn't need to create
+  any temporary Python objects.
+
+  Whether an entry keeps its wrapper alive depends on the policy set via
+  gcc.set_wrapper_cache_policy(): entries can hold a strong reference, or
+  merely a borrowed one (a "weak" entry), which is removed when the wrapper
+  is deallocated.  Under the "lru" policy, the most recently-used wrappers
+  are kept alive by a ring buffer of strong references.  Permanent caches
+  (e.g. for passes, which GCC calls back into) always hold strong
+  references.
+
+  Caches are statically allocated, using PyGccWrapperCache_INIT; the
+  storage is allocated lazily on first insertion, at which point the cache
+  is also added to a list of all caches, so that we can report statistics
+  on them via gcc.get_wrapper_cache_stats()
+*/
+typedef struct PyGccWrapperCache
+{
+    const char *wc_name;
+    int wc_permanent;
+
+    /* Number of slots: zero, or a power of two: */
+    size_t wc_capacity;
+
+    /* Number of occupied slots, and how many of them are strong: */
+    size_t wc_size;
+    size_t wc_num_strong;
+
+    /* NULL keys denote empty slots: */
+    void **wc_keys;
+    PyObject **wc_values;
+    char *wc_strong;
+
+    /* Ring buffer of strong references, for the "lru" policy: */
+    PyObject **wc_ring;
+    size_t wc_ring_size;
+    size_t wc_ring_pos;
+
+    /* Statistics: */
+    unsigned long wc_hits;
+    unsigned long wc_misses;
+
+    struct PyGccWrapperCache *wc_next;
+} PyGccWrapperCache;
+
+#define PyGccWrapperCache_INIT(ARG_name) \
+    { (ARG_name), 0, 0, 0, 0, NULL, NULL, NULL, NULL, 0, 0, 0, 0, NULL }
+
+#define PyGccWrapperCache_INIT_PERMANENT(ARG_name) \
+    { (ARG_name), 1, 0, 0, 0, NULL, NULL, NULL, NULL, 0, 0, 0, 0, NULL }
+
+/*
+  Force a 1-1 mapping between pointer values and wrapper objects, calling
+  "ctor" to create a wrapper for "ptr" if there isn't one already
+*/
+PyObject *
+PyGcc_LazilyCreateWrapper(PyGccWrapperCache *cache,
+                          void *ptr,
+                          PyObject *(*ctor)(void *ptr));
+int
+PyGcc_insert_new_wrapper_into_cache(PyGccWrapperCache *cache,
+                                    void *ptr,
+                                    PyObject *obj);
+
+/*
+  Drop the strong references held by the (non-permanent) wrapper caches,
+  keeping weak entries for those wrappers that are still alive:
+*/
+void
+PyGcc_wrapper_caches_flush(void);
 /*
   Macro DECLARE_SIMPLE_WRAPPER():
     ARG_structname:
@@ -175,10 +260,35 @@ DECLARE_SIMPLE_WRAPPER(PyGccCallgraphNode,
 		       cgraph_node,
                        gcc_cgraph_node, node)
 
-DECLARE_SIMPLE_WRAPPER(PyGccPass,
-		       PyGccPass_TypeObj,
-		       pass,
-		       struct opt_pass *, pass)
+/*
+  gcc.Pass isn't a simple wrapper: for a pass implemented in Python, it also
+  caches the timers for its "gate" and "execute" methods, so that they don't
+  have to be looked up on every call
+*/
+struct PyGccTimer;
+
+struct PyGccPass {
+    struct PyGccWrapper head;
+    struct opt_pass *pass;
+
+    /* (NULL until the method is first called) */
+    struct PyGccTimer *gate_timer;
+    struct PyGccTimer *execute_timer;
+};
+
+typedef struct PyGccPass PyGccPass;
+
+extern PyObject *
+PyGccPass_New(struct opt_pass *pass);
+
+extern PyObject *
+PyGccPass_NewUnique(struct opt_pass *pass);
+
+extern PyGccWrapperTypeObject PyGccPass_TypeObj
+  CPYCHECKER_TYPE_OBJECT_FOR_TYPEDEF("PyGccPass");
+
+extern void
+PyGcc_WrtpMarkForPyGccPass(PyGccPass *wrapper);
 
 DECLARE_SIMPLE_WRAPPER(PyGccLocation, 
 		       PyGccLocation_TypeObj,
@@ -255,6 +365,8 @@ void autogenerated_function_add_types(PyObject *m);
 int autogenerated_gimple_init_types(void);
 void autogenerated_gimple_add_types(PyObject *m);
 PyGccWrapperTypeObject*
+PyGcc_autogenerated_gimple_type_for_code(int code);
+PyGccWrapperTypeObject*
 PyGcc_autogenerated_gimple_type_for_stmt(gcc_gimple stmt);
 
 /* autogenerated-location.c */
@@ -335,16 +447,48 @@ PyObject *
 PyGcc_int_from_double_int(double_int di, bool is_unsigned);
 #endif
 
-PyObject *
-PyGcc_LazilyCreateWrapper(PyObject **cache,
-				 void *ptr,
-				 PyObject *(*ctor)(void *ptr));
-int
-PyGcc_insert_new_wrapper_into_cache(PyObject **cache,
-                                         void *ptr,
-                                         PyObject *obj);
 
 
+/* gcc-python-timing.c */
+struct PyGccTimer;
+
+struct PyGccTimerSample {
+    double wall_start;
+    double cpu_start;
+};
+
+/* Get a new timer for a callback being registered, or NULL on error: */
+struct PyGccTimer *
+PyGcc_timer_for_callback(enum plugin_event event, PyObject *callback);
+
+/* Get a new timer for a method ("gate" or "execute") of a Python pass, or
+   NULL on error (the caller caches it on the gcc.Pass): */
+struct PyGccTimer *
+PyGcc_timer_for_pass(struct opt_pass *pass, const char *kind,
+                     PyObject *pass_obj);
+
+void
+PyGcc_timer_start(struct PyGccTimerSample *sample);
+
+/* Record the time since PyGcc_timer_start; timer can be NULL: */
+void
+PyGcc_timer_stop(struct PyGccTimer *timer,
+                 const struct PyGccTimerSample *sample);
+
+void
+PyGcc_timing_write_stats(const char *filename);
+
+/* Timing of the phases of plugin_init: */
+void
+PyGcc_startup_timing_begin(void);
+
+/* Record the time since the previous mark (or the beginning): */
+void
+PyGcc_startup_timing_mark(const char *phase);
+
+void
+PyGcc_startup_timing_report(void);
+
 /* gcc-python.c */
 int PyGcc_IsWithinEvent(enum plugin_event *out_event);
 
@@ -650,6 +650,29 @@ def sorted_callgraph():
                                                 # Strip out recursive calls:
                                                 if edge.callee != n])
 
+def get_callgraph_sccs(batches=False):
+    """
+    Get the strongly-connected components of the callgraph, in bottom-up
+    order: each SCC is a list of gcc.CallgraphNode, and comes after the
+    SCCs of all of the functions that it calls.
+
+    Recursive functions (and sets of mutually-recursive functions) are thus
+    grouped together, so that an interprocedural analysis can iterate to a
+    fixpoint within each SCC, relying on the results for its callees.
+
+    If batches is True, instead return a list of batches, each a list of
+    SCCs which don't call each other (and so could be processed in
+    parallel), after all of the batches they call into.
+    """
+    from gccutils.graph import strongly_connected_components, batch_sccs
+    def get_dsts(n):
+        return [edge.callee for edge in n.callees]
+    sccs = strongly_connected_components(gcc.get_callgraph_nodes(),
+                                         get_dsts)
+    if batches:
+        return batch_sccs(sccs, get_dsts)
+    return sccs
+
 def topological_sort(nodes, get_srcs, get_dsts):
     """
     Topological sort in O(n), based on depth-first traversal
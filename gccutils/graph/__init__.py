@@ -21,14 +21,20 @@ from gccutils.dot import to_html
 # Generic directed graphs
 ############################################################################
 class Graph(object):
-    __slots__ = ('nodes', 'edges')
+    __slots__ = ('nodes', 'edges', '_bfs_trees', '_reachability')
+
+    # How many BFS trees to cache for get_shortest_path:
+    MAX_CACHED_BFS_TREES = 16
 
     def __init__(self):
         self.nodes = set()
         self.edges = set()
+        self._bfs_trees = None
+        self._reachability = None
 
     def add_node(self, node):
         self.nodes.add(node)
+        self._invalidate_caches()
         return node
 
     def add_edge(self, srcnode, dstnode, *args, **kwargs):
@@ -38,6 +44,7 @@ class Graph(object):
         self.edges.add(e)
         srcnode.succs.add(e)
         dstnode.preds.add(e)
+        self._invalidate_caches()
         return e
 
     def _make_edge(self, srcnode, dstnode):
@@ -47,6 +54,7 @@ class Graph(object):
         if node not in self.nodes:
             return 0
         self.nodes.remove(node)
+        self._invalidate_caches()
         victims = 1
         for edge in list(node.succs):
             victims += self.remove_edge(edge)
@@ -60,6 +68,7 @@ class Graph(object):
         self.edges.remove(edge)
         edge.srcnode.succs.remove(edge)
         edge.dstnode.preds.remove(edge)
+        self._invalidate_caches()
         victims = 0
         if not edge.dstnode.preds:
             # We removed last inedge: recurse
@@ -170,85 +179,270 @@ class Graph(object):
                                 get_srcs,
                                 get_dsts)
 
+    def get_strongly_connected_components(self):
+        """
+        Get the strongly-connected components of this graph, as a list of
+        lists of nodes, in reverse topological order: each SCC is listed
+        before any SCC that can reach it
+        """
+        def get_dsts(node):
+            return [edge.dstnode for edge in node.succs]
+        return strongly_connected_components(self.nodes, get_dsts)
+
+    def get_bfs_tree(self, srcnode):
+        """
+        Breadth-first search from srcnode, giving a dict mapping from each
+        node reachable from srcnode to the Edge by which the search first
+        reached it (None for srcnode itself).
+
+        Following the edges back from a node gives a shortest path to it,
+        since every edge has length 1.
+
+        The results are cached (for the most recently-used sources) until
+        the graph is next modified.
+        """
+        if self._bfs_trees is None:
+            from collections import OrderedDict
+            self._bfs_trees = OrderedDict()
+        elif srcnode in self._bfs_trees:
+            # Move to the end, marking it as most recently used:
+            tree = self._bfs_trees.pop(srcnode)
+            self._bfs_trees[srcnode] = tree
+            return tree
+
+        from collections import deque
+        tree = {srcnode: None}
+        worklist = deque([srcnode])
+        while worklist:
+            node = worklist.popleft()
+            for edge in node.succs:
+                if edge.dstnode not in tree:
+                    tree[edge.dstnode] = edge
+                    worklist.append(edge.dstnode)
+
+        if self._bfs_trees is None:
+            # The graph was modified during the search (e.g. a lazily-built
+            # graph evicted part of itself), so don't cache the result:
+            return tree
+        while len(self._bfs_trees) >= self.MAX_CACHED_BFS_TREES:
+            self._bfs_trees.popitem(last=False)
+        self._bfs_trees[srcnode] = tree
+        return tree
+
     def get_shortest_path(self, srcnode, dstnode):
         '''
         Locate the shortest path from the srcnode to the dstnode
         Return a list of Edge instances, or None if no such path exists
         '''
-        # Dijkstra's algorithm
-        # A dict giving for each node the length of the shortest known path
-        # from srcnode to this node:
-        distance = {}
-
-        # A dict giving for each node the previous node within that shortest
-        # path:
-        inedge = {}
-
-        INFINITY = 0x80000000
-        for node in self.nodes:
-            distance[node] = INFINITY
-            inedge[node] = None
-        distance[srcnode] = 0
-
-        # We use a heapq to keep the nodes sorted by distance
-        # The items in the heapq are lists of the form:
-        #    [distance_to_node, node, is_live)
-        # The first entry in the list ensures that the heapq is sorted
-        # into the order needed for Dijkstra's algorithm
-        #
-        # Since we can't change the priority of items within a heapq,
-        # whenever we need to update the distance we mark the existing
-        # item as dead (setting the is_live boolean to False), and add a
-        # new entry with the correct value; we ignore dead items during
-        # the iteration
-        #
-        # This gets the time taken for a simple 10000 node graph down to
-        # ~3 seconds, compared to minutes/hours.
-        from heapq import heapify, heappop, heappush
-        item_for_node = {}
-        for node in self.nodes:
-            item_for_node[node] = [distance[node], node, True]
-
-        worklist = list(item_for_node.values())
-        heapify(worklist)
-        while worklist:
-            def get_next():
-                while 1:
-                    if not worklist:
-                        return None
-                    disttonode, node, islive = heappop(worklist)
-                    if islive:
-                        return node
-            node = get_next()
-            if node is None:
-                # disjoint
-                break
-            if node == dstnode:
-                # We've found the target node; build a path of the edges to
-                # follow to get here:
-                path = []
-                while inedge[node]:
-                    path = [inedge[node]] + path
-                    node = inedge[node].srcnode
-                return path
-            if distance[node] == INFINITY:
-                # disjoint
-                break
-            for edge in node.succs:
-                alt = distance[node] + 1
-                if alt < distance[edge.dstnode]:
-                    distance[edge.dstnode] = alt
-                    # Changing the distance of edge.dstnode requires us to
-                    # update the heapq:
-                    # Mark the existing item as dead:
-                    item_for_node[edge.dstnode][2] = False
-                    # Create a new itemwith the new distance:
-                    newitem = [alt, edge.dstnode, True]
-                    item_for_node[edge.dstnode] = newitem
-                    heappush(worklist, newitem)
-                    inedge[edge.dstnode] = edge
-        return None
-
+        # If we have a reachability index, use it to avoid a search when
+        # there's no path:
+        if self._reachability is not None:
+            if not self._reachability.is_reachable(srcnode, dstnode):
+                return None
+
+        tree = self.get_bfs_tree(srcnode)
+        if dstnode not in tree:
+            return None
+        path = []
+        node = dstnode
+        while tree[node] is not None:
+            path.append(tree[node])
+            node = tree[node].srcnode
+        path.reverse()
+        return path
+
+    def build_reachability_index(self):
+        """
+        Precompute a ReachabilityIndex for this graph, so that subsequent
+        calls to is_reachable() take near-constant time (until the graph is
+        next modified)
+        """
+        self._reachability = ReachabilityIndex(self)
+        return self._reachability
+
+    def is_reachable(self, srcnode, dstnode):
+        """
+        Is there a path (possibly of length 0) from srcnode to dstnode?
+        """
+        if self._reachability is not None:
+            return self._reachability.is_reachable(srcnode, dstnode)
+        return dstnode in self.get_bfs_tree(srcnode)
+
+    def _invalidate_caches(self):
+        self._bfs_trees = None
+        self._reachability = None
+
+    def _invalidate_for_expansion(self):
+        # For lazily-built graphs, when adding nodes and edges that were
+        # already implicitly present: any BFS tree is still valid, since
+        # building it expanded every node that it reached, but a
+        # ReachabilityIndex only covers the nodes that existed when it was
+        # built:
+        self._reachability = None
+
+def strongly_connected_components(nodes, get_dsts):
+    """
+    Tarjan's algorithm, iteratively (to cope with large graphs).
+
+    Return a list of SCCs, each a list of nodes, in reverse topological
+    order: each SCC is listed before any SCC that can reach it
+    """
+    result = []
+    index_for_node = {}
+    lowlink = {}
+    stack = []
+    onstack = set()
+    for root in nodes:
+        if root in index_for_node:
+            continue
+        index_for_node[root] = lowlink[root] = len(index_for_node)
+        stack.append(root)
+        onstack.add(root)
+        callstack = [(root, iter(get_dsts(root)))]
+        while callstack:
+            node, dsts = callstack[-1]
+            for dst in dsts:
+                if dst not in index_for_node:
+                    index_for_node[dst] = lowlink[dst] = len(index_for_node)
+                    stack.append(dst)
+                    onstack.add(dst)
+                    callstack.append((dst, iter(get_dsts(dst))))
+                    break
+                elif dst in onstack:
+                    lowlink[node] = min(lowlink[node], index_for_node[dst])
+            else:
+                callstack.pop()
+                if callstack:
+                    parent = callstack[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index_for_node[node]:
+                    scc = []
+                    while 1:
+                        member = stack.pop()
+                        onstack.remove(member)
+                        scc.append(member)
+                        if member is node:
+                            break
+                    result.append(scc)
+    return result
+
+def batch_sccs(sccs, get_dsts):
+    """
+    Given a list of SCCs in reverse topological order (as returned by
+    strongly_connected_components), group them into batches: a list of
+    lists of SCCs, such that there are no edges between the SCCs within a
+    batch, and every edge out of a batch leads to an earlier batch.
+
+    Hence the SCCs within each batch can be processed independently of
+    each other (e.g. in parallel), once the earlier batches are complete.
+    """
+    scc_idx_for_node = {}
+    for idx, scc in enumerate(sccs):
+        for node in scc:
+            scc_idx_for_node[node] = idx
+    # The length of the longest chain of SCCs below each SCC:
+    level = []
+    batches = []
+    for idx, scc in enumerate(sccs):
+        sccdepth = 0
+        for node in scc:
+            for dst in get_dsts(node):
+                dstidx = scc_idx_for_node.get(dst)
+                if dstidx is not None and dstidx != idx:
+                    sccdepth = max(sccdepth, level[dstidx] + 1)
+        level.append(sccdepth)
+        if sccdepth == len(batches):
+            batches.append([])
+        batches[sccdepth].append(scc)
+    return batches
+
+class ReachabilityIndex(object):
+    """
+    Precomputed answers to "is there a path from X to Y?" for a Graph.
+
+    The strongly-connected components are condensed into a DAG, which is
+    labelled using a spanning forest: each SCC gets a postorder number,
+    and a sorted list of disjoint intervals of postorder numbers, covering
+    all of the SCCs reachable from it.  A query is then a lookup of the
+    SCC of each node, and a binary search.
+    """
+    __slots__ = ('scc_for_node', 'postorder', 'starts', 'ends')
+
+    def __init__(self, graph):
+        def get_dsts(node):
+            return [edge.dstnode for edge in node.succs]
+        sccs = strongly_connected_components(graph.nodes, get_dsts)
+
+        self.scc_for_node = {}
+        for idx, scc in enumerate(sccs):
+            for node in scc:
+                self.scc_for_node[node] = idx
+
+        # Edges of the condensation DAG:
+        succs = [set() for scc in sccs]
+        haspreds = [False] * len(sccs)
+        for edge in graph.edges:
+            src = self.scc_for_node[edge.srcnode]
+            dst = self.scc_for_node[edge.dstnode]
+            if src != dst:
+                succs[src].add(dst)
+                haspreds[dst] = True
+
+        # Number the SCCs in postorder over a spanning forest, recording
+        # for each the interval of numbers covering its subtree:
+        self.postorder = [None] * len(sccs)
+        lowest = [None] * len(sccs)
+        counter = 0
+        # (visit roots first, in the hope of a more bushy forest)
+        roots = [idx for idx in range(len(sccs)) if not haspreds[idx]]
+        for root in roots + list(range(len(sccs))):
+            if self.postorder[root] is not None or lowest[root] is not None:
+                continue
+            lowest[root] = counter
+            callstack = [(root, iter(succs[root]))]
+            while callstack:
+                idx, children = callstack[-1]
+                for child in children:
+                    if lowest[child] is None:
+                        lowest[child] = counter
+                        callstack.append((child, iter(succs[child])))
+                        break
+                else:
+                    callstack.pop()
+                    self.postorder[idx] = counter
+                    counter += 1
+
+        # Merge the intervals of the successors, visiting the SCCs in
+        # reverse topological order so that the successors are complete:
+        self.starts = [None] * len(sccs)
+        self.ends = [None] * len(sccs)
+        for idx in range(len(sccs)):
+            intervals = [(lowest[idx], self.postorder[idx])]
+            for child in succs[idx]:
+                intervals += zip(self.starts[child], self.ends[child])
+            intervals.sort()
+            starts = []
+            ends = []
+            for start, end in intervals:
+                if ends and start <= ends[-1] + 1:
+                    if end > ends[-1]:
+                        ends[-1] = end
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self.starts[idx] = starts
+            self.ends[idx] = ends
+
+    def is_reachable(self, srcnode, dstnode):
+        from bisect import bisect_right
+        src = self.scc_for_node[srcnode]
+        dst = self.scc_for_node[dstnode]
+        if src == dst:
+            return True
+        target = self.postorder[dst]
+        starts = self.starts[src]
+        i = bisect_right(starts, target) - 1
+        return i >= 0 and target <= self.ends[src][i]
 
 class Node(object):
     __slots__ = ('preds', 'succs')
@@ -0,0 +1,742 @@
+#   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2013 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+############################################################################
+# Generic monotone dataflow framework
+#
+# A DataflowProblem supplies a Lattice, a direction, and transfer functions
+# for nodes (and optionally for edges); DataflowProblem.solve() runs a
+# worklist algorithm to a fixpoint, visiting nodes in reverse-postorder
+# (with respect to the direction of the problem).
+#
+# This works on any gccutils.graph.Graph: a StmtGraph for intraprocedural
+# problems, or a Supergraph for interprocedural ones, in which case values
+# are also propagated along the CallToStart/ExitToReturnSite edges (and
+# problems can override transfer_call/transfer_return to map between the
+# caller's and the callee's variables).
+#
+# Reference clients:
+#   LiveVariables        (backward, gen/kill, bit-vector)
+#   ReachingDefinitions  (forward, gen/kill, bit-vector)
+#   ConstantPropagation  (forward, map from variables to constants)
+############################################################################
+
+from heapq import heappush, heappop
+
+import gcc
+
+from gccutils.graph.stmtgraph import StmtNode, SplitPhiNode
+from gccutils.graph.supergraph import CallNode, ReturnNode, \
+    CallToStart, ExitToReturnSite, CallToReturnSiteEdge, FakeEntryEdge
+from gccutils.graph.ivpgraph import IvpEdge
+
+FORWARD = 'forward'
+BACKWARD = 'backward'
+
+############################################################################
+# Lattices
+############################################################################
+class Lattice(object):
+    """
+    The set of values tracked by a DataflowProblem, with a join operator.
+
+    Values must be treated as immutable: transfer functions build new
+    values rather than modifying their inputs.
+    """
+    __slots__ = ()
+
+    def initial(self):
+        """
+        The value that every node starts with, before any information has
+        reached it (the identity of join)
+        """
+        raise NotImplementedError
+
+    def join(self, a, b):
+        """
+        Combine the values flowing in along two different edges
+        """
+        raise NotImplementedError
+
+    def equal(self, a, b):
+        return a == b
+
+class BitVectorDomain(object):
+    """
+    A mapping between facts and bit positions, so that sets of facts can be
+    represented as Python ints.  Facts are assigned bits on demand.
+    """
+    __slots__ = ('facts', 'index_for_fact')
+
+    def __init__(self, facts=()):
+        self.facts = []
+        self.index_for_fact = {}
+        for fact in facts:
+            self.get_bit(fact)
+
+    def __len__(self):
+        return len(self.facts)
+
+    def get_bit(self, fact):
+        """
+        Get the int with just the bit for the given fact set
+        """
+        idx = self.index_for_fact.get(fact)
+        if idx is None:
+            idx = len(self.facts)
+            self.facts.append(fact)
+            self.index_for_fact[fact] = idx
+        return 1 << idx
+
+    def get_bits(self, facts):
+        result = 0
+        for fact in facts:
+            result |= self.get_bit(fact)
+        return result
+
+    def get_mask(self):
+        """
+        Get the int with the bits for every known fact set
+        """
+        return (1 << len(self.facts)) - 1
+
+    def to_set(self, bits):
+        """
+        Convert an int back to the set of facts it represents
+        """
+        bits &= self.get_mask()
+        result = set()
+        idx = 0
+        while bits:
+            if bits & 1:
+                result.add(self.facts[idx])
+            bits >>= 1
+            idx += 1
+        return result
+
+class BitVectorLattice(Lattice):
+    """
+    Sets of facts within a BitVectorDomain, as Python ints.
+
+    For "may" problems (e.g. liveness), join is union and the initial value
+    is the empty set.
+
+    For "must" problems (e.g. available expressions), join is intersection
+    and the initial value is the universal set, represented as -1 (i.e. every
+    bit set), so that it works even as the domain grows.
+    """
+    __slots__ = ('may', )
+
+    def __init__(self, may=True):
+        self.may = may
+
+    def initial(self):
+        if self.may:
+            return 0
+        else:
+            return -1
+
+    def join(self, a, b):
+        if self.may:
+            return a | b
+        else:
+            return a & b
+
+class NotAConstant(object):
+    """
+    Singleton marking a variable that can have more than one value
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'NAC'
+
+    __str__ = __repr__
+
+NAC = NotAConstant()
+
+class ConstantLattice(Lattice):
+    """
+    Dicts mapping from variables to either a constant or NAC
+
+    A variable that is absent from the dict is undefined i.e. no assignment
+    to it has been seen yet.
+    """
+    __slots__ = ()
+
+    def initial(self):
+        return {}
+
+    def join(self, a, b):
+        if not a:
+            return b
+        if not b:
+            return a
+        result = dict(a)
+        for key, value in b.items():
+            if key in result:
+                if result[key] != value:
+                    result[key] = NAC
+            else:
+                result[key] = value
+        return result
+
+############################################################################
+# Problems and the solver
+############################################################################
+class DataflowProblem(object):
+    """
+    Abstract base class for a dataflow problem on a graph.
+
+    Subclasses must implement transfer(), and can override:
+      get_boundary_value(): the value at the entry (for forward problems) or
+        exit (for backward problems) nodes
+      transfer_edge() or the more specific transfer_call(), transfer_return()
+        and transfer_call_to_return_site(): to modify values as they flow
+        along edges
+    """
+    direction = FORWARD
+
+    def __init__(self, graph, lattice):
+        self.graph = graph
+        self.lattice = lattice
+
+    def get_boundary_nodes(self):
+        """
+        Get the nodes at which the analysis starts i.e. the entry nodes for
+        a forward problem, and the exit nodes for a backward problem
+        """
+        if self.direction == FORWARD:
+            result = set()
+            if hasattr(self.graph, 'get_entry_nodes'):
+                result.update(node
+                              for node in self.graph.get_entry_nodes()
+                              if node is not None)
+            result.update(node for node in self.graph.nodes if not node.preds)
+            return result
+        else:
+            return set(node for node in self.graph.nodes if not node.succs)
+
+    def get_boundary_value(self, node):
+        return self.lattice.initial()
+
+    def transfer(self, node, value):
+        """
+        Given the value flowing into the node (i.e. before it, for a forward
+        problem, after it for a backward problem), get the value flowing out
+        of it
+        """
+        raise NotImplementedError
+
+    def transfer_edge(self, edge, value):
+        """
+        Given the value at one end of an edge, get the value contributed to
+        the node at the other end
+        """
+        kind = edge
+        if isinstance(edge, IvpEdge):
+            kind = edge.inneredge
+        if isinstance(kind, CallToStart):
+            return self.transfer_call(edge, value)
+        if isinstance(kind, ExitToReturnSite):
+            return self.transfer_return(edge, value)
+        if isinstance(kind, CallToReturnSiteEdge):
+            return self.transfer_call_to_return_site(edge, value)
+        return value
+
+    def transfer_call(self, edge, value):
+        return value
+
+    def transfer_return(self, edge, value):
+        return value
+
+    def transfer_call_to_return_site(self, edge, value):
+        return value
+
+    def solve(self):
+        """
+        Run the problem to a fixpoint, returning a DataflowResult
+        """
+        return DataflowSolver(self).solve()
+
+class GenKillProblem(DataflowProblem):
+    """
+    A problem in which each node's transfer function is of the form:
+        out = gen | (in & ~kill)
+    with sets of facts represented as ints within self.domain
+
+    Subclasses must implement get_gen() and get_kill(); the results are
+    cached per node.
+    """
+    def __init__(self, graph, may=True):
+        DataflowProblem.__init__(self, graph, BitVectorLattice(may))
+        self.domain = BitVectorDomain()
+        self._genkill_for_node = {}
+
+    def get_boundary_value(self, node):
+        # Nothing holds at the boundary, even for "must" problems:
+        return 0
+
+    def get_gen(self, node):
+        raise NotImplementedError
+
+    def get_kill(self, node):
+        raise NotImplementedError
+
+    def transfer(self, node, value):
+        genkill = self._genkill_for_node.get(node)
+        if genkill is None:
+            genkill = (self.get_gen(node), ~self.get_kill(node))
+            self._genkill_for_node[node] = genkill
+        gen, notkill = genkill
+        return gen | (value & notkill)
+
+def get_reverse_postorder(nodes, roots, forward=True):
+    """
+    Get a list of the given nodes in reverse-postorder, starting the
+    depth-first traversal at the given roots (and then at any nodes not
+    reachable from them), following the succs (or, if forward is False,
+    the preds) of each node
+    """
+    if forward:
+        def get_next(node):
+            return [edge.dstnode for edge in node.succs]
+    else:
+        def get_next(node):
+            return [edge.srcnode for edge in node.preds]
+    postorder = []
+    visited = set()
+    # Iterative, to avoid hitting the recursion limit on large graphs:
+    for root in list(roots) + sorted(nodes):
+        if root in visited:
+            continue
+        visited.add(root)
+        stack = [(root, iter(get_next(root)))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if child not in visited:
+                    visited.add(child)
+                    stack.append((child, iter(get_next(child))))
+                    break
+            else:
+                stack.pop()
+                postorder.append(node)
+    postorder.reverse()
+    return postorder
+
+class DataflowSolver(object):
+    """
+    Worklist-based solver, processing nodes in reverse-postorder
+    """
+    def __init__(self, problem):
+        self.problem = problem
+
+    def solve(self):
+        problem = self.problem
+        lattice = problem.lattice
+        graph = problem.graph
+        forward = (problem.direction == FORWARD)
+
+        boundary = problem.get_boundary_nodes()
+        order = get_reverse_postorder(graph.nodes, sorted(boundary),
+                                      forward)
+        index_for_node = dict((node, idx) for idx, node in enumerate(order))
+
+        # The values before/after each node in the direction of the problem:
+        invalues = {}
+        outvalues = {}
+        for node in order:
+            outvalues[node] = lattice.initial()
+
+        # The worklist is a heap of indices into "order", so that we always
+        # process the earliest pending node in reverse-postorder:
+        worklist = list(range(len(order)))
+        pending = set(worklist)
+        iterations = 0
+        while worklist:
+            idx = heappop(worklist)
+            pending.discard(idx)
+            node = order[idx]
+            iterations += 1
+
+            if node in boundary:
+                value = problem.get_boundary_value(node)
+            else:
+                value = None
+            if forward:
+                inedges = node.preds
+            else:
+                inedges = node.succs
+            for edge in inedges:
+                if forward:
+                    other = edge.srcnode
+                else:
+                    other = edge.dstnode
+                contribution = problem.transfer_edge(edge, outvalues[other])
+                if value is None:
+                    value = contribution
+                else:
+                    value = lattice.join(value, contribution)
+            if value is None:
+                value = lattice.initial()
+            invalues[node] = value
+
+            newout = problem.transfer(node, value)
+            if lattice.equal(newout, outvalues[node]):
+                # Every node starts on the worklist, so there's no need to
+                # revisit the neighbors:
+                continue
+            outvalues[node] = newout
+
+            if forward:
+                outedges = node.succs
+            else:
+                outedges = node.preds
+            for edge in outedges:
+                if forward:
+                    other = edge.dstnode
+                else:
+                    other = edge.srcnode
+                otheridx = index_for_node[other]
+                if otheridx not in pending:
+                    pending.add(otheridx)
+                    heappush(worklist, otheridx)
+
+        if forward:
+            return DataflowResult(problem, invalues, outvalues, iterations)
+        else:
+            return DataflowResult(problem, outvalues, invalues, iterations)
+
+class DataflowResult(object):
+    """
+    The fixpoint of a DataflowProblem.
+
+    "before" and "after" are in terms of the flow of control through the
+    graph, regardless of the direction of the problem
+    e.g. for liveness, get_before(node) gives the variables live on entry
+    to the node.
+    """
+    __slots__ = ('problem', 'before', 'after', 'iterations')
+
+    def __init__(self, problem, before, after, iterations):
+        self.problem = problem
+        self.before = before
+        self.after = after
+        # The number of node visits needed to reach the fixpoint:
+        self.iterations = iterations
+
+    def get_before(self, node):
+        return self.before[node]
+
+    def get_after(self, node):
+        return self.after[node]
+
+############################################################################
+# Helpers for extracting variables from the nodes of a StmtGraph,
+# Supergraph or IvpGraph
+############################################################################
+VARIABLE_TYPES = (gcc.VarDecl, gcc.ParmDecl, gcc.ResultDecl, gcc.SsaName)
+
+def get_stmtnode(node):
+    """
+    Get the StmtNode underlying a node of a StmtGraph, Supergraph or
+    IvpGraph, or None (e.g. for a FakeEntryNode)
+    """
+    while not isinstance(node, StmtNode):
+        if node is None:
+            return None
+        node = node.innernode
+    return node
+
+def iter_vars_in_expr(expr):
+    """
+    Yield all of the variables referenced within a gcc.Tree expression
+    """
+    if expr is None:
+        return
+    if isinstance(expr, VARIABLE_TYPES):
+        yield expr
+    elif isinstance(expr, gcc.ComponentRef):
+        for var in iter_vars_in_expr(expr.target):
+            yield var
+    elif isinstance(expr, gcc.ArrayRef):
+        for var in iter_vars_in_expr(expr.array):
+            yield var
+        for var in iter_vars_in_expr(expr.index):
+            yield var
+    elif isinstance(expr, (gcc.MemRef, gcc.Unary)):
+        for var in iter_vars_in_expr(expr.operand):
+            yield var
+
+def get_defined_var(node):
+    """
+    Get the variable directly assigned to by the node, or None
+    """
+    if isinstance(getattr(node, 'supergraphnode', None), CallNode):
+        # For an interprocedural call, the assignment happens at the
+        # ReturnNode
+        return None
+    stmtnode = get_stmtnode(node)
+    if stmtnode is None:
+        return None
+    stmt = stmtnode.stmt
+    if isinstance(stmt, (gcc.GimpleAssign, gcc.GimpleCall, gcc.GimplePhi)):
+        if isinstance(stmt.lhs, VARIABLE_TYPES):
+            return stmt.lhs
+
+def get_used_vars(node):
+    """
+    Get the set of variables read by the node
+    """
+    if isinstance(getattr(node, 'supergraphnode', None), ReturnNode):
+        # For an interprocedural call, the arguments are read at the
+        # CallNode
+        return set()
+    stmtnode = get_stmtnode(node)
+    if stmtnode is None:
+        return set()
+    stmt = stmtnode.stmt
+    exprs = []
+    if isinstance(stmtnode, SplitPhiNode):
+        exprs = [stmtnode.rhs]
+    elif isinstance(stmt, gcc.GimplePhi):
+        exprs = [expr for expr, edge in stmt.args]
+    elif isinstance(stmt, gcc.GimpleAssign):
+        exprs = list(stmt.rhs)
+        if not isinstance(stmt.lhs, VARIABLE_TYPES):
+            # e.g. "*p = x;" reads p:
+            exprs.append(stmt.lhs)
+    elif isinstance(stmt, gcc.GimpleCall):
+        exprs = [stmt.fn] + list(stmt.args)
+        if stmt.lhs is not None and not isinstance(stmt.lhs, VARIABLE_TYPES):
+            exprs.append(stmt.lhs)
+    elif isinstance(stmt, gcc.GimpleCond):
+        exprs = [stmt.lhs, stmt.rhs]
+    elif isinstance(stmt, gcc.GimpleReturn):
+        exprs = [stmt.retval]
+    elif isinstance(stmt, gcc.GimpleSwitch):
+        exprs = [stmt.indexvar]
+    result = set()
+    for expr in exprs:
+        result.update(iter_vars_in_expr(expr))
+    return result
+
+############################################################################
+# Reference clients
+############################################################################
+class LiveVariables(GenKillProblem):
+    """
+    Which variables may be read before they are next written?
+
+    The facts are variables (gcc.VarDecl etc)
+    """
+    direction = BACKWARD
+
+    def __init__(self, graph):
+        GenKillProblem.__init__(self, graph, may=True)
+
+    def get_gen(self, node):
+        return self.domain.get_bits(get_used_vars(node))
+
+    def get_kill(self, node):
+        var = get_defined_var(node)
+        if var is not None:
+            return self.domain.get_bit(var)
+        return 0
+
+    def transfer_call(self, edge, value):
+        # The callee's locals aren't live within the caller; the caller's
+        # own locals reach the CallNode via the CallToReturnSiteEdge
+        return 0
+
+    def transfer_return(self, edge, value):
+        return 0
+
+    def get_live_vars_before(self, result, node):
+        return self.domain.to_set(result.get_before(node))
+
+    def get_live_vars_after(self, result, node):
+        return self.domain.to_set(result.get_after(node))
+
+class ReachingDefinitions(GenKillProblem):
+    """
+    Which assignments may have been the most recent write to a variable?
+
+    The facts are the nodes making the assignments
+    """
+    direction = FORWARD
+
+    def __init__(self, graph):
+        GenKillProblem.__init__(self, graph, may=True)
+        self.defs_for_var = {}
+        for node in graph.nodes:
+            var = get_defined_var(node)
+            if var is not None:
+                if var in self.defs_for_var:
+                    self.defs_for_var[var].add(node)
+                else:
+                    self.defs_for_var[var] = set([node])
+
+    def get_gen(self, node):
+        if get_defined_var(node) is not None:
+            return self.domain.get_bit(node)
+        return 0
+
+    def get_kill(self, node):
+        var = get_defined_var(node)
+        if var is not None:
+            return self.domain.get_bits(self.defs_for_var[var])
+        return 0
+
+    def transfer_call(self, edge, value):
+        # Definitions of the caller's locals don't reach into the callee:
+        return 0
+
+    def transfer_return(self, edge, value):
+        return 0
+
+    def get_defs_reaching(self, result, node):
+        """
+        Get the set of nodes whose definitions reach the given node
+        """
+        return self.domain.to_set(result.get_before(node))
+
+class ConstantPropagation(DataflowProblem):
+    """
+    Which variables have a known constant (integer) value?
+
+    The values are dicts from variables to either an int or NAC.
+
+    When run on a Supergraph, the values of arguments are propagated into
+    the callee's parameters, and return values back to the caller.
+    """
+    direction = FORWARD
+
+    # Key for tracking the value being returned by a function:
+    RETURN_VALUE = 'return value'
+
+    def __init__(self, graph):
+        DataflowProblem.__init__(self, graph, ConstantLattice())
+
+    def get_boundary_value(self, node):
+        # Parameters of an entrypoint could have any value:
+        stmtnode = get_stmtnode(node)
+        if stmtnode is None:
+            return {}
+        return dict((parm, NAC)
+                    for parm in stmtnode.fun.decl.arguments)
+
+    def eval_expr(self, value, expr):
+        if isinstance(expr, gcc.IntegerCst):
+            return expr.constant
+        if isinstance(expr, VARIABLE_TYPES):
+            # Treat undefined variables as unknown:
+            return value.get(expr, NAC)
+        return NAC
+
+    def eval_rhs(self, value, stmt):
+        rhs = [self.eval_expr(value, expr) for expr in stmt.rhs]
+        if NAC in rhs:
+            return NAC
+        if stmt.exprcode in (gcc.IntegerCst, gcc.VarDecl, gcc.ParmDecl,
+                             gcc.SsaName, gcc.NopExpr):
+            return rhs[0]
+        if stmt.exprcode == gcc.PlusExpr:
+            return rhs[0] + rhs[1]
+        if stmt.exprcode == gcc.MinusExpr:
+            return rhs[0] - rhs[1]
+        if stmt.exprcode == gcc.MultExpr:
+            return rhs[0] * rhs[1]
+        if stmt.exprcode == gcc.NegateExpr:
+            return -rhs[0]
+        return NAC
+
+    def transfer(self, node, value):
+        stmtnode = get_stmtnode(node)
+        if stmtnode is None:
+            return value
+        stmt = stmtnode.stmt
+        supergraphnode = getattr(node, 'supergraphnode', None)
+
+        if isinstance(stmt, gcc.GimpleReturn):
+            result = dict(value)
+            result[self.RETURN_VALUE] = self.eval_expr(value, stmt.retval)
+            return result
+
+        var = get_defined_var(node)
+        if var is None:
+            return value
+        if isinstance(supergraphnode, ReturnNode):
+            # The value of the LHS arrived along the ExitToReturnSite edge
+            return value
+
+        if isinstance(stmtnode, SplitPhiNode):
+            newvalue = self.eval_expr(value, stmtnode.rhs)
+        elif isinstance(stmt, gcc.GimplePhi):
+            newvalue = None
+            for expr, edge in stmt.args:
+                argvalue = self.eval_expr(value, expr)
+                if newvalue is None:
+                    newvalue = argvalue
+                elif newvalue != argvalue:
+                    newvalue = NAC
+        elif isinstance(stmt, gcc.GimpleAssign):
+            newvalue = self.eval_rhs(value, stmt)
+        else:
+            # A call to a function outside of the graph:
+            newvalue = NAC
+        result = dict(value)
+        result[var] = newvalue
+        return result
+
+    def transfer_edge(self, edge, value):
+        if isinstance(getattr(edge, 'inneredge', edge), FakeEntryEdge):
+            # A call from outside of the supergraph:
+            return self.get_boundary_value(edge.dstnode)
+        return DataflowProblem.transfer_edge(self, edge, value)
+
+    def transfer_call(self, edge, value):
+        # Bind the arguments at the callsite to the callee's parameters:
+        stmt = edge.srcnode.stmt
+        parms = edge.dstnode.function.decl.arguments
+        return dict((parm, self.eval_expr(value, arg))
+                    for parm, arg in zip(parms, stmt.args))
+
+    def transfer_return(self, edge, value):
+        # Bind the return value to the LHS of the call within the caller:
+        lhs = edge.dstnode.stmt.lhs
+        if isinstance(lhs, VARIABLE_TYPES):
+            return {lhs: value.get(self.RETURN_VALUE, NAC)}
+        return {}
+
+    def transfer_call_to_return_site(self, edge, value):
+        # The LHS of the call is set by the ExitToReturnSite edge:
+        lhs = edge.srcnode.stmt.lhs
+        if lhs in value:
+            value = dict(value)
+            del value[lhs]
+        return value
+
+    def get_constants_before(self, result, node):
+        """
+        Get a dict from variables to their known constant values before
+        the given node
+        """
+        return dict((var, constant)
+                    for var, constant in result.get_before(node).items()
+                    if constant is not NAC and var != self.RETURN_VALUE)
@@ -17,7 +17,7 @@
 
 from gccutils.graph import Graph, Node, Edge, Subgraph
 from gccutils.graph.supergraph import Supergraph, CallToStart, \
-    ExitToReturnSite, CallNode
+    ExitToReturnSite, CallToReturnSiteEdge, CallNode, _raw_succs, _raw_preds
 
 ############################################################################
 # Enhancement to a Supergraph to approximate the Interprocedural Valid Paths
@@ -30,6 +30,10 @@ from gccutils.graph.supergraph import Supergraph, CallToStart, \
 class Callstring:
     """
     A callstring-suffix
+
+    Callstrings are interned by the IvpGraph that creates them (see
+    IvpGraph.get_callstring), so that each distinct suffix is a single
+    object, and pushing a callnode onto one can be memoized.
     """
     __slots__ = ('callnodes', )
 
@@ -47,7 +51,7 @@ class Callstring:
         return 'Callstring(%r)' % str(self)
 
     def __eq__(self, other):
-        return self.callnodes == other.callnodes
+        return self is other or self.callnodes == other.callnodes
 
     def __hash__(self):
         return hash(self.callnodes)
@@ -57,91 +61,63 @@ class Callstring:
                          for callnode in self.callnodes])
 
 class IvpGraph(Graph):
-    __slots__ = ('sg', 'maxlength', 'ivpnodes', '_entrynodes')
+    """
+    If lazy is False, all (callstring, supernode) pairs reachable from the
+    entry nodes are built up front.
+
+    If lazy is True, nodes are only expanded (i.e. have their out-edges and
+    successors built) when their "succs" are first accessed, so that a
+    traversal from get_entry_nodes() only pays for what it visits.  The
+    "preds" of a node only contain the edges from nodes expanded so far.
+    In this mode, when returning from a truncated callstring, the possible
+    missing bottom of the stack is reconstructed from the callers of the
+    function, rather than from the set of all callstrings seen.
+    """
+    __slots__ = ('sg', 'maxlength', 'ivpnodes', '_entrynodes',
+                 'all_callstrings', 'lazy',
+                 '_callstrings', '_pushes', '_pending_return_edges')
 
-    def __init__(self, sg, maxlength):
+    def __init__(self, sg, maxlength, lazy=False):
         Graph.__init__(self)
         self.sg = sg
         self.maxlength = maxlength
+        self.lazy = lazy
 
         # Dict mapping from (callstring, supernode) to IvpNode
         self.ivpnodes = {}
 
+        # Interned callstrings: dict from tuple of callnodes to Callstring
+        self._callstrings = {}
+
+        # Memoized results of pushing a callnode onto a callstring:
+        # dict from (Callstring, callnode) to Callstring
+        self._pushes = {}
+
         self._entrynodes = set()
 
         # 1st pass: walk from the entrypoints, calling functions,
         # building nodes, and calling edges.
         # We will fill in the return edges later:
         # set of (ivpnode, inneredge) pairs deferred for later processsing:
-        _pending_return_edges = set()
-
-        def _add_node_for_key(key):
-            callstring, supernode = key
-            newnode = IvpNode(callstring, supernode)
-            self.add_node(newnode)
-            self.ivpnodes[key] = newnode
-            return newnode
+        self._pending_return_edges = set()
 
-        # The "worklist" is a set of IvpNodes that we need to add
-        # edges for.  Doing so may lead to more IvpNodes being
-        # created.
-        worklist = set()
         for supernode in sg.get_entry_nodes():
-            key = (Callstring(tuple()), supernode)
-            node = _add_node_for_key(key)
-            worklist.add(node)
+            node = self._add_node_for_key( (self.get_callstring(()),
+                                            supernode) )
             self._entrynodes.add(node)
 
-        while worklist:
-            ivpnode = worklist.pop()
-            if 0:
-                print('ivpnode: %s' % ivpnode)
-                print('ivpnode: %r' % ivpnode)
+        if lazy:
+            self.all_callstrings = None
+            return
 
-            for inneredge in ivpnode.innernode.succs:
-                if 0:
-                    print('  inneredge: %s' % inneredge)
-                    print('  inneredge: %r' % inneredge)
-                callstring = ivpnode.callstring
-
-                def get_callstring():
-                    if isinstance(inneredge, CallToStart):
-                        # interprocedural call: push onto stack:
-                        callnode = inneredge.srcnode
-                        assert len(callstring.callnodes) <= maxlength
-                        if len(callstring.callnodes) == maxlength:
-                            # Truncate, losing the bottom of the stack:
-                            oldstack = list(callstring.callnodes[1:])
-                        else:
-                            oldstack = list(callstring.callnodes)
-                        return Callstring(tuple(oldstack + [callnode]))
-
-                    elif isinstance(inneredge, ExitToReturnSite):
-                        # interprocedural return: pop from stack
-                        if not callstring.callnodes:
-                            return None
-
-                        # Ensure that we're returning to the correct place
-                        # according to the top of the stack:
-                        callnode = callstring.callnodes[-1]
-                        if inneredge.dstnode == callnode.returnnode:
-                            # add to the pending list
-                            _pending_return_edges.add( (ivpnode, inneredge) )
-
-                        return None
-                    else:
-                        # same stack depth:
-                        return ivpnode.callstring
-
-                newcallstring = get_callstring()
-                if newcallstring:
-                    key = (newcallstring, inneredge.dstnode)
-                    if key not in self.ivpnodes:
-                        dstnode = _add_node_for_key(key)
-                        worklist.add( dstnode )
-                    else:
-                        dstnode = self.ivpnodes[key]
-                    self.add_edge(ivpnode, dstnode, inneredge)
+        # The "worklist" is a queue of IvpNodes that we need to add
+        # edges for.  Doing so may lead to more IvpNodes being
+        # created.
+        from collections import deque
+        worklist = deque(self._entrynodes)
+        while worklist:
+            ivpnode = worklist.popleft()
+            worklist.extend(self._expand(ivpnode))
 
             # FIXME: in case we don't terminate, this is useful for debugging why:
             #if len(self.nodes) > 100:
@@ -157,7 +133,7 @@ class IvpGraph(Graph):
 
         # 3rd pass: go back and add the return edges (using the set of valid
         # callstrings to expand possible-truncated stacks):
-        for srcivpnode, inneredge in _pending_return_edges:
+        for srcivpnode, inneredge in self._pending_return_edges:
             callstring = srcivpnode.callstring
 
             # We have a return edge, valid in the sense
@@ -167,7 +143,7 @@ class IvpGraph(Graph):
             def iter_valid_pops(callstring):
                 # We could be at the top of an untruncated stack, in which
                 # case we simply lose the top element:
-                candidate = Callstring(callstring.callnodes[:-1])
+                candidate = self.get_callstring(callstring.callnodes[:-1])
                 if candidate in self.all_callstrings:
                     yield candidate
 
@@ -183,11 +159,265 @@ class IvpGraph(Graph):
             valid_pops = set(iter_valid_pops(callstring))
             for newcallstring in valid_pops:
                 key = (newcallstring, inneredge.dstnode)
-                dstivpnode = self.ivpnodes[key]
-                self.add_edge(srcivpnode, dstivpnode, inneredge)
+                # Only return to nodes that were reached by the 1st pass:
+                if key in self.ivpnodes:
+                    dstivpnode = self.ivpnodes[key]
+                    self.add_edge(srcivpnode, dstivpnode, inneredge)
+        self._pending_return_edges = None
 
         # (done)
 
+    def get_callstring(self, callnodes):
+        """
+        Get the interned Callstring for the given tuple of callnodes
+        """
+        callstring = self._callstrings.get(callnodes)
+        if callstring is None:
+            callstring = Callstring(callnodes)
+            self._callstrings[callnodes] = callstring
+        return callstring
+
+    def push(self, callstring, callnode):
+        """
+        Get the Callstring for an interprocedural call at callnode from
+        within callstring (truncating the stack if necessary)
+        """
+        key = (callstring, callnode)
+        result = self._pushes.get(key)
+        if result is None:
+            assert len(callstring.callnodes) <= self.maxlength
+            if len(callstring.callnodes) == self.maxlength:
+                # Truncate, losing the bottom of the stack:
+                oldstack = callstring.callnodes[1:]
+            else:
+                oldstack = callstring.callnodes
+            result = self.get_callstring(oldstack + (callnode, ))
+            self._pushes[key] = result
+        return result
+
+    def get_node(self, callstring, supernode):
+        """
+        Get the IvpNode for the given pair, creating it if necessary
+        """
+        key = (callstring, supernode)
+        if key in self.ivpnodes:
+            return self.ivpnodes[key]
+        return self._add_node_for_key(key)
+
+    def _add_node_for_key(self, key):
+        callstring, supernode = key
+        if self.lazy:
+            newnode = LazyIvpNode(callstring, supernode)
+            newnode.ivpg = self
+            newnode.expanded = False
+            self.nodes.add(newnode)
+            self._invalidate_for_expansion()
+        else:
+            newnode = IvpNode(callstring, supernode)
+            self.add_node(newnode)
+        self.ivpnodes[key] = newnode
+        return newnode
+
+    def _expand(self, ivpnode):
+        """
+        Add the out-edges for the given IvpNode, returning a list of the
+        IvpNodes that were created in doing so
+        """
+        if 0:
+            print('ivpnode: %s' % ivpnode)
+            print('ivpnode: %r' % ivpnode)
+
+        newnodes = []
+        callstring = ivpnode.callstring
+        for inneredge in ivpnode.innernode.succs:
+            if 0:
+                print('  inneredge: %s' % inneredge)
+                print('  inneredge: %r' % inneredge)
+
+            if isinstance(inneredge, CallToStart):
+                # interprocedural call: push onto stack:
+                newcallstrings = [self.push(callstring, inneredge.srcnode)]
+
+            elif isinstance(inneredge, ExitToReturnSite):
+                # interprocedural return: pop from stack
+                if not callstring.callnodes:
+                    continue
+
+                # Ensure that we're returning to the correct place
+                # according to the top of the stack:
+                callnode = callstring.callnodes[-1]
+                if inneredge.dstnode != callnode.returnnode:
+                    continue
+
+                if not self.lazy:
+                    # add to the pending list
+                    self._pending_return_edges.add( (ivpnode, inneredge) )
+                    continue
+
+                newcallstrings = self._get_pops(callstring)
+            else:
+                # same stack depth:
+                newcallstrings = [callstring]
+
+            for newcallstring in newcallstrings:
+                key = (newcallstring, inneredge.dstnode)
+                if key not in self.ivpnodes:
+                    dstnode = self._add_node_for_key(key)
+                    newnodes.append(dstnode)
+                else:
+                    dstnode = self.ivpnodes[key]
+                self.add_edge(ivpnode, dstnode, inneredge)
+        return newnodes
+
+    def _get_pops(self, callstring):
+        # Get the possible callstrings after returning from the top of the
+        # given callstring, for the lazy case:
+        #
+        # We could be at the top of an untruncated stack, in which
+        # case we simply lose the top element:
+        result = [self.get_callstring(callstring.callnodes[:-1])]
+
+        # Alternatively, the stack could be truncated, in which case the
+        # missing element could be any call of the function containing the
+        # bottom of the remaining stack:
+        if len(callstring.callnodes) == self.maxlength:
+            bottom = callstring.callnodes[0]
+            entry = self.sg.get_entry_node(bottom.function)
+            for edge in entry.preds:
+                if isinstance(edge, CallToStart):
+                    result.append(
+                        self.get_callstring((edge.srcnode, )
+                                            + callstring.callnodes[:-1]))
+        return result
+
+    def add_edge(self, srcnode, dstnode, *args, **kwargs):
+        if not self.lazy:
+            return Graph.add_edge(self, srcnode, dstnode, *args, **kwargs)
+        # Bypass the properties on the lazy nodes, so that adding an edge
+        # doesn't trigger further expansion:
+        e = self._make_edge(srcnode, dstnode, *args, **kwargs)
+        self.edges.add(e)
+        _raw_succs(srcnode).add(e)
+        _raw_preds(dstnode).add(e)
+        self._invalidate_for_expansion()
+        return e
+
+    def _make_edge(self, srcnode, dstnode, edge):
+        return IvpEdge(srcnode, dstnode, edge)
+
+    def get_functions(self):
+        for fun in self.sg.get_functions():
+            yield fun
+
+    def get_entry_nodes(self):
+        for node in self._entrynodes:
+            yield node
+
+class FunctionalIvpGraph(Graph):
+    """
+    A summary-based ("functional") alternative to IvpGraph, for when
+    cloning functions per callstring would be too expensive (e.g. for
+    deep call chains).
+
+    Each supernode appears once (with the empty callstring), and a call is
+    modelled by:
+      - the CallToStart edge, for paths that descend into the callee (and
+        never return from it), and
+      - the CallToReturnSiteEdge, acting as a summary edge for paths that
+        step over the call; it's only present if the callee can return
+        (i.e. has a valid path from its entry to its exit)
+    The ExitToReturnSite edges are dropped.
+
+    Hence every path from an entry node is a prefix of an interprocedurally
+    valid path, and the size of the graph is linear in that of the
+    supergraph.
+    """
+    __slots__ = ('sg', 'ivpnodes', '_entrynodes', 'can_return')
+
+    def __init__(self, sg):
+        Graph.__init__(self)
+        self.sg = sg
+
+        # Dict mapping from supernode to IvpNode
+        self.ivpnodes = {}
+
+        # Dict from gcc.Function to bool (the function summaries):
+        self.can_return = self._compute_can_return()
+
+        callstring = Callstring(())
+        def get_node(supernode):
+            if supernode in self.ivpnodes:
+                return self.ivpnodes[supernode], False
+            node = self.add_node(IvpNode(callstring, supernode))
+            self.ivpnodes[supernode] = node
+            return node, True
+
+        self._entrynodes = set()
+        worklist = []
+        for supernode in sg.get_entry_nodes():
+            node, isnew = get_node(supernode)
+            self._entrynodes.add(node)
+            worklist.append(node)
+        while worklist:
+            ivpnode = worklist.pop()
+            for inneredge in ivpnode.innernode.succs:
+                if not self._is_valid_edge(inneredge):
+                    continue
+                dstnode, isnew = get_node(inneredge.dstnode)
+                if isnew:
+                    worklist.append(dstnode)
+                self.add_edge(ivpnode, dstnode, inneredge)
+
+    def _is_valid_edge(self, inneredge):
+        if isinstance(inneredge, ExitToReturnSite):
+            return False
+        if isinstance(inneredge, CallToReturnSiteEdge):
+            return self._callee_can_return(inneredge.srcnode)
+        return True
+
+    def _callee_can_return(self, callnode):
+        for edge in callnode.succs:
+            if isinstance(edge, CallToStart):
+                if self.can_return.get(edge.dstnode.function, False):
+                    return True
+        return False
+
+    def _compute_can_return(self):
+        # Iterate to a fixpoint: initially assume that no function can
+        # return, then repeatedly look for a path from entry to exit, only
+        # stepping over calls to functions known to be able to return:
+        funs = list(self.sg.get_functions())
+        self.can_return = dict((fun, False) for fun in funs)
+        changed = True
+        while changed:
+            changed = False
+            for fun in funs:
+                if not self.can_return[fun]:
+                    if self._exit_is_reachable(fun):
+                        self.can_return[fun] = True
+                        changed = True
+        return self.can_return
+
+    def _exit_is_reachable(self, fun):
+        entry = self.sg.get_entry_node(fun)
+        exit = self.sg.get_exit_node(fun)
+        visited = set([entry])
+        worklist = [entry]
+        while worklist:
+            node = worklist.pop()
+            if node == exit:
+                return True
+            for edge in node.succs:
+                if isinstance(edge, (CallToStart, ExitToReturnSite)):
+                    continue
+                if isinstance(edge, CallToReturnSiteEdge):
+                    if not self._callee_can_return(edge.srcnode):
+                        continue
+                if edge.dstnode not in visited:
+                    visited.add(edge.dstnode)
+                    worklist.append(edge.dstnode)
+        return False
+
     def _make_edge(self, srcnode, dstnode, edge):
         return IvpEdge(srcnode, dstnode, edge)
 
@@ -252,6 +482,24 @@ class IvpNode(Node):
                                             self.function.decl.name)))
         return ()
 
+class LazyIvpNode(IvpNode):
+    """
+    An IvpNode within a lazily-built IvpGraph, which is expanded when its
+    successors are first needed
+    """
+    __slots__ = ('ivpg', 'expanded')
+
+    def _get_succs(self):
+        if not self.expanded:
+            self.expanded = True
+            self.ivpg._expand(self)
+        return _raw_succs(self)
+
+    def _set_succs(self, value):
+        Node.succs.__set__(self, value)
+
+    succs = property(_get_succs, _set_succs)
+
 class IvpEdge(Edge):
     __slots__ = ('inneredge', )
 
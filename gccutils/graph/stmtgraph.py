@@ -215,6 +215,10 @@ class StmtNode(Node):
             return Text(str(self))
 
     def __eq__(self, other):
+        if self.stmt is None:
+            # Nodes for empty BBs (e.g. the entry and exit) are only equal
+            # to themselves:
+            return self is other
         return self.stmt == other.stmt
 
 class EntryNode(StmtNode):
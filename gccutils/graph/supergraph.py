@@ -33,54 +33,17 @@ class Supergraph(Graph):
         # 1st pass: locate interprocedural instances of gcc.GimpleCall
         # i.e. where both caller and callee are within the supergraph
         # (perhaps the same function)
-        ipcalls = set()
-        from gcc import get_callgraph_nodes
-        for node in get_callgraph_nodes():
-            fun = node.decl.function
-            if fun:
-                for edge in node.callees:
-                    if edge.callee.decl.function:
-                        ipcalls.add(edge.call_stmt)
+        ipcalls = self._get_ipcalls()
 
         # 2nd pass: construct a StmtGraph for each function in the callgraph
         # and add nodes and edges to "self" wrapping the nodes and edges
         # within each StmtGraph:
         self.stmtg_for_fun = {}
+        from gcc import get_callgraph_nodes
         for node in get_callgraph_nodes():
             fun = node.decl.function
             if fun:
-                stmtg = StmtGraph(fun, split_phi_nodes)
-                self.stmtg_for_fun[fun] = stmtg
-                # Clone the stmtg nodes and edges into the Supergraph:
-                stmtg.supernode_for_stmtnode = {}
-                for node in stmtg.nodes:
-                    if node.stmt in ipcalls:
-                        # These nodes will have two supernodes, a CallNode
-                        # and a ReturnNode:
-                        callnode = self.add_node(CallNode(node, stmtg))
-                        returnnode = self.add_node(ReturnNode(node, stmtg))
-                        callnode.returnnode = returnnode
-                        returnnode.callnode = callnode
-                        stmtg.supernode_for_stmtnode[node] = (callnode, returnnode)
-                        self.add_edge(
-                            callnode, returnnode,
-                            CallToReturnSiteEdge, None)
-                    else:
-                        stmtg.supernode_for_stmtnode[node] = \
-                            self.add_node(SupergraphNode(node, stmtg))
-                for edge in stmtg.edges:
-                    if edge.srcnode.stmt in ipcalls:
-                        # Begin the superedge from the ReturnNode:
-                        srcsupernode = stmtg.supernode_for_stmtnode[edge.srcnode][1]
-                    else:
-                        srcsupernode = stmtg.supernode_for_stmtnode[edge.srcnode]
-                    if edge.dstnode.stmt in ipcalls:
-                        # End the superedge at the CallNode:
-                        dstsupernode = stmtg.supernode_for_stmtnode[edge.dstnode][0]
-                    else:
-                        dstsupernode = stmtg.supernode_for_stmtnode[edge.dstnode]
-                    superedge = self.add_edge(srcsupernode, dstsupernode,
-                                              SupergraphEdge, edge)
+                self._add_stmtgraph(StmtGraph(fun, split_phi_nodes), ipcalls)
 
         # 3rd pass: add the interprocedural edges (call and return):
         for node in get_callgraph_nodes():
@@ -88,36 +51,15 @@ class Supergraph(Graph):
             if fun:
                 for edge in node.callees:
                     if edge.callee.decl.function:
-                        calling_stmtg = self.stmtg_for_fun[fun]
-                        called_stmtg = self.stmtg_for_fun[edge.callee.decl.function]
-
-                        calling_stmtnode = calling_stmtg.node_for_stmt[edge.call_stmt]
-                        assert calling_stmtnode
-
-                        entry_stmtnode = called_stmtg.entry
-                        assert entry_stmtnode
-
-                        exit_stmtnode = called_stmtg.exit
-                        assert exit_stmtnode
-
-                        superedge_call = self.add_edge(
-                            calling_stmtg.supernode_for_stmtnode[calling_stmtnode][0],
-                            called_stmtg.supernode_for_stmtnode[entry_stmtnode],
-                            CallToStart,
-                            None)
-                        superedge_return = self.add_edge(
-                            called_stmtg.supernode_for_stmtnode[exit_stmtnode],
-                            calling_stmtg.supernode_for_stmtnode[calling_stmtnode][1],
-                            ExitToReturnSite,
-                            None)
-                        superedge_return.calling_stmtnode = calling_stmtnode
+                        self._add_call_edges(fun, edge)
 
         # 4th pass: create fake entry node:
         if not add_fake_entry_node:
             self.fake_entry_node = None
             return
 
-        self.fake_entry_node = self.add_node(FakeEntryNode(None, None))
+        self.fake_entry_node = self.add_node(
+            self._make_supernode(FakeEntryNode, None, None))
         """
 	/* At file scope, the presence of a `static' or `register' storage
 	   class specifier, or the absence of all storage class specifiers
@@ -133,11 +75,95 @@ class Supergraph(Graph):
         for fun in self.stmtg_for_fun:
             # Only for non-static functions:
             if fun.decl.is_public:
-                stmtg = self.stmtg_for_fun[fun]
-                self.add_edge(self.fake_entry_node,
-                              stmtg.supernode_for_stmtnode[stmtg.entry],
-                              FakeEntryEdge,
-                              None)
+                self._add_fake_entry_edge(fun)
+
+    def _get_ipcalls(self):
+        ipcalls = set()
+        from gcc import get_callgraph_nodes
+        for node in get_callgraph_nodes():
+            fun = node.decl.function
+            if fun:
+                for edge in node.callees:
+                    if edge.callee.decl.function:
+                        ipcalls.add(edge.call_stmt)
+        return ipcalls
+
+    def _make_supernode(self, cls, innernode, stmtg):
+        return cls(innernode, stmtg)
+
+    def _add_stmtgraph(self, stmtg, ipcalls):
+        """
+        Clone the nodes and edges of the StmtGraph into the Supergraph
+        """
+        self.stmtg_for_fun[stmtg.fun] = stmtg
+        stmtg.supernode_for_stmtnode = {}
+        for node in stmtg.nodes:
+            if node.stmt in ipcalls:
+                # These nodes will have two supernodes, a CallNode
+                # and a ReturnNode:
+                callnode = self.add_node(
+                    self._make_supernode(CallNode, node, stmtg))
+                returnnode = self.add_node(
+                    self._make_supernode(ReturnNode, node, stmtg))
+                callnode.returnnode = returnnode
+                returnnode.callnode = callnode
+                stmtg.supernode_for_stmtnode[node] = (callnode, returnnode)
+                self.add_edge(
+                    callnode, returnnode,
+                    CallToReturnSiteEdge, None)
+            else:
+                stmtg.supernode_for_stmtnode[node] = \
+                    self.add_node(self._make_supernode(SupergraphNode,
+                                                       node, stmtg))
+        for edge in stmtg.edges:
+            if edge.srcnode.stmt in ipcalls:
+                # Begin the superedge from the ReturnNode:
+                srcsupernode = stmtg.supernode_for_stmtnode[edge.srcnode][1]
+            else:
+                srcsupernode = stmtg.supernode_for_stmtnode[edge.srcnode]
+            if edge.dstnode.stmt in ipcalls:
+                # End the superedge at the CallNode:
+                dstsupernode = stmtg.supernode_for_stmtnode[edge.dstnode][0]
+            else:
+                dstsupernode = stmtg.supernode_for_stmtnode[edge.dstnode]
+            superedge = self.add_edge(srcsupernode, dstsupernode,
+                                      SupergraphEdge, edge)
+
+    def _add_call_edges(self, fun, edge):
+        """
+        Add the interprocedural edges for the given gcc.CallgraphEdge within
+        the given gcc.Function
+        """
+        calling_stmtg = self.stmtg_for_fun[fun]
+        called_stmtg = self.stmtg_for_fun[edge.callee.decl.function]
+
+        calling_stmtnode = calling_stmtg.node_for_stmt[edge.call_stmt]
+        assert calling_stmtnode
+
+        entry_stmtnode = called_stmtg.entry
+        assert entry_stmtnode
+
+        exit_stmtnode = called_stmtg.exit
+        assert exit_stmtnode
+
+        superedge_call = self.add_edge(
+            calling_stmtg.supernode_for_stmtnode[calling_stmtnode][0],
+            called_stmtg.supernode_for_stmtnode[entry_stmtnode],
+            CallToStart,
+            None)
+        superedge_return = self.add_edge(
+            called_stmtg.supernode_for_stmtnode[exit_stmtnode],
+            calling_stmtg.supernode_for_stmtnode[calling_stmtnode][1],
+            ExitToReturnSite,
+            None)
+        superedge_return.calling_stmtnode = calling_stmtnode
+
+    def _add_fake_entry_edge(self, fun):
+        stmtg = self.stmtg_for_fun[fun]
+        self.add_edge(self.fake_entry_node,
+                      stmtg.supernode_for_stmtnode[stmtg.entry],
+                      FakeEntryEdge,
+                      None)
 
     def add_node(self, supernode):
         Graph.add_node(self, supernode)
@@ -156,6 +182,23 @@ class Supergraph(Graph):
         for fun in self.stmtg_for_fun:
             yield fun
 
+    def get_stmtgraph(self, fun):
+        return self.stmtg_for_fun[fun]
+
+    def get_entry_node(self, fun):
+        """
+        Get the supernode for the entry of the given gcc.Function
+        """
+        stmtg = self.get_stmtgraph(fun)
+        return stmtg.supernode_for_stmtnode[stmtg.entry]
+
+    def get_exit_node(self, fun):
+        """
+        Get the supernode for the exit of the given gcc.Function
+        """
+        stmtg = self.get_stmtgraph(fun)
+        return stmtg.supernode_for_stmtnode[stmtg.exit]
+
 class SupergraphNode(Node):
     """
     A node in the supergraph, wrapping a StmtNode
@@ -334,3 +377,331 @@ class FakeEntryEdge(SupergraphEdge):
 
     def to_dot_label(self, ctxt):
         return 'external call'
+
+############################################################################
+# A Supergraph which is built on demand: the StmtGraph for each function
+# (and the interprocedural edges in and out of it) are only created when a
+# traversal first reaches that function, and the least-recently-used
+# functions can be evicted to bound memory usage.
+############################################################################
+class LazySupergraph(Supergraph):
+    """
+    A Supergraph that only contains the functions that have been reached so
+    far.
+
+    Accessing the "succs" of a CallNode (or of the exit node of a function)
+    materializes the callee (or the callers), and similarly for the "preds"
+    of a ReturnNode (or of the entry node of a function), so that walking
+    the graph via node.succs/node.preds works as for a Supergraph.
+
+    Use get_stmtgraph() or get_entry_node() to start a traversal from a
+    particular function; "nodes" and "edges" only contain the materialized
+    functions.
+
+    If maxfunctions is not None, then once more than that number of
+    functions have been materialized, the least-recently-used ones are
+    evicted, removing their nodes and edges from the graph.  The nodes of
+    an evicted function are stale: if the function is needed again, new
+    nodes are created for it.  All of the functions materialized by a
+    single expansion are kept, so the limit can be temporarily exceeded
+    (e.g. when expanding the FakeEntryNode, which needs every public
+    function).
+    """
+    __slots__ = ('split_phi_nodes',
+                 'maxfunctions',
+                 'ipcalls',
+                 'all_funs',
+                 'calls_from_fun',
+                 'calls_to_fun',
+                 'callee_for_stmt',
+                 '_lru',
+                 '_pinned')
+
+    def __init__(self, split_phi_nodes, add_fake_entry_node,
+                 maxfunctions=None):
+        Graph.__init__(self)
+        self.supernode_for_stmtnode = {}
+        self.stmtg_for_fun = {}
+        self.split_phi_nodes = split_phi_nodes
+        self.maxfunctions = maxfunctions
+        self.ipcalls = self._get_ipcalls()
+
+        # Gather the interprocedural calls from the callgraph (which is
+        # cheap, compared to building the StmtGraph instances):
+        #   calls_from_fun: gcc.Function -> list of gcc.CallgraphEdge
+        #   calls_to_fun: gcc.Function -> list of (caller, gcc.CallgraphEdge)
+        #   callee_for_stmt: gcc.GimpleCall -> gcc.Function
+        self.all_funs = []
+        self.calls_from_fun = {}
+        self.calls_to_fun = {}
+        self.callee_for_stmt = {}
+        from gcc import get_callgraph_nodes
+        for node in get_callgraph_nodes():
+            fun = node.decl.function
+            if fun:
+                self.all_funs.append(fun)
+                self.calls_from_fun[fun] = []
+        for fun in self.all_funs:
+            self.calls_to_fun[fun] = []
+        for node in get_callgraph_nodes():
+            fun = node.decl.function
+            if fun:
+                for edge in node.callees:
+                    callee = edge.callee.decl.function
+                    if callee:
+                        self.calls_from_fun[fun].append(edge)
+                        self.calls_to_fun[callee].append( (fun, edge) )
+                        self.callee_for_stmt[edge.call_stmt] = callee
+
+        from collections import OrderedDict
+        # The materialized functions, least-recently-used first:
+        self._lru = OrderedDict()
+        self._pinned = None
+
+        if add_fake_entry_node:
+            self.fake_entry_node = self.add_node(
+                self._make_supernode(FakeEntryNode, None, None))
+            self._update_fake_entry_node()
+        else:
+            self.fake_entry_node = None
+
+    def _make_supernode(self, cls, innernode, stmtg):
+        supernode = _lazy_class_for_class[cls](innernode, stmtg)
+        supernode.lazysg = self
+        supernode.pending_succs = False
+        supernode.pending_preds = False
+        return supernode
+
+    def add_edge(self, srcnode, dstnode, *args, **kwargs):
+        # Bypass the properties on the lazy nodes, so that adding an edge
+        # doesn't trigger further expansion:
+        assert isinstance(srcnode, Node)
+        assert isinstance(dstnode, Node)
+        e = self._make_edge(srcnode, dstnode, *args, **kwargs)
+        self.edges.add(e)
+        _raw_succs(srcnode).add(e)
+        _raw_preds(dstnode).add(e)
+        self._invalidate_for_expansion()
+        return e
+
+    def add_node(self, supernode):
+        self.nodes.add(supernode)
+        self.supernode_for_stmtnode[supernode.innernode] = supernode
+        self._invalidate_for_expansion()
+        return supernode
+
+    def get_functions(self):
+        for fun in self.all_funs:
+            yield fun
+
+    def get_stmtgraph(self, fun):
+        """
+        Get the StmtGraph for the given gcc.Function, materializing it if
+        necessary (as do get_entry_node and get_exit_node)
+        """
+        stmtg = self.stmtg_for_fun.get(fun)
+        if stmtg is None:
+            outermost = self._pin()
+            stmtg = self._materialize(fun)
+            if outermost:
+                self._unpin()
+        else:
+            self._touch(fun)
+        return stmtg
+
+    def get_num_materialized(self):
+        return len(self.stmtg_for_fun)
+
+    def _touch(self, fun):
+        # Mark the function as the most-recently used:
+        if fun in self._lru:
+            del self._lru[fun]
+            self._lru[fun] = None
+
+    def _pin(self):
+        # Track the functions used by this expansion, so that none of them
+        # are evicted until it's complete:
+        if self._pinned is None:
+            self._pinned = set()
+            return True
+        return False
+
+    def _unpin(self):
+        pinned = self._pinned
+        self._pinned = None
+        if self.maxfunctions is not None:
+            for fun in list(self._lru):
+                if len(self.stmtg_for_fun) <= self.maxfunctions:
+                    break
+                if fun not in pinned:
+                    self._evict(fun)
+
+    def _materialize(self, fun):
+        stmtg = StmtGraph(fun, self.split_phi_nodes)
+        self._add_stmtgraph(stmtg, self.ipcalls)
+        self._lru[fun] = None
+        self._pinned.add(fun)
+
+        # Add the interprocedural edges to any materialized callees and
+        # callers:
+        for edge in self.calls_from_fun[fun]:
+            if edge.callee.decl.function in self.stmtg_for_fun:
+                self._add_call_edges(fun, edge)
+        for caller, edge in self.calls_to_fun[fun]:
+            if caller in self.stmtg_for_fun and caller != fun:
+                self._add_call_edges(caller, edge)
+
+        if self.fake_entry_node and fun.decl.is_public:
+            self._add_fake_entry_edge(fun)
+
+        self._update_neighbors(fun)
+        return stmtg
+
+    def _evict(self, fun):
+        stmtg = self.stmtg_for_fun.pop(fun)
+        del self._lru[fun]
+        for supernodes in stmtg.supernode_for_stmtnode.values():
+            if not isinstance(supernodes, tuple):
+                supernodes = (supernodes, )
+            for supernode in supernodes:
+                # Remove the edges directly (rather than via
+                # Graph.remove_edge, which would remove any other nodes
+                # left without predecessors):
+                for edge in list(_raw_succs(supernode)) + list(_raw_preds(supernode)):
+                    if edge in self.edges:
+                        self.edges.remove(edge)
+                        _raw_succs(edge.srcnode).discard(edge)
+                        _raw_preds(edge.dstnode).discard(edge)
+                self.nodes.discard(supernode)
+                if self.supernode_for_stmtnode.get(supernode.innernode) is supernode:
+                    del self.supernode_for_stmtnode[supernode.innernode]
+        self._invalidate_caches()
+        self._update_neighbors(fun)
+
+    def _update_neighbors(self, fun):
+        # Update the pending flags for the function and those it
+        # interacts with:
+        funs = set([fun])
+        for edge in self.calls_from_fun[fun]:
+            funs.add(edge.callee.decl.function)
+        for caller, edge in self.calls_to_fun[fun]:
+            funs.add(caller)
+        for neighbor in funs:
+            if neighbor in self.stmtg_for_fun:
+                self._update_pending(neighbor)
+        if self.fake_entry_node:
+            self._update_fake_entry_node()
+
+    def _update_pending(self, fun):
+        stmtg = self.stmtg_for_fun[fun]
+        missing_callers = False
+        for caller, edge in self.calls_to_fun[fun]:
+            if caller not in self.stmtg_for_fun:
+                missing_callers = True
+                break
+        if stmtg.entry:
+            stmtg.supernode_for_stmtnode[stmtg.entry].pending_preds = missing_callers
+        if stmtg.exit:
+            stmtg.supernode_for_stmtnode[stmtg.exit].pending_succs = missing_callers
+
+        for edge in self.calls_from_fun[fun]:
+            missing_callee = edge.callee.decl.function not in self.stmtg_for_fun
+            stmtnode = stmtg.node_for_stmt[edge.call_stmt]
+            callnode, returnnode = stmtg.supernode_for_stmtnode[stmtnode]
+            callnode.pending_succs = missing_callee
+            returnnode.pending_preds = missing_callee
+
+    def _update_fake_entry_node(self):
+        self.fake_entry_node.pending_succs = False
+        for fun in self.all_funs:
+            if fun.decl.is_public and fun not in self.stmtg_for_fun:
+                self.fake_entry_node.pending_succs = True
+                break
+
+    def _expand(self, supernode, funs):
+        outermost = self._pin()
+        if supernode.stmtg:
+            self._pinned.add(supernode.stmtg.fun)
+        for fun in funs:
+            if fun not in self.stmtg_for_fun:
+                self._materialize(fun)
+            else:
+                self._pinned.add(fun)
+        if outermost:
+            self._unpin()
+
+    def _expand_succs(self, supernode):
+        if supernode is self.fake_entry_node:
+            funs = [fun for fun in self.all_funs if fun.decl.is_public]
+        elif isinstance(supernode, CallNode):
+            funs = [self.callee_for_stmt[supernode.stmt]]
+        else:
+            # The exit node of a function; we need all of the callers:
+            funs = [caller
+                    for caller, edge in self.calls_to_fun[supernode.function]]
+        self._expand(supernode, funs)
+
+    def _expand_preds(self, supernode):
+        if isinstance(supernode, ReturnNode):
+            funs = [self.callee_for_stmt[supernode.stmt]]
+        else:
+            # The entry node of a function; we need all of the callers:
+            funs = [caller
+                    for caller, edge in self.calls_to_fun[supernode.function]]
+        self._expand(supernode, funs)
+
+# The underlying storage for "succs" and "preds" within Node, for use by the
+# lazy nodes, which wrap them with properties:
+def _raw_succs(node):
+    return Node.succs.__get__(node, Node)
+
+def _raw_preds(node):
+    return Node.preds.__get__(node, Node)
+
+class LazyNodeMixin(object):
+    """
+    Wrap the "succs" and "preds" of a node within a LazySupergraph,
+    expanding the graph when they're accessed (if necessary)
+    """
+    __slots__ = ()
+
+    def _get_succs(self):
+        if self.pending_succs:
+            self.lazysg._expand_succs(self)
+        elif self.stmtg:
+            self.lazysg._touch(self.stmtg.fun)
+        return _raw_succs(self)
+
+    def _set_succs(self, value):
+        Node.succs.__set__(self, value)
+
+    succs = property(_get_succs, _set_succs)
+
+    def _get_preds(self):
+        if self.pending_preds:
+            self.lazysg._expand_preds(self)
+        elif self.stmtg:
+            self.lazysg._touch(self.stmtg.fun)
+        return _raw_preds(self)
+
+    def _set_preds(self, value):
+        Node.preds.__set__(self, value)
+
+    preds = property(_get_preds, _set_preds)
+
+class LazySupergraphNode(LazyNodeMixin, SupergraphNode):
+    __slots__ = ('lazysg', 'pending_succs', 'pending_preds')
+
+class LazyCallNode(LazyNodeMixin, CallNode):
+    __slots__ = ('lazysg', 'pending_succs', 'pending_preds')
+
+class LazyReturnNode(LazyNodeMixin, ReturnNode):
+    __slots__ = ('lazysg', 'pending_succs', 'pending_preds')
+
+class LazyFakeEntryNode(LazyNodeMixin, FakeEntryNode):
+    __slots__ = ('lazysg', 'pending_succs', 'pending_preds')
+
+_lazy_class_for_class = {SupergraphNode: LazySupergraphNode,
+                         CallNode: LazyCallNode,
+                         ReturnNode: LazyReturnNode,
+                         FakeEntryNode: LazyFakeEntryNode}
@@ -0,0 +1,162 @@
+#   Copyright 2011, 2012 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2011, 2012 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Profiling of all of the Python code run by the plugin, as enabled by
+#   -fplugin-arg-python-profile=DIR
+# and optionally:
+#   -fplugin-arg-python-profile-interval=MILLISECONDS
+#
+# The plugin calls start() before running any script.  When the compiler
+# finishes, the results for the translation unit are written to DIR, either
+# as a pstats file (from cProfile), or, if an interval was given, as a file
+# of "collapsed" stacks from sampling every MILLISECONDS, suitable for
+# turning into a flame graph with e.g. flamegraph.pl
+
+import os
+import sys
+import threading
+
+import gcc
+
+class DeterministicProfiler(object):
+    """
+    Use cProfile to record every Python call
+    """
+    suffix = 'pstats'
+
+    def __init__(self):
+        import cProfile
+        self.prof = cProfile.Profile()
+
+    def start(self):
+        self.prof.enable()
+
+    def stop(self):
+        self.prof.disable()
+
+    def write(self, filename):
+        self.prof.dump_stats(filename)
+
+class SamplingProfiler(object):
+    """
+    Periodically sample the Python stack of the thread that runs the
+    plugin's callbacks, from another thread.
+
+    The plugin's thread holds the GIL whilst GCC itself is running, so
+    samples are only taken whilst Python code is executing.
+    """
+    suffix = 'collapsed'
+
+    def __init__(self, interval):
+        # interval is in seconds
+        self.interval = interval
+        self.counts = {}
+        self._ident = threading.current_thread().ident
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        name='gcc-python-profiler')
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            self._stopped.wait(self.interval)
+            if self._stopped.is_set():
+                return
+            frame = sys._current_frames().get(self._ident)
+            if frame is not None:
+                self._record(frame)
+
+    def _record(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append('%s (%s:%i)' % (code.co_name,
+                                         code.co_filename,
+                                         code.co_firstlineno))
+            frame = frame.f_back
+        key = ';'.join(reversed(stack))
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def write(self, filename):
+        with open(filename, 'w') as f:
+            for key in sorted(self.counts):
+                f.write('%s %i\n' % (key, self.counts[key]))
+
+_profiler = None
+_directory = None
+
+def start(directory=None, interval=None):
+    """
+    Start profiling all of the Python code run by the plugin, writing the
+    results to the given directory (or the current directory) at the end of
+    the compilation.
+
+    interval, if given, is a sampling interval in milliseconds (as a str or
+    number); otherwise every call is recorded
+    """
+    global _profiler, _directory
+    if _profiler:
+        raise RuntimeError('the profiler is already running')
+    if interval is not None:
+        interval = float(interval)
+        if interval <= 0:
+            raise ValueError('profile interval must be positive: %r'
+                             % interval)
+        _profiler = SamplingProfiler(interval / 1000.0)
+    else:
+        _profiler = DeterministicProfiler()
+    _directory = directory or '.'
+    if not os.path.isdir(_directory):
+        os.makedirs(_directory)
+
+    # Callbacks are invoked in the reverse order of registration, so
+    # registering this now means that it runs after any registered by
+    # scripts:
+    gcc.register_callback(gcc.PLUGIN_FINISH, _on_finish)
+
+    _profiler.start()
+
+def stop():
+    """
+    Stop profiling and write out the results, returning the filename, or
+    None if the profiler wasn't running.
+
+    The file is named after the translation unit and the process ID, so
+    that each compiler invocation within a build writes a separate file.
+    """
+    global _profiler
+    if not _profiler:
+        return None
+    profiler = _profiler
+    _profiler = None
+    profiler.stop()
+    base_name = os.path.basename(gcc.get_dump_base_name() or 'gcc')
+    filename = os.path.join(_directory,
+                            '%s.%i.%s' % (base_name, os.getpid(),
+                                          profiler.suffix))
+    profiler.write(filename)
+    return filename
+
+def _on_finish():
+    stop()
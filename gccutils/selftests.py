@@ -24,3 +24,56 @@
 def assertEqual(lhs, rhs):
     if lhs != rhs:
         raise ValueError('non-equal values: %r != %r' % (lhs, rhs))
+
+def get_loc_key(loc):
+    """
+    Get a hashable, comparable key for a gcc.Location (or None)
+    """
+    if loc is None:
+        return None
+    return (loc.file, loc.line, loc.column)
+
+def get_line(fun, marker):
+    """
+    Get the (1-based) number of the first line of the source file of the
+    gcc.Function that contains the given text, or None if there isn't one
+    """
+    with open(fun.start.file) as f:
+        for i, line in enumerate(f):
+            if marker in line:
+                return i + 1
+
+def describe_reports(rep, ignored_locs=(), normalize=str):
+    """
+    Describe the reports of a libcpychecker Reporter, as a list of
+    (location, message, diagnostics) tuples, where "diagnostics" describes
+    the warning and the notes that would be written to stderr, other than
+    those at the given locations (as keys from get_loc_key)
+
+    The messages are passed through "normalize", so that tests can hide
+    details that legitimately differ between runs
+    """
+    result = []
+    for report in rep.reports:
+        diagnostics = []
+        for d in report._saved_diagnostics:
+            if 'similar trace(s) to this' in d.msg:
+                # The number of traces explored can legitimately differ:
+                continue
+            if get_loc_key(d.loc) in ignored_locs:
+                continue
+            diagnostics.append((d.__class__.__name__,
+                                get_loc_key(d.loc),
+                                normalize(d.msg)))
+        result.append((get_loc_key(report.loc), normalize(report.msg),
+                       diagnostics))
+    return result
+
+def describe_report_steps(rep, fun, normalize=str):
+    """
+    Get the location and description of each step of the path to each
+    report of a libcpychecker Reporter, as shown in the HTML report
+    """
+    return [[(state['location'], normalize(state['message']))
+             for state in report.to_json(fun)['states']]
+            for report in rep.reports]
@@ -83,6 +83,19 @@ def generate_function():
                           tp_richcompare = 'PyGccFunction_richcompare',
                           tp_getset = getsettable.identifier,
                                     )
+    methods = PyMethodTable('PyGccFunction_methods', [])
+    methods.add_method('export',
+                       '(PyCFunction)PyGccFunction_export',
+                       'METH_NOARGS',
+                       "Get a snapshot of this function's CFG and gimple, as a dict of lists of tuples")
+    methods.add_method('gimple_list',
+                       '(PyCFunction)PyGccFunction_gimple_list',
+                       'METH_VARARGS | METH_KEYWORDS',
+                       "Get a list of the gimple statements in this function's CFG, optionally\n"
+                       "filtered by statement kind and by callee name")
+    cu.add_defn(methods.c_defn())
+    pytype.tp_methods = methods.identifier
+
     cu.add_defn(pytype.c_defn())
     modinit_preinit += pytype.c_invoke_type_ready()
     modinit_postinit += pytype.c_invoke_add_to_module()
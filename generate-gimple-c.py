@@ -238,6 +238,11 @@ PyGccGimple_get_block(struct PyGccGimple *self, void *closure)
                        '(PyCFunction)PyGccGimple_walk_tree',
                        'METH_VARARGS | METH_KEYWORDS',
                        "Visit all gcc.Tree nodes associated with this statement")
+    methods.add_method('find_trees',
+                       '(PyCFunction)PyGccGimple_find_trees',
+                       'METH_VARARGS | METH_KEYWORDS',
+                       "Get a list of the gcc.Tree nodes associated with this statement that\n"
+                       "match the given classes")
     cu.add_defn(methods.c_defn())
     pytype.tp_methods = methods.identifier
 
@@ -449,15 +454,19 @@ def generate_gimple_code_map():
 
     cu.add_defn("""
 PyGccWrapperTypeObject*
-PyGcc_autogenerated_gimple_type_for_stmt(gcc_gimple stmt)
+PyGcc_autogenerated_gimple_type_for_code(int code)
 {
-    enum gimple_code code = gimple_code(stmt.inner);
-
     /* printf("code:%i\\n", code); */
     assert(code >= 0);
     assert(code < LAST_AND_UNUSED_GIMPLE_CODE);
     return pytype_for_gimple_code[code];
 }
+
+PyGccWrapperTypeObject*
+PyGcc_autogenerated_gimple_type_for_stmt(gcc_gimple stmt)
+{
+    return PyGcc_autogenerated_gimple_type_for_code(gimple_code(stmt.inner));
+}
 """)
 
 generate_gimple_code_map()
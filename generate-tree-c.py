@@ -98,6 +98,11 @@ PyGccTree_get_addr(struct PyGccTree *self, void *closure)
                        'PyGccTree_debug',
                        'METH_VARARGS',
                        "Dump the tree to stderr")
+    methods.add_method('find_trees',
+                       '(PyCFunction)PyGccTree_find_trees',
+                       'METH_VARARGS | METH_KEYWORDS',
+                       "Get a list of this node and its operands (recursively) that match the\n"
+                       "given classes")
     cu.add_defn("""
 PyObject*
 PyGccTree_debug(PyObject *self, PyObject *args)
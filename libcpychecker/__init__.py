@@ -16,14 +16,35 @@
 #   <http://www.gnu.org/licenses/>.
 
 import gcc
-from libcpychecker.formatstrings import check_pyargs
 from libcpychecker.utils import log
-from libcpychecker.refcounts import check_refcounts, get_traces
-from libcpychecker.attributes import register_our_attributes
-from libcpychecker.initializers import check_initializers
-from libcpychecker.types import get_PyObject
-if hasattr(gcc, 'PLUGIN_FINISH_DECL'):
-    from libcpychecker.compat import on_finish_decl
+
+# The submodules are only imported when a pass actually needs them: in
+# particular, the refcount checker (refcounts.py and absinterp.py) is large,
+# and isn't needed unless verify_refcounting is set.
+
+def check_pyargs(fun):
+    from libcpychecker.formatstrings import check_pyargs
+    return check_pyargs(fun)
+
+def check_refcounts(*args, **kwargs):
+    from libcpychecker.refcounts import check_refcounts
+    return check_refcounts(*args, **kwargs)
+
+def get_traces(fun):
+    from libcpychecker.refcounts import get_traces
+    return get_traces(fun)
+
+def check_initializers():
+    from libcpychecker.initializers import check_initializers
+    return check_initializers()
+
+def function_uses_python_api(fun):
+    from libcpychecker.prefilter import function_uses_python_api
+    return function_uses_python_api(fun)
+
+def get_PyObject():
+    from libcpychecker.types import get_PyObject
+    return get_PyObject()
 
 class CpyCheckerGimplePass(gcc.GimplePass):
     """
@@ -38,7 +59,15 @@ class CpyCheckerGimplePass(gcc.GimplePass):
                  show_possible_null_derefs=False,
                  only_on_python_code=True,
                  maxtrans=256,
-                 dump_json=False):
+                 dump_json=False,
+                 fuse_straight_line=False,
+                 slice_irrelevant_code=False,
+                 skip_non_python_functions=None,
+                 tu_budget=None,
+                 prioritize_coverage=False,
+                 max_witnesses=None,
+                 metrics_file=None,
+                 metrics_memory=False):
         gcc.GimplePass.__init__(self, 'cpychecker-gimple')
         self.dump_traces = dump_traces
         self.show_traces = show_traces
@@ -48,6 +77,32 @@ class CpyCheckerGimplePass(gcc.GimplePass):
         self.only_on_python_code = only_on_python_code
         self.maxtrans = maxtrans
         self.dump_json = dump_json
+        self.fuse_straight_line = fuse_straight_line
+        self.slice_irrelevant_code = slice_irrelevant_code
+        # Skip the refcount checker for functions that can't touch the Python
+        # C API, unless we're dumping the traces for a selftest of the
+        # interpreter itself:
+        if skip_non_python_functions is None:
+            skip_non_python_functions = not dump_traces
+        self.skip_non_python_functions = skip_non_python_functions
+        # If given, share a total of tu_budget transitions between the
+        # functions of the translation unit, with maxtrans being the minimum
+        # for each function:
+        self.budget = None
+        if tu_budget is not None:
+            from libcpychecker.absinterp import Budget
+            self.budget = Budget(tu_budget, minimum=maxtrans)
+        self.prioritize_coverage = prioritize_coverage
+        self.max_witnesses = max_witnesses
+        # If given, append a row of metrics about the cost of checking each
+        # function to this file:
+        self.metrics_writer = None
+        if metrics_file:
+            from libcpychecker.metrics import MetricsWriter
+            self.metrics_writer = MetricsWriter(metrics_file)
+        # Whether to include the peak memory used within the metrics (which
+        # slows down the analysis, and so isn't on by default):
+        self.metrics_memory = metrics_memory
 
     def execute(self, fun):
         if fun:
@@ -63,26 +118,50 @@ class CpyCheckerGimplePass(gcc.GimplePass):
 
             # The refcount code is too buggy for now to be on by default:
             if self.verify_refcounting:
-                if 0:
-                    # Profiled version:
-                    import cProfile
-                    prof_filename = '%s.%s.refcount-profile' % (gcc.get_dump_base_name(),
-                                                                fun.decl.name)
-                    cProfile.runctx('self._check_refcounts(fun)',
-                                    globals(), locals(),
-                                    filename=prof_filename)
-                    import pstats
-                    prof = pstats.Stats(prof_filename)
-                    prof.sort_stats('cumulative').print_stats(20)
-                else:
-                    # Normal mode (without profiler):
-                    self._check_refcounts(fun)
+                if self.skip_non_python_functions:
+                    # Skip functions that can't touch the Python C API
+                    # (e.g. helpers in plain C):
+                    if not function_uses_python_api(fun):
+                        gcc.add_plugin_stat('cpychecker.functions_skipped')
+                        return
+                gcc.add_plugin_stat('cpychecker.functions_checked')
+                if self.budget and self.budget.num_functions is None:
+                    self.budget.num_functions = self._count_functions()
+                # (use -fplugin-arg-python-profile to profile this)
+                self._check_refcounts(fun)
+
+    def _count_functions(self):
+        """
+        Count the functions within the translation unit that the refcount
+        checker will be run on (for the Budget)
+        """
+        count = 0
+        for node in gcc.get_callgraph_nodes():
+            fun = node.decl.function
+            if fun:
+                if (self.skip_non_python_functions
+                    and not function_uses_python_api(fun)):
+                    continue
+                count += 1
+        return count
 
     def _check_refcounts(self, fun):
+        metrics = None
+        if self.metrics_writer:
+            from libcpychecker.metrics import FunctionMetrics
+            metrics = FunctionMetrics(fun, trace_memory=self.metrics_memory)
         check_refcounts(fun, self.dump_traces, self.show_traces,
                         self.show_possible_null_derefs,
                         maxtrans=self.maxtrans,
-                        dump_json=self.dump_json)
+                        dump_json=self.dump_json,
+                        fuse_straight_line=self.fuse_straight_line,
+                        slice_irrelevant_code=self.slice_irrelevant_code,
+                        budget=self.budget,
+                        prioritize_coverage=self.prioritize_coverage,
+                        max_witnesses=self.max_witnesses,
+                        metrics=metrics)
+        if metrics:
+            self.metrics_writer.write(metrics)
 
 
 class CpyCheckerIpaPass(gcc.SimpleIpaPass):
@@ -97,12 +176,15 @@ class CpyCheckerIpaPass(gcc.SimpleIpaPass):
         check_initializers()
 
 def main(**kwargs):
+    from libcpychecker.attributes import register_our_attributes
+
     # Register our custom attributes:
     gcc.register_callback(gcc.PLUGIN_ATTRIBUTES,
                           register_our_attributes)
 
     # Hook for GCC 4.7 and later:
     if hasattr(gcc, 'PLUGIN_FINISH_DECL'):
+        from libcpychecker.compat import on_finish_decl
         gcc.register_callback(gcc.PLUGIN_FINISH_DECL,
                               on_finish_decl)
 
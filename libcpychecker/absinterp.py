@@ -235,9 +235,11 @@ class AbstractValue(object):
             # Assume that all such functions either:
             #   - return a new reference, or
             #   - return NULL and set an exception (e.g. MemoryError)
-            return state.cpython.make_transitions_for_new_ref_or_fail(stmt,
-                                                                      None,
-                                                                      'new ref from call through function pointer')
+            return state.call_facet('cpython',
+                                    'make_transitions_for_new_ref_or_fail',
+                                    stmt,
+                                    None,
+                                    'new ref from call through function pointer')
         return state.apply_fncall_side_effects(
             [state.mktrans_assignment(stmt.lhs,
                                       UnknownValue.make(returntype, stmt.loc),
@@ -1258,23 +1260,7 @@ class SplitValue(Exception):
                    '\n'.join([repr(alt) for alt in self.altvalues])))
 
     def split(self, state):
-        log('creating states for split of %s into %s', self.value, self.altvalues)
-        result = []
-        for altvalue, desc in zip(self.altvalues, self.descriptions):
-            log(' creating state for split where %s is %s', self.value, altvalue)
-            altvalue.fromsplit = True
-
-            newstate = state.copy()
-            newstate.fromsplit = True
-            for r in newstate.value_for_region:
-                # Replace instances of the value itself:
-                if newstate.value_for_region[r] is self.value:
-                    log('  replacing value for region %s with %s', r, altvalue)
-                    newstate.value_for_region[r] = altvalue
-            result.append(Transition(state,
-                                     newstate,
-                                     desc))
-        return result
+        return state.split_value(self.value, self.altvalues, self.descriptions)
 
 
 class Facet(object):
@@ -1284,21 +1270,50 @@ class Facet(object):
     Each facet knows which State instance it relates to, and knows how to
     copy itself to a new State.
 
+    Copying a State doesn't copy its facets: the new State shares them with
+    the old one, and they must no longer be modified.  Reading a facet's data
+    (as an attribute of any of the States sharing it) is free; a State gets
+    its own copy of a facet (using the facet's copy method) when it needs to
+    modify it, via State.writable_facet, which is the only way that a facet
+    should be obtained for modification.
+
+    The "state" attribute of a shared facet refers to the State that it was
+    created for, so methods that use it must be called on the other States
+    sharing the facet via State.call_facet.
+
     Potentially it can also supply "impl_" methods, which implement named
     functions within the API, describing all possible transitions from the
     current state to new states (e.g. success, failure, etc), creating
     appropriate new States with appropriate new Facet subclass instances.
     """
-    __slots__ = ('state', )
+    __slots__ = ('state', '_shared')
 
     def __init__(self, state):
         check_isinstance(state, State)
+        self._shared = False
         self.state = state
 
     def copy(self, newstate):
         # Concrete subclasses should implement this.
         raise NotImplementedError
 
+    def get_key(self):
+        """
+        Get a hashable summary of the data within this facet (see
+        State.get_key): by default, a tuple of its attributes.
+
+        Subclasses with attributes that aren't hashable should override this.
+        """
+        result = []
+        for cls in self.__class__.__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if name not in Facet.__slots__:
+                    result.append(getattr(self, name, None))
+        attrs = getattr(self, '__dict__', {})
+        for name in sorted(attrs):
+            result.append((name, attrs[name]))
+        return tuple(result)
+
 class State(object):
     """
     A Location with memory state, and zero or more additional "facets" of
@@ -1322,17 +1337,25 @@ class State(object):
 
     Hopefully this will allow checking of additional APIs to be slotted into
     the checker, whilst keeping each API's special-case rules isolated.
+
+    Facets are shared between copies of a State until they're modified: see
+    the Facet class.  Use writable_facet() to get a facet in order to modify
+    it, and call_facet() to call a method that uses the facet's State.
     """
 
     # We can't use the __slots__ optimization here, as we're adding additional
     # per-facet attributes
 
+    # The number of States created so far (see libcpychecker.metrics):
+    num_created = 0
+
     def __init__(self, stmtgraph, stmtnode, lastgccloc,
                  facets, region_for_var=None, value_for_region=None,
                  return_rvalue=None, has_returned=False, not_returning=False):
         check_isinstance(stmtgraph, StmtGraph)
         check_isinstance(stmtnode, StmtNode)
         check_isinstance(facets, dict)
+        State.num_created += 1
         self.stmtgraph = stmtgraph
         self.fun = stmtgraph.fun
         self.stmtnode = stmtnode
@@ -1357,6 +1380,77 @@ class State(object):
         self.has_returned = has_returned
         self.not_returning = not_returning
 
+        # The CompiledStmtGraph for the function, if any (see below):
+        self.compiled = None
+
+    def writable_facet(self, name):
+        """
+        Get the named Facet, for modifying it (or for calling methods that
+        modify it, or this State), copying it into this State first if it's
+        shared with other States
+        """
+        facet = getattr(self, name)
+        if facet._shared or facet.state is not self:
+            facet = facet.copy(self)
+            setattr(self, name, facet)
+        return facet
+
+    def call_facet(self, name, methname, *args):
+        """
+        Call the named method of the named Facet, as it applies to this
+        State, without copying the facet.  The method must not modify the
+        facet, or this State (it can make new States from it, though).
+
+        A facet shared with other States is lent to this State for the
+        duration of the call, so that the method sees this State as its
+        "state" attribute.
+        """
+        facet = getattr(self, name)
+        meth = getattr(facet, methname)
+        if facet.state is self:
+            return meth(*args)
+        owner = facet.state
+        facet.state = self
+        try:
+            return meth(*args)
+        finally:
+            facet.state = owner
+
+    def get_key(self):
+        """
+        Get a hashable summary of this State: two States with equal keys are
+        at the same StmtNode, with the same Region for each variable, and the
+        same AbstractValue instance for each Region, and so the traces
+        onwards from them are the same, other than where they are cut short
+        by loop detection (which depends on the path taken to reach each
+        State).
+
+        AbstractValue and Region instances compare by identity, so that
+        States in which different regions alias the same value (which
+        State.split_value relies on) don't get the same key as States where
+        they merely have equal-looking values.  The key holds references to
+        the values, so their ids can't be reused by other values.
+
+        Only valid once the State has been fully built, since the result is
+        cached.
+        """
+        key = self.__dict__.get('_key')
+        if key is None:
+            facets = []
+            for name in sorted(self.facets):
+                facet = getattr(self, name, None)
+                facets.append((name, facet.get_key() if facet else None))
+            key = (id(self.stmtnode),
+                   self.lastgccloc,
+                   tuple(self.region_for_var.items()),
+                   tuple(self.value_for_region.items()),
+                   self.return_rvalue,
+                   self.has_returned,
+                   self.not_returning,
+                   tuple(facets))
+            self._key = key
+        return key
+
     def __str__(self):
         return ('loc: %s region_for_var:%s value_for_region:%s'
                 % (self.stmtnode,
@@ -1418,12 +1512,15 @@ class State(object):
                       self.return_rvalue,
                       self.has_returned,
                       self.not_returning)
-        # Make a copy of each facet into the new state:
+        # Share the facets with the new state, rather than copying them;
+        # either state must now copy them before modifying them (see
+        # writable_facet):
         for key in self.facets:
-            facetcls = self.facets[key]
-            f_old = getattr(self, key)
-            f_new = f_old.copy(s_new)
-            setattr(s_new, key, f_new)
+            facet = getattr(self, key, None)
+            if facet is not None:
+                facet._shared = True
+                setattr(s_new, key, facet)
+        s_new.compiled = self.compiled
         return s_new
 
     def verify(self):
@@ -1607,14 +1704,14 @@ class State(object):
             index = index.value
         return self._array_region(parent, index)
 
-    def pointer_plus_region(self, stmt):
+    def pointer_plus_region(self, cstmt):
         # Cope with treating pointers as arrays.
         # The constant appears to be in bytes, rather than as units of the type
         log('pointer_add_region')
-        assert stmt.exprcode == gcc.PointerPlusExpr
-        rhs = stmt.rhs
-        a = self.eval_rvalue(rhs[0], stmt.loc)
-        b = self.eval_rvalue(rhs[1], stmt.loc)
+        assert cstmt.exprcode == gcc.PointerPlusExpr
+        rhs = cstmt.rhs
+        a = self.eval_rvalue(rhs[0], cstmt.loc)
+        b = self.eval_rvalue(rhs[1], cstmt.loc)
         log('a: %r', a)
         log('b: %r', b)
         if isinstance(a, PointerToRegion) and isinstance(b, ConcreteValue):
@@ -1637,7 +1734,7 @@ class State(object):
             return self._array_region(parent, index)
         else:
             raise NotImplementedError("Don't know how to cope with pointer addition of\n  %r\nand\n  %rat %s"
-                                      % (a, b, stmt.loc))
+                                      % (a, b, cstmt.loc))
 
     def _array_region(self, parent, index):
         # Used by element_region, and pointer_add_region
@@ -1927,11 +2024,30 @@ class State(object):
             new.assign(lhs, rhs, self.stmtnode.get_gcc_loc())
         return Transition(self, new, desc)
 
+    def mktrans_assignment_for(self, cstmt, value, desc):
+        """
+        Like mktrans_assignment, assigning an AbstractValue to the LHS of a
+        CompiledStmt, using the precomputed Region for the LHS if there is
+        one
+        """
+        check_isinstance(value, AbstractValue)
+        if cstmt.lhs_region is None:
+            return self.mktrans_assignment(cstmt.lhs, value, desc)
+        new = self.use_next_stmt_node()
+        new.value_for_region[cstmt.lhs_region] = value
+        return Transition(self, new, desc)
+
     def update_stmt_node(self, new_stmt_node):
         new = self.copy()
         new.stmtnode = new_stmt_node
-        if new.stmtnode.stmt and new.stmtnode.stmt.loc:
-            new.lastgccloc = new.stmtnode.stmt.loc
+        if self.compiled:
+            loc = self.compiled.get_compiled_stmt(new_stmt_node).loc
+        elif new_stmt_node.stmt:
+            loc = new_stmt_node.stmt.loc
+        else:
+            loc = None
+        if loc:
+            new.lastgccloc = loc
         else:
             new.lastgccloc = self.lastgccloc
         return new
@@ -1945,7 +2061,13 @@ class State(object):
             assert edge.srcnode == stmtnode
             assert edge.dstnode != stmtnode
             return edge.dstnode
-        new_stmt_node = next_stmt_node(self.stmtnode)
+        if self.compiled:
+            new_stmt_node = self.compiled.get_compiled_stmt(self.stmtnode).next_stmtnode
+            if new_stmt_node is None:
+                raise ValueError('len(stmtnode.succs) == %i at %s'
+                                 % (len(self.stmtnode.succs), self.stmtnode))
+        else:
+            new_stmt_node = next_stmt_node(self.stmtnode)
         return self.update_stmt_node(new_stmt_node)
 
     def get_gcc_loc_or_none(self):
@@ -2012,6 +2134,21 @@ class State(object):
         backtrack and split the current state into a version with an explicit
         NULL value and a version with a non-NULL value
 
+        Where the caller is able to return Transitions directly, split_pointer
+        does the same without the exception.
+        """
+        altvalues, descriptions = self.get_null_split(ptr_rvalue, loc)
+        raise SplitValue(ptr_rvalue, altvalues, descriptions)
+
+    def get_null_split(self, ptr_rvalue, loc=None, add_region=True):
+        """
+        Get the alternative values for splitting the given UnknownValue
+        pointer into a non-NULL pointer (to a new Region) and a NULL pointer,
+        as a pair of lists: the values and their descriptions
+
+        add_region: whether to add the new Region to this State's
+        region_for_var
+
         FIXME: we should split into multiple non-NULL values, covering the
         various aliasing possibilities
         """
@@ -2021,13 +2158,54 @@ class State(object):
         global region_id
         region = Region('heap-region-%i' % region_id, None)
         region_id += 1
-        self.region_for_var[region] = region
+        if add_region:
+            self.region_for_var[region] = region
         non_null_ptr = PointerToRegion(ptr_rvalue.gcctype, loc, region)
         null_ptr = ConcreteValue(ptr_rvalue.gcctype, loc, 0)
-        raise SplitValue(ptr_rvalue,
-                         [non_null_ptr, null_ptr],
-                         [("when treating %s as non-NULL" % ptr_rvalue),
-                          ("when treating %s as NULL" % ptr_rvalue)])
+        return ([non_null_ptr, null_ptr],
+                [("when treating %s as non-NULL" % ptr_rvalue),
+                 ("when treating %s as NULL" % ptr_rvalue)])
+
+    def split_pointer(self, ptr_rvalue, loc=None, add_region=True):
+        """
+        Get the list of Transitions splitting this State into a version in
+        which the given UnknownValue pointer is non-NULL and a version in
+        which it is NULL; each of them then interprets the current statement
+        again.
+
+        This is equivalent to raise_split_value, for use by the handler of a
+        statement that can tell that it needs to split before it has done
+        anything else, avoiding the cost of raising and catching a
+        SplitValue.  If the dereference would have happened within a copy of
+        this State, add_region should be False (see get_null_split).
+        """
+        altvalues, descriptions = self.get_null_split(ptr_rvalue, loc,
+                                                      add_region)
+        return self.split_value(ptr_rvalue, altvalues, descriptions)
+
+    def split_value(self, value, altvalues, descriptions):
+        """
+        Get a list of Transitions to copies of this State (at the same
+        statement), one for each of the alternative values of the given
+        AbstractValue, in which the value is replaced by the alternative
+        """
+        log('creating states for split of %s into %s', value, altvalues)
+        result = []
+        for altvalue, desc in zip(altvalues, descriptions):
+            log(' creating state for split where %s is %s', value, altvalue)
+            altvalue.fromsplit = True
+
+            newstate = self.copy()
+            newstate.fromsplit = True
+            for r in newstate.value_for_region:
+                # Replace instances of the value itself:
+                if newstate.value_for_region[r] is value:
+                    log('  replacing value for region %s with %s', r, altvalue)
+                    newstate.value_for_region[r] = altvalue
+            result.append(Transition(self,
+                                     newstate,
+                                     desc))
+        return result
 
     def deallocate_region(self, stmt, region):
         # Mark the region as deallocated
@@ -2044,43 +2222,66 @@ class State(object):
 
     def get_transitions(self):
         # Return a list of Transition instances, based on input State
-        stmt = self.stmtnode.get_stmt()
-        if stmt:
-            return self._get_transitions_for_stmt(stmt)
-        else:
-            result = []
-            for succedge in sorted(self.stmtnode.succs):
-                newstate = self.copy()
-                newstate.stmtnode = succedge.dstnode
-                result.append(Transition(self, newstate, ''))
-            log('result: %s', result)
-            return result
-
-    def _get_transitions_for_stmt(self, stmt):
-        log('_get_transitions_for_stmt: %r %s', stmt, stmt)
-        log('dir(stmt): %s', dir(stmt))
-        if stmt.loc:
-            gcc.set_location(stmt.loc)
-        if isinstance(stmt, gcc.GimpleCall):
-            return self._get_transitions_for_GimpleCall(stmt)
-        elif isinstance(stmt, (gcc.GimpleDebug, gcc.GimpleLabel,
-                               gcc.GimplePredict, gcc.GimpleNop)):
-            return [Transition(self,
-                               self.use_next_stmt_node(),
-                               None)]
-        elif isinstance(stmt, gcc.GimpleCond):
-            return self._get_transitions_for_GimpleCond(stmt)
-        elif isinstance(stmt, gcc.GimpleReturn):
-            return self._get_transitions_for_GimpleReturn(stmt)
-        elif isinstance(stmt, gcc.GimpleAssign):
-            return self._get_transitions_for_GimpleAssign(stmt)
-        elif isinstance(stmt, gcc.GimpleSwitch):
-            return self._get_transitions_for_GimpleSwitch(stmt)
-        elif isinstance(stmt, gcc.GimpleAsm):
-            return self._get_transitions_for_GimpleAsm(stmt)
+        if self.compiled:
+            cstmt = self.compiled.get_compiled_stmt(self.stmtnode)
         else:
-            raise NotImplementedError("Don't know how to cope with %r (%s) at %s"
-                                      % (stmt, stmt, stmt.loc))
+            cstmt = compile_stmt(self.stmtgraph, self.stmtnode, self.facets)
+        log('get_transitions: %s', cstmt.stmt)
+        if cstmt.loc:
+            gcc.set_location(cstmt.loc)
+        return cstmt.handler(self, cstmt)
+
+    def _get_transitions_for_empty_node(self, cstmt):
+        result = []
+        for dstnode in cstmt.dstnodes:
+            newstate = self.copy()
+            newstate.stmtnode = dstnode
+            result.append(Transition(self, newstate, ''))
+        log('result: %s', result)
+        return result
+
+    def _get_transitions_for_nop(self, cstmt):
+        return [Transition(self,
+                           self.use_next_stmt_node(),
+                           None)]
+
+    def _get_transitions_for_unknown_stmt(self, cstmt):
+        stmt = cstmt.stmt
+        raise NotImplementedError("Don't know how to cope with %r (%s) at %s"
+                                  % (stmt, stmt, stmt.loc))
+
+    def step_in_place(self, cstmt):
+        """
+        Run a straight-line statement (one for which cstmt.can_fuse is true)
+        on this State itself, rather than on a new State, moving this State
+        to the next statement.
+
+        This has the same effect on the State as the Transition that
+        get_transitions() would give, so it must only be used on a State that
+        isn't yet part of a Trace.
+        """
+        assert cstmt.can_fuse
+        if cstmt.loc:
+            gcc.set_location(cstmt.loc)
+        value = None
+        if isinstance(cstmt, CompiledGimpleAssign):
+            value = self.eval_rhs(cstmt)
+            check_isinstance(value, AbstractValue)
+            if isinstance(value, DeallocatedMemory):
+                raise ReadFromDeallocatedMemory(cstmt.stmt, value)
+
+        # Move to the next statement (as per use_next_stmt_node):
+        self.stmtnode = cstmt.next_stmtnode
+        loc = self.compiled.get_compiled_stmt(self.stmtnode).loc
+        if loc:
+            self.lastgccloc = loc
+
+        # Do the assignment (as per mktrans_assignment_for):
+        if value is not None:
+            if cstmt.lhs_region is None:
+                self.assign(cstmt.lhs, value, cstmt.loc)
+            else:
+                self.value_for_region[cstmt.lhs_region] = value
 
     def mkstate_nop(self, stmt):
         """
@@ -2173,46 +2374,43 @@ class State(object):
         return [self.eval_rvalue(arg, stmt.loc)
                 for arg in stmt.args]
 
-    def _get_transitions_for_GimpleCall(self, stmt):
-        log('stmt.lhs: %s %r', stmt.lhs, stmt.lhs)
-        log('stmt.fn: %s %r', stmt.fn, stmt.fn)
-        log('dir(stmt.fn): %s', dir(stmt.fn))
-        if hasattr(stmt.fn, 'operand'):
-            log('stmt.fn.operand: %s', stmt.fn.operand)
-        returntype = stmt.fn.type.dereference.type
-        log('returntype: %s', returntype)
+    def _get_transitions_for_GimpleCall(self, cstmt):
+        stmt = cstmt.stmt
+        log('stmt.lhs: %s %r', cstmt.lhs, cstmt.lhs)
+        log('stmt.fn: %s %r', cstmt.fn, cstmt.fn)
+        log('returntype: %s', cstmt.returntype)
 
-        if stmt.noreturn:
+        if cstmt.noreturn:
             # The function being called does not return e.g. "exit(0);"
             # Transition to a special noreturn state:
             return [self.mktrans_not_returning('not returning from %s'
-                                               % stmt.fn)]
+                                               % cstmt.fn)]
 
-        if isinstance(stmt.fn, (gcc.VarDecl, gcc.ParmDecl, gcc.SsaName)):
+        if cstmt.is_indirect:
             # Calling through a function pointer:
-            val = self.eval_rvalue(stmt.fn, stmt.loc)
+            val = self.eval_rvalue(cstmt.fn, cstmt.loc)
             log('val: %s',  val)
             check_isinstance(val, AbstractValue)
             return val.get_transitions_for_function_call(self, stmt)
 
         # Evaluate the arguments:
-        args = self.eval_stmt_args(stmt)
+        args = [self.eval_rvalue(arg, cstmt.loc)
+                for arg in cstmt.args]
 
         # Check for uninitialized and deallocated data:
         for i, arg in enumerate(args):
             if isinstance(arg, UninitializedData):
-                raise UsageOfUninitializedData(self, stmt.args[i],
+                raise UsageOfUninitializedData(self, cstmt.args[i],
                                                arg,
-                                               'passing uninitialized data (%s) as argument %i to function' % (stmt.args[i], i + 1))
+                                               'passing uninitialized data (%s) as argument %i to function' % (cstmt.args[i], i + 1))
             if isinstance(arg, PointerToRegion):
                 rvalue = self.value_for_region.get(arg.region, None)
                 if isinstance(rvalue, DeallocatedMemory):
                     raise PassingPointerToDeallocatedMemory(i, 'function', stmt, rvalue)
 
-        if isinstance(stmt.fn.operand, gcc.FunctionDecl):
-            log('dir(stmt.fn.operand): %s', dir(stmt.fn.operand))
-            log('stmt.fn.operand.name: %r', stmt.fn.operand.name)
-            fnname = stmt.fn.operand.name
+        if cstmt.fnname:
+            fnname = cstmt.fnname
+            log('fnname: %r', fnname)
 
             # Hand off to impl_* methods of facets, where these methods exist
             # In each case, the method should have the form:
@@ -2222,14 +2420,13 @@ class State(object):
             # for the evaluated arguments (which for some functions will
             # involve varargs, like above).
             # They should return a list of Transition instances.
-            methname = 'impl_%s' % fnname
-            for key in self.facets:
-                facet = getattr(self, key)
-                if hasattr(facet, methname):
-                    meth = getattr(facet, 'impl_%s' % fnname)
+            # (The facet that handles the function, if any, was looked up
+            # when the statement was compiled)
+            if cstmt.impl:
+                key, methname = cstmt.impl
 
-                    # Call the facet's method:
-                    return meth(stmt, *args)
+                # Call the facet's method:
+                return self.call_facet(key, methname, stmt, *args)
 
             #from libcpychecker.c_stdio import c_stdio_functions, handle_c_stdio_function
 
@@ -2244,8 +2441,7 @@ class State(object):
                     raise NotImplementedError('not yet implemented: %s' % fnname)
 
             # Unknown function returning (PyObject*):
-            from libcpychecker.refcounts import type_is_pyobjptr_subclass
-            if type_is_pyobjptr_subclass(stmt.fn.operand.type.type):
+            if cstmt.returns_pyobjptr:
                 log('Invocation of unknown function returning PyObject * (or subclass): %r' % fnname)
 
                 fnmeta = FnMeta(name=fnname)
@@ -2258,13 +2454,17 @@ class State(object):
                     # The function being called was marked as returning a
                     # borrowed ref, rather than a new ref:
                     return self.apply_fncall_side_effects(
-                        self.cpython.make_transitions_for_borrowed_ref_or_fail(stmt,
-                                                                               fnmeta),
+                        self.call_facet('cpython',
+                                        'make_transitions_for_borrowed_ref_or_fail',
+                                        stmt,
+                                        fnmeta),
                         stmt)
                 return self.apply_fncall_side_effects(
-                    self.cpython.make_transitions_for_new_ref_or_fail(stmt,
-                                                                      fnmeta,
-                                                                 'new ref from (unknown) %s' % fnname),
+                    self.call_facet('cpython',
+                                    'make_transitions_for_new_ref_or_fail',
+                                    stmt,
+                                    fnmeta,
+                                    'new ref from (unknown) %s' % fnname),
                     stmt)
 
             # GCC builtins:
@@ -2273,18 +2473,19 @@ class State(object):
                 # The return value of:
                 #    __builtin_expect(long exp, long c)
                 # is "exp" (the 0-th argument):
-                return [self.mktrans_assignment(stmt.lhs, stmt.args[0], None)]
+                return [self.mktrans_assignment_for(cstmt, args[0], None)]
 
             # Unknown function of other type:
             log('Invocation of unknown function: %r', fnname)
             return self.apply_fncall_side_effects(
-                [self.mktrans_assignment(stmt.lhs,
-                                         UnknownValue.make(returntype, stmt.loc),
-                                         None)],
+                [self.mktrans_assignment_for(cstmt,
+                                             UnknownValue.make(cstmt.returntype,
+                                                               cstmt.loc),
+                                             None)],
                 stmt)
 
-        log('stmt.args: %s %r', stmt.args, stmt.args)
-        for i, arg in enumerate(stmt.args):
+        log('stmt.args: %s %r', cstmt.args, cstmt.args)
+        for i, arg in enumerate(cstmt.args):
             log('args[%i]: %s %r', i, arg, arg)
 
     def get_function_name(self, stmt):
@@ -2331,7 +2532,8 @@ class State(object):
                 for argindex in stolen_refs_by_fnname[stmt.fn.operand.name]:
                     v_arg = args[argindex-1]
                     if isinstance(v_arg, PointerToRegion):
-                        t_iter.dest.cpython.steal_reference(v_arg, stmt.loc)
+                        t_iter.dest.writable_facet('cpython').steal_reference(v_arg,
+                                                                          stmt.loc)
 
         # cpython: handle functions that have been marked as setting the
         # exception state:
@@ -2340,8 +2542,8 @@ class State(object):
             for t_iter in transitions:
                 # Mark the global exception state (with an arbitrary
                 # error):
-                t_iter.dest.cpython.set_exception('PyExc_MemoryError',
-                                                  stmt.loc)
+                t_iter.dest.writable_facet('cpython').set_exception(
+                    'PyExc_MemoryError', stmt.loc)
 
         # cpython: handle functions that have been marked as setting the
         # exception state when they return a negative value:
@@ -2368,8 +2570,8 @@ class State(object):
                     if eqzero is True:
                         # Mark the global exception state (with an arbitrary
                         # error):
-                        t_iter.dest.cpython.set_exception('PyExc_MemoryError',
-                                                          stmt.loc)
+                        t_iter.dest.writable_facet('cpython').set_exception(
+                            'PyExc_MemoryError', stmt.loc)
 
             transitions = process_splittable_transitions(transitions,
                                                          handle_negative_return)
@@ -2382,11 +2584,9 @@ class State(object):
                     t_iter.dest.value_for_region[v_arg.region] = v_newval
         return transitions
 
-    def _get_transitions_for_GimpleCond(self, stmt):
-        def make_transition_for_true(stmt, has_siblings):
-            e = true_edge(self.stmtnode)
-            assert e
-            nextstate = self.update_stmt_node(e.dstnode)
+    def _get_transitions_for_GimpleCond(self, cstmt):
+        def make_transition_for_true(has_siblings):
+            nextstate = self.update_stmt_node(cstmt.true_stmtnode)
             nextstate.prior_bool = True
             if has_siblings:
                 desc = 'when taking True path'
@@ -2394,10 +2594,8 @@ class State(object):
                 desc = 'taking True path'
             return Transition(self, nextstate, desc)
 
-        def make_transition_for_false(stmt, has_siblings):
-            e = false_edge(self.stmtnode)
-            assert e
-            nextstate = self.update_stmt_node(e.dstnode)
+        def make_transition_for_false(has_siblings):
+            nextstate = self.update_stmt_node(cstmt.false_stmtnode)
             nextstate.prior_bool = False
             if has_siblings:
                 desc = 'when taking False path'
@@ -2405,36 +2603,47 @@ class State(object):
                 desc = 'taking False path'
             return Transition(self, nextstate, desc)
 
-        log('stmt.exprcode: %s', stmt.exprcode)
-        log('stmt.exprtype: %s', stmt.exprtype)
-        log('stmt.lhs: %r %s', stmt.lhs, stmt.lhs)
-        log('stmt.rhs: %r %s', stmt.rhs, stmt.rhs)
-        boolval = self.eval_condition(stmt, stmt.lhs, stmt.exprcode, stmt.rhs)
+        log('stmt.exprcode: %s', cstmt.exprcode)
+        log('stmt.lhs: %r %s', cstmt.lhs, cstmt.lhs)
+        log('stmt.rhs: %r %s', cstmt.rhs, cstmt.rhs)
+        splits = []
+        boolval = self.eval_condition(cstmt, cstmt.lhs, cstmt.exprcode,
+                                      cstmt.rhs, splits)
+        if splits:
+            # Split on the pointer directly, rather than via SplitValue:
+            return self.split_pointer(splits[0], cstmt.loc)
         if boolval is True:
             log('taking True edge')
-            nextstate = make_transition_for_true(stmt, False)
+            nextstate = make_transition_for_true(False)
             return [nextstate]
         elif boolval is False:
             log('taking False edge')
-            nextstate = make_transition_for_false(stmt, False)
+            nextstate = make_transition_for_false(False)
             return [nextstate]
         else:
             check_isinstance(boolval, UnknownValue)
             # We don't have enough information; both branches are possible:
-            return [make_transition_for_true(stmt, True),
-                    make_transition_for_false(stmt, True)]
+            return [make_transition_for_true(True),
+                    make_transition_for_false(True)]
 
-    def eval_condition(self, stmt, expr_lhs, exprcode, expr_rhs):
+    def eval_condition(self, cstmt, expr_lhs, exprcode, expr_rhs,
+                       splits=None):
         """
-        Evaluate a comparison, returning one of True, False, or None
+        Evaluate a comparison within the given CompiledStmt, returning one of
+        True, False, or None
+
+        If the comparison is of an unknown pointer against NULL, we need to
+        split the analysis into the NULL and non-NULL cases.  If "splits" is
+        a list, the pointer is appended to it (and None is returned), for the
+        caller to split on; otherwise a SplitValue is raised.
         """
         log('eval_condition: %s %s %s ', expr_lhs, exprcode, expr_rhs)
         check_isinstance(expr_lhs, gcc.Tree)
         check_isinstance(exprcode, type) # it's a type, rather than an instance
         check_isinstance(expr_rhs, gcc.Tree)
 
-        lhs = self.eval_rvalue(expr_lhs, stmt.loc)
-        rhs = self.eval_rvalue(expr_rhs, stmt.loc)
+        lhs = self.eval_rvalue(expr_lhs, cstmt.loc)
+        rhs = self.eval_rvalue(expr_rhs, cstmt.loc)
         check_isinstance(lhs, AbstractValue)
         check_isinstance(rhs, AbstractValue)
 
@@ -2479,26 +2688,29 @@ class State(object):
             # versions, so that we can evaluate the true and false branch with
             # explicitly data
             log('splitting %s into non-NULL/NULL pointers', expr_lhs)
-            self.raise_split_value(lhs, stmt.loc)
+            if splits is not None:
+                splits.append(lhs)
+                return None
+            self.raise_split_value(lhs, cstmt.loc)
 
         log('unable to compare %r with %r', lhs, rhs)
         #raise NotImplementedError("Don't know how to do %s comparison of %s with %s"
         #                          % (exprcode, lhs, rhs))
-        return UnknownValue(stmt.lhs.type, stmt.loc)
+        return UnknownValue(cstmt.lhs.type, cstmt.loc)
 
-    def eval_binop_args(self, stmt):
-        rhs = stmt.rhs
-        a = self.eval_rvalue(rhs[0], stmt.loc)
-        b = self.eval_rvalue(rhs[1], stmt.loc)
+    def eval_binop_args(self, cstmt):
+        rhs = cstmt.rhs
+        a = self.eval_rvalue(rhs[0], cstmt.loc)
+        b = self.eval_rvalue(rhs[1], cstmt.loc)
         log('a: %r', a)
         log('b: %r', b)
         return a, b
 
-    def eval_rhs(self, stmt):
-        log('eval_rhs(%s): %s', stmt, stmt.rhs)
-        rhs = stmt.rhs
+    def eval_rhs(self, cstmt):
+        log('eval_rhs(%s): %s', cstmt.stmt, cstmt.rhs)
+        rhs = cstmt.rhs
         # Handle arithmetic and boolean expressions:
-        if stmt.exprcode in (gcc.PlusExpr, gcc.MinusExpr,  gcc.MultExpr, gcc.TruncDivExpr,
+        if cstmt.exprcode in (gcc.PlusExpr, gcc.MinusExpr,  gcc.MultExpr, gcc.TruncDivExpr,
                              gcc.TruncModExpr,
                              gcc.RdivExpr, gcc.ExactDivExpr,
                              gcc.MaxExpr, gcc.MinExpr,
@@ -2507,147 +2719,135 @@ class State(object):
 
                              gcc.TruthAndExpr, gcc.TruthOrExpr
                              ):
-            a, b = self.eval_binop_args(stmt)
+            a, b = self.eval_binop_args(cstmt)
             if isinstance(a, UninitializedData):
-                raise UsageOfUninitializedData(self, stmt.rhs[0], a,
+                raise UsageOfUninitializedData(self, cstmt.rhs[0], a,
                                                'usage of uninitialized data (%s) on left-hand side of %s'
-                                               % (stmt.rhs[0], stmt.exprcode.get_symbol()))
+                                               % (cstmt.rhs[0], cstmt.exprcode.get_symbol()))
             if isinstance(b, UninitializedData):
-                raise UsageOfUninitializedData(self, stmt.rhs[1], b,
+                raise UsageOfUninitializedData(self, cstmt.rhs[1], b,
                                                'usage of uninitialized data (%s) on right-hand side of %s'
-                                               % (stmt.rhs[0], stmt.exprcode.get_symbol()))
+                                               % (cstmt.rhs[0], cstmt.exprcode.get_symbol()))
             try:
-                c = a.eval_binop(stmt.exprcode, b, rhs[1], stmt.lhs.type, stmt.loc)
+                c = a.eval_binop(cstmt.exprcode, b, rhs[1], cstmt.lhs_type, cstmt.loc)
                 check_isinstance(c, AbstractValue)
                 return c
             except NotImplementedError:
-                return UnknownValue.make(stmt.lhs.type, stmt.loc)
-        elif stmt.exprcode == gcc.ComponentRef:
-            return self.eval_rvalue(rhs[0], stmt.loc)
-        elif stmt.exprcode == gcc.VarDecl:
-            return self.eval_rvalue(rhs[0], stmt.loc)
-        elif stmt.exprcode == gcc.ParmDecl:
-            return self.eval_rvalue(rhs[0], stmt.loc)
-        elif stmt.exprcode == gcc.IntegerCst:
-            return self.eval_rvalue(rhs[0], stmt.loc)
-        elif stmt.exprcode == gcc.RealCst:
-            return self.eval_rvalue(rhs[0], stmt.loc)
-        elif stmt.exprcode == gcc.StringCst:
-            return self.eval_rvalue(rhs[0], stmt.loc)
-        elif stmt.exprcode == gcc.AddrExpr:
-            return self.eval_rvalue(rhs[0], stmt.loc)
-        elif stmt.exprcode == gcc.NopExpr:
-            return self.eval_rvalue(rhs[0], stmt.loc)
-        elif stmt.exprcode == gcc.ArrayRef:
-            return self.eval_rvalue(rhs[0], stmt.loc)
-        elif stmt.exprcode == gcc.MemRef:
-            return self.eval_rvalue(rhs[0], stmt.loc)
-        elif stmt.exprcode == gcc.PointerPlusExpr:
+                return UnknownValue.make(cstmt.lhs_type, cstmt.loc)
+        elif cstmt.exprcode == gcc.ComponentRef:
+            return self.eval_rvalue(rhs[0], cstmt.loc)
+        elif cstmt.exprcode == gcc.VarDecl:
+            return self.eval_rvalue(rhs[0], cstmt.loc)
+        elif cstmt.exprcode == gcc.ParmDecl:
+            return self.eval_rvalue(rhs[0], cstmt.loc)
+        elif cstmt.exprcode == gcc.IntegerCst:
+            return self.eval_rvalue(rhs[0], cstmt.loc)
+        elif cstmt.exprcode == gcc.RealCst:
+            return self.eval_rvalue(rhs[0], cstmt.loc)
+        elif cstmt.exprcode == gcc.StringCst:
+            return self.eval_rvalue(rhs[0], cstmt.loc)
+        elif cstmt.exprcode == gcc.AddrExpr:
+            return self.eval_rvalue(rhs[0], cstmt.loc)
+        elif cstmt.exprcode == gcc.NopExpr:
+            return self.eval_rvalue(rhs[0], cstmt.loc)
+        elif cstmt.exprcode == gcc.ArrayRef:
+            return self.eval_rvalue(rhs[0], cstmt.loc)
+        elif cstmt.exprcode == gcc.MemRef:
+            return self.eval_rvalue(rhs[0], cstmt.loc)
+        elif cstmt.exprcode == gcc.PointerPlusExpr:
             try:
-                region = self.pointer_plus_region(stmt)
-                return PointerToRegion(stmt.lhs.type, stmt.loc, region)
+                region = self.pointer_plus_region(cstmt)
+                return PointerToRegion(cstmt.lhs_type, cstmt.loc, region)
             except NotImplementedError:
-                return UnknownValue.make(stmt.lhs.type, stmt.loc)
-        elif stmt.exprcode in (gcc.EqExpr, gcc.NeExpr, gcc.LtExpr,
+                return UnknownValue.make(cstmt.lhs_type, cstmt.loc)
+        elif cstmt.exprcode in (gcc.EqExpr, gcc.NeExpr, gcc.LtExpr,
                                gcc.LeExpr, gcc.GeExpr, gcc.GtExpr):
             # Comparisons
-            result = self.eval_condition(stmt, rhs[0], stmt.exprcode, rhs[1])
+            result = self.eval_condition(cstmt, rhs[0], cstmt.exprcode, rhs[1])
             if result is not None:
-                return ConcreteValue(stmt.lhs.type, stmt.loc,
+                return ConcreteValue(cstmt.lhs_type, cstmt.loc,
                                      1 if result else 0)
             else:
-                return UnknownValue.make(stmt.lhs.type, stmt.loc)
+                return UnknownValue.make(cstmt.lhs_type, cstmt.loc)
         # Unary expressions:
-        elif stmt.exprcode in (gcc.AbsExpr, gcc.BitNotExpr, gcc.ConvertExpr,
+        elif cstmt.exprcode in (gcc.AbsExpr, gcc.BitNotExpr, gcc.ConvertExpr,
                                gcc.NegateExpr, gcc.FixTruncExpr, gcc.FloatExpr):
-            v_rhs = self.eval_rvalue(stmt.rhs[0], stmt.loc)
-            return v_rhs.eval_unary_op(stmt.exprcode, stmt.lhs.type, stmt.loc)
-        elif stmt.exprcode == gcc.BitFieldRef:
-            return self.eval_rvalue(rhs[0], stmt.loc)
-        elif stmt.exprcode == gcc.Constructor:
+            v_rhs = self.eval_rvalue(cstmt.rhs[0], cstmt.loc)
+            return v_rhs.eval_unary_op(cstmt.exprcode, cstmt.lhs_type, cstmt.loc)
+        elif cstmt.exprcode == gcc.BitFieldRef:
+            return self.eval_rvalue(rhs[0], cstmt.loc)
+        elif cstmt.exprcode == gcc.Constructor:
             # Default value for whole array becomes 0:
-            return ConcreteValue(stmt.lhs.type,
-                                 stmt.loc, 0)
+            return ConcreteValue(cstmt.lhs_type,
+                                 cstmt.loc, 0)
         else:
             raise NotImplementedError("Don't know how to cope with exprcode: %r (%s) at %s"
-                                      % (stmt.exprcode, stmt.exprcode, stmt.loc))
-
-    def _get_transitions_for_GimpleAssign(self, stmt):
-        log('stmt.lhs: %r %s', stmt.lhs, stmt.lhs)
-        log('stmt.rhs: %r %s', stmt.rhs, stmt.rhs)
-        log('stmt: %r %s', stmt, stmt)
-        log('stmt.exprcode: %r', stmt.exprcode)
-
-        value = self.eval_rhs(stmt)
+                                      % (cstmt.exprcode, cstmt.exprcode, cstmt.loc))
+
+    def _get_transitions_for_GimpleAssign(self, cstmt):
+        log('stmt.lhs: %r %s', cstmt.lhs, cstmt.lhs)
+        log('stmt.rhs: %r %s', cstmt.rhs, cstmt.rhs)
+        log('stmt.exprcode: %r', cstmt.exprcode)
+
+        # If the first thing that evaluating the RHS does is to dereference
+        # an unknown pointer, split on it now, rather than having the
+        # dereference raise a SplitValue:
+        if cstmt.rhs_deref is not None:
+            v_ptr = self.eval_rvalue(cstmt.rhs_deref, cstmt.loc)
+            if isinstance(v_ptr, UnknownValue):
+                return self.split_pointer(v_ptr)
+
+        value = self.eval_rhs(cstmt)
         log('value from eval_rhs: %r', value)
         check_isinstance(value, AbstractValue)
 
         if isinstance(value, DeallocatedMemory):
-            raise ReadFromDeallocatedMemory(stmt, value)
+            raise ReadFromDeallocatedMemory(cstmt.stmt, value)
+
+        # Similarly for a write through an unknown pointer (which
+        # mktrans_assignment would dereference within the new State):
+        if cstmt.lhs_deref is not None:
+            v_ptr = self.eval_rvalue(cstmt.lhs_deref,
+                                     self.stmtnode.get_gcc_loc())
+            if isinstance(v_ptr, UnknownValue):
+                return self.split_pointer(v_ptr, add_region=False)
 
-        nextstate = self.use_next_stmt_node()
-        return [self.mktrans_assignment(stmt.lhs,
-                                        value,
-                                        None)]
+        return [self.mktrans_assignment_for(cstmt, value, None)]
 
-    def _get_transitions_for_GimpleReturn(self, stmt):
-        #log('stmt.lhs: %r %s', stmt.lhs, stmt.lhs)
-        #log('stmt.rhs: %r %s', stmt.rhs, stmt.rhs)
-        log('stmt: %r %s', stmt, stmt)
-        log('stmt.retval: %r', stmt.retval)
+    def _get_transitions_for_GimpleReturn(self, cstmt):
+        log('stmt.retval: %r', cstmt.retval)
 
         nextstate = self.copy()
 
-        if stmt.retval:
-            rvalue = self.eval_rvalue(stmt.retval, stmt.loc)
+        if cstmt.retval:
+            rvalue = self.eval_rvalue(cstmt.retval, cstmt.loc)
             log('rvalue from eval_rvalue: %r', rvalue)
             nextstate.return_rvalue = rvalue
         nextstate.has_returned = True
         return [Transition(self, nextstate, 'returning')]
 
-    def _get_transitions_for_GimpleSwitch(self, stmt):
-        def get_labels_for_rvalue(self, stmt, rvalue):
-            # Gather all possible labels for the given rvalue
-            result = []
-            for label in stmt.labels:
-                # FIXME: for now, treat all labels as possible:
-                result.append(label)
-            return result
-        log('stmt.indexvar: %r', stmt.indexvar)
-        log('stmt.labels: %r', stmt.labels)
-        indexval = self.eval_rvalue(stmt.indexvar, stmt.loc)
+    def _get_transitions_for_GimpleSwitch(self, cstmt):
+        log('stmt.indexvar: %r', cstmt.indexvar)
+        indexval = self.eval_rvalue(cstmt.indexvar, cstmt.loc)
         log('indexval: %r', indexval)
-        labels = get_labels_for_rvalue(self, stmt, indexval)
-        log('labels: %r', labels)
         result = []
-        for label in labels:
+        # FIXME: for now, treat all labels as possible:
+        for dstnode, desc in cstmt.cases:
             newstate = self.copy()
-            bb = self.stmtgraph.fun.cfg.get_block_for_label(label.target)
-            newstate.stmtnode = self.stmtgraph.entry_of_bb[bb]
-            if label.low:
-                check_isinstance(label.low, gcc.IntegerCst)
-                if label.high:
-                    check_isinstance(label.high, gcc.IntegerCst)
-                    desc = 'when following cases %i...%i' % (label.low.constant, label.high.constant)
-                else:
-                    desc = 'when following case %i' % label.low.constant
-            else:
-                desc = 'when following default'
+            newstate.stmtnode = dstnode
             result.append(Transition(self,
                                      newstate,
                                      desc))
         return result
 
-    def _get_transitions_for_GimpleAsm(self, stmt):
-        log('stmt: %r %s', stmt, stmt)
-
-        if stmt.string == '':
+    def _get_transitions_for_GimpleAsm(self, cstmt):
+        if cstmt.string == '':
             # Empty fragment of inline assembler:
             s_next = self.use_next_stmt_node()
             return [Transition(self, s_next, None)]
 
         raise NotImplementedError('Unable to handle inline assembler: %s'
-                                  % stmt.string)
+                                  % cstmt.string)
 
     def get_persistent_refs_for_region(self, dst_region):
         # Locate all regions containing pointers that point at the given region
@@ -2673,6 +2873,291 @@ class State(object):
 
 region_id = 0
 
+############################################################################
+# "Compiling" statements
+#
+# Every State that reaches a statement needs the same information about it:
+# its operands, its successors, which handler to use, and so on.  Rather
+# than reading all of these through the gcc wrapper API again for each
+# State, we decode each StmtNode of the function once, up-front, into a
+# CompiledStmt, and the States execute those.
+############################################################################
+
+class CompiledStmt(object):
+    """
+    A StmtNode, decoded for execution by State.get_transitions()
+
+    handler: the State method implementing the statement, called with the
+    State and this CompiledStmt, returning a list of Transition instances
+
+    can_fuse: can the statement be run by State.step_in_place() (see
+    fuse_straight_line_code)?
+    """
+    __slots__ = ('stmtnode', 'stmt', 'loc', 'next_stmtnode', 'handler')
+
+    can_fuse = False
+
+    def __init__(self, stmtnode, handler):
+        self.stmtnode = stmtnode
+        self.stmt = stmtnode.get_stmt()
+        if self.stmt:
+            self.loc = self.stmt.loc
+        else:
+            self.loc = None
+        # The successor, for statements that don't branch:
+        if len(stmtnode.succs) == 1:
+            self.next_stmtnode = list(stmtnode.succs)[0].dstnode
+        else:
+            self.next_stmtnode = None
+        self.handler = handler
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.stmtnode)
+
+def get_region_for_lhs(region_for_var, lhs):
+    """
+    Get the Region that an assignment to "lhs" writes to, if it's a variable
+    within region_for_var (the regions of the initial State, and thus of
+    every State of the function), or None
+    """
+    if region_for_var is None:
+        return None
+    if isinstance(lhs, gcc.SsaName):
+        lhs = lhs.var
+    if isinstance(lhs, (gcc.VarDecl, gcc.ParmDecl, gcc.ResultDecl)):
+        return region_for_var.get(lhs, None)
+    return None
+
+def get_dereferenced_local(region_for_var, expr):
+    """
+    If evaluating "expr" (as either an lvalue or an rvalue) starts by
+    reading a local variable within region_for_var, and dereferencing it as
+    a pointer (e.g. "*p", "p->field", "p->field.subfield"), get that
+    variable (or SSA name), otherwise None
+    """
+    if region_for_var is None:
+        return None
+    while isinstance(expr, gcc.ComponentRef):
+        expr = expr.target
+    if not isinstance(expr, gcc.MemRef):
+        return None
+    ptr = expr.operand
+    var = ptr.var if isinstance(ptr, gcc.SsaName) else ptr
+    if isinstance(var, (gcc.VarDecl, gcc.ParmDecl)) and var in region_for_var:
+        return ptr
+    return None
+
+class CompiledEmptyNode(CompiledStmt):
+    # A StmtNode without a statement, e.g. the entry or exit of the function
+    __slots__ = ('dstnodes', )
+
+    def __init__(self, stmtnode):
+        CompiledStmt.__init__(self, stmtnode, State._get_transitions_for_empty_node)
+        self.dstnodes = [edge.dstnode for edge in sorted(stmtnode.succs)]
+
+class CompiledNop(CompiledStmt):
+    # A statement with no effect, e.g. a label
+    __slots__ = ()
+
+    can_fuse = True
+
+    def __init__(self, stmtnode):
+        CompiledStmt.__init__(self, stmtnode, State._get_transitions_for_nop)
+
+class CompiledSkip(CompiledNop):
+    # A statement that isn't relevant to the analysis (see
+    # libcpychecker.relevance), treated as a no-op that jumps to the given
+    # StmtNode
+    __slots__ = ()
+
+    def __init__(self, stmtnode, next_stmtnode):
+        CompiledNop.__init__(self, stmtnode)
+        self.next_stmtnode = next_stmtnode
+
+class CompiledGimpleCall(CompiledStmt):
+    __slots__ = ('lhs', 'lhs_region', 'fn', 'args', 'returntype', 'noreturn',
+                 'is_indirect', 'fnname', 'impl', 'returns_pyobjptr')
+
+    def __init__(self, stmtnode, facets, region_for_var):
+        CompiledStmt.__init__(self, stmtnode, State._get_transitions_for_GimpleCall)
+        stmt = self.stmt
+        self.lhs = stmt.lhs
+        self.lhs_region = get_region_for_lhs(region_for_var, self.lhs)
+        self.fn = stmt.fn
+        self.args = stmt.args
+        self.returntype = self.fn.type.dereference.type
+        self.noreturn = stmt.noreturn
+        self.is_indirect = isinstance(self.fn,
+                                      (gcc.VarDecl, gcc.ParmDecl, gcc.SsaName))
+
+        # For calls to a named function: its name, and the (facet name,
+        # method name) of any facet's impl_* method for it:
+        self.fnname = None
+        self.impl = None
+        self.returns_pyobjptr = False
+        if not self.is_indirect:
+            fndecl = getattr(self.fn, 'operand', None)
+            if isinstance(fndecl, gcc.FunctionDecl):
+                self.fnname = fndecl.name
+                methname = 'impl_%s' % self.fnname
+                for key in facets:
+                    if hasattr(facets[key], methname):
+                        self.impl = (key, methname)
+                        break
+                from libcpychecker.refcounts import type_is_pyobjptr_subclass
+                self.returns_pyobjptr = type_is_pyobjptr_subclass(fndecl.type.type)
+
+class CompiledGimpleAssign(CompiledStmt):
+    __slots__ = ('lhs', 'lhs_type', 'lhs_region', 'rhs', 'exprcode',
+                 'rhs_deref', 'lhs_deref')
+
+    can_fuse = True
+
+    def __init__(self, stmtnode, region_for_var):
+        CompiledStmt.__init__(self, stmtnode, State._get_transitions_for_GimpleAssign)
+        stmt = self.stmt
+        self.lhs = stmt.lhs
+        self.lhs_type = self.lhs.type
+        self.lhs_region = get_region_for_lhs(region_for_var, self.lhs)
+        self.rhs = stmt.rhs
+        self.exprcode = stmt.exprcode
+        # The local pointers (if any) that are dereferenced before anything
+        # else happens when evaluating the RHS, and when writing to the LHS:
+        self.rhs_deref = None
+        if self.exprcode in (gcc.MemRef, gcc.ComponentRef):
+            self.rhs_deref = get_dereferenced_local(region_for_var,
+                                                    self.rhs[0])
+        self.lhs_deref = None
+        if self.lhs_region is None:
+            self.lhs_deref = get_dereferenced_local(region_for_var, self.lhs)
+
+class CompiledGimpleCond(CompiledStmt):
+    __slots__ = ('lhs', 'rhs', 'exprcode', 'true_stmtnode', 'false_stmtnode')
+
+    def __init__(self, stmtnode):
+        CompiledStmt.__init__(self, stmtnode, State._get_transitions_for_GimpleCond)
+        stmt = self.stmt
+        self.lhs = stmt.lhs
+        self.rhs = stmt.rhs
+        self.exprcode = stmt.exprcode
+        e = true_edge(stmtnode)
+        assert e
+        self.true_stmtnode = e.dstnode
+        e = false_edge(stmtnode)
+        assert e
+        self.false_stmtnode = e.dstnode
+
+class CompiledGimpleReturn(CompiledStmt):
+    __slots__ = ('retval', )
+
+    def __init__(self, stmtnode):
+        CompiledStmt.__init__(self, stmtnode, State._get_transitions_for_GimpleReturn)
+        self.retval = self.stmt.retval
+
+class CompiledGimpleSwitch(CompiledStmt):
+    __slots__ = ('indexvar', 'cases')
+
+    def __init__(self, stmtnode, stmtgraph):
+        CompiledStmt.__init__(self, stmtnode, State._get_transitions_for_GimpleSwitch)
+        stmt = self.stmt
+        self.indexvar = stmt.indexvar
+
+        # A list of (StmtNode, description) pairs, one per label:
+        self.cases = []
+        for label in stmt.labels:
+            bb = stmtgraph.fun.cfg.get_block_for_label(label.target)
+            if label.low:
+                check_isinstance(label.low, gcc.IntegerCst)
+                if label.high:
+                    check_isinstance(label.high, gcc.IntegerCst)
+                    desc = 'when following cases %i...%i' % (label.low.constant, label.high.constant)
+                else:
+                    desc = 'when following case %i' % label.low.constant
+            else:
+                desc = 'when following default'
+            self.cases.append((stmtgraph.entry_of_bb[bb], desc))
+
+class CompiledGimpleAsm(CompiledStmt):
+    __slots__ = ('string', )
+
+    def __init__(self, stmtnode):
+        CompiledStmt.__init__(self, stmtnode, State._get_transitions_for_GimpleAsm)
+        self.string = self.stmt.string
+
+def compile_stmt(stmtgraph, stmtnode, facets, region_for_var=None):
+    """
+    Decode a StmtNode into a CompiledStmt.
+
+    If given, region_for_var is the mapping from variables to regions of the
+    initial State of the function, used to look up the regions for the
+    locals that are assigned to.
+    """
+    stmt = stmtnode.get_stmt()
+    if not stmt:
+        return CompiledEmptyNode(stmtnode)
+    if isinstance(stmt, gcc.GimpleCall):
+        return CompiledGimpleCall(stmtnode, facets, region_for_var)
+    elif isinstance(stmt, (gcc.GimpleDebug, gcc.GimpleLabel,
+                           gcc.GimplePredict, gcc.GimpleNop)):
+        return CompiledNop(stmtnode)
+    elif isinstance(stmt, gcc.GimpleCond):
+        return CompiledGimpleCond(stmtnode)
+    elif isinstance(stmt, gcc.GimpleReturn):
+        return CompiledGimpleReturn(stmtnode)
+    elif isinstance(stmt, gcc.GimpleAssign):
+        return CompiledGimpleAssign(stmtnode, region_for_var)
+    elif isinstance(stmt, gcc.GimpleSwitch):
+        return CompiledGimpleSwitch(stmtnode, stmtgraph)
+    elif isinstance(stmt, gcc.GimpleAsm):
+        return CompiledGimpleAsm(stmtnode)
+    else:
+        # Only complain if this statement is actually reached:
+        return CompiledStmt(stmtnode, State._get_transitions_for_unknown_stmt)
+
+class CompiledStmtGraph(object):
+    """
+    The CompiledStmt instances for the nodes of a StmtGraph, shared by all
+    of the States within the analysis of a function.
+
+    Each node is compiled the first time that a State reaches it.
+
+    fuse_straight_line: should iter_traces use fuse_straight_line_code?
+
+    relevance: if not None, a libcpychecker.relevance.RelevanceSlice; the
+    statements that it deems irrelevant are compiled to CompiledSkip
+    instances
+    """
+    def __init__(self, stmtgraph, facets, s_entry, fuse_straight_line=False,
+                 relevance=None):
+        check_isinstance(stmtgraph, StmtGraph)
+        check_isinstance(s_entry, State)
+        self.stmtgraph = stmtgraph
+        self.facets = facets
+        self.fuse_straight_line = fuse_straight_line
+        self.relevance = relevance
+        # The variables that have regions at the start of the function (a
+        # snapshot, since regions for globals are added to States as they
+        # are used, independently along each path):
+        self.region_for_var = s_entry.region_for_var.copy()
+        # Keyed by the id() of each StmtNode, since hashing and comparing
+        # StmtNode instances involves the underlying gcc.Gimple:
+        self._compiled = {}
+
+    def get_compiled_stmt(self, stmtnode):
+        try:
+            return self._compiled[id(stmtnode)]
+        except KeyError:
+            next_stmtnode = None
+            if self.relevance:
+                next_stmtnode = self.relevance.get_skip_target(stmtnode)
+            if next_stmtnode is not None:
+                cstmt = CompiledSkip(stmtnode, next_stmtnode)
+            else:
+                cstmt = compile_stmt(self.stmtgraph, stmtnode, self.facets,
+                                     self.region_for_var)
+            self._compiled[id(stmtnode)] = cstmt
+            return cstmt
+
 class Transition(object):
     __slots__ = ('src', # State
                  'dest', # State
@@ -2696,6 +3181,89 @@ class Transition(object):
         logger('dest:')
         self.dest.log(logger)
 
+class FusedTransition(Transition):
+    """
+    A Transition that covers a run of straight-line statements (see
+    fuse_straight_line_code)
+    """
+    __slots__ = ('stmtnodes', # list of StmtNode: the statements that were run
+                 )
+
+    def __init__(self, src, dest, desc, stmtnodes):
+        Transition.__init__(self, src, dest, desc)
+        self.stmtnodes = stmtnodes
+
+    def __repr__(self):
+        return ('FusedTransition(%r, %r, %i statements)'
+                % (self.dest, self.desc, len(self.stmtnodes)))
+
+    def expand(self):
+        """
+        Get the equivalent list of per-statement Transition instances, by
+        re-running the statements from the source State
+        """
+        transitions = run_straight_line_code(self.src, self.stmtnodes)
+        # Use our destination State for the final Transition, so that the
+        # result fits within the Trace:
+        transitions[-1].dest = self.dest
+        return transitions
+
+def run_straight_line_code(state, stmtnodes):
+    """
+    Run each of the given straight-line statements in turn, starting at the
+    given State, returning the list of Transition instances
+    """
+    result = []
+    for stmtnode in stmtnodes:
+        assert state.stmtnode is stmtnode
+        transitions = state.get_transitions()
+        assert len(transitions) == 1
+        result.append(transitions[0])
+        state = transitions[0].dest
+    return result
+
+def fuse_straight_line_code(transition):
+    """
+    Given the only Transition from a straight-line statement (an assignment
+    or a no-op), extend it to cover the following straight-line statements
+    within the same basic block, running them in place on its destination
+    State.  This saves creating a State, a Transition and a Trace for each
+    of those statements.
+
+    Returns either a FusedTransition or the original Transition.  The
+    per-statement Transitions can be recovered using Trace.expanded().
+    """
+    s_src = transition.src
+    s_dest = transition.dest
+    compiled = s_src.compiled
+    if not compiled.get_compiled_stmt(s_src.stmtnode).can_fuse:
+        return transition
+
+    bb = s_src.stmtnode.bb
+    stmtnodes = [s_src.stmtnode]
+    while True:
+        stmtnode = s_dest.stmtnode
+        # Stop at the end of the block, or at a join point:
+        if stmtnode.bb != bb or len(stmtnode.preds) != 1:
+            break
+        cstmt = compiled.get_compiled_stmt(stmtnode)
+        if not cstmt.can_fuse or cstmt.next_stmtnode is None:
+            break
+        try:
+            s_dest.step_in_place(cstmt)
+        except Exception:
+            # Leave this statement to be run normally, so that any error or
+            # split is handled in the usual way.  The statement might have
+            # partially modified s_dest, so run the statements so far again
+            # on a fresh State:
+            s_dest = run_straight_line_code(s_src, stmtnodes)[-1].dest
+            break
+        stmtnodes.append(stmtnode)
+
+    if len(stmtnodes) == 1:
+        return transition
+    return FusedTransition(s_src, s_dest, transition.desc, stmtnodes)
+
 class Trace(object):
     __slots__ = ('states', 'transitions', 'err', 'paths_taken')
 
@@ -2720,6 +3288,27 @@ class Trace(object):
     def add_error(self, err):
         self.err = err
 
+    def expanded(self):
+        """
+        Get the equivalent Trace with any FusedTransition instances replaced
+        by their per-statement Transitions (or this Trace if it has none),
+        for use when reporting on the Trace
+        """
+        if not any(isinstance(t, FusedTransition) for t in self.transitions):
+            return self
+        t = Trace()
+        t.err = self.err
+        t.paths_taken = self.paths_taken[:]
+        for transition in self.transitions:
+            if isinstance(transition, FusedTransition):
+                for t_iter in transition.expand():
+                    t.states.append(t_iter.dest)
+                    t.transitions.append(t_iter)
+            else:
+                t.states.append(transition.dest)
+                t.transitions.append(transition)
+        return t
+
     def copy(self):
         t = Trace()
         t.states = self.states[:]
@@ -2829,6 +3418,11 @@ class Trace(object):
         """
         check_isinstance(r_in, Region)
 
+        # (look at the intermediate states of any runs of straight-line code)
+        trace = self.expanded()
+        if trace is not self:
+            return trace.get_description_for_region(r_in)
+
         # If a local pointer variable has just the given region as a value (as
         # well as its initial "uninitialized" or NULL states), then that's a
         # good name for this region:
@@ -2922,80 +3516,318 @@ class Limits:
     def __init__(self, maxtrans):
         self.maxtrans = maxtrans
         self.trans_seen = 0
+        # Statistics about the traversal (see libcpychecker.metrics): the
+        # number of partial traces that were abandoned (due to loops, or
+        # being pruned), and the length of the longest trace seen:
+        self.traces_abandoned = 0
+        self.max_depth = 0
 
-    def on_transition(self, transition, result):
+    def on_transition(self, transition, result, depth=0):
         """
         result is a list of all *complete* traces so far
+
+        depth is the length of the trace that the transition extends
         """
         if 0:
             print('%s -> %s'
                   % (transition.src.stmtnode, transition.dest.stmtnode))
         self.trans_seen += 1
+        if depth >= self.max_depth:
+            self.max_depth = depth + 1
         if self.trans_seen > self.maxtrans:
             raise TooComplicated(result)
 
-def iter_traces(stmtgraph, facets, prefix=None, limits=None, depth=0):
+    def on_abandoned_trace(self):
+        self.traces_abandoned += 1
+
+class Complexity(object):
     """
-    Traverse the tree of traces of program state, returning a list
-    of Trace instances.
+    Up-front estimates of how hard a StmtGraph will be to analyze:
 
-    For now, don't include any traces that contain loops, as a primitive
-    way of ensuring termination of the analysis
+    num_stmts: the number of nodes
 
-    This is recursive, setting up a depth-first traversal of the state tree.
-    If it's interrupted by a TooComplicated exception, we should at least
-    capture an incomplete list of paths down to some of the bottoms of the
-    tree.
+    cyclomatic: the cyclomatic number (edges - nodes + 2), i.e. the number
+    of linearly independent paths
+
+    num_branches: the number of nodes with more than one successor
+
+    num_modelled_calls: the number of calls to functions that the facets
+    model, each of which typically leads to several outcomes (e.g. success
+    and failure)
+    """
+    def __init__(self, stmtgraph, facets):
+        self.num_stmts = 0
+        num_edges = 0
+        self.num_branches = 0
+        self.num_modelled_calls = 0
+        for node in stmtgraph.nodes:
+            self.num_stmts += 1
+            num_succs = len(node.succs)
+            num_edges += num_succs
+            if num_succs > 1:
+                self.num_branches += 1
+            stmt = node.stmt
+            if isinstance(stmt, gcc.GimpleCall):
+                fndecl = getattr(stmt.fn, 'operand', None)
+                if isinstance(fndecl, gcc.FunctionDecl):
+                    methname = 'impl_%s' % fndecl.name
+                    for key in facets:
+                        if hasattr(facets[key], methname):
+                            self.num_modelled_calls += 1
+                            break
+        self.cyclomatic = num_edges - self.num_stmts + 2
+
+    def __repr__(self):
+        return ('Complexity(num_stmts=%i, cyclomatic=%i, num_branches=%i,'
+                ' num_modelled_calls=%i)'
+                % (self.num_stmts, self.cyclomatic, self.num_branches,
+                   self.num_modelled_calls))
+
+    def estimate_paths(self, limit=2 ** 20):
+        """
+        Estimate how many paths through the function there are, assuming that
+        the branches and modelled calls are independent (capped at "limit")
+        """
+        splits = self.num_branches + self.num_modelled_calls
+        if splits >= 20:
+            return limit
+        return min(max(self.cyclomatic, 2 ** splits), limit)
+
+    def estimate_transitions(self):
+        """
+        Estimate how many transitions a full analysis will take
+        """
+        return self.num_stmts * self.estimate_paths()
+
+class Budget(object):
+    """
+    A total number of transitions to share between the analyses of all of the
+    functions within a translation unit, giving each one a Limits based on
+    its Complexity.
+
+    If num_functions is given (the number of functions that will be
+    analyzed), "minimum" transitions of the total are reserved for each of
+    the functions still to come, so that the functions analyzed first can't
+    use up the total and starve the rest.
+
+    Each function gets as many transitions as its Complexity suggests that it
+    needs, but at least "minimum", and at most half of what remains of the
+    total after those reservations (and "maximum", if given).  Functions are
+    only charged for the transitions that they actually use, so those that
+    need less than their allowance leave more for the rest.
+
+    Once the total is used up, each function just gets "minimum", so the
+    total number of transitions is bounded by:
+       total + minimum * (number of functions)
+    """
+    def __init__(self, total, minimum=256, maximum=None, num_functions=None):
+        self.total = total
+        self.minimum = minimum
+        self.maximum = maximum
+        self.num_functions = num_functions
+        self.used = 0
+        self.num_charged = 0
+
+    def get_remaining(self):
+        return max(self.total - self.used, 0)
+
+    def get_reserved(self):
+        """
+        Get the number of transitions reserved for the functions after the
+        one about to be analyzed
+        """
+        if self.num_functions is None:
+            return 0
+        return self.minimum * max(self.num_functions - self.num_charged - 1,
+                                  0)
+
+    def get_maxtrans(self, complexity):
+        maxtrans = max(complexity.estimate_transitions(),
+                       self.minimum)
+        available = max(self.get_remaining() - self.get_reserved(), 0)
+        maxtrans = min(maxtrans,
+                       max(available // 2, self.minimum))
+        if self.maximum is not None:
+            maxtrans = min(maxtrans, self.maximum)
+        return maxtrans
+
+    def make_limits(self, stmtgraph, facets):
+        complexity = Complexity(stmtgraph, facets)
+        limits = Limits(maxtrans=self.get_maxtrans(complexity))
+        log('%s: %r; maxtrans=%i of remaining %i',
+            stmtgraph.fun.decl.name, complexity, limits.maxtrans,
+            self.get_remaining())
+        return limits
+
+    def charge(self, limits):
+        """
+        Charge the transitions used by an analysis against the total
+        """
+        self.used += min(limits.trans_seen, limits.maxtrans)
+        self.num_charged += 1
+
+class Coverage(object):
+    """
+    Which parts of a StmtGraph have been reached by the transitions taken so
+    far within iter_traces:
+
+    the StmtNodes, and the basic blocks containing them (keyed by id() and
+    index respectively), and the "outcomes": pairs of (id of a StmtNode,
+    description of a Transition from it), so that the different outcomes of
+    a function call are covered separately
+
+    If relevance is given (the libcpychecker.relevance.RelevanceSlice that
+    the traversal is using), reaching a skipped StmtNode covers all of the
+    StmtNodes that are skipped over along with it.
+    """
+    def __init__(self, stmtgraph, relevance=None):
+        self.stmtgraph = stmtgraph
+        self.relevance = relevance
+        self.stmtnodes = set()
+        self.bbs = set()
+        self.outcomes = set()
+
+    def on_transition(self, transition):
+        if isinstance(transition, FusedTransition):
+            for stmtnode in transition.stmtnodes:
+                self._add_stmtnode(stmtnode)
+        else:
+            self._add_stmtnode(transition.src.stmtnode)
+        self._add_stmtnode(transition.dest.stmtnode)
+        self.outcomes.add((id(transition.src.stmtnode), transition.desc))
+
+    def _add_stmtnode(self, stmtnode):
+        if id(stmtnode) in self.stmtnodes:
+            return
+        if self.relevance and not self.relevance.is_relevant(stmtnode):
+            stmtnodes = self.relevance.get_skipped_nodes(stmtnode)
+        else:
+            stmtnodes = [stmtnode]
+        for stmtnode in stmtnodes:
+            self.stmtnodes.add(id(stmtnode))
+            if stmtnode.bb:
+                self.bbs.add(stmtnode.bb.index)
+
+    def covers_stmtnode(self, stmtnode):
+        return id(stmtnode) in self.stmtnodes
+
+    def covers_bb(self, bb):
+        return bb is None or bb.index in self.bbs
+
+    def covers_outcome(self, transition):
+        return (id(transition.src.stmtnode), transition.desc) in self.outcomes
+
+    def get_num_stmts_covered(self):
+        return len(self.stmtnodes)
+
+    def get_num_stmts(self):
+        return len(self.stmtgraph.nodes)
+
+    def __str__(self):
+        num_stmts = self.get_num_stmts()
+        num_covered = self.get_num_stmts_covered()
+        return ('%i of %i statements (%i%%)'
+                % (num_covered, num_stmts,
+                   (100 * num_covered // num_stmts) if num_stmts else 100))
+
+class TraceFilter(object):
+    """
+    Hooks by which the client of iter_traces can examine each complete Trace
+    as soon as it's found (rather than once the traversal is over), and can
+    stop the traversal from extending partial traces that it's no longer
+    interested in.
+
+    This implementation keeps everything; subclasses override the methods
+    """
+    def on_complete_trace(self, trace):
+        """
+        Called with each complete Trace as it's found.  Return False to
+        discard it, rather than including it in the result of iter_traces
+        """
+        return True
+
+    def should_prune(self, prefix):
+        """
+        Should the partial Trace be abandoned, rather than extended?
+        """
+        return False
+
+def filter_complete_traces(traces, tracefilter):
+    """
+    Pass a list of newly-completed traces to the TraceFilter (if any),
+    returning those that it wants to keep
+    """
+    if tracefilter is None:
+        return traces
+    return [trace for trace in traces
+            if tracefilter.on_complete_trace(trace)]
+
+def make_entry_state(stmtgraph, facets, fuse_straight_line=False,
+                     relevance=None):
+    """
+    Make the State at the entry to the function, for iter_traces
     """
     fun = stmtgraph.fun
-    log('iter_traces(%r, %r, %r)', fun, facets, prefix)
-    if prefix is None:
-        prefix = Trace()
-        curstate = State(stmtgraph,
-                         stmtgraph.get_entry_nodes()[0],
-                         None,
-                         facets,
-                         None, None, None)
-        #Resources())
-        curstate.init_for_function(fun)
-        for key in facets:
-            facet_cls = facets[key]
-            f_new = facet_cls(curstate, fun=fun)
-            setattr(curstate, key, f_new)
-            f_new.init_for_function(fun)
-    else:
-        check_isinstance(prefix, Trace)
-        curstate = prefix.states[-1]
+    curstate = State(stmtgraph,
+                     stmtgraph.get_entry_nodes()[0],
+                     None,
+                     facets,
+                     None, None, None)
+    #Resources())
+    curstate.init_for_function(fun)
+    for key in facets:
+        facet_cls = facets[key]
+        f_new = facet_cls(curstate, fun=fun)
+        setattr(curstate, key, f_new)
+        f_new.init_for_function(fun)
+    # Decode all of the statements of the function up-front:
+    curstate.compiled = CompiledStmtGraph(stmtgraph, facets, curstate,
+                                          fuse_straight_line,
+                                          relevance)
+    return curstate
+
+def get_end_of_trace(prefix):
+    """
+    If the Trace has finished, get the list of complete traces that it
+    gives: either [prefix], or [] if it has been abandoned due to a loop.
+    Otherwise, return None.
+    """
+    curstate = prefix.states[-1]
 
-        if curstate.has_returned:
-            # This state has returned a value (and hence terminated):
-            return [prefix]
+    if curstate.has_returned:
+        # This state has returned a value (and hence terminated):
+        return [prefix]
 
-        if curstate.not_returning:
-            # This state has called "exit" or similar, and thus this
-            # trace should terminate:
-            return [prefix]
+    if curstate.not_returning:
+        # This state has called "exit" or similar, and thus this
+        # trace should terminate:
+        return [prefix]
 
-        # Stop interpreting when you see a loop, to ensure termination:
-        if prefix.has_looped():
-            log('loop detected; stopping iteration')
-            if 0:
-                gcc.inform(curstate.get_gcc_loc(fun),
-                           'loop detected; stopping iteration')
-            # Don't return the prefix so far: it is not a complete trace
-            return []
-
-    # We need the prevstate in order to handle Phi nodes
-    if len(prefix.states) > 1:
-        prevstate = prefix.states[-2]
-    else:
-        prevstate = None
+    # Stop interpreting when you see a loop, to ensure termination:
+    if prefix.has_looped():
+        log('loop detected; stopping iteration')
+        if 0:
+            fun = curstate.stmtgraph.fun
+            gcc.inform(curstate.get_gcc_loc(fun),
+                       'loop detected; stopping iteration')
+        # Don't return the prefix so far: it is not a complete trace
+        return []
 
-    prefix.log(log, 'PREFIX')
-    log('  %s:%s', fun.decl.name, curstate.stmtnode)
+    return None
+
+def get_transitions_for_trace(prefix, curstate):
+    """
+    Get the list of Transition instances onwards from the final State of the
+    Trace (curstate), or, if the State is one that terminates with an
+    error, a Trace for that error
+    """
     try:
         transitions = curstate.get_transitions()
         check_isinstance(transitions, list)
+        if (len(transitions) == 1
+            and curstate.compiled
+            and curstate.compiled.fuse_straight_line):
+            transitions = [fuse_straight_line_code(transitions[0])]
     except PredictedError:
         # We're at a terminating state:
         err = sys.exc_info()[1]
@@ -3003,7 +3835,7 @@ def iter_traces(stmtgraph, facets, prefix=None, limits=None, depth=0):
         trace_with_err = prefix.copy()
         trace_with_err.add_error(err)
         trace_with_err.log(log, 'FINISHED TRACE WITH ERROR: %s' % err)
-        return [trace_with_err]
+        return trace_with_err
     except SplitValue:
         # Split the state up, splitting into parallel worlds with different
         # values for the given value
@@ -3013,6 +3845,66 @@ def iter_traces(stmtgraph, facets, prefix=None, limits=None, depth=0):
         check_isinstance(transitions, list)
 
     log('transitions: %s', transitions)
+    return transitions
+
+def iter_traces(stmtgraph, facets, prefix=None, limits=None, depth=0,
+                fuse_straight_line=False, relevance=None, coverage=None,
+                prioritize=False, tracefilter=None):
+    """
+    Traverse the tree of traces of program state, returning a list
+    of Trace instances.
+
+    If fuse_straight_line is true, runs of straight-line code within each
+    basic block are interpreted as a single FusedTransition (see
+    fuse_straight_line_code).
+
+    If relevance is given (a libcpychecker.relevance.RelevanceSlice of the
+    StmtGraph), only the statements that it deems relevant are interpreted,
+    with the others being skipped over.
+
+    If coverage is given (a Coverage for the StmtGraph), it is updated with
+    every transition taken.
+
+    If tracefilter is given (a TraceFilter), it sees each complete trace as
+    soon as it's found, deciding whether it's kept, and can prune partial
+    traces.
+
+    For now, don't include any traces that contain loops, as a primitive
+    way of ensuring termination of the analysis
+
+    This is recursive, setting up a depth-first traversal of the state tree.
+    If it's interrupted by a TooComplicated exception, we should at least
+    capture an incomplete list of paths down to some of the bottoms of the
+    tree.
+
+    If prioritize is true, the tree is instead traversed in order of which
+    transitions would cover the most new code (see iter_traces_prioritized),
+    so that if the traversal is interrupted, the traces found so far cover
+    as much of the function as possible.
+    """
+    fun = stmtgraph.fun
+    log('iter_traces(%r, %r, %r)', fun, facets, prefix)
+    if prefix is None:
+        prefix = Trace()
+        curstate = make_entry_state(stmtgraph, facets, fuse_straight_line,
+                                    relevance)
+        if prioritize:
+            return iter_traces_prioritized(prefix, curstate, limits,
+                                           coverage, tracefilter)
+    else:
+        check_isinstance(prefix, Trace)
+        curstate = prefix.states[-1]
+        result = get_end_of_trace(prefix)
+        if result is not None:
+            if not result and limits:
+                limits.on_abandoned_trace()
+            return filter_complete_traces(result, tracefilter)
+
+    prefix.log(log, 'PREFIX')
+    log('  %s:%s', fun.decl.name, curstate.stmtnode)
+    transitions = get_transitions_for_trace(prefix, curstate)
+    if isinstance(transitions, Trace):
+        return filter_complete_traces([transitions], tracefilter)
 
     if len(transitions) > 0:
         result = []
@@ -3022,15 +3914,23 @@ def iter_traces(stmtgraph, facets, prefix=None, limits=None, depth=0):
 
             # Potentially raise a TooComplicated exception:
             if limits:
-                limits.on_transition(transition, result)
+                limits.on_transition(transition, result, depth)
+
+            if coverage:
+                coverage.on_transition(transition)
 
             newprefix = prefix.copy().add(transition)
+            if tracefilter and tracefilter.should_prune(newprefix):
+                if limits:
+                    limits.on_abandoned_trace()
+                continue
 
             # Recurse
             # This gives us a depth-first traversal of the state tree
             try:
                 for trace in iter_traces(stmtgraph, facets, newprefix, limits,
-                                         depth + 1):
+                                         depth + 1, coverage=coverage,
+                                         tracefilter=tracefilter):
                     result.append(trace)
             except TooComplicated:
                 err = sys.exc_info()[1]
@@ -3041,7 +3941,108 @@ def iter_traces(stmtgraph, facets, prefix=None, limits=None, depth=0):
     else:
         # We're at a terminating state:
         prefix.log(log, 'FINISHED TRACE')
-        return [prefix]
+        return filter_complete_traces([prefix], tracefilter)
+
+def get_transition_priority(transition, transitions, coverage):
+    """
+    How much new code would taking the Transition (one of "transitions", the
+    possible transitions from a State) cover?  Higher is better.
+    """
+    score = 0
+    dest_stmtnode = transition.dest.stmtnode
+    if not coverage.covers_bb(dest_stmtnode.bb):
+        score += 2
+    if not coverage.covers_stmtnode(dest_stmtnode):
+        score += 1
+    # Prefer outcomes of function calls that we haven't seen yet (e.g. the
+    # failure paths of calls into the Python API, once the success paths
+    # have been seen):
+    if len(transitions) > 1 and not coverage.covers_outcome(transition):
+        compiled = transition.src.compiled
+        if compiled:
+            cstmt = compiled.get_compiled_stmt(transition.src.stmtnode)
+            if isinstance(cstmt, CompiledGimpleCall) and cstmt.impl:
+                score += 2
+    return score
+
+def iter_traces_prioritized(prefix, curstate, limits=None, coverage=None,
+                            tracefilter=None):
+    """
+    Like iter_traces, but rather than a depth-first traversal, keep a
+    frontier of partial traces, and extend whichever one would cover the most
+    code not yet covered by the transitions taken so far (preferring longer
+    traces amongst those that are equally good, so that traces get
+    completed).
+
+    The priorities within the frontier are recalculated as they are taken
+    from it, since the coverage changes as the traversal proceeds.
+    """
+    from heapq import heappush, heappop
+    if coverage is None:
+        coverage = Coverage(curstate.stmtgraph, curstate.compiled.relevance)
+
+    result = []
+    # A heap of (-priority, -depth, sequence number, prefix, transition,
+    # transitions), where "transition" is one of the possible "transitions"
+    # onwards from the final State of "prefix":
+    frontier = []
+    counter = [0]
+
+    def add_transitions(prefix, transitions):
+        for transition in transitions:
+            check_isinstance(transition, Transition)
+            transition.dest.verify()
+            priority = get_transition_priority(transition, transitions,
+                                               coverage)
+            counter[0] += 1
+            heappush(frontier, (-priority, -len(prefix.transitions),
+                                counter[0], prefix, transition, transitions))
+
+    def expand(prefix, curstate):
+        log('  %s:%s', curstate.stmtgraph.fun.decl.name, curstate.stmtnode)
+        transitions = get_transitions_for_trace(prefix, curstate)
+        if isinstance(transitions, Trace):
+            result.extend(filter_complete_traces([transitions], tracefilter))
+        elif transitions:
+            add_transitions(prefix, transitions)
+        else:
+            # We're at a terminating state:
+            prefix.log(log, 'FINISHED TRACE')
+            result.extend(filter_complete_traces([prefix], tracefilter))
+
+    expand(prefix, curstate)
+    while frontier:
+        item = heappop(frontier)
+        negpriority, negdepth, _, prefix, transition, transitions = item
+        # The coverage may have changed since this was added; if so, put it
+        # back with its new priority:
+        priority = get_transition_priority(transition, transitions, coverage)
+        if -priority > negpriority:
+            counter[0] += 1
+            heappush(frontier, (-priority, negdepth, counter[0],
+                                prefix, transition, transitions))
+            continue
+
+        # Potentially raise a TooComplicated exception:
+        if limits:
+            limits.on_transition(transition, result, -negdepth)
+
+        coverage.on_transition(transition)
+
+        newprefix = prefix.copy().add(transition)
+        if tracefilter and tracefilter.should_prune(newprefix):
+            if limits:
+                limits.on_abandoned_trace()
+            continue
+        newprefix.log(log, 'PREFIX')
+        ended = get_end_of_trace(newprefix)
+        if ended is not None:
+            if not ended and limits:
+                limits.on_abandoned_trace()
+            result += filter_complete_traces(ended, tracefilter)
+        else:
+            expand(newprefix, newprefix.states[-1])
+    return result
 
 class StateGraph:
     """
@@ -176,10 +176,18 @@ class Reporter:
 
         # Add a note to each report that survived about any duplicates:
         for report in self.reports:
-            if report.duplicates:
+            num_duplicates = (len(report.duplicates)
+                              + report.num_discarded_duplicates
+                              + report.num_pruned_duplicates)
+            if report.num_pruned_duplicates:
+                # Each pruned trace could have led to more than one:
+                report.add_note(report.loc,
+                                ('found at least %i similar trace(s) to this'
+                                 % num_duplicates))
+            elif num_duplicates:
                 report.add_note(report.loc,
                                 ('found %i similar trace(s) to this'
-                                 % len(report.duplicates)))
+                                 % num_duplicates))
 
     def flush(self):
         for r in self.reports:
@@ -220,6 +228,11 @@ class Report:
         # De-duplication handling:
         self.is_duplicate = False
         self.duplicates = [] # list of Report
+        # Duplicates that were found, but not kept, and traces that weren't
+        # explored since they could only have led to more duplicates (see
+        # refcounts.ReportSaturation):
+        self.num_discarded_duplicates = 0
+        self.num_pruned_duplicates = 0
 
     def add_warning(self, loc, msg):
         # Add a gcc.warning() to the buffer of GCC diagnostics
@@ -235,6 +248,9 @@ class Report:
             d.flush()
 
     def add_trace(self, trace, annotator=None):
+        # Describe every statement along the way, even those that were
+        # interpreted together as a single transition:
+        trace = trace.expanded()
         self.trace = trace
         self._annotators[trace] = annotator
         describe_trace(trace, self, annotator)
@@ -310,6 +310,37 @@ def compatible_type(exp_type, actual_type, actualarg=None):
 
     return False
 
+# The functions whose format strings check_pyargs verifies, as a dict from
+# the name of the function as seen by the compiler to a
+#   (name to report, index of format string arg, index of first vararg,
+#    with_size_t, index of keyword array arg or None)
+# tuple.
+#
+# If "PY_SSIZE_T_CLEAN" is defined before #include <Python.h>, then the
+# preprocessor is actually turning these into "_SizeT"-suffixed variants,
+# which handle some format codes differently
+#
+# FIXME: should we report the name as seen by the compiler?
+# It doesn't appear in the CPython API docs
+checked_callees = {
+    'PyArg_ParseTuple':
+        ('PyArg_ParseTuple', 1, 2, False, None),
+    '_PyArg_ParseTuple_SizeT':
+        ('PyArg_ParseTuple', 1, 2, True, None),
+    'PyArg_Parse':
+        ('PyArg_Parse', 1, 2, False, None),
+    '_PyArg_Parse_SizeT':
+        ('PyArg_Parse', 1, 2, True, None),
+    'PyArg_ParseTupleAndKeywords':
+        ('PyArg_ParseTupleAndKeywords', 2, 4, False, 3),
+    '_PyArg_ParseTupleAndKeywords_SizeT':
+        ('PyArg_ParseTupleAndKeywords', 2, 4, True, 3),
+    'Py_BuildValue':
+        ('Py_BuildValue', 0, 1, False, None),
+    '_Py_BuildValue_SizeT':
+        ('Py_BuildValue', 0, 1, True, None),
+}
+
 def check_pyargs(fun):
     from libcpychecker.PyArg_ParseTuple import PyArgParseFmt
     from libcpychecker.Py_BuildValue import PyBuildValueFmt
@@ -413,62 +444,20 @@ def check_pyargs(fun):
                         sys.stderr.write(err.extra_info())
 
     def maybe_check_callsite(stmt):
-        if stmt.fndecl:
-            # If "PY_SSIZE_T_CLEAN" is defined before #include <Python.h>, then
-            # the preprocessor is actually turning these into "_SizeT"-suffixed
-            # variants, which handle some format codes differently
-
-            # FIXME: should we report the name as seen by the compiler?
-            # It doesn't appear in the CPython API docs
-
-            if stmt.fndecl.name == 'PyArg_ParseTuple':
-                check_callsite(stmt,
-                               PyArgParseFmt,
-                               'PyArg_ParseTuple',
-                               1, 2, False)
-            elif stmt.fndecl.name == '_PyArg_ParseTuple_SizeT':
-                check_callsite(stmt,
-                               PyArgParseFmt,
-                               'PyArg_ParseTuple',
-                               1, 2, True)
-            elif stmt.fndecl.name == 'PyArg_Parse':
-                check_callsite(stmt,
-                               PyArgParseFmt,
-                               'PyArg_Parse',
-                               1, 2, False)
-            elif stmt.fndecl.name == '_PyArg_Parse_SizeT':
-                check_callsite(stmt,
-                               PyArgParseFmt,
-                               'PyArg_Parse',
-                               1, 2, True)
-            elif stmt.fndecl.name == 'PyArg_ParseTupleAndKeywords':
-                check_keyword_array(stmt, 3)
-                check_callsite(stmt,
-                               PyArgParseFmt,
-                               'PyArg_ParseTupleAndKeywords',
-                               2, 4, False)
-            elif stmt.fndecl.name == '_PyArg_ParseTupleAndKeywords_SizeT':
-                check_keyword_array(stmt, 3)
-                check_callsite(stmt,
-                               PyArgParseFmt,
-                               'PyArg_ParseTupleAndKeywords',
-                               2, 4, True)
-            elif stmt.fndecl.name == 'Py_BuildValue':
-                check_callsite(stmt,
-                               PyBuildValueFmt,
-                               'Py_BuildValue',
-                               0, 1, False)
-            elif stmt.fndecl.name == 'Py_BuildValue_SizeT':
-                check_callsite(stmt,
-                               PyBuildValueFmt,
-                               'Py_BuildValue',
-                               0, 1, True)
-
-    if fun.cfg:
-        for bb in fun.cfg.basic_blocks:
-            if isinstance(bb.gimple, list):
-                for stmt in bb.gimple:
-                    if stmt.loc:
-                        gcc.set_location(stmt.loc)
-                    if isinstance(stmt, gcc.GimpleCall):
-                        maybe_check_callsite(stmt)
+        if stmt.fndecl and stmt.fndecl.name in checked_callees:
+            (funcname, fmt_idx, varargs_idx,
+             with_size_t, keywords_idx) = checked_callees[stmt.fndecl.name]
+            if funcname == 'Py_BuildValue':
+                fmtclass = PyBuildValueFmt
+            else:
+                fmtclass = PyArgParseFmt
+            if keywords_idx is not None:
+                check_keyword_array(stmt, keywords_idx)
+            check_callsite(stmt, fmtclass, funcname,
+                           fmt_idx, varargs_idx, with_size_t)
+
+    # Only wrap the calls that we're interested in:
+    for stmt in fun.gimple_list(callees=tuple(checked_callees)):
+        if stmt.loc:
+            gcc.set_location(stmt.loc)
+        maybe_check_callsite(stmt)
@@ -0,0 +1,216 @@
+#   Copyright 2011, 2012 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2011, 2012 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Measuring how much work the refcount checker does for each function, so
+# that the most expensive functions can be found across a large build.
+#
+# Each FunctionMetrics is written out as one row of a file, which is
+# appended to, so that a single file can gather the rows for every function
+# of every source file in a build.  The format depends on the filename: CSV
+# if it ends in ".csv", otherwise JSON Lines (one JSON object per line).
+#
+# Since the compiler may be running in several processes at once (e.g. with
+# "make -j"), each row is written with a single write to a file opened for
+# appending, and a CSV file is created with its header already in place.
+
+import errno
+import os
+import sys
+import time
+
+import gcc
+
+from libcpychecker.absinterp import State
+
+try:
+    # Python 3.4 onwards:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+if hasattr(time, 'process_time'):
+    # Python 3.3 onwards:
+    get_cpu_time = time.process_time
+else:
+    get_cpu_time = time.clock
+
+class FunctionMetrics(object):
+    """
+    The cost of running the refcount checker on one function
+    """
+
+    # The names of the values recorded, in the order that they're written:
+    FIELDS = ('tu', 'file', 'function', 'line',
+              'transitions', 'states', 'complete_traces', 'abandoned_traces',
+              'max_depth', 'too_complicated',
+              'cpu_time', 'wall_time', 'peak_memory')
+
+    def __init__(self, fun, trace_memory=False):
+        self.tu = gcc.get_dump_base_name()
+        self.file = fun.start.file
+        self.function = fun.decl.name
+        self.line = fun.start.line
+
+        self.transitions = 0
+        self.states = 0
+        self.complete_traces = 0
+        self.abandoned_traces = 0
+        self.max_depth = 0
+        self.too_complicated = False
+
+        self.cpu_time = None
+        self.wall_time = None
+        # Peak memory allocated by Python during the analysis, in bytes (or
+        # None if tracemalloc isn't available, or trace_memory is false, since
+        # tracing memory allocations slows everything down, and so inflates
+        # the times):
+        self.trace_memory = trace_memory and tracemalloc is not None
+        self.peak_memory = None
+
+    def start(self):
+        """
+        Start measuring the time and memory used
+        """
+        self._start_states = State.num_created
+        self._start_cpu_time = get_cpu_time()
+        self._start_wall_time = time.time()
+        self._stop_tracemalloc = False
+        self._measure_peak = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._stop_tracemalloc = True
+                self._measure_peak = True
+            elif hasattr(tracemalloc, 'reset_peak'):
+                # Python 3.9 onwards:
+                tracemalloc.reset_peak()
+                self._measure_peak = True
+            # (otherwise someone else is tracing, and the peak could only be
+            # reset by clearing their traces, so it isn't measured)
+            self._start_memory = tracemalloc.get_traced_memory()[0]
+
+    def on_traversal(self, limits, traces, too_complicated):
+        """
+        Record the results of iter_traces: the absinterp.Limits that it was
+        given, the list of complete traces, and whether it raised
+        TooComplicated
+        """
+        self.transitions = limits.trans_seen
+        self.complete_traces = len(traces)
+        self.abandoned_traces = limits.traces_abandoned
+        self.max_depth = limits.max_depth
+        self.too_complicated = too_complicated
+
+    def stop(self):
+        """
+        Stop measuring the time and memory used
+        """
+        self.cpu_time = get_cpu_time() - self._start_cpu_time
+        self.wall_time = time.time() - self._start_wall_time
+        self.states = State.num_created - self._start_states
+        if self.trace_memory and tracemalloc.is_tracing():
+            if self._measure_peak:
+                peak = tracemalloc.get_traced_memory()[1]
+                self.peak_memory = max(peak - self._start_memory, 0)
+            if self._stop_tracemalloc:
+                tracemalloc.stop()
+
+    def as_dict(self):
+        return dict((field, getattr(self, field)) for field in self.FIELDS)
+
+    def __str__(self):
+        return ('%i transitions, %i states, %i complete traces,'
+                ' %i abandoned traces, %fs CPU'
+                % (self.transitions, self.states, self.complete_traces,
+                   self.abandoned_traces, self.cpu_time))
+
+class MetricsWriter(object):
+    """
+    Appends rows of FunctionMetrics to a file, as CSV if the filename ends
+    in ".csv", or as JSON Lines otherwise
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.as_csv = filename.endswith('.csv')
+
+    def write(self, metrics):
+        if self.as_csv:
+            if not os.path.exists(self.filename):
+                self._create(format_csv_row(metrics.FIELDS))
+            d = metrics.as_dict()
+            line = format_csv_row([d[field] for field in metrics.FIELDS])
+        else:
+            from json import dumps
+            line = dumps(metrics.as_dict(), sort_keys=True) + '\n'
+        self._append(line)
+
+    def _create(self, header):
+        """
+        Create the file, containing just the header, unless another process
+        gets there first
+        """
+        # Write the header to a temporary file, and then link it into place,
+        # so that the file never exists without it:
+        tmpname = '%s.%i.tmp' % (self.filename, os.getpid())
+        with open(tmpname, 'w') as f:
+            f.write(header)
+        try:
+            try:
+                os.link(tmpname, self.filename)
+            except OSError:
+                e = sys.exc_info()[1]
+                if e.errno == errno.EEXIST:
+                    return
+                # No hard links here; create the file exclusively instead
+                # (leaving a brief window in which it has no header):
+                try:
+                    fd = os.open(self.filename,
+                                 os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+                except OSError:
+                    e = sys.exc_info()[1]
+                    if e.errno == errno.EEXIST:
+                        return
+                    raise
+                try:
+                    os.write(fd, header.encode('utf-8'))
+                finally:
+                    os.close(fd)
+        finally:
+            os.unlink(tmpname)
+
+    def _append(self, line):
+        fd = os.open(self.filename,
+                     os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+        try:
+            os.write(fd, line.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+def format_csv_row(values):
+    """
+    Get a row of CSV, as a str
+    """
+    import csv
+    try:
+        # Python 2:
+        from cStringIO import StringIO
+    except ImportError:
+        from io import StringIO
+    f = StringIO()
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(values)
+    return f.getvalue()
@@ -0,0 +1,108 @@
+#   Copyright 2011, 2012 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2011, 2012 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# A quick test of whether a function could interact with the Python C API at
+# all, so that the refcount checker can skip those that can't (e.g. helper
+# functions written in plain C, within a file that includes <Python.h>)
+# without building a StmtGraph for them, or importing the checker itself.
+#
+# This only looks at the types of the function's declarations, and at the
+# declarations referenced by its statements (found using find_trees(), so
+# that the walk over each statement's operands happens within GCC).
+
+import gcc
+
+from libcpychecker.attributes import fnnames_returning_borrowed_refs, \
+    fnnames_setting_exception, fnnames_setting_exception_on_negative_result, \
+    stolen_refs_by_fnname
+from libcpychecker.types import type_is_pyobjptr_subclass
+
+# Cache of the results of type_involves_pyobject, keyed by gcc.Type:
+_type_cache = {}
+
+def type_involves_pyobject(t):
+    """
+    Is the gcc.Type a PyObject (or subclass), or a pointer to one, or an
+    array of them, or a pointer to a pointer to one, and so on?  Also true
+    for functions whose return type or argument types are.
+    """
+    if t is None:
+        return False
+    try:
+        return _type_cache[t]
+    except KeyError:
+        pass
+    result = False
+    if isinstance(t, (gcc.FunctionType, gcc.MethodType)):
+        if type_involves_pyobject(t.type):
+            result = True
+        else:
+            for argtype in (t.argument_types or []):
+                if type_involves_pyobject(argtype):
+                    result = True
+                    break
+    else:
+        basetype = t
+        while isinstance(basetype, (gcc.PointerType, gcc.ArrayType)):
+            basetype = basetype.dereference
+        if isinstance(basetype, gcc.RecordType):
+            result = bool(type_is_pyobjptr_subclass(basetype.pointer))
+    _type_cache[t] = result
+    return result
+
+def is_python_api_function(fndecl):
+    """
+    Is the gcc.FunctionDecl part of the Python C API, or a function taking or
+    returning objects, or one that we've been told about via our attributes?
+    """
+    name = fndecl.name
+    if name.startswith('Py') or name.startswith('_Py'):
+        return True
+    if (name in fnnames_returning_borrowed_refs
+        or name in fnnames_setting_exception
+        or name in fnnames_setting_exception_on_negative_result
+        or name in stolen_refs_by_fnname):
+        return True
+    return type_involves_pyobject(fndecl.type)
+
+# The kinds of tree within a statement that could involve the Python C API:
+_INTERESTING_TREES = (gcc.FunctionDecl, gcc.VarDecl, gcc.ComponentRef)
+
+def function_uses_python_api(fun):
+    """
+    Could the gcc.Function interact with the Python C API?
+
+    This is conservative: it's true if the function's own type, or that of
+    any of its locals, involves PyObject (see type_involves_pyobject), or if
+    any of its statements calls (or takes the address of) such a function or
+    a function within the API, or accesses a global or a field of such a
+    type.
+    """
+    if type_involves_pyobject(fun.decl.type):
+        return True
+    for var in (fun.local_decls or []):
+        if type_involves_pyobject(var.type):
+            return True
+    for bb in fun.cfg.basic_blocks:
+        for stmt in (bb.gimple or []):
+            for t in stmt.find_trees(_INTERESTING_TREES):
+                if isinstance(t, gcc.FunctionDecl):
+                    if is_python_api_function(t):
+                        return True
+                elif type_involves_pyobject(t.type):
+                    return True
+    return False
@@ -35,8 +35,8 @@ from libcpychecker.PyArg_ParseTuple import PyArgParseFmt, FormatStringWarning,\
     ConverterCallbackType, ConverterResultType
 from libcpychecker.Py_BuildValue import PyBuildValueFmt, ObjectFormatUnit, \
     CodeSO, CodeN
-from libcpychecker.types import is_py3k, is_debug_build, get_PyObjectPtr, \
-    get_Py_ssize_t
+from libcpychecker.types import is_py3k, get_PyObjectPtr, get_Py_ssize_t, \
+    type_is_pyobjptr, type_is_pyobjptr_subclass
 from libcpychecker.utils import log
 from libcpychecker import compat
 
@@ -51,62 +51,6 @@ def stmt_is_assignment_to_count(stmt):
                 if stmt.lhs.field.name == 'ob_refcnt':
                     return True
 
-def type_is_pyobjptr(t):
-    assert t is None or isinstance(t, gcc.Type)
-    if str(t) == 'struct PyObject *':
-        return True
-
-def type_is_pyobjptr_subclass(t):
-    assert t is None or isinstance(t, gcc.Type)
-    # It must be a pointer:
-    if not isinstance(t, gcc.PointerType):
-        return False
-
-    # ...to a struct:
-    if not isinstance(t.dereference, gcc.RecordType):
-        return False
-
-    # Obtain the fields of the struct/class
-    # For C++ "fields" will also contain a gcc.TypeDecl for the
-    # type itself, and for any nested types (e.g. typedefs), so filter them
-    # out.  This avoids an infinite recursion for classes with no data, where
-    # the initial decl of the type otherwise would make it appear that there's
-    # a nested copy of the struct inside itself.
-    fields = [field for field in t.dereference.fields
-              if isinstance(field, gcc.FieldDecl)]
-
-    if len(fields) == 0:
-        # Opaque struct: there's nothing we can do.
-        # Assume it's *not* a PyObject subclass:
-        return False
-
-    # if first field is a PyObject subclass, then we're good:
-    if type_is_pyobjptr_subclass(fields[0].type.pointer):
-        return True
-
-    fieldnames = [f.name for f in fields]
-
-    if is_py3k():
-        # For Python 3, the first field must be "ob_base", or it must be "PyObject":
-        if str(t) == 'struct PyObject *':
-            return True
-        if fieldnames[0] != 'ob_base':
-            return False
-    else:
-        # For Python 2, the first two fields must be "ob_refcnt" and "ob_type".
-        # (In a debug build, these are preceded by _ob_next and _ob_prev)
-        # FIXME: debug builds!
-        if is_debug_build():
-            if fieldnames[:4] != ['_ob_next', '_ob_prev',
-                                  'ob_refcnt', 'ob_type']:
-                return False
-        else:
-            if fieldnames[:2] != ['ob_refcnt', 'ob_type']:
-                return False
-
-    # Passed all tests:
-    return True
-
 def stmt_is_assignment_to_objptr(stmt):
     if hasattr(stmt, 'lhs'):
         if stmt.lhs:
@@ -168,7 +112,8 @@ class FunctionCall:
         if name is None:
             name = 'new ref from %s()' % self.fnmeta.name
         oc = self.add_outcome(self.fnmeta.desc_when_call_succeeds())
-        s_new, r_nonnull = self.s_src.cpython.mkstate_new_ref(self.stmt, name, typeobjregion)
+        s_new, r_nonnull = self.s_src.call_facet('cpython', 'mkstate_new_ref',
+                                                 self.stmt, name, typeobjregion)
         oc.state = s_new
         oc.returns_ptr(r_nonnull)
         return oc
@@ -257,14 +202,14 @@ class Outcome:
                               self.get_stmt().loc)
 
     def sets_exception(self, exc_name):
-        self.state.cpython.set_exception(exc_name, self.get_stmt().loc)
+        self.state.writable_facet('cpython').set_exception(exc_name, self.get_stmt().loc)
 
     def sets_exception_ptr(self, v_ptr):
-        self.state.cpython.exception_rvalue = v_ptr
+        self.state.writable_facet('cpython').exception_rvalue = v_ptr
 
     def adds_external_ref(self, v_ptr):
         if isinstance(v_ptr, PointerToRegion):
-            self.state.cpython.add_external_ref(v_ptr, self.get_stmt().loc)
+            self.state.writable_facet('cpython').add_external_ref(v_ptr, self.get_stmt().loc)
 
 
 ############################################################################
@@ -634,8 +579,8 @@ class CPython(Facet):
         check_isinstance(v_pyobjectptr, PointerToRegion)
         check_isinstance(stmt, gcc.Gimple)
         s_new = self.state.copy()
-        s_new.cpython.dec_ref(v_pyobjectptr, stmt.loc)
-        v_ob_refcnt = s_new.cpython.get_refcount(v_pyobjectptr, stmt)
+        s_new.writable_facet('cpython').dec_ref(v_pyobjectptr, stmt.loc)
+        v_ob_refcnt = s_new.writable_facet('cpython').get_refcount(v_pyobjectptr, stmt)
         # print('ob_refcnt: %r' % v_ob_refcnt)
         eq_zero = v_ob_refcnt.eval_comparison('eq', ConcreteValue.from_int(1), None)
         # print('eq_zero: %r' % eq_zero)
@@ -731,7 +676,7 @@ class CPython(Facet):
         t_failure = self.state.mktrans_assignment(stmt.lhs,
                                        ConcreteValue(returntype, stmt.loc, 0),
                                        'when %s() fails' % fnname)
-        t_failure.dest.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        t_failure.dest.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
         return (nonnull, t_success, t_failure)
 
     def object_ctor_bytes(self, stmt):
@@ -824,9 +769,10 @@ class CPython(Facet):
         """
         newstate = self.state.use_next_stmt_node()
 
-        r_nonnull = newstate.cpython.make_sane_object(stmt, name,
-                                              RefcountValue.new_ref(stmt.loc, None),
-                                              typeobjregion)
+        f_cpython = newstate.writable_facet('cpython')
+        r_nonnull = f_cpython.make_sane_object(stmt, name,
+                                               RefcountValue.new_ref(stmt.loc, None),
+                                               typeobjregion)
         if stmt.lhs:
             newstate.assign(stmt.lhs,
                             PointerToRegion(stmt.lhs.type,
@@ -841,10 +787,11 @@ class CPython(Facet):
         check_isinstance(fnmeta, FnMeta)
         newstate = self.state.use_next_stmt_node()
 
-        r_nonnull = newstate.cpython.make_sane_object(stmt,
-                                              'borrowed reference returned by %s()' % fnmeta.name,
-                                              RefcountValue.borrowed_ref(stmt.loc, None),
-                                              r_typeobj)
+        f_cpython = newstate.writable_facet('cpython')
+        r_nonnull = f_cpython.make_sane_object(stmt,
+                                               'borrowed reference returned by %s()' % fnmeta.name,
+                                               RefcountValue.borrowed_ref(stmt.loc, None),
+                                               r_typeobj)
         if stmt.lhs:
             newstate.assign(stmt.lhs,
                             PointerToRegion(stmt.lhs.type,
@@ -862,7 +809,7 @@ class CPython(Facet):
         t_failure = self.state.mktrans_assignment(stmt.lhs,
                                                   value,
                                                   None)
-        t_failure.dest.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        t_failure.dest.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
         return t_failure.dest
 
     def make_transitions_for_new_ref_or_fail(self, stmt, fnmeta, objname=None):
@@ -912,10 +859,13 @@ class CPython(Facet):
                         return True
 
     def iter_python_refcounts(self):
-        # yield a sequence of (Region, AbstractValue) pairs:
+        # Get a list of (Region, AbstractValue) pairs:
         #  [...., (r_obj, v_ob_refcnt), ....]
         # corresponding to all of the PyObject* memory regions that we know
         # about, and their ob_refcnt values
+        # (a list rather than a generator, so that it can be called via
+        # State.call_facet)
+        result = []
         for var in self.state.region_for_var:
             check_isinstance(self.state.region_for_var[var], Region)
             r_obj = self.state.region_for_var[var]
@@ -930,7 +880,8 @@ class CPython(Facet):
 
             v_ob_refcnt = self.state.get_value_of_field_by_region(r_obj,
                                                                   'ob_refcnt')
-            yield (r_obj, v_ob_refcnt)
+            result.append((r_obj, v_ob_refcnt))
+        return result
 
     def handle_null_error(self, stmt, idx, ptr, rawreturnvalue=0):
         # Handle Objects/abstract.c's null_error()
@@ -959,8 +910,8 @@ class CPython(Facet):
                 t_failure.desc = ('when %s raises SystemError due to'
                                   ' NULL as argument %i at %s'
                                   % (stmt.fn, idx + 1, stmt.loc))
-                t_failure.dest.cpython.set_exception('PyExc_SystemError',
-                                                     stmt.loc)
+                t_failure.dest.writable_facet('cpython').set_exception(
+                    'PyExc_SystemError', stmt.loc)
             else:
                 t_failure.desc = ('when %s fails due to'
                                   ' NULL as argument %i at %s'
@@ -988,7 +939,7 @@ class CPython(Facet):
                               ' PyErr_BadInternalCall) due to'
                               ' NULL as argument %i at %s'
                               % (stmt.fn, idx + 1, stmt.loc))
-            t_failure.dest.cpython.bad_internal_call(stmt.loc)
+            t_failure.dest.writable_facet('cpython').bad_internal_call(stmt.loc)
             return t_failure
         # otherwise, implicit return of None to signify no problems
 
@@ -1066,7 +1017,7 @@ class CPython(Facet):
         s_failure = self.state.mkstate_concrete_return_of(stmt, 0)
         # Various errors are possible, but a TypeError is always possible
         # e.g. for the case of the wrong number of arguments:
-        s_failure.cpython.set_exception('PyExc_TypeError', stmt.loc)
+        s_failure.writable_facet('cpython').set_exception('PyExc_TypeError', stmt.loc)
 
         # Parse the format string, and figure out what the effects of a
         # successful parsing are:
@@ -1235,7 +1186,7 @@ class CPython(Facet):
         s_failure = self.state.mkstate_concrete_return_of(stmt, 0)
         # Various errors are possible, but a TypeError is always possible
         # e.g. for the case of the wrong number of arguments:
-        s_failure.cpython.set_exception('PyExc_TypeError', stmt.loc)
+        s_failure.writable_facet('cpython').set_exception('PyExc_TypeError', stmt.loc)
         result = [self.state.mktrans_from_fncall_state(stmt,
                         s_failure, 'fails', has_siblings=True)]
 
@@ -1254,9 +1205,10 @@ class CPython(Facet):
                     # Write back a sane object:
                     v_obj = PointerToRegion(get_PyObjectPtr(),
                                             stmt.loc,
-                                            s_success.cpython.make_sane_object(stmt,
-                                                                               'argument %i' % (i + 1),
-                                                                               RefcountValue.borrowed_ref(stmt.loc, None)))
+                                            s_success.writable_facet('cpython').make_sane_object(
+                                                stmt,
+                                                'argument %i' % (i + 1),
+                                                RefcountValue.borrowed_ref(stmt.loc, None)))
                     s_success.value_for_region[vararg.region] = v_obj
 
         return result
@@ -1328,9 +1280,9 @@ class CPython(Facet):
                     # success for codes "S" and "O":
                     if isinstance(v_vararg, PointerToRegion):
                         if isinstance(unit, CodeSO):
-                            t_success.dest.cpython.add_external_ref(v_vararg, stmt.loc)
+                            t_success.dest.writable_facet('cpython').add_external_ref(v_vararg, stmt.loc)
                         else:
-                            t_success.dest.cpython.steal_reference(v_vararg, stmt.loc)
+                            t_success.dest.writable_facet('cpython').steal_reference(v_vararg, stmt.loc)
             return True
 
         t_success, t_failure = self.make_transitions_for_new_ref_or_fail(stmt, fnmeta)
@@ -1408,8 +1360,8 @@ class CPython(Facet):
                            make_null_ptr(stmt.lhs.type,
                                          stmt.loc),
                            fnmeta.desc_when_call_fails())
-        t_failure.dest.cpython.set_exception('PyExc_ValueError',
-                                             stmt.loc)
+        t_failure.dest.writable_facet('cpython').set_exception(
+            'PyExc_ValueError', stmt.loc)
         return [t_success, t_failure]
 
     ########################################################################
@@ -1587,10 +1539,10 @@ class CPython(Facet):
         # the dictionary now owns a new ref on "item".  We won't model the
         # insides of the dictionary type.  Instead, treat it as a new
         # external reference:
-        s_success.cpython.add_external_ref(v_item, stmt.loc)
+        s_success.writable_facet('cpython').add_external_ref(v_item, stmt.loc)
 
         s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-        s_failure.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        s_failure.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
 
         return self.state.make_transitions_for_fncall(stmt, fnmeta,
                                                       s_success, s_failure)
@@ -1666,7 +1618,7 @@ class CPython(Facet):
                         defined_in='Python/errors.c')
         # equiv to PyErr_Restore(NULL, NULL, NULL)
         t_next = self.state.mktrans_nop(stmt, fnmeta.name)
-        t_next.dest.cpython.exception_rvalue = make_null_pyobject_ptr(stmt)
+        t_next.dest.writable_facet('cpython').exception_rvalue = make_null_pyobject_ptr(stmt)
         return [t_next]
 
     def impl_PyErr_Format(self, stmt, v_exc, v_fmt, *v_args):
@@ -1679,7 +1631,7 @@ class CPython(Facet):
         t_next = self.state.mktrans_assignment(stmt.lhs,
                                          make_null_pyobject_ptr(stmt),
                                          'PyErr_Format()')
-        t_next.dest.cpython.exception_rvalue = v_exc
+        t_next.dest.writable_facet('cpython').exception_rvalue = v_exc
         return [t_next]
 
     def impl_PyErr_NewException(self, stmt, v_name, v_base, v_dict):
@@ -1707,7 +1659,7 @@ class CPython(Facet):
                                          make_null_pyobject_ptr(stmt),
                                          ('PyErr_NoMemory() returns NULL,'
                                           ' raising MemoryError'))
-        t_next.dest.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        t_next.dest.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
         return [t_next]
 
     def impl_PyErr_Occurred(self, stmt):
@@ -1882,7 +1834,7 @@ class CPython(Facet):
         t_success = self.state.mktrans_nop(stmt, fnmeta.name)
         t_success.desc = 'reacquiring the GIL by calling %s()' % fnmeta.name
         # Acquire the GIL:
-        t_success.dest.cpython.has_gil = True
+        t_success.dest.writable_facet('cpython').has_gil = True
         return [t_success]
 
     def impl_PyEval_SaveThread(self, stmt):
@@ -1898,7 +1850,7 @@ class CPython(Facet):
                                                   UnknownValue.make(returntype, stmt.loc),
                                                   'releasing the GIL by calling %s()' % fnmeta.name)
         # Release the GIL:
-        t_success.dest.cpython.has_gil = False
+        t_success.dest.writable_facet('cpython').has_gil = False
         return [t_success]
 
     ########################################################################
@@ -1937,7 +1889,7 @@ class CPython(Facet):
         s_success = self.state.mkstate_concrete_return_of(stmt, 0)
         s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
         # Various errors can happen; this is just one:
-        s_failure.cpython.set_exception('PyExc_IOError', stmt.loc)
+        s_failure.writable_facet('cpython').set_exception('PyExc_IOError', stmt.loc)
         return self.state.make_transitions_for_fncall(stmt, fnmeta,
                                                       s_success, s_failure)
 
@@ -1949,7 +1901,7 @@ class CPython(Facet):
         s_success = self.state.mkstate_concrete_return_of(stmt, 0)
         s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
         # Various errors can happen; this is just one:
-        s_failure.cpython.set_exception('PyExc_IOError', stmt.loc)
+        s_failure.writable_facet('cpython').set_exception('PyExc_IOError', stmt.loc)
         return self.state.make_transitions_for_fncall(stmt, fnmeta,
                                                       s_success, s_failure)
 
@@ -1977,7 +1929,7 @@ class CPython(Facet):
             self.state.raise_split_value(v_op, stmt.loc)
         if v_op.is_null_ptr():
             s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-            s_failure.cpython.bad_argument(stmt.loc)
+            s_failure.writable_facet('cpython').bad_argument(stmt.loc)
             return [Transition(self.state,
                                s_failure,
                                '%s() fails due to NULL argument' % fnmeta.name)]
@@ -2006,7 +1958,7 @@ class CPython(Facet):
         t_failure = self.state.mktrans_assignment(stmt.lhs,
                                             ConcreteValue(returntype, stmt.loc, -1),
                                             fnmeta.desc_when_call_fails())
-        t_failure.dest.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        t_failure.dest.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
         return [t_success, t_failure]
 
     def impl_PyFloat_FromDouble(self, stmt, v_fval):
@@ -2169,7 +2121,7 @@ class CPython(Facet):
         t_failure = self.state.mktrans_assignment(stmt.lhs,
                                             ConcreteValue(returntype, stmt.loc, -1),
                                             fnmeta.desc_when_call_fails())
-        t_failure.dest.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        t_failure.dest.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
         return [t_success, t_failure]
 
     def impl_PyInt_FromLong(self, stmt, v_ival):
@@ -2237,7 +2189,7 @@ class CPython(Facet):
                                                 ConcreteValue(returntype, stmt.loc, 0),
                                                 'when %s() returns NULL setting an exception (error occurred)' % fnmeta.name)
 
-        t_error.dest.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        t_error.dest.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
         return [t_nextvalue, t_end, t_error]
 
     ########################################################################
@@ -2260,14 +2212,14 @@ class CPython(Facet):
         # It handles newitem being NULL:
         if v_newitem.is_null_ptr():
             s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-            s_failure.cpython.bad_internal_call(stmt.loc)
+            s_failure.writable_facet('cpython').bad_internal_call(stmt.loc)
             return [Transition(self.state,
                                s_failure,
                                'returning -1 from %s() due to NULL item' % fnmeta.name)]
 
         # On success, adds a ref on input:
         s_success = self.state.mkstate_concrete_return_of(stmt, 0)
-        s_success.cpython.add_ref(v_newitem, stmt.loc)
+        s_success.writable_facet('cpython').add_ref(v_newitem, stmt.loc)
         #...and set the pointer value within ob_item array, so that we can
         # discount that refcount:
         ob_item_region = self.state.make_field_region(v_op.region, 'ob_item')
@@ -2296,7 +2248,7 @@ class CPython(Facet):
 
         # Can fail with memory error, overflow error:
         s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-        s_failure.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        s_failure.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
 
         return self.state.make_transitions_for_fncall(stmt, fnmeta,
                                                       s_success, s_failure)
@@ -2379,7 +2331,7 @@ class CPython(Facet):
             # FIXME: update refcounts
             # "Steal" a reference to item:
             if isinstance(v_item, PointerToRegion):
-                s_success.cpython.steal_reference(v_item, stmt.loc)
+                s_success.writable_facet('cpython').steal_reference(v_item, stmt.loc)
 
             # and discards a
             # reference to an item already in the list at the affected position.
@@ -2467,8 +2419,8 @@ class CPython(Facet):
                                          stmt.loc,
                                          -1),
                            fnmeta.desc_when_call_fails())
-        t_failure.dest.cpython.set_exception('PyExc_TypeError',
-                                             stmt.loc)
+        t_failure.dest.writable_facet('cpython').set_exception(
+            'PyExc_TypeError', stmt.loc)
         return [t_success, t_failure]
 
     ########################################################################
@@ -2539,7 +2491,7 @@ class CPython(Facet):
 
         # Can fail with memory error, overflow error:
         s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-        s_failure.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        s_failure.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
 
         return self.state.make_transitions_for_fncall(stmt, fnmeta,
                                                       s_success, s_failure)
@@ -2557,18 +2509,18 @@ class CPython(Facet):
         # Explicitly checks for non-NULL obj:
         if v_value.is_null_ptr():
             s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-            s_failure.cpython.set_exception('PyExc_TypeError', stmt.loc)
+            s_failure.writable_facet('cpython').set_exception('PyExc_TypeError', stmt.loc)
             return [Transition(self.state,
                                s_failure,
                                'returning -1 from %s()' % fnmeta.name)]
 
         # On success, steals a ref from v_value:
         s_success = self.state.mkstate_concrete_return_of(stmt, 0)
-        s_success.cpython.steal_reference(v_value, stmt.loc)
+        s_success.writable_facet('cpython').steal_reference(v_value, stmt.loc)
 
         # Can fail with memory error, overflow error:
         s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-        s_failure.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        s_failure.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
 
         return self.state.make_transitions_for_fncall(stmt, fnmeta,
                                                       s_success, s_failure)
@@ -2582,7 +2534,7 @@ class CPython(Facet):
 
         # Can fail with memory error, overflow error:
         s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-        s_failure.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        s_failure.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
 
         return self.state.make_transitions_for_fncall(stmt, fnmeta,
                                                       s_success, s_failure)
@@ -2657,8 +2609,8 @@ class CPython(Facet):
                     # by the call.  Hence args with code "N" lose a ref:
                     if isinstance(v_vararg, PointerToRegion):
                         if isinstance(unit, CodeN):
-                            on_success.state.cpython.dec_ref(v_vararg, fncall.stmt.loc)
-                            on_failure.state.cpython.dec_ref(v_vararg, fncall.stmt.loc)
+                            on_success.state.writable_facet('cpython').dec_ref(v_vararg, fncall.stmt.loc)
+                            on_failure.state.writable_facet('cpython').dec_ref(v_vararg, fncall.stmt.loc)
             return True
 
         fmt_string = fncall.args[fmtargidx].as_string_constant()
@@ -2972,7 +2924,7 @@ class CPython(Facet):
         t_failure = self.state.mktrans_assignment(stmt.lhs,
                                        ConcreteValue(stmt.lhs.type, stmt.loc, 0),
                                        fnmeta.desc_when_call_fails())
-        t_failure.dest.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        t_failure.dest.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
         return [t_success, t_failure]
 
     def impl_PyObject_Repr(self, stmt, v_o):
@@ -3122,7 +3074,7 @@ class CPython(Facet):
 
         # can fail with -1, setting an exception
         s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-        s_failure.cpython.set_exception('PyExc_TypeError', stmt.loc)
+        s_failure.writable_facet('cpython').set_exception('PyExc_TypeError', stmt.loc)
 
         # otherwise, expect zero
         s_success = self.state.mkstate_concrete_return_of(stmt, 0)
@@ -3215,7 +3167,7 @@ class CPython(Facet):
                                                                      stmt.loc))
         # else, return -1 and set an exception
         s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-        s_failure.cpython.set_exception('PyExc_TypeError', stmt.loc)
+        s_failure.writable_facet('cpython').set_exception('PyExc_TypeError', stmt.loc)
 
         return self.state.make_transitions_for_fncall(stmt, fnmeta,
                                                       s_success, s_failure)
@@ -3262,7 +3214,7 @@ class CPython(Facet):
         t_failure = self.state.mktrans_assignment(stmt.lhs,
                                             ConcreteValue(returntype, stmt.loc, 0),
                                             fnmeta.desc_when_call_fails())
-        t_failure.dest.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        t_failure.dest.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
         return [t_success, t_failure]
 
     def impl_PyString_Concat(self, stmt, v_pv, v_w):
@@ -3288,8 +3240,8 @@ class CPython(Facet):
         if v_w.is_null_ptr():
             # Py_DECREF(*pv)
             s_nop = self.state.mkstate_nop(stmt)
-            result = s_nop.cpython.mktransitions_Py_DECREF(v_star_pv,
-                                                           stmt)
+            result = s_nop.call_facet('cpython', 'mktransitions_Py_DECREF',
+                                      v_star_pv, stmt)
 
             # *pv = NULL, and set desc:
             for t_new in result:
@@ -3303,7 +3255,7 @@ class CPython(Facet):
         # Try to allocate new string, which can fail:
         s_success = self.state.mkstate_nop(stmt)
         typeobjregion = self.typeobjregion_by_name('PyString_Type')
-        r_nonnull = s_success.cpython.make_sane_object(
+        r_nonnull = s_success.writable_facet('cpython').make_sane_object(
             stmt,
             'result of %s' % fnmeta.name,
             RefcountValue.new_ref(stmt.loc, None))
@@ -3311,10 +3263,10 @@ class CPython(Facet):
 
 
         # Handle Py_DECREF(*pv):
-        t_successes = s_success.cpython.mktransitions_Py_DECREF(v_star_pv,
-                                                                stmt)
-        t_failures = s_failure.cpython.mktransitions_Py_DECREF(v_star_pv,
-                                                               stmt)
+        t_successes = s_success.call_facet('cpython', 'mktransitions_Py_DECREF',
+                                           v_star_pv, stmt)
+        t_failures = s_failure.call_facet('cpython', 'mktransitions_Py_DECREF',
+                                          v_star_pv, stmt)
 
         # Handle *pv = v:
         for t_success in t_successes:
@@ -3351,8 +3303,8 @@ class CPython(Facet):
         if not v_w.is_null_ptr():
             new_results = []
             for t_concat in results:
-                for t_withdecref in t_concat.dest.cpython.mktransitions_Py_DECREF(v_w,
-                                                                                  stmt):
+                for t_withdecref in t_concat.dest.call_facet(
+                        'cpython', 'mktransitions_Py_DECREF', v_w, stmt):
                     t_withdecref.desc = t_concat.desc + ' (%s on RHS)' % t_withdecref.desc
                     new_results.append(t_withdecref)
             return new_results
@@ -3439,7 +3391,7 @@ class CPython(Facet):
 
         # for non-strings, can fail with -1, setting an exception
         s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-        s_failure.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        s_failure.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
 
         # otherwise, expect a non-negative value:
         returntype = stmt.fn.type.dereference.type
@@ -3482,7 +3434,7 @@ class CPython(Facet):
         t_failure = self.state.mktrans_assignment(stmt.lhs,
                                        ConcreteValue(stmt.lhs.type, stmt.loc, 0),
                                        fnmeta.desc_when_call_fails())
-        t_failure.dest.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        t_failure.dest.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
         return [t_success, t_failure]
 
     ########################################################################
@@ -3521,11 +3473,11 @@ class CPython(Facet):
                                             ConcreteValue(returntype, stmt.loc, 0),
                                             fnmeta.desc_when_call_succeeds())
         if isinstance(v_value, PointerToRegion):
-            t_success.dest.cpython.add_external_ref(v_value, stmt.loc)
+            t_success.dest.writable_facet('cpython').add_external_ref(v_value, stmt.loc)
         t_failure = self.state.mktrans_assignment(stmt.lhs,
                                             ConcreteValue(returntype, stmt.loc, -1),
                                             fnmeta.desc_when_call_fails())
-        t_failure.dest.cpython.set_exception('PyExc_MemoryError', stmt.loc)
+        t_failure.dest.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc)
         return [t_success, t_failure]
 
     ########################################################################
@@ -3617,7 +3569,7 @@ class CPython(Facet):
         if not self.object_ptr_has_global_ob_type(v_op, 'PyTuple_Type'):
             # FIXME: Py_XDECREF on newitem
             s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-            s_failure.cpython.bad_internal_call(stmt.loc)
+            s_failure.writable_facet('cpython').bad_internal_call(stmt.loc)
             result.append(Transition(self.state,
                                      s_failure,
                                      fnmeta.desc_when_call_fails('not a tuple')))
@@ -3632,7 +3584,7 @@ class CPython(Facet):
         if eq_one is False: # tri-state
             # FIXME: Py_XDECREF on newitem
             s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-            s_failure.cpython.bad_internal_call(stmt.loc)
+            s_failure.writable_facet('cpython').bad_internal_call(stmt.loc)
             result.append(Transition(self.state,
                                      s_failure,
                                      fnmeta.desc_when_call_fails('refcount is not 1')))
@@ -3653,7 +3605,7 @@ class CPython(Facet):
         # to be non-False:
         if lt_zero is not False or lt_size is not True:
             s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-            s_failure.cpython.set_exception('PyExc_IndexError', stmt.loc)
+            s_failure.writable_facet('cpython').set_exception('PyExc_IndexError', stmt.loc)
             result.append(Transition(self.state,
                                      s_failure,
                                      fnmeta.desc_when_call_fails('index out of range')))
@@ -3706,7 +3658,7 @@ class CPython(Facet):
         # (For now, ignore the fact that it could be a tuple subclass)
 
         s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-        s_failure.cpython.set_exception('PyExc_SystemError', stmt.loc)
+        s_failure.writable_facet('cpython').set_exception('PyExc_SystemError', stmt.loc)
         t_failure = Transition(self.state,
                                s_failure,
                                fnmeta.desc_when_call_fails('not a tuple'))
@@ -3729,7 +3681,7 @@ class CPython(Facet):
         s_success = self.state.mkstate_concrete_return_of(stmt, 0)
 
         s_failure = self.state.mkstate_concrete_return_of(stmt, -1)
-        s_failure.cpython.set_exception('PyExc_MemoryError', stmt.loc) # various possible errors
+        s_failure.writable_facet('cpython').set_exception('PyExc_MemoryError', stmt.loc) # various possible errors
 
         return self.state.make_transitions_for_fncall(stmt, fnmeta,
                                                       s_success, s_failure)
@@ -3780,7 +3732,7 @@ class CPython(Facet):
             self.state.raise_split_value(v_op, stmt.loc)
         if v_op.is_null_ptr():
             s_failure = self.state.mkstate_concrete_return_of(stmt, 0)
-            s_failure.cpython.bad_internal_call(stmt.loc)
+            s_failure.writable_facet('cpython').bad_internal_call(stmt.loc)
             return [Transition(self.state,
                                s_failure,
                                '%s() fails due to NULL argument' % fnmeta.name)]
@@ -4098,9 +4050,9 @@ def check_refcount_for_one_object(r_obj, v_ob_refcnt, v_return,
             exp_refs = ['return value']
     else:
         is_return_value = False
-        # Try to get a descriptive name for the region:
-        desc = trace.get_description_for_region(r_obj)
-        # print('desc: %r' % desc)
+        # (a descriptive name for the region is only looked up if we're going
+        # to report on it, below)
+        desc = None
         exp_refs = []
 
     # The reference count should also reflect any non-stack pointers
@@ -4123,6 +4075,9 @@ def check_refcount_for_one_object(r_obj, v_ob_refcnt, v_return,
 
     # Here's where we verify the refcount:
     if isinstance(v_ob_refcnt, RefcountValue):
+        if v_ob_refcnt.relvalue != exp_refcnt and desc is None:
+            # Try to get a descriptive name for the region:
+            desc = trace.get_description_for_region(r_obj)
         if v_ob_refcnt.relvalue > exp_refcnt:
             # Refcount is too high:
             w = emit_refcount_warning('memory leak: ob_refcnt of %s is %i too high'
@@ -4149,14 +4104,14 @@ def check_refcount_for_one_object(r_obj, v_ob_refcnt, v_return,
 #   __attribute__((cpychecker_negative_result_sets_exception))
 def warn_about_NULL_without_exception(v_return,
                                       trace, endstate, fun, rep):
+    v_exception = endstate.cpython.exception_rvalue
     if not trace.err:
         if (isinstance(v_return, ConcreteValue)
             and v_return.value == 0
             and str(v_return.gcctype)=='struct PyObject *'):
 
-            if (isinstance(endstate.cpython.exception_rvalue,
-                          ConcreteValue)
-                and endstate.cpython.exception_rvalue.value == 0):
+            if (isinstance(v_exception, ConcreteValue)
+                and v_exception.value == 0):
 
                 # Don't emit the error for functions that are a
                 # PyTypeObject's tp_iternext callback, as it's
@@ -4174,9 +4129,8 @@ def warn_about_NULL_without_exception(v_return,
     #    __attribute__((cpychecker_sets_exception))
     # then verify that this is the case:
     if fun.decl.name in fnnames_setting_exception:
-        if (isinstance(endstate.cpython.exception_rvalue,
-                       ConcreteValue)
-            and endstate.cpython.exception_rvalue.value == 0):
+        if (isinstance(v_exception, ConcreteValue)
+            and v_exception.value == 0):
             w = rep.make_warning(fun,
                       endstate.get_gcc_loc(fun),
                       ('function is marked with'
@@ -4190,9 +4144,8 @@ def warn_about_NULL_without_exception(v_return,
     if fun.decl.name in fnnames_setting_exception_on_negative_result:
         if (isinstance(v_return, ConcreteValue)
             and v_return.value < 0):
-            if (isinstance(endstate.cpython.exception_rvalue,
-                           ConcreteValue)
-                and endstate.cpython.exception_rvalue.value == 0):
+            if (isinstance(v_exception, ConcreteValue)
+                and v_exception.value == 0):
                 w = rep.make_warning(fun,
                       endstate.get_gcc_loc(fun),
                       ('function is marked with __attribute__(('
@@ -4205,9 +4158,173 @@ def make_stmt_graph(fun):
     stmtgraph = StmtGraph(fun, False, omit_complex_edges=True)
     return stmtgraph
 
+def check_trace(fun, trace, rep, show_possible_null_derefs=False):
+    """
+    Check one complete Trace through the gcc.Function, adding reports about
+    any problems with it to the Reporter
+    """
+    if trace.err:
+        # This trace bails early with a fatal error; it probably doesn't
+        # have a return value
+        log('trace.err: %s %r', trace.err, trace.err)
+
+        # Unless explicitly enabled, don't report on NULL pointer
+        # dereferences that are only possible, not definite: it may be
+        # that there are invariants that we know nothing about that mean
+        # that they can't happen:
+        # (similarly for arithmetic issues e.g. negative shift, divide by
+        # zero, etc)
+        if isinstance(trace.err, (NullPtrDereference, NullPtrArgument,
+                                  PredictedArithmeticError)):
+            if not trace.err.isdefinite:
+                if not show_possible_null_derefs:
+                    return
+
+        w = rep.make_warning(fun, trace.err.loc, str(trace.err))
+        w.add_trace(trace)
+        if hasattr(trace.err, 'why'):
+            if trace.err.why:
+                w.add_note(trace.err.loc,
+                           trace.err.why)
+        # FIXME: in our example this ought to mention where the values came from
+        return
+    # Otherwise, the trace proceeds normally
+    v_return = trace.return_value()
+    log('trace.return_value(): %s', trace.return_value())
+
+    # Ideally, we should "own" exactly one reference, and it should be
+    # the return value.  Anything else is an error (and there are other
+    # kinds of error...)
+
+    # Locate all PyObject that we touched
+    endstate = trace.states[-1]
+    endstate.log(log)
+    log('return_value: %r', v_return)
+    log('endstate.region_for_var: %r', endstate.region_for_var)
+    log('endstate.value_for_region: %r', endstate.value_for_region)
+
+    if endstate.not_returning:
+        # We have a function that calls exit() or abort() or similar
+        # Don't bother reporting reference leaks etc: the process is
+        # going away
+        return
+
+    # Check the refcount of all Python objects we know about:
+    if hasattr(endstate, 'cpython'):
+        for r_obj, v_ob_refcnt in endstate.call_facet('cpython',
+                                                      'iter_python_refcounts'):
+            check_refcount_for_one_object(r_obj, v_ob_refcnt, v_return,
+                                          trace, endstate, fun, rep)
+
+    # Detect returning a deallocated object:
+    if v_return:
+        if isinstance(v_return, PointerToRegion):
+            rvalue = endstate.value_for_region.get(v_return.region, None)
+            if isinstance(rvalue, DeallocatedMemory):
+                w = rep.make_warning(fun,
+                                     endstate.get_gcc_loc(fun),
+                                     'returning pointer to deallocated memory')
+                w.add_trace(trace)
+                w.add_note(rvalue.loc,
+                           'memory deallocated here')
+
+    warn_about_NULL_without_exception(v_return,
+                                      trace, endstate, fun, rep)
+
+class ReportSaturation(TraceFilter):
+    """
+    A TraceFilter which checks each trace as soon as iter_traces finds it,
+    keeping at most max_witnesses reports within each equivalence class of
+    reports (those with the same location and message: see
+    Report.is_duplicate_of), rather than building every report only for
+    Reporter.remove_duplicates to throw them away.
+
+    Once a class has that many reports it is "saturated": further reports
+    within it are only counted (against the first report in the class), and
+    a trace that only gives saturated reports isn't kept.
+
+    It also prunes partial traces: if a trace reaches a State that's the
+    same as one seen within an earlier complete trace (see State.get_key),
+    the traces onwards from it can only give the reports that the earlier
+    ones from that State gave, so if all of those are saturated, there's no
+    point in continuing.  Each pruned trace is counted as at least one more
+    duplicate of each of those reports.
+    """
+    def __init__(self, fun, rep, max_witnesses,
+                 show_possible_null_derefs=False):
+        self.fun = fun
+        self.rep = rep
+        self.max_witnesses = max_witnesses
+        self.show_possible_null_derefs = show_possible_null_derefs
+
+        # Mapping from (loc, msg) to the list of Report instances kept
+        # within that class:
+        self.witnesses = {}
+
+        # Mapping from the key of each State within the complete traces so
+        # far to the set of classes of the reports that those traces gave:
+        self.classes_for_state = {}
+
+        self.num_traces = 0
+        self.num_discarded = 0
+        self.num_pruned = 0
+
+    def is_saturated(self, reportclass):
+        return len(self.witnesses[reportclass]) >= self.max_witnesses
+
+    def on_complete_trace(self, trace):
+        trace.log(log, 'TRACE %i' % self.num_traces)
+        self.num_traces += 1
+
+        numreports = len(self.rep.reports)
+        check_trace(self.fun, trace, self.rep, self.show_possible_null_derefs)
+        newreports = self.rep.reports[numreports:]
+        del self.rep.reports[numreports:]
+
+        classes = set()
+        keep = not newreports
+        for report in newreports:
+            reportclass = (report.loc, report.msg)
+            classes.add(reportclass)
+            witnesses = self.witnesses.setdefault(reportclass, [])
+            if len(witnesses) < self.max_witnesses:
+                witnesses.append(report)
+                self.rep.reports.append(report)
+                keep = True
+            else:
+                witnesses[0].num_discarded_duplicates += 1
+                self.num_discarded += 1
+
+        for state in trace.states:
+            key = state.get_key()
+            if key in self.classes_for_state:
+                self.classes_for_state[key] |= classes
+            else:
+                self.classes_for_state[key] = set(classes)
+        return keep
+
+    def should_prune(self, prefix):
+        classes = self.classes_for_state.get(prefix.states[-1].get_key())
+        if classes is None:
+            return False
+        for reportclass in classes:
+            if not self.is_saturated(reportclass):
+                return False
+        log('pruning trace: it can only reproduce saturated reports')
+        self.num_pruned += 1
+        for reportclass in classes:
+            self.witnesses[reportclass][0].num_pruned_duplicates += 1
+        return True
+
 def impl_check_refcounts(fun, dump_traces=False,
                          show_possible_null_derefs=False,
-                         maxtrans=256):
+                         maxtrans=256,
+                         fuse_straight_line=False,
+                         slice_irrelevant_code=False,
+                         budget=None,
+                         prioritize_coverage=False,
+                         max_witnesses=None,
+                         metrics=None):
     """
     Inner implementation of the refcount checker, checking the refcounting
     behavior of a function, returning a Reporter instance.
@@ -4219,6 +4336,27 @@ def impl_check_refcounts(fun, dump_traces=False,
 
     dump_traces: bool: if True, dump information about the traces through
     the function to stdout (for self tests)
+
+    fuse_straight_line: bool: if True, interpret runs of straight-line code
+    as single transitions (see absinterp.fuse_straight_line_code)
+
+    slice_irrelevant_code: bool: if True, skip over statements that can't
+    affect the CPython facet (see libcpychecker.relevance)
+
+    budget: an absinterp.Budget shared by all of the functions in the
+    translation unit, to use instead of maxtrans, or None
+
+    prioritize_coverage: bool: if True, explore the paths that cover the most
+    new code first (see absinterp.iter_traces_prioritized), rather than
+    depth-first, and report the coverage achieved if not all paths could be
+    analyzed
+
+    max_witnesses: if not None, the number of traces to keep for each
+    distinct report, with the exploration of traces that could only give
+    more of them being cut short (see ReportSaturation)
+
+    metrics: a libcpychecker.metrics.FunctionMetrics to record the cost of
+    the traversal in, or None
     """
     # Abstract interpretation:
     # Walk the CFG, gathering the information we're interested in
@@ -4234,24 +4372,71 @@ def impl_check_refcounts(fun, dump_traces=False,
     if get_PyObject():
         facets['cpython'] = CPython
 
-    limits=Limits(maxtrans=maxtrans)
-
     stmtgraph = make_stmt_graph(fun)
+
+    if budget:
+        limits = budget.make_limits(stmtgraph, facets)
+    else:
+        limits = Limits(maxtrans=maxtrans)
+
     if 0:
         dot = stmtgraph.to_dot('foo')
         from gccutils import invoke_dot
         invoke_dot(dot)
 
+    relevance = None
+    if slice_irrelevant_code and 'cpython' in facets:
+        from libcpychecker.relevance import RelevanceSlice
+        relevance = RelevanceSlice(stmtgraph, facets)
+
+    coverage = None
+    if prioritize_coverage:
+        coverage = Coverage(stmtgraph, relevance)
+
+    rep = Reporter()
+
+    saturation = None
+    if max_witnesses:
+        saturation = ReportSaturation(fun, rep, max_witnesses,
+                                      show_possible_null_derefs)
+
+    too_complicated = False
     try:
         traces = iter_traces(stmtgraph,
                              facets,
-                             limits=limits)
+                             limits=limits,
+                             fuse_straight_line=fuse_straight_line,
+                             relevance=relevance,
+                             coverage=coverage,
+                             prioritize=prioritize_coverage,
+                             tracefilter=saturation)
     except TooComplicated:
         err = sys.exc_info()[1]
+        too_complicated = True
         gcc.inform(fun.start,
                    'this function is too complicated for the reference-count checker to fully analyze: not all paths were analyzed')
+        if prioritize_coverage:
+            gcc.inform(fun.start,
+                       'the paths analyzed reached %s' % coverage)
         traces = err.complete_traces
 
+    if metrics:
+        metrics.on_traversal(limits, traces, too_complicated)
+
+    if coverage:
+        gcc.add_plugin_stat('cpychecker.stmts_covered',
+                            coverage.get_num_stmts_covered())
+        gcc.add_plugin_stat('cpychecker.stmts_total',
+                            coverage.get_num_stmts())
+    if saturation:
+        gcc.add_plugin_stat('cpychecker.reports_discarded',
+                            saturation.num_discarded)
+        gcc.add_plugin_stat('cpychecker.traces_pruned',
+                            saturation.num_pruned)
+
+    if budget:
+        budget.charge(limits)
+
     if dump_traces:
         traces = list(traces)
         dump_traces_to_stdout(traces)
@@ -4260,90 +4445,25 @@ def impl_check_refcounts(fun, dump_traces=False,
     if 0:
         filename = ('%s.%s-refcount-traces.html'
                     % (gcc.get_dump_base_name(), fun.decl.name))
-        rep = Reporter()
+        debugrep = Reporter()
         for i, trace in enumerate(traces):
             endstate = trace.states[-1]
-            r = rep.make_debug_dump(fun,
-                                    endstate.get_gcc_loc(fun),
-                                    'Debug dump of trace %i' % i)
+            r = debugrep.make_debug_dump(fun,
+                                         endstate.get_gcc_loc(fun),
+                                         'Debug dump of trace %i' % i)
             r.add_trace(trace, DebugAnnotator())
-        rep.dump_html(fun, filename)
-        rep.flush()
+        debugrep.dump_html(fun, filename)
+        debugrep.flush()
         gcc.inform(fun.start,
                    ('graphical debug report for function %r written out to %r'
                     % (fun.decl.name, filename)))
 
-    rep = Reporter()
-
-    # Iterate through all traces, adding reports to the Reporter:
-    for i, trace in enumerate(traces):
-        trace.log(log, 'TRACE %i' % i)
-        if trace.err:
-            # This trace bails early with a fatal error; it probably doesn't
-            # have a return value
-            log('trace.err: %s %r', trace.err, trace.err)
-
-            # Unless explicitly enabled, don't report on NULL pointer
-            # dereferences that are only possible, not definite: it may be
-            # that there are invariants that we know nothing about that mean
-            # that they can't happen:
-            # (similarly for arithmetic issues e.g. negative shift, divide by
-            # zero, etc)
-            if isinstance(trace.err, (NullPtrDereference, NullPtrArgument,
-                                      PredictedArithmeticError)):
-                if not trace.err.isdefinite:
-                    if not show_possible_null_derefs:
-                        continue
-
-            w = rep.make_warning(fun, trace.err.loc, str(trace.err))
-            w.add_trace(trace)
-            if hasattr(trace.err, 'why'):
-                if trace.err.why:
-                    w.add_note(trace.err.loc,
-                               trace.err.why)
-            # FIXME: in our example this ought to mention where the values came from
-            continue
-        # Otherwise, the trace proceeds normally
-        v_return = trace.return_value()
-        log('trace.return_value(): %s', trace.return_value())
-
-        # Ideally, we should "own" exactly one reference, and it should be
-        # the return value.  Anything else is an error (and there are other
-        # kinds of error...)
-
-        # Locate all PyObject that we touched
-        endstate = trace.states[-1]
-        endstate.log(log)
-        log('return_value: %r', v_return)
-        log('endstate.region_for_var: %r', endstate.region_for_var)
-        log('endstate.value_for_region: %r', endstate.value_for_region)
-
-        if endstate.not_returning:
-            # We have a function that calls exit() or abort() or similar
-            # Don't bother reporting reference leaks etc: the process is
-            # going away
-            continue
-
-        # Check the refcount of all Python objects we know about:
-        if hasattr(endstate, 'cpython'):
-            for r_obj, v_ob_refcnt in endstate.cpython.iter_python_refcounts():
-                check_refcount_for_one_object(r_obj, v_ob_refcnt, v_return,
-                                              trace, endstate, fun, rep)
-
-        # Detect returning a deallocated object:
-        if v_return:
-            if isinstance(v_return, PointerToRegion):
-                rvalue = endstate.value_for_region.get(v_return.region, None)
-                if isinstance(rvalue, DeallocatedMemory):
-                    w = rep.make_warning(fun,
-                                         endstate.get_gcc_loc(fun),
-                                         'returning pointer to deallocated memory')
-                    w.add_trace(trace)
-                    w.add_note(rvalue.loc,
-                               'memory deallocated here')
-
-        warn_about_NULL_without_exception(v_return,
-                                          trace, endstate, fun, rep)
+    # Iterate through all traces, adding reports to the Reporter (unless
+    # they were checked as they were found):
+    if not saturation:
+        for i, trace in enumerate(traces):
+            trace.log(log, 'TRACE %i' % i)
+            check_trace(fun, trace, rep, show_possible_null_derefs)
 
     # (all traces analysed)
 
@@ -4354,7 +4474,13 @@ def check_refcounts(fun, dump_traces=False, show_traces=False,
                     show_possible_null_derefs=False,
                     show_timings=False,
                     maxtrans=256,
-                    dump_json=False):
+                    dump_json=False,
+                    fuse_straight_line=False,
+                    slice_irrelevant_code=False,
+                    budget=None,
+                    prioritize_coverage=False,
+                    max_witnesses=None,
+                    metrics=None):
     """
     The top-level function of the refcount checker, checking the refcounting
     behavior of a function
@@ -4367,6 +4493,26 @@ def check_refcounts(fun, dump_traces=False, show_traces=False,
     show_traces: bool: if True, display a diagram of the state transition graph
 
     show_timings: bool: if True, add timing information to stderr
+
+    fuse_straight_line: bool: if True, interpret runs of straight-line code
+    as single transitions, for speed
+
+    slice_irrelevant_code: bool: if True, skip over code that can't affect
+    reference counts or the exception state, for speed
+
+    budget: an absinterp.Budget of transitions shared by all of the
+    functions in the translation unit; if given, maxtrans is ignored
+
+    prioritize_coverage: bool: if True, explore the paths that reach the most
+    new code first, so that if not all paths can be analyzed, those that are
+    find as many distinct problems as possible
+
+    max_witnesses: int: if not None, stop looking for more traces that
+    exhibit a problem once this many have been found, so that the analysis
+    can move on to finding different problems
+
+    metrics: a libcpychecker.metrics.FunctionMetrics to record the cost of
+    the analysis in, or None
     """
 
     log('check_refcounts(%r, %r, %r)', fun, dump_traces, show_traces)
@@ -4374,27 +4520,43 @@ def check_refcounts(fun, dump_traces=False, show_traces=False,
     # show_timings = 1
 
     if show_timings:
-        import time
-        start_cpusecs = time.clock()
+        if not metrics:
+            from libcpychecker.metrics import FunctionMetrics
+            metrics = FunctionMetrics(fun, trace_memory=False)
         gcc.inform(fun.start, 'Analyzing reference-counting within %s' % fun.decl.name)
 
-    if show_traces:
-        from libcpychecker.visualizations import StateGraphPrettyPrinter
-        sg = StateGraph(fun, log, MyState)
-        sgpp = StateGraphPrettyPrinter(sg)
-        dot = sgpp.to_dot()
-        #dot = sgpp.extra_items()
-        # print(dot)
-        invoke_dot(dot)
-
-    rep = impl_check_refcounts(fun,
-                               dump_traces,
-                               show_possible_null_derefs,
-                               maxtrans)
-
-    # Organize the Report instances into equivalence classes, simplifying
-    # the list of reports:
-    rep.remove_duplicates()
+    if metrics:
+        metrics.start()
+    try:
+        if show_traces:
+            from libcpychecker.visualizations import StateGraphPrettyPrinter
+            sg = StateGraph(fun, log, MyState)
+            sgpp = StateGraphPrettyPrinter(sg)
+            dot = sgpp.to_dot()
+            #dot = sgpp.extra_items()
+            # print(dot)
+            invoke_dot(dot)
+
+        rep = impl_check_refcounts(fun,
+                                   dump_traces,
+                                   show_possible_null_derefs,
+                                   maxtrans,
+                                   fuse_straight_line,
+                                   slice_irrelevant_code,
+                                   budget,
+                                   prioritize_coverage,
+                                   max_witnesses,
+                                   metrics)
+
+        # Organize the Report instances into equivalence classes,
+        # simplifying the list of reports:
+        rep.remove_duplicates()
+    finally:
+        # (the metrics cover the analysis, not the writing of the reports;
+        # stopping here also ensures that any memory tracing is stopped if
+        # the analysis fails)
+        if metrics:
+            metrics.stop()
 
     # Flush the reporter's messages, which will actually emit gcc errors and
     # warnings (if any), for those Report instances that survived
@@ -4426,13 +4588,9 @@ def check_refcounts(fun, dump_traces=False, show_traces=False,
         htmlfile.close()
         srcfile.close()
 
-
     if show_timings:
-        end_cpusecs = time.clock()
         gcc.inform(fun.start, 'Finished analyzing reference-counting within %s' % fun.decl.name)
-        gcc.inform(fun.start,
-                   ('%i transitions, %fs CPU'
-                    % (limits.trans_seen, end_cpusecs - start_cpusecs)))
+        gcc.inform(fun.start, str(metrics))
 
     if 0:
         dot = cfg_to_dot(fun.cfg, fun.decl.name)
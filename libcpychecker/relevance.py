@@ -0,0 +1,351 @@
+#   Copyright 2011, 2012 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2011, 2012 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Slicing a function down to the statements that matter to the refcount
+# checker.
+#
+# Much of the code within a typical extension function is arithmetic, string
+# handling, or calls into the C library, none of which can affect the
+# reference counts of objects, the exception state, or whether a PyObject*
+# is NULL.  Interpreting it anyway costs time, and worse, every condition
+# within it doubles the number of paths that need to be explored.
+#
+# RelevanceSlice computes which statements of a StmtGraph are "relevant":
+#   - those that read or write memory (other than locals), or which could
+#     otherwise have effects that we can't see from the statement alone
+#   - calls to functions that the facets model, or that return a PyObject*
+#     (or that have been marked with any of our attributes)
+#   - returns, switches and inline assembler
+#   - assignments to relevant variables: initially those of PyObject* type,
+#     and then any variable read by a relevant statement, and so on, until
+#     we reach a fixpoint
+#   - conditions on relevant variables, or that decide between different
+#     relevant statements
+#
+# Every other statement is "skipped": it's interpreted as a no-op that jumps
+# directly to the next relevant statement, if there's a unique one.  In
+# particular, a condition that leads to the same relevant statement along
+# all of its paths is skipped, merging those paths into one (and similarly,
+# loops that only contain irrelevant code are skipped entirely).
+#
+# Since no relevant statement reads a variable that's assigned to by an
+# irrelevant one, skipping them has no effect on the values seen by the
+# relevant statements.  However, the checker won't report problems that
+# could only occur within the skipped code (e.g. a division by zero).
+
+import gcc
+
+from gccutils.graph.dataflow import VARIABLE_TYPES
+
+from libcpychecker.attributes import fnnames_returning_borrowed_refs, \
+    fnnames_setting_exception, fnnames_setting_exception_on_negative_result, \
+    stolen_refs_by_fnname
+from libcpychecker.types import type_is_pyobjptr_subclass
+from libcpychecker.utils import log
+
+# The types that a pointer argument to an unknown function can point to,
+# without us treating the call as relevant: the function can't write a
+# pointer (and hence, a PyObject*) through such an argument:
+SCALAR_TYPES = (gcc.IntegerType, gcc.RealType, gcc.BooleanType,
+                gcc.EnumeralType)
+
+def get_var(expr):
+    """
+    Get the underlying declaration of a variable, looking through SSA names
+    """
+    if isinstance(expr, gcc.SsaName):
+        return expr.var
+    return expr
+
+def get_vars_in_exprs(exprs):
+    """
+    Get the set of all variables referenced within any of the given gcc.Tree
+    expressions (including those whose address is taken)
+    """
+    result = set()
+    for expr in exprs:
+        if expr is None:
+            continue
+        for var in expr.find_trees(VARIABLE_TYPES):
+            result.add(get_var(var))
+    return result
+
+def get_vars_in_stmt(stmt):
+    """
+    Get the set of all variables referenced anywhere within a gcc.Gimple
+    """
+    return set(get_var(var) for var in stmt.find_trees(VARIABLE_TYPES))
+
+def reads_memory(exprs):
+    """
+    Do any of the given gcc.Tree expressions read from memory, rather than
+    from variables and constants?
+    """
+    for expr in exprs:
+        if expr is not None and expr.find_trees(gcc.Reference, first=True):
+            return True
+    return False
+
+class StmtSummary(object):
+    """
+    What the relevance analysis needs to know about a StmtNode
+
+    pinned: is the statement relevant regardless of which variables are?
+
+    defvar: the local variable written by the statement, if any
+
+    usedvars: the variables read by the statement, which must be relevant
+    if the statement is
+
+    anyvars: the variables which, if relevant, make the statement relevant
+    (for a call, every variable that it mentions, since the callee could
+    write through a pointer to any of them)
+
+    is_cond: is the statement a gcc.GimpleCond?
+    """
+    __slots__ = ('pinned', 'defvar', 'usedvars', 'anyvars', 'is_cond')
+
+    def __init__(self, pinned, defvar=None, usedvars=(), anyvars=(),
+                 is_cond=False):
+        self.pinned = pinned
+        self.defvar = defvar
+        self.usedvars = frozenset(usedvars)
+        self.anyvars = frozenset(anyvars)
+        self.is_cond = is_cond
+
+class RelevanceSlice(object):
+    """
+    The statements of a StmtGraph that are relevant to the facets (see
+    above), and where each of the irrelevant ones should jump to
+    """
+    def __init__(self, stmtgraph, facets):
+        self.stmtgraph = stmtgraph
+        self.facets = facets
+        fun = stmtgraph.fun
+        self.localvars = set()
+        for var in (fun.local_decls or []):
+            if not var.static:
+                self.localvars.add(var)
+        for var in (fun.decl.arguments or []):
+            self.localvars.add(var)
+
+        # Keyed by the id() of each StmtNode, since hashing and comparing
+        # StmtNode instances involves the underlying gcc.Gimple:
+        self._nodes = {}
+        self._summaries = {}
+        for node in stmtgraph.nodes:
+            self._nodes[id(node)] = node
+            self._summaries[id(node)] = self._summarize(node)
+
+        self.relevantvars = set(var for var in self.localvars
+                                if type_is_pyobjptr_subclass(var.type))
+        self._solve()
+
+        # Mapping from the id() of each skipped StmtNode to the StmtNode it
+        # jumps to, and to the list of StmtNodes that it skips over (both
+        # computed when first needed):
+        self._targets = {}
+        self._skipped_nodes = {}
+
+    def _summarize(self, stmtnode):
+        stmt = stmtnode.stmt
+        if stmt is None:
+            # The entry and exit nodes:
+            return StmtSummary(True)
+        if isinstance(stmt, (gcc.GimpleDebug, gcc.GimpleLabel,
+                             gcc.GimplePredict, gcc.GimpleNop)):
+            return StmtSummary(len(stmtnode.succs) != 1)
+        def pinned():
+            return StmtSummary(True, usedvars=get_vars_in_stmt(stmt))
+        if isinstance(stmt, gcc.GimpleCond):
+            return StmtSummary(False,
+                               usedvars=get_vars_in_exprs([stmt.lhs,
+                                                           stmt.rhs]),
+                               is_cond=True)
+        if isinstance(stmt, gcc.GimpleAssign):
+            rhs = list(stmt.rhs)
+            lhsvar = get_var(stmt.lhs)
+            if (lhsvar not in self.localvars
+                or reads_memory(rhs)
+                or len(stmtnode.succs) != 1):
+                return pinned()
+            return StmtSummary(False,
+                               defvar=lhsvar,
+                               usedvars=get_vars_in_exprs(rhs))
+        if isinstance(stmt, gcc.GimpleCall):
+            if (self._call_is_pinned(stmt)
+                or len(stmtnode.succs) != 1):
+                return pinned()
+            usedvars = get_vars_in_exprs(stmt.args)
+            defvar = get_var(stmt.lhs)
+            return StmtSummary(False,
+                               defvar=defvar,
+                               usedvars=usedvars,
+                               anyvars=usedvars)
+        # Returns, switches, asm, and anything else:
+        return pinned()
+
+    def _call_is_pinned(self, stmt):
+        """
+        Could the gcc.GimpleCall affect the facets other than by what it
+        assigns to its LHS?
+        """
+        if stmt.noreturn:
+            return True
+        if stmt.lhs is not None and get_var(stmt.lhs) not in self.localvars:
+            return True
+        fndecl = getattr(stmt.fn, 'operand', None)
+        if not isinstance(fndecl, gcc.FunctionDecl):
+            # Calling through a function pointer:
+            return True
+        fnname = fndecl.name
+        methname = 'impl_%s' % fnname
+        for key in self.facets:
+            if hasattr(self.facets[key], methname):
+                return True
+        if (fnname in fnnames_returning_borrowed_refs
+            or fnname in fnnames_setting_exception
+            or fnname in fnnames_setting_exception_on_negative_result
+            or fnname in stolen_refs_by_fnname):
+            return True
+        if type_is_pyobjptr_subclass(fndecl.type.type):
+            return True
+        # Any pointer arguments must point at scalars, so that the callee
+        # can't write any pointers back through them:
+        for arg in stmt.args:
+            if isinstance(arg.type, gcc.PointerType):
+                if not isinstance(arg.type.dereference, SCALAR_TYPES):
+                    return True
+        return False
+
+    def _is_relevant(self, node):
+        """
+        Is the StmtNode relevant, given the current set of relevant variables
+        (and ignoring whether it's a condition that needs to be kept)?
+        """
+        summary = self._summaries[id(node)]
+        if summary.pinned:
+            return True
+        if summary.is_cond:
+            return bool(summary.usedvars & self.relevantvars)
+        if summary.defvar in self.relevantvars:
+            return True
+        return bool(summary.anyvars & self.relevantvars)
+
+    def _solve(self):
+        self._relevant = set()
+        while True:
+            relevant = set(id(node) for node in self.stmtgraph.nodes
+                           if self._is_relevant(node))
+            # Irrelevant conditions which don't lead to a unique relevant
+            # statement must be kept:
+            while True:
+                kept = set()
+                for node in self.stmtgraph.nodes:
+                    if id(node) in relevant:
+                        continue
+                    if self._summaries[id(node)].is_cond:
+                        if len(self._get_exits(node, relevant)) != 1:
+                            kept.add(id(node))
+                if not kept:
+                    break
+                relevant |= kept
+
+            # Everything that the relevant statements read is relevant:
+            relevantvars = set(self.relevantvars)
+            for key in relevant:
+                relevantvars |= self._summaries[key].usedvars
+            if relevant == self._relevant and relevantvars == self.relevantvars:
+                break
+            self._relevant = relevant
+            self.relevantvars = relevantvars
+
+        log('relevance slice of %s: %i of %i statements are relevant',
+            self.stmtgraph.fun.decl.name,
+            len(self._relevant), len(self._nodes))
+
+    def _get_exits(self, node, relevant):
+        """
+        Get the list of relevant StmtNodes reachable from the given irrelevant
+        one by paths through only irrelevant StmtNodes
+        """
+        exits = []
+        seen = set([id(node)])
+        worklist = [node]
+        while worklist:
+            for edge in worklist.pop().succs:
+                dstnode = edge.dstnode
+                if id(dstnode) in seen:
+                    continue
+                seen.add(id(dstnode))
+                if id(dstnode) in relevant:
+                    exits.append(dstnode)
+                else:
+                    worklist.append(dstnode)
+        return exits
+
+    def is_relevant(self, stmtnode):
+        return id(stmtnode) in self._relevant
+
+    def get_skip_target(self, stmtnode):
+        """
+        Get the StmtNode that a State at the given StmtNode should move to,
+        skipping the statement, or None if the statement is relevant and
+        must be interpreted
+        """
+        key = id(stmtnode)
+        if key in self._relevant:
+            return None
+        try:
+            return self._targets[key]
+        except KeyError:
+            exits = self._get_exits(stmtnode, self._relevant)
+            if len(exits) == 1:
+                target = exits[0]
+            else:
+                # A straight-line statement leading into code that branches
+                # to several relevant statements:
+                target = list(stmtnode.succs)[0].dstnode
+            self._targets[key] = target
+            return target
+
+    def get_skipped_nodes(self, stmtnode):
+        """
+        Get the list of StmtNodes skipped over when skipping the given
+        irrelevant one: itself, and those reachable from it by paths through
+        only irrelevant StmtNodes
+        """
+        key = id(stmtnode)
+        try:
+            return self._skipped_nodes[key]
+        except KeyError:
+            result = [stmtnode]
+            seen = set([key])
+            worklist = [stmtnode]
+            while worklist:
+                for edge in worklist.pop().succs:
+                    dstnode = edge.dstnode
+                    if id(dstnode) in seen or id(dstnode) in self._relevant:
+                        continue
+                    seen.add(id(dstnode))
+                    result.append(dstnode)
+                    worklist.append(dstnode)
+            self._skipped_nodes[key] = result
+            return result
+
+    def get_num_skipped(self):
+        return len(self._nodes) - len(self._relevant)
@@ -75,6 +75,62 @@ def get_Py_complex():
 def get_PyBytesObject():
     return get_global_typedef('PyBytesObject')
 
+def type_is_pyobjptr(t):
+    assert t is None or isinstance(t, gcc.Type)
+    if str(t) == 'struct PyObject *':
+        return True
+
+def type_is_pyobjptr_subclass(t):
+    assert t is None or isinstance(t, gcc.Type)
+    # It must be a pointer:
+    if not isinstance(t, gcc.PointerType):
+        return False
+
+    # ...to a struct:
+    if not isinstance(t.dereference, gcc.RecordType):
+        return False
+
+    # Obtain the fields of the struct/class
+    # For C++ "fields" will also contain a gcc.TypeDecl for the
+    # type itself, and for any nested types (e.g. typedefs), so filter them
+    # out.  This avoids an infinite recursion for classes with no data, where
+    # the initial decl of the type otherwise would make it appear that there's
+    # a nested copy of the struct inside itself.
+    fields = [field for field in t.dereference.fields
+              if isinstance(field, gcc.FieldDecl)]
+
+    if len(fields) == 0:
+        # Opaque struct: there's nothing we can do.
+        # Assume it's *not* a PyObject subclass:
+        return False
+
+    # if first field is a PyObject subclass, then we're good:
+    if type_is_pyobjptr_subclass(fields[0].type.pointer):
+        return True
+
+    fieldnames = [f.name for f in fields]
+
+    if is_py3k():
+        # For Python 3, the first field must be "ob_base", or it must be "PyObject":
+        if str(t) == 'struct PyObject *':
+            return True
+        if fieldnames[0] != 'ob_base':
+            return False
+    else:
+        # For Python 2, the first two fields must be "ob_refcnt" and "ob_type".
+        # (In a debug build, these are preceded by _ob_next and _ob_prev)
+        # FIXME: debug builds!
+        if is_debug_build():
+            if fieldnames[:4] != ['_ob_next', '_ob_prev',
+                                  'ob_refcnt', 'ob_type']:
+                return False
+        else:
+            if fieldnames[:2] != ['ob_refcnt', 'ob_type']:
+                return False
+
+    # Passed all tests:
+    return True
+
 # Map from name of PyTypeObject global to the typedef for the corresponding
 # object structure:
 type_dict = {
@@ -17,4 +17,5 @@
 #   <http://www.gnu.org/licenses/>.
 
 from libcpychecker import main
-main(verify_refcounting=True)
+main(verify_refcounting=True,
+     skip_non_python_functions=False)
@@ -0,0 +1,96 @@
+#   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2013 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that copies of a State share its facets until they're modified
+
+import gcc
+
+from libcpychecker.absinterp import make_entry_state
+from libcpychecker.refcounts import make_stmt_graph, CPython
+
+from gccutils.selftests import assertEqual
+
+def verify_sharing(fun):
+    stmtgraph = make_stmt_graph(fun)
+    s_parent = make_entry_state(stmtgraph, {'cpython': CPython})
+    f_parent = s_parent.cpython
+    assert f_parent.state is s_parent
+    assert not f_parent._shared
+
+    # Copying a State shares its facets, for both States:
+    s_child = s_parent.copy()
+    assert f_parent._shared
+    assert s_parent.cpython is f_parent
+    assert s_child.cpython is f_parent
+    assert f_parent.state is s_parent
+
+    # Reading from them doesn't copy them:
+    assert hasattr(s_child, 'cpython')
+    assert s_child.cpython.exception_rvalue.is_null_ptr()
+    assert s_child.cpython.has_gil
+    s_child.get_key()
+    assert s_child.cpython is f_parent
+
+    # A State gets its own copy of a facet in order to modify it:
+    f_child = s_child.writable_facet('cpython')
+    assert f_child is not f_parent
+    assert f_child.state is s_child
+    assert not f_child._shared
+    assert s_child.cpython is f_child
+    assert s_child.writable_facet('cpython') is f_child
+    f_child.set_exception('PyExc_MemoryError', fun.start)
+    f_child.has_gil = False
+    assert not f_child.exception_rvalue.is_null_ptr()
+
+    # ...leaving the other State's copy unchanged:
+    assert s_parent.cpython is f_parent
+    assert f_parent.has_gil
+    assert f_parent.exception_rvalue.is_null_ptr()
+
+    # (the original State must also copy a facet that it has shared, before
+    # modifying it):
+    f_parent2 = s_parent.writable_facet('cpython')
+    assert f_parent2 is not f_parent
+    assert f_parent2.state is s_parent
+
+    # A facet is shared again when its State is copied again:
+    s_grandchild = s_child.copy()
+    assert s_grandchild.cpython is f_child
+    assert f_child._shared
+    assert not s_grandchild.cpython.has_gil
+
+    # A method called via call_facet sees the State it was called for, even
+    # if the facet is shared with another State:
+    def get_regions(state):
+        return [r_obj
+                for r_obj, v_ob_refcnt
+                in state.call_facet('cpython', 'iter_python_refcounts')]
+    r_self, r_args = get_regions(s_child)
+    del s_grandchild.region_for_var[r_self]
+    assertEqual(get_regions(s_grandchild), [r_args])
+    assertEqual(get_regions(s_child), [r_self, r_args])
+    # ...without copying it:
+    assert s_grandchild.cpython is f_child
+    assert f_child.state is s_child
+
+def on_pass_execution(p, fun):
+    if p.name == '*warn_function_return':
+        if fun and fun.decl.name == 'test':
+            verify_sharing(fun)
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
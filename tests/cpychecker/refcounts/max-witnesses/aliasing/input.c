@@ -0,0 +1,48 @@
+/*
+   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+   Copyright 2013 Red Hat, Inc.
+
+   This is free software: you can redistribute it and/or modify it
+   under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful, but
+   WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+   General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see
+   <http://www.gnu.org/licenses/>.
+*/
+
+#include <Python.h>
+
+/*
+  Test of --max-witnesses with paths that reach the same statements with
+  different aliasing between the variables: on one path "a" and "b" are
+  the same object, on the other they're different objects
+*/
+
+PyObject *
+test(PyObject *self, PyObject *args)
+{
+    PyObject *a;
+    PyObject *b;
+    int flag;
+
+    if (!PyArg_ParseTuple(args, "i", &flag)) {
+        return NULL;
+    }
+
+    a = PyList_New(0);
+    if (flag) {
+        b = a;
+    } else {
+        b = PyList_New(0);
+    }
+
+    Py_DECREF(b); /* the line to check */
+    return a;
+}
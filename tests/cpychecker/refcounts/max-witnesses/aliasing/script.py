@@ -0,0 +1,94 @@
+#   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2013 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that --max-witnesses keeps the witnesses of each report for paths
+# that differ only in which variables alias which values, rather than
+# treating their States as the same
+
+import copy
+
+import gcc
+
+from libcpychecker.refcounts import impl_check_refcounts
+
+from gccutils.selftests import assertEqual, get_line
+
+MAX_WITNESSES = 2
+
+def get_classes(rep):
+    # Get a mapping from (line, message) to the list of reports with that
+    # location and message:
+    result = {}
+    for report in rep.reports:
+        result.setdefault((report.loc.line, report.msg), []).append(report)
+    return result
+
+def verify_key(state):
+    # States that share their values have the same key:
+    s1 = state.copy()
+    s2 = state.copy()
+    assertEqual(s1.get_key(), s2.get_key())
+
+    # but replacing a value with an equal-looking one (the same repr)
+    # gives a different key, since it's no longer aliased with anything
+    # else that holds the original:
+    region, value = list(s1.value_for_region.items())[-1]
+    s3 = state.copy()
+    s3.value_for_region[region] = copy.copy(value)
+    assertEqual(repr(s3.value_for_region[region]), repr(value))
+    assert s3.get_key() != s1.get_key()
+
+def on_pass_execution(p, fun):
+    if p.name == '*warn_function_return':
+        if fun and fun.decl.name == 'test':
+            all_reports = get_classes(impl_check_refcounts(fun))
+            rep = impl_check_refcounts(fun, max_witnesses=MAX_WITNESSES)
+            kept_reports = get_classes(rep)
+
+            # The same problems are found:
+            assertEqual(sorted(kept_reports.keys()),
+                        sorted(all_reports.keys()))
+
+            for reportclass in all_reports:
+                num_traces = len(all_reports[reportclass])
+                kept = kept_reports[reportclass]
+                assertEqual(len(kept), min(num_traces, MAX_WITNESSES))
+                # The counts of the traces that weren't kept are never more
+                # than the number that there really were:
+                first = kept[0]
+                assert (len(kept) + first.num_discarded_duplicates
+                        + first.num_pruned_duplicates) <= num_traces
+
+            # Both the path on which "b" is "a", and the one on which it's a
+            # different object, lead to a NULL dereference at the Py_DECREF,
+            # and both are kept as witnesses:
+            line = get_line(fun, 'the line to check')
+            classes = [reportclass for reportclass in all_reports
+                       if reportclass[0] == line]
+            assert classes
+            for reportclass in classes:
+                if len(all_reports[reportclass]) >= MAX_WITNESSES:
+                    break
+            else:
+                raise ValueError('no report at line %i with %i traces'
+                                 % (line, MAX_WITNESSES))
+
+            for report in rep.reports:
+                verify_key(report.trace.states[-1])
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
@@ -0,0 +1,138 @@
+#   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2013 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify the measuring of the cost of the refcount checker, and the writing
+# out of the measurements
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+
+import gcc
+
+from libcpychecker.metrics import FunctionMetrics, MetricsWriter, tracemalloc
+from libcpychecker.refcounts import check_refcounts
+
+from gccutils.selftests import assertEqual
+
+class BrokenBudget(object):
+    """
+    A Budget that fails, to simulate an error during the analysis
+    """
+    def make_limits(self, stmtgraph, facets):
+        raise ValueError('broken budget')
+
+def verify_metrics(fun):
+    # Memory isn't traced unless asked for:
+    metrics = FunctionMetrics(fun)
+    assert not metrics.trace_memory
+    rep = check_refcounts(fun, metrics=metrics)
+    assert not rep.got_warnings()
+
+    assertEqual(metrics.function, 'test')
+    assertEqual(metrics.file, fun.start.file)
+    assertEqual(metrics.line, fun.start.line)
+    assert metrics.transitions > 0
+    assert metrics.states > 0
+    assert metrics.complete_traces > 0
+    assertEqual(metrics.abandoned_traces, 0)
+    assert metrics.max_depth > 0
+    assertEqual(metrics.too_complicated, False)
+    assert metrics.cpu_time >= 0
+    assert metrics.wall_time >= 0
+    assertEqual(metrics.peak_memory, None)
+    return metrics
+
+def verify_stopped_on_error(fun):
+    # An error during the analysis mustn't leave the measurements running:
+    if tracemalloc is None or tracemalloc.is_tracing():
+        return
+    metrics = FunctionMetrics(fun, trace_memory=True)
+    try:
+        check_refcounts(fun, budget=BrokenBudget(), metrics=metrics)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('expected a ValueError')
+    assert not tracemalloc.is_tracing()
+    assert metrics.cpu_time is not None
+    assert metrics.peak_memory is not None
+
+def verify_existing_tracing(fun):
+    # If something else is already tracing memory allocations, it's left
+    # tracing, with its traces intact:
+    if tracemalloc is None or tracemalloc.is_tracing():
+        return
+    tracemalloc.start()
+    try:
+        data = bytearray(1000)
+        assert tracemalloc.get_object_traceback(data) is not None
+        metrics = FunctionMetrics(fun, trace_memory=True)
+        check_refcounts(fun, metrics=metrics)
+        assert tracemalloc.is_tracing()
+        assert tracemalloc.get_object_traceback(data) is not None
+        if hasattr(tracemalloc, 'reset_peak'):
+            assert metrics.peak_memory is not None
+        else:
+            assertEqual(metrics.peak_memory, None)
+    finally:
+        tracemalloc.stop()
+
+def verify_writing(metrics):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        # Rows appended by separate writers (as by separate invocations of
+        # the compiler) share the one file, with a single header:
+        filename = os.path.join(tmpdir, 'metrics.csv')
+        MetricsWriter(filename).write(metrics)
+        MetricsWriter(filename).write(metrics)
+        with open(filename) as f:
+            rows = list(csv.reader(f))
+        assertEqual(len(rows), 3)
+        assertEqual(tuple(rows[0]), FunctionMetrics.FIELDS)
+        for row in rows[1:]:
+            d = dict(zip(rows[0], row))
+            assertEqual(d['function'], 'test')
+            assertEqual(int(d['transitions']), metrics.transitions)
+        # (with no temporary files left behind):
+        assertEqual(os.listdir(tmpdir), ['metrics.csv'])
+
+        filename = os.path.join(tmpdir, 'metrics.jsonl')
+        MetricsWriter(filename).write(metrics)
+        MetricsWriter(filename).write(metrics)
+        with open(filename) as f:
+            rows = [json.loads(line) for line in f]
+        assertEqual(len(rows), 2)
+        for row in rows:
+            assertEqual(sorted(row.keys()), sorted(FunctionMetrics.FIELDS))
+            assertEqual(row['function'], 'test')
+            assertEqual(row['states'], metrics.states)
+    finally:
+        shutil.rmtree(tmpdir)
+
+def on_pass_execution(p, fun):
+    if p.name == '*warn_function_return':
+        if fun and fun.decl.name == 'test':
+            metrics = verify_metrics(fun)
+            verify_stopped_on_error(fun)
+            verify_existing_tracing(fun)
+            verify_writing(metrics)
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
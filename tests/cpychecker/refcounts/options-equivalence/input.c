@@ -0,0 +1,119 @@
+/*
+   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+   Copyright 2013 Red Hat, Inc.
+
+   This is free software: you can redistribute it and/or modify it
+   under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful, but
+   WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+   General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see
+   <http://www.gnu.org/licenses/>.
+*/
+
+/*
+  Some of the existing testcases, for checking that the options that speed
+  up the refcount checker don't change what it finds.  They're renamed as
+  necessary, so that they can all be built together.
+*/
+
+#define test test_PyDict_SetItem_incorrect
+#define test_methods test_methods_PyDict_SetItem_incorrect
+#include "../PyDict_SetItem/incorrect/input.c"
+#undef test
+#undef test_methods
+
+#define test test_PyList_Append_incorrect_loop
+#include "../PyList_Append/incorrect-loop/input.c"
+#undef test
+
+#define test_methods test_methods_PyTuple_SetItem_incorrect_multiple
+#include "../PyTuple_SetItem/incorrect_multiple/input.c"
+#undef test_methods
+
+#define test test_loops_complex_loop_conditional_1
+#include "../loops/complex-loop-conditional-1/input.c"
+#undef test
+
+#define test test_macros_Py_XDECREF_crash
+#include "../macros/Py_XDECREF/crash/input.c"
+#undef test
+
+#define test_methods test_methods_missing_decref
+#include "../missing_decref/input.c"
+#undef test_methods
+
+#define test test_multiple_returns
+#include "../multiple-returns/input.c"
+#undef test
+
+#include "../passing_dead_object/input.c"
+
+#define test_methods test_methods_returning_dead_object
+#include "../returning_dead_object/input.c"
+#undef test_methods
+
+#define test_methods test_methods_use_after_dealloc
+#include "../use_after_dealloc/input.c"
+#undef test_methods
+
+#define test_methods test_methods_loop_n_times
+#include "../loop_n_times/input.c"
+#undef test_methods
+
+#define test_methods test_methods_correct_decref
+#include "../correct_decref/input.c"
+#undef test_methods
+
+/*
+  A condition that doesn't involve a PyObject*, but which guards a
+  Py_DECREF, so that it must not be skipped, following a loop which can be
+*/
+extern int get_count(void);
+extern void log_total(int total);
+
+PyObject *
+test_cond_guarding_decref(PyObject *self, PyObject *args)
+{
+    PyObject *list;
+    int n;
+    int count;
+    int i;
+    int total = 0;
+
+    if (!PyArg_ParseTuple(args, "i", &n)) {
+        return NULL;
+    }
+
+    list = PyList_New(0);
+    if (!list) {
+        return NULL;
+    }
+
+    count = get_count();
+    for (i = 0; i < count; i++) {
+        total += i;
+    }
+    log_total(total);
+
+    if (n > 100) { /* the condition to check */
+        /* Bug: the list is returned after being deallocated: */
+        Py_DECREF(list);
+    }
+
+    return list;
+}
+
+/*
+  PEP-7
+Local variables:
+c-basic-offset: 4
+indent-tabs-mode: nil
+End:
+*/
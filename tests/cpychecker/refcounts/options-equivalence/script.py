@@ -0,0 +1,95 @@
+#   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2013 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that the options that speed up the refcount checker don't change
+# the problems that it reports, or how it describes the paths to them, for
+# each of the testcases within input.c
+
+import gcc
+
+from libcpychecker.refcounts import impl_check_refcounts, make_stmt_graph, \
+    CPython
+from libcpychecker.relevance import RelevanceSlice
+
+from gccutils.selftests import assertEqual, get_loc_key, get_line, \
+    describe_reports, describe_report_steps
+
+def check(fun, **kwargs):
+    """
+    Run the checker on the function, with the given options
+    """
+    rep = impl_check_refcounts(fun, **kwargs)
+    rep.remove_duplicates()
+    return rep
+
+def verify_slicing(fun):
+    stmtgraph = make_stmt_graph(fun)
+    relevance = RelevanceSlice(stmtgraph, {'cpython': CPython})
+
+    # The skipped statements aren't described within the traces when
+    # slicing, so ignore anything at their locations (unless a relevant
+    # statement shares the location):
+    skipped_locs = set()
+    relevant_locs = set()
+    for node in stmtgraph.nodes:
+        loc = get_loc_key(node.get_gcc_loc())
+        if relevance.is_relevant(node):
+            relevant_locs.add(loc)
+        else:
+            skipped_locs.add(loc)
+    skipped_locs -= relevant_locs
+
+    assertEqual(describe_reports(check(fun, slice_irrelevant_code=True),
+                                 skipped_locs),
+                describe_reports(check(fun), skipped_locs))
+
+    if fun.decl.name == 'test_cond_guarding_decref':
+        # The loop should be skipped, but not the condition guarding the
+        # Py_DECREF:
+        assert relevance.get_num_skipped() > 0
+        line = get_line(fun, 'the condition to check')
+        conds = [node for node in stmtgraph.nodes
+                 if isinstance(node.stmt, gcc.GimpleCond)
+                 and node.stmt.loc.line == line]
+        assert conds
+        for node in conds:
+            assert relevance.is_relevant(node)
+
+        # ...and the bug that it leads to should be found, along the path
+        # through it:
+        reports = describe_reports(check(fun, slice_irrelevant_code=True))
+        assert [report for report in reports
+                if [d for d in report[2] if d[1][1] == line]]
+
+def verify_fusion(fun):
+    # Interpreting straight-line code as single transitions should make no
+    # difference at all to what's reported:
+    fused = check(fun, fuse_straight_line=True)
+    unfused = check(fun)
+    assertEqual(describe_reports(fused), describe_reports(unfused))
+    assertEqual(describe_report_steps(fused, fun),
+                describe_report_steps(unfused, fun))
+
+def on_pass_execution(p, fun):
+    if p.name == '*warn_function_return':
+        # (ignoring any inline functions from the Python headers):
+        if fun and not fun.start.file.endswith('.h'):
+            verify_slicing(fun)
+            verify_fusion(fun)
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
@@ -0,0 +1,89 @@
+/*
+   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+   Copyright 2013 Red Hat, Inc.
+
+   This is free software: you can redistribute it and/or modify it
+   under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful, but
+   WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+   General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see
+   <http://www.gnu.org/licenses/>.
+*/
+
+#include <Python.h>
+
+/*
+  Test of --prioritize-coverage: a function with many paths, most of which
+  only differ near their ends, and with some code that can be skipped by
+  --slice-irrelevant-code
+*/
+
+extern void log_total(int total);
+
+PyObject *
+test(PyObject *self, PyObject *args)
+{
+    PyObject *list;
+    int flags;
+    int total = 0;
+
+    if (!PyArg_ParseTuple(args, "i", &flags)) {
+        return NULL;
+    }
+
+    /* Irrelevant to the refcounts: */
+    if (flags & 256) {
+        total = 1;
+    }
+    log_total(total);
+
+    list = PyList_New(0);
+    if (!list) {
+        return NULL;
+    }
+
+    if (flags & 1) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    if (flags & 2) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    if (flags & 4) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    if (flags & 8) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    return list;
+
+ error:
+    Py_DECREF(list);
+    return NULL;
+}
+
+/*
+  PEP-7
+Local variables:
+c-basic-offset: 4
+indent-tabs-mode: nil
+End:
+*/
@@ -0,0 +1,105 @@
+#   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2013 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify the ordering of iter_traces with prioritize=True, and the coverage
+# that it reports
+
+import re
+
+import gcc
+
+from libcpychecker.absinterp import iter_traces, Limits, Coverage, \
+    TooComplicated
+from libcpychecker.refcounts import make_stmt_graph, CPython
+from libcpychecker.relevance import RelevanceSlice
+
+from gccutils.selftests import assertEqual
+
+def get_coverage(fun, maxtrans, prioritize, slice_irrelevant_code=False):
+    """
+    Run iter_traces on the function, returning a (Coverage, Limits, bool)
+    triple, where the bool is True if all paths were analyzed
+    """
+    stmtgraph = make_stmt_graph(fun)
+    facets = {'cpython': CPython}
+    relevance = None
+    if slice_irrelevant_code:
+        relevance = RelevanceSlice(stmtgraph, facets)
+        assert relevance.get_num_skipped() > 0
+    coverage = Coverage(stmtgraph, relevance)
+    limits = Limits(maxtrans=maxtrans)
+    try:
+        iter_traces(stmtgraph, facets,
+                    limits=limits,
+                    relevance=relevance,
+                    coverage=coverage,
+                    prioritize=prioritize)
+    except TooComplicated:
+        return coverage, limits, False
+    return coverage, limits, True
+
+def verify_coverage(fun):
+    # Analyze every path:
+    full, limits, complete = get_coverage(fun, 100000, False)
+    assert complete
+    num_covered = full.get_num_stmts_covered()
+    assert num_covered > full.get_num_stmts() // 2
+
+    # Doing it in order of coverage reaches the same statements:
+    prioritized, limits, complete = get_coverage(fun, 100000, True)
+    assert complete
+    assertEqual(prioritized.get_num_stmts_covered(), num_covered)
+
+    # The statements skipped when slicing still count as covered:
+    sliced, limits, complete = get_coverage(fun, 100000, True,
+                                            slice_irrelevant_code=True)
+    assert complete
+    assert sliced.get_num_stmts_covered() >= num_covered
+
+    # Find how many transitions are needed for the prioritized traversal to
+    # reach all of that, which should be far fewer than are needed to
+    # analyze every path:
+    maxtrans = 16
+    while True:
+        prioritized, limits, complete = get_coverage(fun, maxtrans, True)
+        if prioritized.get_num_stmts_covered() == num_covered:
+            break
+        maxtrans *= 2
+    assert not complete
+
+    # ...whereas the depth-first traversal doesn't reach it all with that
+    # many:
+    dfs, limits, complete = get_coverage(fun, maxtrans, False)
+    assert not complete
+    assert dfs.get_num_stmts_covered() < num_covered
+
+    # Verify the report of the coverage:
+    m = re.match(r'^([0-9]+) of ([0-9]+) statements \(([0-9]+)%\)$',
+                 str(dfs))
+    assert m
+    assertEqual(int(m.group(1)), dfs.get_num_stmts_covered())
+    assertEqual(int(m.group(2)), dfs.get_num_stmts())
+    assertEqual(int(m.group(3)),
+                100 * dfs.get_num_stmts_covered() // dfs.get_num_stmts())
+
+def on_pass_execution(p, fun):
+    if p.name == '*warn_function_return':
+        if fun and fun.decl.name == 'test':
+            verify_coverage(fun)
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
@@ -0,0 +1,113 @@
+/*
+   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+   Copyright 2013 Red Hat, Inc.
+
+   This is free software: you can redistribute it and/or modify it
+   under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful, but
+   WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+   General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see
+   <http://www.gnu.org/licenses/>.
+*/
+
+#include <Python.h>
+
+/*
+  Testcases in which the checker splits the analysis on whether a pointer
+  that it knows nothing about is NULL, for checking that splitting within
+  the handlers of the statements finds the same things (and describes them
+  the same way) as splitting by raising a SplitValue.  Some of the existing
+  testcases are included, renamed as necessary so that they can all be
+  built together.
+*/
+
+#define test test_macros_Py_XDECREF_crash
+#include "../macros/Py_XDECREF/crash/input.c"
+#undef test
+
+#include "../passing_dead_object/input.c"
+
+#define test_methods test_methods_use_after_dealloc
+#include "../use_after_dealloc/input.c"
+#undef test_methods
+
+struct coord {
+    int x;
+    int y;
+};
+
+extern struct coord *coord_ptr;
+
+/* Comparing an unknown pointer against NULL: */
+int
+test_cond(struct coord *p)
+{
+    if (p == NULL) {
+        return -1;
+    }
+    return 0;
+}
+
+/* Reading through an unknown pointer: */
+int
+test_read_through_arg(struct coord *p)
+{
+    return p->y;
+}
+
+/* Writing through an unknown pointer: */
+void
+test_write_through_arg(struct coord *p, int x)
+{
+    p->x = x;
+}
+
+/* Writing through a global pointer, copied into a local: */
+void
+test_write_through_global(int x)
+{
+    struct coord *p = coord_ptr;
+    p->x = x;
+}
+
+/* Copying between two unknown pointers: */
+void
+test_copy_between_args(struct coord *dst, const struct coord *src)
+{
+    dst->y = src->x;
+}
+
+/* Both kinds of split, and a reference to an object of unknown origin: */
+PyObject *
+test_incref_arg(PyObject *self, PyObject *obj)
+{
+    if (!obj) {
+        return NULL;
+    }
+    Py_INCREF(obj);
+    return obj;
+}
+
+/* A bug found along only one side of a split: */
+PyObject *
+test_leak_after_read(PyObject *self, struct coord *p)
+{
+    PyObject *result = PyLong_FromLong(p->x);
+    /* Bug: "result" is leaked, if non-NULL: */
+    Py_RETURN_NONE;
+}
+
+/*
+  PEP-7
+Local variables:
+c-basic-offset: 4
+indent-tabs-mode: nil
+End:
+*/
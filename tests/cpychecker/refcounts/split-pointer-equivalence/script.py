@@ -0,0 +1,130 @@
+#   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2013 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that splitting on unknown pointers within the handlers of the
+# statements (State.split_pointer) gives the same traces, and reports, as
+# splitting by raising a SplitValue, for each of the testcases within
+# input.c
+
+import re
+
+import gcc
+
+from libcpychecker import absinterp
+from libcpychecker.absinterp import State, iter_traces
+from libcpychecker.refcounts import impl_check_refcounts, make_stmt_graph, \
+    CPython
+
+from gccutils.selftests import assertEqual, get_loc_key, describe_reports, \
+    describe_report_steps
+
+# The testcases that split on an unknown pointer:
+SPLITTING = ('test_cond', 'test_read_through_arg', 'test_write_through_arg',
+             'test_write_through_global', 'test_copy_between_args',
+             'test_incref_arg', 'test_leak_after_read')
+
+class SplittingBySplitValue(object):
+    """
+    Context manager within which the handlers don't split on unknown
+    pointers themselves, leaving it to SplitValue
+    """
+    def __enter__(self):
+        self.orig_get_dereferenced_local = absinterp.get_dereferenced_local
+        self.orig_eval_condition = State.eval_condition
+        orig_eval_condition = self.orig_eval_condition
+
+        def eval_condition(self, cstmt, expr_lhs, exprcode, expr_rhs,
+                           splits=None):
+            return orig_eval_condition(self, cstmt, expr_lhs, exprcode,
+                                       expr_rhs)
+        absinterp.get_dereferenced_local = lambda region_for_var, expr: None
+        State.eval_condition = eval_condition
+
+    def __exit__(self, exc_type, exc_value, tb):
+        absinterp.get_dereferenced_local = self.orig_get_dereferenced_local
+        State.eval_condition = self.orig_eval_condition
+
+class CountingSplits(object):
+    """
+    Context manager counting the calls to State.split_pointer
+    """
+    def __enter__(self):
+        self.count = 0
+        self.orig_split_pointer = State.split_pointer
+        orig_split_pointer = self.orig_split_pointer
+        counter = self
+
+        def split_pointer(self, *args, **kwargs):
+            counter.count += 1
+            return orig_split_pointer(self, *args, **kwargs)
+        State.split_pointer = split_pointer
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        State.split_pointer = self.orig_split_pointer
+
+def normalize(text):
+    # The names of the regions created by splits are numbered globally:
+    return re.sub(r'heap-region-[0-9]+', 'heap-region-N', str(text))
+
+def describe_traces(fun):
+    """
+    Get the location and description of each transition of each trace of
+    the function
+    """
+    stmtgraph = make_stmt_graph(fun)
+    traces = iter_traces(stmtgraph, {'cpython': CPython})
+    return [[(get_loc_key(trans.src.get_gcc_loc_or_none()),
+              normalize(trans.desc))
+             for trans in trace.transitions]
+            for trace in traces]
+
+def describe_problems(fun):
+    """
+    Describe the reports for the function, and the steps of the path to
+    each one, as shown in the HTML report
+    """
+    rep = impl_check_refcounts(fun)
+    rep.remove_duplicates()
+    return (describe_reports(rep, normalize=normalize),
+            describe_report_steps(rep, fun, normalize=normalize))
+
+def verify_splitting(fun):
+    with CountingSplits() as counter:
+        traces = describe_traces(fun)
+        problems = describe_problems(fun)
+    with SplittingBySplitValue():
+        with CountingSplits() as legacy_counter:
+            assertEqual(describe_traces(fun), traces)
+            assertEqual(describe_problems(fun), problems)
+
+    assertEqual(legacy_counter.count, 0)
+    if fun.decl.name in SPLITTING:
+        # (the split is handled directly):
+        assert counter.count > 0
+    if fun.decl.name == 'test_leak_after_read':
+        reports, steps = problems
+        assert reports
+
+def on_pass_execution(p, fun):
+    if p.name == '*warn_function_return':
+        # (ignoring any inline functions from the Python headers):
+        if fun and not fun.start.file.endswith('.h'):
+            verify_splitting(fun)
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
@@ -0,0 +1,156 @@
+/*
+   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+   Copyright 2013 Red Hat, Inc.
+
+   This is free software: you can redistribute it and/or modify it
+   under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful, but
+   WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+   General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see
+   <http://www.gnu.org/licenses/>.
+*/
+
+#include <Python.h>
+
+/*
+  Test of sharing a budget of transitions between the functions of a
+  translation unit (--tu-budget): two functions with too many paths to
+  analyze within it, and a simple one
+*/
+
+PyObject *
+first_big(PyObject *self, PyObject *args)
+{
+    PyObject *list;
+    int flags;
+
+    if (!PyArg_ParseTuple(args, "i", &flags)) {
+        return NULL;
+    }
+
+    list = PyList_New(0);
+    if (!list) {
+        return NULL;
+    }
+
+    if (flags & 1) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    if (flags & 2) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    if (flags & 4) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    if (flags & 8) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    if (flags & 16) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    if (flags & 32) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    return list;
+
+ error:
+    Py_DECREF(list);
+    return NULL;
+}
+
+PyObject *
+second_big(PyObject *self, PyObject *args)
+{
+    PyObject *list;
+    int flags;
+
+    if (!PyArg_ParseTuple(args, "i", &flags)) {
+        return NULL;
+    }
+
+    list = PyList_New(0);
+    if (!list) {
+        return NULL;
+    }
+
+    if (flags & 1) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    if (flags & 2) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    if (flags & 4) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    if (flags & 8) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    if (flags & 16) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    if (flags & 32) {
+        if (PyList_Append(list, Py_None) < 0) {
+            goto error;
+        }
+    }
+
+    return list;
+
+ error:
+    Py_DECREF(list);
+    return NULL;
+}
+
+PyObject *
+small(PyObject *self, PyObject *args)
+{
+    return PyList_New(0);
+}
+
+/*
+  PEP-7
+Local variables:
+c-basic-offset: 4
+indent-tabs-mode: nil
+End:
+*/
@@ -0,0 +1,103 @@
+#   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2013 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify the sharing of an absinterp.Budget of transitions between the
+# functions within a translation unit
+
+import gcc
+
+from libcpychecker.absinterp import Budget, iter_traces, TooComplicated
+from libcpychecker.refcounts import impl_check_refcounts, make_stmt_graph, \
+    CPython
+
+from gccutils.selftests import assertEqual
+
+MINIMUM = 32
+
+# The functions, in the order in which to analyze them:
+NAMES = ('first_big', 'second_big', 'small')
+
+def analyze(fun, budget):
+    """
+    Run iter_traces on the function with a Limits from the Budget, charging
+    the Budget for it, and returning a (Limits, bool) pair, where the bool is
+    True if all paths were analyzed
+    """
+    stmtgraph = make_stmt_graph(fun)
+    facets = {'cpython': CPython}
+    limits = budget.make_limits(stmtgraph, facets)
+    try:
+        iter_traces(stmtgraph, facets, limits=limits)
+        complete = True
+    except TooComplicated:
+        complete = False
+    budget.charge(limits)
+    return limits, complete
+
+def verify_sharing(funs):
+    total = 20 * MINIMUM
+    budget = Budget(total, minimum=MINIMUM, num_functions=len(NAMES))
+    used = 0
+    results = {}
+    for name in NAMES:
+        available = budget.get_remaining() - budget.get_reserved()
+        limits, complete = analyze(funs[name], budget)
+        # Every function gets at least the minimum, but can't use what's
+        # reserved for the functions after it:
+        assert limits.maxtrans >= MINIMUM
+        assert limits.maxtrans <= max(available // 2, MINIMUM)
+        # Each function is charged for what it used, from the same total:
+        used += min(limits.trans_seen, limits.maxtrans)
+        assertEqual(budget.used, used)
+        assertEqual(budget.get_remaining(), max(total - used, 0))
+        results[name] = (limits, complete)
+
+    assert not results['first_big'][1]
+    assert not results['second_big'][1]
+    assert results['small'][1]
+
+    # The first complicated function didn't starve the second:
+    assert results['second_big'][0].maxtrans > MINIMUM
+
+def verify_exhaustion(funs):
+    # Once the total has been used up, each function just gets the minimum:
+    budget = Budget(0, minimum=MINIMUM, num_functions=len(NAMES))
+    for name in NAMES:
+        limits, complete = analyze(funs[name], budget)
+        assertEqual(limits.maxtrans, MINIMUM)
+    assertEqual(budget.get_remaining(), 0)
+    assert budget.used >= 2 * MINIMUM
+
+def on_pass_execution(p, fun):
+    if p.name == '*warn_function_return':
+        # Verify the note given when a function's allowance runs out (see
+        # stderr.txt):
+        if fun and fun.decl.name == 'first_big':
+            impl_check_refcounts(fun, budget=Budget(0, minimum=MINIMUM))
+
+    if p.name == '*free_lang_data':
+        funs = {}
+        for node in gcc.get_callgraph_nodes():
+            fun = node.decl.function
+            if fun and fun.decl.name in NAMES:
+                funs[fun.decl.name] = fun
+        assertEqual(sorted(funs.keys()), sorted(NAMES))
+        verify_sharing(funs)
+        verify_exhaustion(funs)
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2013 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that the callgraph SCC code in gccutils works
+import gcc
+
+def on_pass_execution(p, fn):
+    if p.name == '*free_lang_data':
+        from gccutils import get_callgraph_sccs
+
+        sccs = get_callgraph_sccs()
+        index = {}
+        names = {}
+        for i, scc in enumerate(sccs):
+            for cgn in scc:
+                index[cgn.decl.name] = i
+            names[i] = set(cgn.decl.name for cgn in scc)
+
+        # f and g are mutually recursive:
+        assert index['f'] == index['g']
+        assert names[index['f']] == set(['f', 'g'])
+
+        # e is directly recursive, but alone in its SCC:
+        assert names[index['e']] == set(['e'])
+
+        # Bottom-up: callees before callers:
+        assert index['e'] < index['a']
+        assert index['c'] < index['a']
+
+        assert index['a'] < index['d']
+        assert index['b'] < index['d']
+        assert index['c'] < index['d']
+
+        assert index['c'] < index['g']
+        assert index['b'] < index['f']
+
+        assert index['f'] < index['j']
+
+        # Batches:
+        batches = get_callgraph_sccs(batches=True)
+        batch_index = {}
+        for i, batch in enumerate(batches):
+            for scc in batch:
+                for cgn in scc:
+                    batch_index[cgn.decl.name] = i
+        # Leaf functions come first:
+        assert batch_index['b'] == 0
+        assert batch_index['c'] == 0
+        assert batch_index['h'] == 0
+        # (e only calls itself):
+        assert batch_index['e'] == 0
+        assert batch_index['a'] == 1
+        assert batch_index['d'] == 2
+        assert batch_index['f'] == batch_index['g']
+        assert batch_index['f'] < batch_index['j']
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
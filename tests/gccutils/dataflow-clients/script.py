@@ -0,0 +1,69 @@
+#   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2013 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that the reference clients of gccutils.graph.dataflow work
+import gcc
+
+from gccutils.graph.stmtgraph import StmtGraph
+from gccutils.graph.dataflow import LiveVariables, ReachingDefinitions, \
+    ConstantPropagation, get_defined_var
+
+def get_names(vars_):
+    return set(var.name for var in vars_ if isinstance(var, gcc.VarDecl))
+
+def on_pass_execution(p, fn):
+    if p.name == '*warn_function_return':
+        stmtg = StmtGraph(fn, split_phi_nodes=False)
+        returnnode = [node for node in stmtg.nodes
+                      if isinstance(node.stmt, gcc.GimpleReturn)][0]
+        defs_of_c = [node for node in stmtg.nodes
+                     if getattr(get_defined_var(node), 'name', None) == 'c']
+        assert len(defs_of_c) == 2
+
+        # Liveness:
+        lv = LiveVariables(stmtg)
+        result = lv.solve()
+        live_at_entry = lv.get_live_vars_after(result, stmtg.entry)
+        assert 'i' in [var.name for var in live_at_entry]
+        live_at_entry = get_names(live_at_entry)
+        assert 'a' not in live_at_entry
+        assert 'unused' not in live_at_entry
+        for node in defs_of_c:
+            assert 'c' in get_names(lv.get_live_vars_after(result, node))
+            assert 'c' not in get_names(lv.get_live_vars_before(result, node))
+
+        # Reaching definitions:
+        rd = ReachingDefinitions(stmtg)
+        result = rd.solve()
+        reaching = rd.get_defs_reaching(result, returnnode)
+        for node in defs_of_c:
+            assert node in reaching
+
+        # Constant propagation:
+        cp = ConstantPropagation(stmtg)
+        result = cp.solve()
+        constants = dict((var.name, value)
+                         for var, value
+                         in cp.get_constants_before(result, returnnode).items()
+                         if isinstance(var, gcc.VarDecl))
+        assert constants['a'] == 3
+        assert constants['b'] == 7
+        assert constants['c'] == 14
+        assert constants['unused'] == 42
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
@@ -0,0 +1,49 @@
+/*
+   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+   Copyright 2013 Red Hat, Inc.
+
+   This is free software: you can redistribute it and/or modify it
+   under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful, but
+   WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+   General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see
+   <http://www.gnu.org/licenses/>.
+*/
+
+/*
+   Exercise gccutils.graph.dataflow on a Supergraph, propagating values
+   into and out of the functions that are called
+*/
+
+/* Only ever called with constant arguments: */
+static int add(int a, int b)
+{
+    int sum = a + b;
+    return sum;
+}
+
+/* Called with different arguments from different places: */
+static int twice(int x)
+{
+    return x * 2;
+}
+
+int test(void)
+{
+    int p = 7;
+    int q;
+    int r;
+    int s;
+
+    q = add(p, 3);
+    r = twice(q);
+    s = twice(5);
+    return q + r + s;
+}
@@ -0,0 +1,103 @@
+#   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2013 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that the reference clients of gccutils.graph.dataflow propagate
+# values across the calls and returns within a Supergraph
+import gcc
+
+from gccutils.graph.supergraph import Supergraph
+from gccutils.graph.dataflow import ConstantPropagation, ReachingDefinitions, \
+    NAC, get_defined_var
+
+class RecordingConstantPropagation(ConstantPropagation):
+    """
+    ConstantPropagation, recording the values passing along the edges into
+    and out of the callees
+    """
+    def __init__(self, graph):
+        ConstantPropagation.__init__(self, graph)
+        self.calls = []
+        self.returns = []
+
+    def transfer_call(self, edge, value):
+        result = ConstantPropagation.transfer_call(self, edge, value)
+        self.calls.append((edge.dstnode.function.decl.name, result))
+        return result
+
+    def transfer_return(self, edge, value):
+        result = ConstantPropagation.transfer_return(self, edge, value)
+        self.returns.append((edge.srcnode.function.decl.name, result))
+        return result
+
+def get_names(values):
+    return dict((var.name, value)
+                for var, value in values.items()
+                if isinstance(var, (gcc.VarDecl, gcc.ParmDecl)))
+
+def get_return_node(sg, name):
+    nodes = [node for node in sg.nodes
+             if node.function and node.function.decl.name == name
+             and isinstance(node.stmt, gcc.GimpleReturn)]
+    assert len(nodes) == 1
+    return nodes[0]
+
+def on_pass_execution(p, fn):
+    if p.name == '*free_lang_data':
+        sg = Supergraph(split_phi_nodes=False,
+                        add_fake_entry_node=True)
+
+        # Constant propagation:
+        cp = RecordingConstantPropagation(sg)
+        result = cp.solve()
+
+        # The arguments are bound to the parameters of the callees:
+        assert 'add' in [name for name, value in cp.calls]
+        assert 'twice' in [name for name, value in cp.calls]
+        constants = get_names(
+            cp.get_constants_before(result, get_return_node(sg, 'add')))
+        assert constants['a'] == 7
+        assert constants['b'] == 3
+        assert constants['sum'] == 10
+
+        # ...with the arguments from different callsites being merged:
+        values = get_names(result.get_before(get_return_node(sg, 'twice')))
+        assert values['x'] is NAC
+
+        # The return values are bound to the LHS of each call:
+        returned = [value for name, value in cp.returns if name == 'add']
+        assert [value for value in returned if 10 in value.values()]
+        constants = get_names(
+            cp.get_constants_before(result, get_return_node(sg, 'test')))
+        assert constants['p'] == 7
+        assert constants['q'] == 10
+        assert 'r' not in constants
+        assert 's' not in constants
+
+        # Reaching definitions: the definitions within the caller don't
+        # reach into the callees, but do reach past the calls:
+        rd = ReachingDefinitions(sg)
+        result = rd.solve()
+        defs_of_p = [node for node in sg.nodes
+                     if getattr(get_defined_var(node), 'name', None) == 'p']
+        assert len(defs_of_p) == 1
+        assert defs_of_p[0] not in \
+            rd.get_defs_reaching(result, get_return_node(sg, 'add'))
+        assert defs_of_p[0] in \
+            rd.get_defs_reaching(result, get_return_node(sg, 'test'))
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
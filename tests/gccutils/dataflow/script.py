@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2013 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Note: the line diagrams in the comments use the
+# Unicode "Box Drawing" characters (see tests/gccutils/graph/script.py)
+
+import unittest
+
+from gccutils.graph import Graph, Node
+from gccutils.graph.dataflow import BitVectorDomain, BitVectorLattice, \
+    GenKillProblem, FORWARD, BACKWARD, get_reverse_postorder
+
+class NamedNode(Node):
+    def __init__(self, name):
+        Node.__init__(self)
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return '%r' % self.name
+
+def make_graph(names, edges):
+    g = Graph()
+    nodes = {}
+    for name in names:
+        nodes[name] = g.add_node(NamedNode(name))
+    for src, dst in edges:
+        g.add_edge(nodes[src], nodes[dst])
+    return g, nodes
+
+def make_diamond_with_loop():
+    """
+    Construct:
+       a ─> b ─┬─> c ─┬─> e ─> f
+               └─> d ─┘   │
+               A          │
+               └──────────┘
+    """
+    return make_graph('abcdef',
+                      ['ab', 'bc', 'bd', 'ce', 'de', 'ef', 'eb'])
+
+class NamesSeen(GenKillProblem):
+    """
+    Which node names have we seen along some path (or all paths, if
+    may=False)?
+    Nodes whose name is in "killers" clear the set.
+    """
+    def __init__(self, graph, direction=FORWARD, may=True, killers=''):
+        GenKillProblem.__init__(self, graph, may)
+        self.direction = direction
+        self.killers = killers
+
+    def get_gen(self, node):
+        return self.domain.get_bit(node.name)
+
+    def get_kill(self, node):
+        if node.name in self.killers:
+            return -1
+        return 0
+
+    def names_before(self, result, name, nodes):
+        return ''.join(sorted(self.domain.to_set(result.get_before(nodes[name]))))
+
+    def names_after(self, result, name, nodes):
+        return ''.join(sorted(self.domain.to_set(result.get_after(nodes[name]))))
+
+class BitVectorTests(unittest.TestCase):
+    def test_domain(self):
+        domain = BitVectorDomain(['x', 'y'])
+        self.assertEqual(domain.get_bit('x'), 1)
+        self.assertEqual(domain.get_bit('y'), 2)
+        self.assertEqual(domain.get_bits(['x', 'z']), 5)
+        self.assertEqual(len(domain), 3)
+        self.assertEqual(domain.to_set(6), set(['y', 'z']))
+        # The universal set:
+        self.assertEqual(domain.to_set(-1), set(['x', 'y', 'z']))
+
+    def test_lattice(self):
+        may = BitVectorLattice(may=True)
+        self.assertEqual(may.initial(), 0)
+        self.assertEqual(may.join(3, 5), 7)
+        must = BitVectorLattice(may=False)
+        self.assertEqual(must.join(must.initial(), 5), 5)
+        self.assertEqual(must.join(3, 5), 1)
+
+class OrderingTests(unittest.TestCase):
+    def test_reverse_postorder(self):
+        g, nodes = make_diamond_with_loop()
+        order = ''.join(node.name
+                        for node in get_reverse_postorder(g.nodes,
+                                                          [nodes['a']]))
+        self.assertEqual(order[:2], 'ab')
+        self.assertEqual(order[-2:], 'ef')
+        order = ''.join(node.name
+                        for node in get_reverse_postorder(g.nodes,
+                                                          [nodes['f']],
+                                                          forward=False))
+        self.assertEqual(order[:2], 'fe')
+        self.assertEqual(order[-1], 'a')
+
+class SolverTests(unittest.TestCase):
+    def test_forward_may(self):
+        g, nodes = make_diamond_with_loop()
+        p = NamesSeen(g)
+        result = p.solve()
+        self.assertEqual(p.names_before(result, 'a', nodes), '')
+        self.assertEqual(p.names_after(result, 'a', nodes), 'a')
+        # "b" can be reached via the loop:
+        self.assertEqual(p.names_before(result, 'b', nodes), 'abcde')
+        self.assertEqual(p.names_after(result, 'f', nodes), 'abcdef')
+
+    def test_forward_must(self):
+        g, nodes = make_diamond_with_loop()
+        p = NamesSeen(g, may=False)
+        result = p.solve()
+        self.assertEqual(p.names_before(result, 'b', nodes), 'a')
+        # Only one of "c" and "d" must have been seen:
+        self.assertEqual(p.names_before(result, 'e', nodes), 'ab')
+        self.assertEqual(p.names_after(result, 'f', nodes), 'abef')
+
+    def test_backward(self):
+        g, nodes = make_diamond_with_loop()
+        p = NamesSeen(g, direction=BACKWARD)
+        result = p.solve()
+        self.assertEqual(p.names_after(result, 'f', nodes), '')
+        self.assertEqual(p.names_before(result, 'f', nodes), 'f')
+        self.assertEqual(p.names_after(result, 'a', nodes), 'bcdef')
+
+    def test_kill(self):
+        g, nodes = make_diamond_with_loop()
+        p = NamesSeen(g, killers='c')
+        result = p.solve()
+        self.assertEqual(p.names_after(result, 'c', nodes), 'c')
+        self.assertEqual(p.names_before(result, 'e', nodes), 'abcde')
+        self.assertEqual(p.names_before(result, 'd', nodes), 'abcde')
+
+    def test_disjoint(self):
+        g, nodes = make_graph('abxy', ['ab', 'xy'])
+        p = NamesSeen(g)
+        result = p.solve()
+        self.assertEqual(p.names_after(result, 'b', nodes), 'ab')
+        self.assertEqual(p.names_after(result, 'y', nodes), 'xy')
+
+    def test_long_loop(self):
+        # A long loop, which needs information to propagate all the way
+        # around the back edge:
+        LENGTH = 10000
+        names = [str(i) for i in range(LENGTH)]
+        g = Graph()
+        nodes = [g.add_node(NamedNode(name)) for name in names]
+        for i in range(LENGTH - 1):
+            g.add_edge(nodes[i], nodes[i + 1])
+        g.add_edge(nodes[-1], nodes[1])
+        p = NamesSeen(g)
+        result = p.solve()
+        self.assertEqual(len(p.domain.to_set(result.get_before(nodes[1]))),
+                         LENGTH)
+        # Visiting in reverse-postorder means we only need to go around the
+        # loop twice:
+        self.assertTrue(result.iterations <= 2 * LENGTH)
+
+import sys
+sys.argv = ['foo', '-v']
+
+unittest.main()
@@ -27,7 +27,7 @@
 
 import unittest
 
-from gccutils.graph import Graph, Node, Edge
+from gccutils.graph import Graph, Node, Edge, batch_sccs
 
 class NamedNode(Node):
     def __init__(self, name=None):
@@ -109,7 +109,12 @@ class PathfindingTests(unittest.TestCase):
         b = g.add_node(Node())
         # no edges between them
         path = g.get_shortest_path(a, b)
-        self.assertEqual(path, []) # FIXME: shouldn't this be None?
+        self.assertEqual(path, None)
+
+    def test_path_to_self(self):
+        g, a, b, ab = make_trivial_graph()
+        path = g.get_shortest_path(a, a)
+        self.assertEqual(path, [])
 
     def test_trivial_path(self):
         g, a, b, ab = make_trivial_graph()
@@ -165,6 +170,122 @@ class PathfindingTests(unittest.TestCase):
         self.assertEqual(p1, be)
         self.assertEqual(p2, ef)
 
+    def test_cache_invalidation(self):
+        # Verify that modifying the graph discards cached BFS trees:
+        g, a, b, ab = make_trivial_graph()
+        c = g.add_node(NamedNode('c'))
+        self.assertEqual(g.get_shortest_path(a, c), None)
+        bc = g.add_edge(b, c)
+        self.assertEqual(g.get_shortest_path(a, c), [ab, bc])
+        ac = g.add_edge(a, c)
+        self.assertEqual(g.get_shortest_path(a, c), [ac])
+
+class SccTests(unittest.TestCase):
+    def test_cycles(self):
+        # Three cycles, with a ─> b ─> c:
+        LENGTH = 5
+        g = Graph()
+        a = add_cycle(g, LENGTH)
+        b = add_cycle(g, LENGTH)
+        c = add_cycle(g, LENGTH)
+        g.add_edge(a, b)
+        g.add_edge(b, c)
+        sccs = g.get_strongly_connected_components()
+        self.assertEqual(len(sccs), 3)
+        for scc in sccs:
+            self.assertEqual(len(scc), LENGTH)
+        # Reverse topological order:
+        self.assertIn(c, sccs[0])
+        self.assertIn(b, sccs[1])
+        self.assertIn(a, sccs[2])
+
+    def test_long_path(self):
+        # Verify that we don't hit the recursion limit:
+        LENGTH = 10000
+        g = Graph()
+        first, last = add_long_path(g, LENGTH)
+        sccs = g.get_strongly_connected_components()
+        self.assertEqual(len(sccs), LENGTH + 1)
+        self.assertEqual(sccs[0], [last])
+        self.assertEqual(sccs[-1], [first])
+
+    def test_batches(self):
+        # Verify the batching for:
+        #  a ─┬─> b ─> d
+        #     └─> c ─┘
+        #  e ─> f
+        g = Graph()
+        a, b, c, d, e, f = [g.add_node(NamedNode(name))
+                            for name in 'abcdef']
+        for src, dst in [(a, b), (a, c), (b, d), (c, d), (e, f)]:
+            g.add_edge(src, dst)
+        def get_dsts(node):
+            return [edge.dstnode for edge in node.succs]
+        batches = batch_sccs(g.get_strongly_connected_components(), get_dsts)
+        def names(batch):
+            return ''.join(sorted(str(scc[0]) for scc in batch))
+        self.assertEqual([names(batch) for batch in batches],
+                         ['df', 'bce', 'a'])
+
+class ReachabilityTests(unittest.TestCase):
+    def assertMatchesBfs(self, g):
+        # Verify that the index gives the same results as a BFS for every
+        # pair of nodes:
+        index = g.build_reachability_index()
+        for src in g.nodes:
+            reachable = g.get_bfs_tree(src)
+            for dst in g.nodes:
+                self.assertEqual(index.is_reachable(src, dst),
+                                 dst in reachable)
+                self.assertEqual(g.is_reachable(src, dst),
+                                 dst in reachable)
+
+    def test_trivial(self):
+        g, a, b, ab = make_trivial_graph()
+        g.build_reachability_index()
+        self.assertTrue(g.is_reachable(a, b))
+        self.assertFalse(g.is_reachable(b, a))
+        self.assertTrue(g.is_reachable(a, a))
+
+    def test_cycles(self):
+        LENGTH = 5
+        g = Graph()
+        a = add_cycle(g, LENGTH)
+        b = add_cycle(g, LENGTH)
+        c = add_cycle(g, LENGTH)
+        d = add_cycle(g, LENGTH)
+        g.add_edge(a, b)
+        g.add_edge(b, c)
+        g.add_edge(a, d)
+        self.assertMatchesBfs(g)
+
+    def test_random_graphs(self):
+        import random
+        rng = random.Random(42)
+        for i in range(20):
+            g = Graph()
+            nodes = [g.add_node(NamedNode(str(j))) for j in range(30)]
+            for j in range(rng.randint(0, 60)):
+                g.add_edge(rng.choice(nodes), rng.choice(nodes))
+            self.assertMatchesBfs(g)
+
+    def test_invalidation(self):
+        g, a, b, ab = make_trivial_graph()
+        g.build_reachability_index()
+        self.assertFalse(g.is_reachable(b, a))
+        g.add_edge(b, a)
+        self.assertTrue(g.is_reachable(b, a))
+
+    def test_long_path(self):
+        LENGTH = 10000
+        g = Graph()
+        first, last = add_long_path(g, LENGTH)
+        g.build_reachability_index()
+        self.assertTrue(g.is_reachable(first, last))
+        self.assertFalse(g.is_reachable(last, first))
+        path = g.get_shortest_path(first, last)
+        self.assertEqual(len(path), LENGTH)
+
 import sys
 sys.argv = ['foo', '-v']
 
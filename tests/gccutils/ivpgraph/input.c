@@ -0,0 +1,59 @@
+/*
+   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+   Copyright 2013 Red Hat, Inc.
+
+   This is free software: you can redistribute it and/or modify it
+   under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful, but
+   WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+   General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program.  If not, see
+   <http://www.gnu.org/licenses/>.
+*/
+
+/*
+   Exercise the eager, lazy and functional variants of IvpGraph
+*/
+
+static int depth3(int i)
+{
+    return i + 1;
+}
+
+static int depth2(int i)
+{
+    return depth3(i) * 2;
+}
+
+static int depth1(int i)
+{
+    return depth2(i) - depth3(i);
+}
+
+static void never_returns(void)
+{
+    for (;;) {
+    }
+}
+
+int test(int i)
+{
+    if (i < 0) {
+        never_returns();
+    }
+    return depth1(i);
+}
+
+/*
+  PEP-7
+Local variables:
+c-basic-offset: 4
+indent-tabs-mode: nil
+End:
+*/
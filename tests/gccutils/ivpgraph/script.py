@@ -0,0 +1,83 @@
+#   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2013 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Exercise the eager, lazy and functional variants of IvpGraph
+import gcc
+
+from gccutils.graph.supergraph import Supergraph, CallToReturnSiteEdge
+from gccutils.graph.ivpgraph import IvpGraph, FunctionalIvpGraph
+
+def walk(graph):
+    visited = set(graph.get_entry_nodes())
+    worklist = list(visited)
+    while worklist:
+        node = worklist.pop()
+        for edge in node.succs:
+            if edge.dstnode not in visited:
+                visited.add(edge.dstnode)
+                worklist.append(edge.dstnode)
+    return visited
+
+def get_function_names(nodes):
+    return set(node.function.decl.name
+               for node in nodes
+               if node.function)
+
+def on_pass_execution(p, fn):
+    if p.name == '*free_lang_data':
+        sg = Supergraph(split_phi_nodes=False,
+                        add_fake_entry_node=True)
+
+        # Eager:
+        eager = IvpGraph(sg, maxlength=1)
+        assert len(list(eager.get_entry_nodes())) == 1
+        assert set(eager.get_functions()) == set(sg.get_functions())
+        for node in eager.nodes:
+            # Callstrings are interned:
+            callnodes = node.callstring.callnodes
+            assert eager.get_callstring(callnodes) is node.callstring
+        assert get_function_names(eager.nodes) == \
+            set(['test', 'depth1', 'depth2', 'depth3', 'never_returns'])
+
+        # Lazy: initially just the entry node:
+        lazy = IvpGraph(sg, maxlength=1, lazy=True)
+        assert len(lazy.nodes) == 1
+        assert list(lazy.get_entry_nodes()) == list(lazy.nodes)
+        assert set(lazy.get_functions()) == set(sg.get_functions())
+        visited = walk(lazy)
+        assert len(visited) == len(lazy.nodes)
+        assert get_function_names(visited) == get_function_names(eager.nodes)
+
+        # Functional:
+        functional = FunctionalIvpGraph(sg)
+        can_return = dict((fun.decl.name, value)
+                          for fun, value in functional.can_return.items())
+        assert can_return['depth3']
+        assert can_return['depth1']
+        assert can_return['test']
+        assert not can_return['never_returns']
+        # Each supernode appears at most once:
+        assert len(functional.nodes) <= len(sg.nodes)
+        assert get_function_names(functional.nodes) == \
+            get_function_names(eager.nodes)
+        # There's no summary edge for the call to never_returns():
+        for edge in functional.edges:
+            if isinstance(edge.inneredge, CallToReturnSiteEdge):
+                assert edge.srcnode.stmt.fndecl.name != 'never_returns'
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
@@ -0,0 +1,109 @@
+#   Copyright 2013 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2013 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that LazySupergraph only builds the functions that are reached
+import gcc
+
+from gccutils.graph.supergraph import Supergraph, LazySupergraph
+
+def get_materialized_names(sg):
+    return set(fun.decl.name for fun in sg.stmtg_for_fun)
+
+def walk(node):
+    visited = set([node])
+    worklist = [node]
+    while worklist:
+        node = worklist.pop()
+        for edge in node.succs:
+            if edge.dstnode not in visited:
+                visited.add(edge.dstnode)
+                worklist.append(edge.dstnode)
+    return visited
+
+def on_pass_execution(p, fn):
+    if p.name == '*free_lang_data':
+        sg = LazySupergraph(split_phi_nodes=False,
+                            add_fake_entry_node=False)
+        assert sg.get_num_materialized() == 0
+        funs = dict((fun.decl.name, fun) for fun in sg.get_functions())
+
+        # Walking from the entry of top() should build its callees, but
+        # not other():
+        walk(sg.get_entry_node(funs['top']))
+        assert get_materialized_names(sg) == set(['top', 'middle', 'leaf'])
+
+        # Once every function is built, the result should be the same
+        # shape as the eager Supergraph:
+        for fun in funs.values():
+            sg.get_stmtgraph(fun)
+        eager = Supergraph(split_phi_nodes=False,
+                           add_fake_entry_node=False)
+        assert len(sg.nodes) == len(eager.nodes)
+        assert len(sg.edges) == len(eager.edges)
+
+        # Walking backwards from the entry of leaf() needs its callers:
+        sg = LazySupergraph(split_phi_nodes=False,
+                            add_fake_entry_node=False)
+        entry = sg.get_entry_node(funs['leaf'])
+        assert get_materialized_names(sg) == set(['leaf'])
+        callers = set(edge.srcnode.function.decl.name for edge in entry.preds)
+        assert callers == set(['top', 'middle'])
+
+        # Verify eviction:
+        sg = LazySupergraph(split_phi_nodes=False,
+                            add_fake_entry_node=False,
+                            maxfunctions=1)
+        sg.get_stmtgraph(funs['other'])
+        sg.get_stmtgraph(funs['leaf'])
+        assert get_materialized_names(sg) == set(['leaf'])
+
+        # Searching for paths expands the graph as it goes:
+        sg = LazySupergraph(split_phi_nodes=False,
+                            add_fake_entry_node=False)
+        top_entry = sg.get_entry_node(funs['top'])
+        leaf_exit = sg.get_exit_node(funs['leaf'])
+        other_entry = sg.get_entry_node(funs['other'])
+        path = sg.get_shortest_path(top_entry, leaf_exit)
+        assert path
+        assert path[0].srcnode == top_entry
+        assert path[-1].dstnode == leaf_exit
+        for edge, nextedge in zip(path, path[1:]):
+            assert edge.dstnode == nextedge.srcnode
+        # (the result is cached):
+        assert sg.get_shortest_path(top_entry, leaf_exit) == path
+        assert sg.is_reachable(top_entry, leaf_exit)
+        assert not sg.is_reachable(top_entry, other_entry)
+        assert sg.get_shortest_path(top_entry, other_entry) is None
+        sg.build_reachability_index()
+        assert sg.is_reachable(top_entry, leaf_exit)
+        assert not sg.is_reachable(top_entry, other_entry)
+
+        # ...even if that evicts functions along the way:
+        sg = LazySupergraph(split_phi_nodes=False,
+                            add_fake_entry_node=False,
+                            maxfunctions=1)
+        top_entry = sg.get_entry_node(funs['top'])
+        assert sg.is_reachable(top_entry, top_entry)
+        assert len(sg.get_bfs_tree(top_entry)) > 1
+
+        # The fake entry node should lead to all of the public functions:
+        sg = LazySupergraph(split_phi_nodes=False,
+                            add_fake_entry_node=True)
+        assert len(list(sg.fake_entry_node.succs)) == 4
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
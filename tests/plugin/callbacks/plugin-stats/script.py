@@ -0,0 +1,73 @@
+#   Copyright 2012 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2012 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that gcc.get_plugin_stats() reports on the time spent in Python
+# callbacks and passes, and on counters added by gcc.add_plugin_stat()
+
+import gcc
+
+def on_pass_execution(p, fn):
+    pass
+
+class TestPass(gcc.GimplePass):
+    def gate(self, fun):
+        return True
+
+    def execute(self, fun):
+        gcc.add_plugin_stat('test.functions')
+        gcc.add_plugin_stat('test.total', 2)
+
+def on_finish():
+    gcc.add_plugin_stat('test.total', value=3)
+    stats = gcc.get_plugin_stats()
+    assert sorted(stats.keys()) == ['callbacks', 'counters', 'passes',
+                                    'startup']
+    assert stats['counters'] == {'test.functions': 1, 'test.total': 5}
+
+    phases = [phase['phase'] for phase in stats['startup']]
+    assert phases == ['Py_Initialize', 'gcc module', 'wrapper types', 'script']
+    for phase in stats['startup']:
+        assert phase['wall_time'] >= 0.0
+        assert phase['cpu_time'] >= 0.0
+
+    callbacks = dict((cb['name'], cb) for cb in stats['callbacks'])
+    cb = callbacks['__main__.on_pass_execution']
+    assert cb['event'] == 'PLUGIN_PASS_EXECUTION'
+    assert cb['calls'] > 0
+    assert cb['wall_time'] >= cb['max_wall_time'] >= 0.0
+    assert cb['cpu_time'] >= 0.0
+
+    # This callback is still running, so its call isn't recorded yet:
+    assert callbacks['__main__.on_finish']['calls'] == 0
+
+    methods = dict((p['method'], p)
+                   for p in stats['passes']
+                   if p['pass'] == 'test-pass')
+    assert sorted(methods.keys()) == ['execute', 'gate']
+    for method in methods.values():
+        assert method['name'] == '__main__.TestPass'
+        assert method['calls'] == 1
+        assert method['slowest_function'] == 'main'
+    print('OK')
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
+gcc.register_callback(gcc.PLUGIN_FINISH,
+                      on_finish)
+
+ps = TestPass(name='test-pass')
+ps.register_after('cfg')
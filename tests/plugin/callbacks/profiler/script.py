@@ -0,0 +1,57 @@
+#   Copyright 2012 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2012 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that gccutils.profiler (as used by -fplugin-arg-python-profile)
+# records the Python passes
+
+import os
+import pstats
+import shutil
+import tempfile
+
+import gcc
+from gccutils import profiler
+
+class TestPass(gcc.GimplePass):
+    def execute(self, fun):
+        pass
+
+def on_finish(tmpdir):
+    # (we run before the profiler's own PLUGIN_FINISH callback)
+    filename = profiler.stop()
+    assert os.path.dirname(filename) == tmpdir
+    assert filename.endswith('.pstats')
+
+    stats = pstats.Stats(filename)
+    executed = [func for (filename, line, func) in stats.stats
+                if func == 'execute']
+    assert executed
+
+    # Stopping twice is harmless:
+    assert profiler.stop() is None
+
+    shutil.rmtree(tmpdir)
+    print('OK')
+
+tmpdir = tempfile.mkdtemp()
+profiler.start(tmpdir)
+
+gcc.register_callback(gcc.PLUGIN_FINISH,
+                      on_finish, tmpdir)
+
+ps = TestPass(name='test-pass')
+ps.register_after('cfg')
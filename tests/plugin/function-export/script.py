@@ -0,0 +1,82 @@
+#   Copyright 2011 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2011 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that gcc.Function.export() gives the same information as walking
+# the CFG
+
+import gcc
+
+def on_pass_execution(p, fn):
+    if p.name != '*warn_function_return':
+        return
+
+    data = fn.export()
+    assert sorted(data.keys()) == ['blocks', 'edges', 'entry', 'exit',
+                                   'locations', 'stmts', 'trees']
+    stmts = data['stmts']
+    trees = data['trees']
+
+    assert data['entry'] == fn.cfg.entry.index
+    assert data['exit'] == fn.cfg.exit.index
+
+    # Each tree is only listed once:
+    assert len(set(id(t) for t in trees)) == len(trees)
+
+    blocks = dict((index, (phi_ids, stmt_ids))
+                  for index, phi_ids, stmt_ids in data['blocks'])
+    assert sorted(blocks.keys()) == sorted(bb.index
+                                           for bb in fn.cfg.basic_blocks)
+
+    expected_edges = sorted((e.src.index, e.dest.index)
+                            for bb in fn.cfg.basic_blocks
+                            for e in bb.succs)
+    assert sorted((src, dest)
+                  for src, dest, flags in data['edges']) == expected_edges
+    bbs = dict((bb.index, bb) for bb in fn.cfg.basic_blocks)
+    for src, dest, flags in data['edges']:
+        for e in bbs[src].succs:
+            if e.dest.index == dest:
+                assert bool(flags & gcc.EDGE_TRUE_VALUE) == e.true_value
+                assert bool(flags & gcc.EDGE_FALSE_VALUE) == e.false_value
+
+    callees = []
+    for bb in fn.cfg.basic_blocks:
+        phi_ids, stmt_ids = blocks[bb.index]
+        assert len(phi_ids) == len(bb.phi_nodes or [])
+        assert len(stmt_ids) == len(bb.gimple or [])
+        for stmt, stmt_id in zip(bb.gimple or [], stmt_ids):
+            kind, bb_index, loc_id, op_ids, extra = stmts[stmt_id]
+            assert kind is type(stmt)
+            assert bb_index == bb.index
+            if loc_id != -1:
+                filename, line, column = data['locations'][loc_id]
+                assert line == stmt.loc.line
+            if isinstance(stmt, gcc.GimpleAssign):
+                assert trees[op_ids[0]] is stmt.lhs
+                assert [trees[op_id] for op_id in op_ids[1:]] == stmt.rhs
+            if isinstance(stmt, gcc.GimpleCall):
+                assert [trees[op_id] for op_id in op_ids[3:]] == stmt.args
+                if extra == -1:
+                    callees.append(None)
+                else:
+                    assert trees[extra] is stmt.fndecl
+                    callees.append(trees[extra].name)
+    assert callees == ['bar', None]
+    print('OK')
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
@@ -0,0 +1,58 @@
+#   Copyright 2011 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2011 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that gcc.Function.gimple_list() gives the same statements as
+# walking the CFG, and that its filters work
+
+import gcc
+
+def on_pass_execution(p, fn):
+    if p.name != '*warn_function_return':
+        return
+
+    all_stmts = []
+    for bb in fn.cfg.basic_blocks:
+        all_stmts += bb.phi_nodes or []
+        all_stmts += bb.gimple or []
+    assert fn.gimple_list() == all_stmts
+
+    calls = [stmt for stmt in all_stmts
+             if isinstance(stmt, gcc.GimpleCall)]
+    assert fn.gimple_list(kinds=gcc.GimpleCall) == calls
+    assert fn.gimple_list(kinds=(gcc.GimpleCall,)) == calls
+    assert (fn.gimple_list(kinds=(gcc.GimpleCall, gcc.GimpleReturn))
+            == [stmt for stmt in all_stmts
+                if isinstance(stmt, (gcc.GimpleCall, gcc.GimpleReturn))])
+
+    def callees(**kwargs):
+        return [stmt.fndecl.name for stmt in fn.gimple_list(**kwargs)]
+    assert callees(callees=['bar']) == ['bar', 'bar']
+    assert sorted(callees(callees=set(['bar', 'baz']))) == ['bar', 'bar', 'baz']
+    assert callees(callees=['not_a_function_anywhere']) == []
+    assert callees(kinds=gcc.GimpleReturn, callees=['bar']) == []
+
+    try:
+        fn.gimple_list(callees='bar')
+    except TypeError:
+        pass
+    else:
+        raise AssertionError('expected a TypeError')
+
+    print('OK')
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
@@ -0,0 +1,67 @@
+#   Copyright 2012 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2012 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+
+# Verify that the wrapper caches can be told not to keep wrappers alive,
+# whilst still giving a 1-1 mapping for wrappers that are in use
+
+import gcc
+
+def expect_value_error(fn, *args, **kwargs):
+    try:
+        fn(*args, **kwargs)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('expected a ValueError')
+
+expect_value_error(gcc.set_wrapper_cache_policy, 'bogus')
+expect_value_error(gcc.set_wrapper_cache_policy, 'lru')
+expect_value_error(gcc.set_wrapper_cache_policy, 'weak', flush='never')
+
+gcc.set_wrapper_cache_policy('weak', flush='pass')
+
+def on_pass_execution(p, fn):
+    if p.name != '*warn_function_return':
+        return
+
+    decl = fn.decl
+    gcc.flush_wrapper_caches()
+    stats = gcc.get_wrapper_cache_stats()
+    assert stats['gcc.Tree']['strong'] == 0
+
+    # The wrapper is still alive, and thus must be reused:
+    assert fn.decl is decl
+    hits = gcc.get_wrapper_cache_stats()['gcc.Tree']['hits']
+    assert hits == stats['gcc.Tree']['hits'] + 1
+
+    # The cache doesn't keep unused wrappers alive:
+    size = stats['gcc.Tree']['size']
+    fn.decl.result
+    assert gcc.get_wrapper_cache_stats()['gcc.Tree']['size'] == size
+
+    # With an LRU policy, recently-used wrappers are kept alive:
+    gcc.set_wrapper_cache_policy('lru', maxsize=16)
+    fn.decl.result
+    assert gcc.get_wrapper_cache_stats()['gcc.Tree']['size'] == size + 1
+    gcc.flush_wrapper_caches()
+    assert gcc.get_wrapper_cache_stats()['gcc.Tree']['size'] == size
+
+    print('OK')
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
@@ -0,0 +1,47 @@
+#   Copyright 2012 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2012 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Verify that wrapper objects are unique per GCC object, and that
+# gcc.get_wrapper_cache_stats() reports on the caches that enforce this
+
+import gcc
+
+def on_pass_execution(p, fn):
+    if p.name != '*warn_function_return':
+        return
+
+    before = gcc.get_wrapper_cache_stats()
+
+    # Repeated lookups should yield the same wrapper objects:
+    assert fn.decl is fn.decl
+    assert fn.cfg.entry is fn.cfg.entry
+    for bb in fn.cfg.basic_blocks:
+        if bb.gimple:
+            assert bb.gimple[0] is bb.gimple[0]
+
+    after = gcc.get_wrapper_cache_stats()
+    for name in ('gcc.Tree', 'gcc.Gimple', 'gcc.BasicBlock'):
+        stats = after[name]
+        assert sorted(stats.keys()) == ['capacity', 'hits', 'misses', 'size',
+                                        'strong']
+        assert stats['size'] <= stats['misses']
+        assert stats['size'] < stats['capacity']
+        assert stats['hits'] > before.get(name, {}).get('hits', 0)
+    print('OK')
+
+gcc.register_callback(gcc.PLUGIN_PASS_EXECUTION,
+                      on_pass_execution)
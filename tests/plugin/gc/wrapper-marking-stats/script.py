@@ -0,0 +1,47 @@
+#   Copyright 2012 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2012 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+
+# Verify that gcc.get_wrapper_marking_stats() reports on the marking of
+# wrapped objects during garbage collection
+
+import gcc
+
+def on_finish():
+    before = gcc.get_wrapper_marking_stats()
+
+    # Create some wrappers, of both kinds:
+    types = [tu.block for tu in gcc.get_translation_units()]
+    options = gcc.get_option_list()
+
+    gcc._force_garbage_collection()
+
+    after = gcc.get_wrapper_marking_stats()
+    assert after['num_walks'] == before['num_walks'] + 1
+    assert after['live_marked_wrappers'] >= len(types)
+    assert after['live_unmarked_wrappers'] >= len(options)
+
+    # Only the wrappers of GC-managed objects get walked:
+    assert after['last_marked'] == after['live_marked_wrappers']
+    assert (after['total_marked']
+            == before['total_marked'] + after['last_marked'])
+    assert after['last_time'] >= 0.0
+    assert after['total_time'] >= before['total_time']
+    print('OK')
+
+gcc.register_callback(gcc.PLUGIN_FINISH,
+                      on_finish)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+#   Copyright 2011 David Malcolm <dmalcolm@redhat.com>
+#   Copyright 2011 Red Hat, Inc.
+#
+#   This is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see
+#   <http://www.gnu.org/licenses/>.
+
+# Selftest for gcc.Gimple.find_trees and gcc.Tree.find_trees
+import gcc
+
+class FindTreeNodesPass(gcc.GimplePass):
+    def execute(self, fun):
+        # This is called per-function during compilation:
+        print('fun: %s' % fun)
+        for bb in fun.cfg.basic_blocks:
+            if bb.gimple:
+                for stmt in bb.gimple:
+                    print('  stmt: %s' % stmt)
+                    self.check_stmt(stmt)
+
+    def check_stmt(self, stmt):
+        # Locate the first string constant in each statement:
+        nodes = stmt.find_trees(gcc.StringCst, first=True)
+        assert len(nodes) <= 1
+        if nodes:
+            node = nodes[0]
+            print('    node: %r (%s)' % (node, node))
+            assert node is stmt.walk_tree(self.is_string_cst)
+
+        # Without any filtering, we should see the same nodes as walk_tree:
+        seen = set()
+        def visit(node):
+            seen.add(node)
+        stmt.walk_tree(visit)
+        assert set(stmt.find_trees()) == seen
+
+        # Filtering on a class of tree codes:
+        assert (set(stmt.find_trees((gcc.Constant, gcc.Reference)))
+                == set(node for node in seen
+                       if isinstance(node, (gcc.Constant, gcc.Reference))))
+
+        # Limiting the depth:
+        for node in stmt.find_trees(max_depth=0):
+            assert node in seen
+            assert node.find_trees(max_depth=0) == [node]
+            assert set(node.find_trees()) <= seen
+
+    def is_string_cst(self, node):
+        return isinstance(node, gcc.StringCst)
+
+ps = FindTreeNodesPass(name='find-tree-nodes')
+ps.register_after('cfg')